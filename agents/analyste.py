@@ -6,6 +6,11 @@ from utils.llm import llm_call
 
 logger = logging.getLogger(__name__)
 
+# À incrémenter à chaque modification du prompt : la version fait partie de la
+# clé du cache de l'analyste (`pipeline.analyst_cache`), les anciennes analyses
+# cessent alors d'être servies.
+ANALYST_PROMPT_VERSION = 1
+
 
 def agent_analyste(user_question, api_key=None, model_name="gemini-3-flash-preview"):
     """
@@ -1,84 +1,193 @@
 """
 Agent Ranker : Classe et score les résultats de recherche
+
+Deux étages :
+
+1. un **pré-filtre déterministe** (`prefilter`), sans appel LLM : priorité par
+   domaine, écartement des pages de navigation (recherches, sommaires,
+   accueils) et recouvrement lexical entre titre/extrait et concepts de
+   l'analyste ;
+2. le **classement LLM par lots** (`RANKER_SHARD_SIZE` candidats par appel),
+   lancés en parallèle puis fusionnés par score. La durée de l'étape est celle
+   du lot le plus lent, et non plus celle d'une génération JSON géante.
+
+Avec `on_result`, chaque lot est streamé et chaque candidat noté est notifié
+dès que son objet est complet (`pipeline.normalizer.JsonArrayObjectExtractor`) :
+le scraping des sources retenues démarre pendant la fin du classement.
+
+Aucun candidat n'est perdu en silence : ceux écartés par le pré-filtre, ou
+oubliés par le modèle, sont rendus avec `keep=False` et la raison de l'écart.
 """
 import datetime
+import json
 import logging
-from typing import List, Dict
-from utils.llm import llm_call
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from pipeline.normalizer import JsonArrayObjectExtractor
+from utils import profiler
+from utils.json_utils import lire_json_beton
+from utils.legal_ids import legal_refs
+from utils.llm import llm_call, llm_call_stream
+from utils.passages import build_query, tokenize
 
 logger = logging.getLogger(__name__)
 
+# Candidats par appel LLM, et appels simultanés au plus.
+RANKER_SHARD_SIZE = int(os.getenv("RANKER_SHARD_SIZE", "20"))
+RANKER_MAX_WORKERS = int(os.getenv("RANKER_MAX_WORKERS", "6"))
+# Candidats transmis au LLM au plus, après pré-filtre (les suivants, moins bien
+# notés par le pré-filtre, sont rendus écartés avec leur raison).
+RANKER_MAX_CANDIDATES = int(os.getenv("RANKER_MAX_CANDIDATES", "150"))
+# Format de sortie demandé au LLM : "verbose" (un objet JSON par candidat,
+# raison comprise) ou "compact" (`r1:0.92:K:raison` / `r2:0.10`, une ligne par
+# candidat, raison pour les seuls conservés).
+RANKER_OUTPUT = os.getenv("RANKER_OUTPUT", "verbose")
+RANKER_OUTPUTS = ("verbose", "compact")
+# Tokens de sortie par candidat, selon le format.
+_TOKENS_PER_CANDIDATE = {"verbose": 120, "compact": 40}
 
-def agent_ranker(
+# Ligne du format compact. Tolérant : séparateurs « : » ou « | », virgule
+# décimale, puces ou espaces en tête, drapeau K/D facultatif.
+_COMPACT_LINE_RE = re.compile(
+    r"^[\s\-*•`]*(r\d+)\s*[:|]\s*([01](?:[.,]\d+)?)\s*(?:[:|]\s*([KkDd])\b\s*(?:[:|]\s*(.*?))?)?\s*$"
+)
+
+# Priorité a priori d'un domaine (0..1) : sources officielles d'abord.
+_DOMAIN_PRIORS = {
+    "legifrance.gouv.fr": 1.0,
+    "bofip.impots.gouv.fr": 1.0,
+    "conseil-etat.fr": 0.9,
+    "courdecassation.fr": 0.9,
+    "conseil-constitutionnel.fr": 0.9,
+    "europa.eu": 0.85,
+    "opendata.justice-administrative.fr": 0.8,
+    "justicelibre.org": 0.8,
+    "assemblee-nationale.fr": 0.6,
+    "senat.fr": 0.6,
+    "fiscalonline.fr": 0.6,
+}
+_DEFAULT_PRIOR = 0.3
+# En dessous, un candidat sans aucun recouvrement avec la question est écarté.
+_PRIOR_KEEP_WITHOUT_OVERLAP = 0.8
+
+# Pages de navigation : listes de résultats, sommaires, accueils, plans de site.
+_NAVIGATION_RE = re.compile(
+    r"(?i)(/search\b|/recherche\b|[?&](q|query|searchField|page)=|/liste/|/sommaire|"
+    r"/plan-du-site|/accueil/?$|/home/?$|/tag/|/categorie/|/rss\b|/contact\b)"
+)
+
+
+def source_prior(domain: str) -> float:
+    """Priorité a priori d'un domaine (sous-domaines compris)."""
+    domain = (domain or "").lower()
+    for known, prior in _DOMAIN_PRIORS.items():
+        if domain == known or domain.endswith("." + known):
+            return prior
+    return _DEFAULT_PRIOR
+
+
+def _is_navigation(url: str) -> bool:
+    if not url:
+        return True
+    parsed = urlparse(url)
+    if parsed.path in ("", "/") and not parsed.query:
+        return True
+    return bool(_NAVIGATION_RE.search(url))
+
+
+def prefilter(
+    results: List[Dict],
     question: str,
-    structured_results: List[Dict],
-    analyst_results: str,
-    specialists_results,
-    openai_api_key: str,
-    model: str = "gpt-4o"
-) -> List[Dict]:
+    analyst_json: Optional[dict] = None,
+    max_candidates: int = RANKER_MAX_CANDIDATES,
+) -> Tuple[List[Dict], List[Dict]]:
+    """Pré-filtre déterministe des candidats, avant tout appel LLM.
+
+    Returns:
+        (candidats à classer, triés par score de pré-filtre décroissant ;
+        candidats écartés, avec `keep=False`, `score=0.0` et la raison).
     """
-    Utilise OpenAI GPT-4o pour réordonner et filtrer les résultats légaux/fiscaux via un prompt expert.
+    query = set(build_query(question, analyst_json))
+    scored: List[Tuple[float, Dict]] = []
+    dropped: List[Dict] = []
+    for r in results:
+        url = r.get("url", "")
+        domain = r.get("source_domain") or urlparse(url).netloc
+        prior = source_prior(domain)
+        if _is_navigation(url):
+            dropped.append(_dropped(r, "Pré-filtre : page de navigation (recherche, sommaire, accueil)."))
+            continue
+        tokens = set(tokenize(f"{r.get('title', '')} {r.get('snippet', '')}"))
+        overlap = len(tokens & query) / len(query) if query else 0.0
+        if overlap == 0.0 and query and prior < _PRIOR_KEEP_WITHOUT_OVERLAP:
+            dropped.append(_dropped(r, "Pré-filtre : aucun concept de la question ni de l'analyse."))
+            continue
+        scored.append((prior + overlap, r))
 
-    Args:
-        question: Question de l'utilisateur.
-        structured_results: Liste de résultats structurés (de search_official_sources, format dict avec title, url, snippet...).
-        analyst_results: Résultats de l'agent analyste.
-        specialists_results: Résultats des agents spécialisés.
-        openai_api_key: Clé API OpenAI.
-        model: Modèle OpenAI (par défaut gpt-4o).
+    scored.sort(key=lambda x: x[0], reverse=True)
+    kept = [r for _, r in scored[:max_candidates]]
+    for _, r in scored[max_candidates:]:
+        dropped.append(_dropped(r, f"Pré-filtre : au-delà des {max_candidates} candidats les mieux notés."))
+    return kept, dropped
 
-    Returns:
-        La liste renvoyée par GPT (JSON["results"]), chaque dict étant enrichi avec toutes les infos de structured_results correspondantes (title, url, snippet, etc).
+
+def speculative_candidates(
+    results: List[Dict],
+    question: str,
+    analyst_json: Optional[dict] = None,
+    min_prior: float = 1.0,
+) -> List[Dict]:
+    """Candidats très probablement retenus par le ranker, à scraper par anticipation.
+
+    Sources de priorité maximale (Légifrance, BOFiP) qui passent le pré-filtre,
+    dans l'ordre du pré-filtre (recouvrement avec la question d'abord).
     """
+    kept, _ = prefilter(results, question, analyst_json)
+    return [r for r in kept
+            if source_prior(r.get("source_domain") or urlparse(r.get("url", "")).netloc) >= min_prior]
 
-    # Cap : au-delà de 100 candidats le JSON de réponse dépasse max_tokens (16 384)
-    MAX_CANDIDATES = 100
-    if len(structured_results) > MAX_CANDIDATES:
-        logger.warning(
-            "Ranker : %d candidats → tronqué à %d (limite max_tokens)",
-            len(structured_results), MAX_CANDIDATES,
-        )
-        structured_results = structured_results[:MAX_CANDIDATES]
 
-    # Prépare les candidats conformément au format attendu pour le prompt (ajoute id...)
-    candidates = []
-    for idx, r in enumerate(structured_results):
-        candidate = {
-            "id": f"r{idx+1}",
-            "title": r.get("title", ""),
-            "snippet": r.get("snippet", ""),
-            "url": r.get("url", ""),
-        }
-        # Déduit le type de source simplifié pour aider le LLM (si possible)
-        domain = r.get("source_domain", "")
-        if "legifrance" in domain:
-            candidate["source_type"] = "CGI"
-        elif "bofip" in domain:
-            candidate["source_type"] = "BOFIP"
-        elif "conseil-etat" in domain or "jade.conseil-etat" in domain:
-            candidate["source_type"] = "Jurisprudence CE"
-        elif "courdecassation" in domain:
-            candidate["source_type"] = "Jurisprudence Cass"
-        elif "opendata.justice-administrative" in domain:
-            candidate["source_type"] = "Jurisprudence TA/CAA"
-        elif "conseil-constitutionnel" in domain:
-            candidate["source_type"] = "Constitutionnel"
-        elif "assemblee-nationale" in domain:
-            candidate["source_type"] = "Assemblée"
-        elif "senat" in domain:
-            candidate["source_type"] = "Sénat"
-        elif "europa.eu" in domain:
-            candidate["source_type"] = "CJUE"
-        elif "justicelibre" in domain:
-            candidate["source_type"] = "Jurisprudence TA/CAA"
-        else:
-            candidate["source_type"] = "Autre"
-        candidates.append(candidate)
+def _dropped(result: Dict, reason: str) -> Dict:
+    out = result.copy()
+    out.update({"keep": False, "score": 0.0, "reason": reason, "_prefiltre": True})
+    return out
 
+
+def _source_type(domain: str) -> str:
+    """Type de source simplifié, pour aider le LLM."""
+    if "legifrance" in domain:
+        return "CGI"
+    if "bofip" in domain:
+        return "BOFIP"
+    if "conseil-etat" in domain:
+        return "Jurisprudence CE"
+    if "courdecassation" in domain:
+        return "Jurisprudence Cass"
+    if "opendata.justice-administrative" in domain:
+        return "Jurisprudence TA/CAA"
+    if "conseil-constitutionnel" in domain:
+        return "Constitutionnel"
+    if "assemblee-nationale" in domain:
+        return "Assemblée"
+    if "senat" in domain:
+        return "Sénat"
+    if "europa.eu" in domain:
+        return "CJUE"
+    if "justicelibre" in domain:
+        return "Jurisprudence TA/CAA"
+    return "Autre"
+
+
+def _system_prompt(analyst_results: str, specialists_results, n_candidates: int,
+                   output: str = "verbose") -> str:
     current_date = datetime.datetime.now().strftime("%d/%m/%Y")
 
-    system_prompt = (
+    return (
         "Tu es une IA experte en fiscalité française, spécialisée dans le classement et la validation de sources juridiques.\n\n"
         f"La date du jour est : {current_date}.\n\n"
         "🎯 TA MISSION\n"
@@ -119,8 +228,12 @@ def agent_ranker(
         "⚠️ OBLIGATION DE TRAITEMENT\n"
         "- Tu DOIS traiter TOUS les candidats fournis, sans exception.\n"
         "- Le score doit refléter la 'Valeur Ajoutée' par rapport au diagnostic technique.\n\n"
+    ) + (_format_compact(n_candidates) if output == "compact" else _format_verbose(n_candidates))
+
 
-        f"IMPORTANT: Ta réponse DOIT contenir exactement {len(candidates)} objets dans la liste 'results'. Si tu en oublies un seul, le système plantera."
+def _format_verbose(n_candidates: int) -> str:
+    return (
+        f"IMPORTANT: Ta réponse DOIT contenir exactement {n_candidates} objets dans la liste 'results'. Si tu en oublies un seul, le système plantera."
 
         "📦 FORMAT DE SORTIE STRICT (JSON)\n"
         "{\n"
@@ -136,45 +249,241 @@ def agent_ranker(
         "AUCUN texte hors JSON."
     )
 
-    user_content = {
-        "question": question,
-        "candidates": candidates
-    }
 
-    # Appel LLM via la couche d'abstraction
+def _format_compact(n_candidates: int) -> str:
+    # Une ligne par candidat, raison seulement pour les conservés : l'essentiel
+    # des tokens de sortie du mode verbeux part dans les `reason`.
+    return (
+        f"IMPORTANT: Ta réponse DOIT contenir exactement {n_candidates} lignes, une par candidat.\n\n"
+        "📦 FORMAT DE SORTIE STRICT (COMPACT)\n"
+        "- candidat conservé : <id>:<score>:K:<raison fiscale en quelques mots>\n"
+        "- candidat écarté   : <id>:<score>\n"
+        "Exemple :\n"
+        "r1:0.95:K:définit l'assiette du régime T+1\n"
+        "r2:0.10\n"
+        "AUCUN autre texte, ni JSON, ni puces."
+    )
+
+
+def parse_compact(text: str) -> List[Dict]:
+    """Décode la sortie compacte du ranker.
+
+    Les lignes illisibles sont ignorées : une réponse tronquée (max_tokens,
+    coupure réseau) rend tout ce qui a été émis avant la coupure, les candidats
+    manquants sont traités par l'appelant.
+    """
+    results: Dict[str, Dict] = {}
+    for line in (text or "").splitlines():
+        m = _COMPACT_LINE_RE.match(line)
+        if not m:
+            continue
+        result_id, score, flag, reason = m.groups()
+        results[result_id] = {
+            "id": result_id,
+            "keep": (flag or "").upper() == "K",
+            "score": min(1.0, float(score.replace(",", "."))),
+            "reason": (reason or "").strip(),
+        }
+    return list(results.values())
+
+
+def _parse(completion: str, output: str) -> List[Dict]:
+    if output == "compact":
+        return parse_compact(completion)
+    try:
+        ranking = json.loads(completion)
+    except Exception as exc:
+        logger.warning(f"Erreur décodage JSON ranker (tentative lire_json_beton): {exc}")
+        ranking = lire_json_beton(completion)
+    return ranking.get("results", []) if isinstance(ranking, dict) else []
+
+
+def _stream_completion(kwargs: Dict, output: str, on_result: Callable[[Dict], None]) -> str:
+    """Streame la réponse et notifie chaque résultat dès qu'il est complet.
+
+    Rend le texte intégral : c'est lui qui fait foi pour le classement final,
+    les notifications ne servent qu'à lancer le travail en aval plus tôt.
+    """
+    extractor = JsonArrayObjectExtractor("results") if output != "compact" else None
+    parts: List[str] = []
+    pending = ""                        # ligne compacte en cours
+    for chunk in llm_call_stream(**kwargs):
+        parts.append(chunk)
+        if extractor is not None:
+            decoded = extractor.feed(chunk)
+        else:
+            pending += chunk
+            lines = pending.split("\n")
+            pending = lines.pop()
+            decoded = parse_compact("\n".join(lines))
+        for res in decoded:
+            on_result(res)
+    return "".join(parts)
+
+
+def _rank_shard(
+    question: str,
+    shard: List[Dict],
+    system_prompt: str,
+    openai_api_key: str,
+    model: str,
+    output: str = "verbose",
+    on_result: Optional[Callable[[Dict], None]] = None,
+) -> List[Dict]:
+    """Classe un lot de candidats (ids globaux) ; rend la liste des résultats décodés.
+
+    Avec `on_result`, la réponse est streamée et chaque résultat est notifié
+    dès que son objet JSON (ou sa ligne compacte) est complet.
+    """
+    user_content = {"question": question, "candidates": shard}
     chat_messages = [
         {"role": "system", "content": system_prompt},
-        {"role": "user", "content": str(user_content)} # dump comme string simple, structure lisible
+        {"role": "user", "content": str(user_content)},  # dump comme string simple, structure lisible
     ]
-    res = llm_call(
-        model,
+    kwargs = dict(
         messages=chat_messages,
-        json_mode=True,
-        max_tokens=16384,
+        json_mode=output != "compact",
+        max_tokens=256 + _TOKENS_PER_CANDIDATE[output] * len(shard),
         api_key=openai_api_key,
         agent_name="ranker",
     )
-    # Extraction du JSON "strict"
-    import json
-    from utils.json_utils import lire_json_beton
-    completion = res.text
+    if on_result is None:
+        completion = llm_call(model, **kwargs).text
+    else:
+        completion = _stream_completion({"model_name": model, **kwargs}, output, on_result)
+    return _parse(completion, output)
+
+
+def agent_ranker(
+    question: str,
+    structured_results: List[Dict],
+    analyst_results: str,
+    specialists_results,
+    openai_api_key: str,
+    model: str = "gpt-4o",
+    analyst_json: Optional[dict] = None,
+    shard_size: int = RANKER_SHARD_SIZE,
+    output: Optional[str] = None,
+    on_result: Optional[Callable[[Dict], None]] = None,
+) -> List[Dict]:
+    """
+    Pré-filtre puis classe par lots parallèles les résultats légaux/fiscaux via un prompt expert.
+
+    Args:
+        question: Question de l'utilisateur.
+        structured_results: Liste de résultats structurés (de search_official_sources, format dict avec title, url, snippet...).
+        analyst_results: Résultats de l'agent analyste.
+        specialists_results: Résultats des agents spécialisés.
+        openai_api_key: Clé API OpenAI.
+        model: Modèle OpenAI (par défaut gpt-4o).
+        analyst_json: Analyse déjà décodée (sinon relue depuis `analyst_results`).
+        shard_size: Candidats par appel LLM.
+        output: Format de sortie du LLM, "verbose" ou "compact" (défaut : RANKER_OUTPUT).
+        on_result: Rappel appelé avec chaque candidat enrichi dès que le modèle
+            l'a noté (réponse streamée), depuis le thread de son lot : permet de
+            lancer le scraping pendant que le reste du classement s'écrit. Doit
+            être thread-safe.
+
+    Returns:
+        Tous les candidats, triés par score décroissant, chacun enrichi de
+        keep/score/reason. Les candidats écartés sans passer par le LLM portent
+        `_prefiltre=True`.
+    """
+    if analyst_json is None:
+        try:
+            analyst_json = lire_json_beton(analyst_results) if analyst_results else {}
+        except Exception:
+            analyst_json = {}
+    if not isinstance(analyst_json, dict):
+        analyst_json = {}
+    output = output or RANKER_OUTPUT
+    if output not in RANKER_OUTPUTS:
+        raise ValueError(f"Format de sortie du ranker inconnu : {output}. Disponibles : {RANKER_OUTPUTS}")
+
+    kept, dropped = prefilter(structured_results, question, analyst_json)
+    logger.info("Ranker : %d candidats → %d après pré-filtre", len(structured_results), len(kept))
+    if not kept:
+        return dropped
+
+    # Ids globaux : stables d'un lot à l'autre, la fusion se fait par id.
+    id_to_structured = {f"r{idx+1}": r.copy() for idx, r in enumerate(kept)}
+    candidates = []
+    for idx, r in enumerate(kept):
+        candidate = {
+            "id": f"r{idx+1}",
+            "title": r.get("title", ""),
+            "snippet": r.get("snippet", ""),
+            "url": r.get("url", ""),
+            "source_type": _source_type(r.get("source_domain", "")),
+        }
+        # Références juridiques (`utils.legal_ids`, posées au dédoublonnage) :
+        # permettent au modèle de rapprocher la source des articles cités par
+        # l'analyse.
+        refs = r["legal_refs"] if "legal_refs" in r else sorted(legal_refs(r))
+        if refs:
+            candidate["refs"] = refs
+        candidates.append(candidate)
+    notify = None
+    if on_result is not None:
+        def notify(res: Dict) -> None:
+            src_info = id_to_structured.get(res.get("id"))
+            if src_info is None:
+                return
+            enriched = src_info.copy()
+            enriched.update(res)
+            try:
+                on_result(enriched)
+            except Exception as exc:
+                logger.warning("Ranker : rappel on_result en échec : %s", exc)
+
+    shard_size = max(1, shard_size)
+    shards = [candidates[i:i + shard_size] for i in range(0, len(candidates), shard_size)]
+
+    # copy_context() évalué ici (thread appelant) : la trace LLM suit chaque lot.
+    executor = ThreadPoolExecutor(max_workers=max(1, min(RANKER_MAX_WORKERS, len(shards))),
+                                  thread_name_prefix="ranker")
     try:
-        ranking = json.loads(completion)
-    except Exception as exc:
-        logger.warning(f"Erreur décodage JSON ranker (tentative lire_json_beton): {exc}")
-        ranking = lire_json_beton(completion)
+        rank_shard = profiler.bind(_rank_shard, "ranker")
+        futures = [
+            executor.submit(copy_context().run, rank_shard, question, shard,
+                            _system_prompt(analyst_results, specialists_results, len(shard), output),
+                            openai_api_key, model, output, notify)
+            for shard in shards
+        ]
+        ranked_by_id: Dict[str, Dict] = {}
+        errors = []
+        for shard, future in zip(shards, futures):
+            try:
+                shard_results = future.result()
+            except Exception as exc:
+                logger.warning("Ranker : lot de %d candidats en échec : %s", len(shard), exc)
+                errors.append(exc)
+                continue
+            shard_ids = {c["id"] for c in shard}
+            for res in shard_results:
+                if isinstance(res, dict) and res.get("id") in shard_ids:
+                    ranked_by_id[res["id"]] = res
+    finally:
+        executor.shutdown(wait=False)
 
-    # Agrégation dans l'autre sens : la sortie JSON["results"] de GPT-4o reçoit TOUTES les données du structured_result correspondant.
-    id_to_structured = {f"r{idx+1}": r.copy() for idx, r in enumerate(structured_results)}
+    if errors and len(errors) == len(shards):
+        raise errors[0]
+
+    # Agrégation dans l'autre sens : chaque résultat reçoit TOUTES les données du structured_result correspondant.
     aggregated = []
-    for res in ranking.get("results", []):
-        result_id = res.get("id")
-        src_info = id_to_structured.get(result_id, {})
+    for result_id, src_info in id_to_structured.items():
         enriched = src_info.copy()
-        enriched.update(res)
+        res = ranked_by_id.get(result_id)
+        if res is None:
+            enriched.update({"keep": False, "score": 0.0,
+                             "reason": "Non classé : absent de la réponse du modèle."})
+        else:
+            enriched.update(res)
         aggregated.append(enriched)
+    missing = sum(1 for rid in id_to_structured if rid not in ranked_by_id)
+    if missing:
+        logger.warning("Ranker : %d candidats non classés par le modèle", missing)
 
     # Tri par score décroissant
     aggregated_sorted = sorted(aggregated, key=lambda x: x.get("score", 0), reverse=True)
-
-    return aggregated_sorted
+    return aggregated_sorted + dropped
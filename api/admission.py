@@ -0,0 +1,333 @@
+"""
+Contrôle d'admission des pipelines : file d'attente bornée, équitable, à priorités.
+
+Les places d'exécution (`MAX_CONCURRENT_PIPELINES`) sont rares : un run complet
+en occupe une pendant plusieurs minutes. Plutôt que de refuser une requête
+dès que tout est pris, on la met en file — bornée (`ADMISSION_QUEUE_MAX`) et
+avec un temps d'attente maximal (`ADMISSION_WAIT_TIMEOUT_S`) — ce qui absorbe
+les rafales qui auraient été servies dans la minute.
+
+Ordre de service, quand une place se libère :
+
+1. **priorité** : les réponses de suivi (quelques secondes) passent avant les
+   runs complets (plusieurs minutes) ;
+2. **équité** : à priorité égale, tourniquet entre utilisateurs
+   (`Principal.key`) — un utilisateur qui envoie dix questions d'affilée ne
+   fait pas attendre les autres derrière ses dix runs ;
+3. FIFO pour les requêtes d'un même utilisateur.
+
+Le contrôleur vit dans la boucle asyncio (aucun verrou de thread : tout s'y
+exécute dans un seul thread). Il tient aussi les statistiques d'attente exposées par
+`/ready` et `/v1/admin/admission`.
+
+Avec plusieurs workers, chaque admission prend en plus un bail dans l'état
+partagé (`utils/shared_state.py`) : la capacité tient pour tout le serveur. La
+file reste propre à chaque worker ; une place rendue par un autre worker est
+remarquée au prochain réexamen (`wait`), au plus une seconde plus tard. Prendre
+ou rendre un bail est bloquant (transaction SQLite, verrou Redis) : ces appels
+passent par un thread (`asyncio.to_thread`), jamais sur la boucle, qui porte
+aussi les flux SSE, leurs heartbeats et les sondes. Une place est retenue
+localement le temps de la prise du bail.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import statistics
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Coroutine, Deque, Dict, List, Optional, Set
+
+from utils import metrics
+from utils.shared_state import SharedState, new_holder
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_FOLLOW_UP = 0
+PRIORITY_FULL_RUN = 1
+
+# Durée d'occupation d'une place avant toute mesure (run complet en recette).
+DEFAULT_SERVICE_S = 240.0
+_SERVICE_EWMA_ALPHA = 0.2
+_WAIT_WINDOW = 500
+
+_PRIORITY_LABELS = {PRIORITY_FOLLOW_UP: "follow_up", PRIORITY_FULL_RUN: "full_run"}
+_WAIT_SECONDS = metrics.Histogram("fisca_admission_wait_seconds",
+                                  "Attente avant admission d'un pipeline.", ("priority",))
+_REFUSED = metrics.Counter("fisca_admission_refused_total",
+                           "Requêtes non admises : file pleine ou attente dépassée.", ("reason",))
+
+
+class QueueFull(Exception):
+    """Toutes les places sont prises et la file d'attente est pleine."""
+
+
+@dataclass(eq=False)
+class Ticket:
+    key: str
+    priority: int
+    enqueued_at: float
+    future: asyncio.Future
+    granted_at: Optional[float] = None
+    released: bool = False
+    holder: str = ""
+
+    @property
+    def granted(self) -> bool:
+        return self.granted_at is not None
+
+
+@dataclass
+class _Stats:
+    admitted: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    waits: Deque[float] = field(default_factory=lambda: deque(maxlen=_WAIT_WINDOW))
+
+
+class AdmissionController:
+    """Places d'exécution + file d'attente (voir le docstring du module)."""
+
+    def __init__(self, capacity: int, max_queue: int, service_s: float = DEFAULT_SERVICE_S,
+                 shared: Optional[SharedState] = None, lease_ttl_s: float = 900.0):
+        self.capacity = max(1, capacity)
+        self.max_queue = max(0, max_queue)
+        self.shared = shared
+        self.lease_ttl_s = lease_ttl_s
+        self.in_use = 0
+        self._leasing = 0              # places retenues le temps de prendre un bail
+        # priorité → utilisateur → ses tickets ; l'ordre des utilisateurs est le tourniquet.
+        self._queues: Dict[int, "OrderedDict[str, Deque[Ticket]]"] = {}
+        self._waiting = 0
+        self._service_s = service_s
+        self._stats = _Stats()
+        self._dispatch_lock = asyncio.Lock()
+        self._background: Set[asyncio.Task] = set()
+
+    # ── État ─────────────────────────────────────────────────────────────────
+    @property
+    def free(self) -> int:
+        return max(0, self.capacity - self.in_use - self._leasing)
+
+    @property
+    def depth(self) -> int:
+        return self._waiting
+
+    def available(self) -> int:
+        """Places libres pour le serveur entier (tous workers confondus).
+
+        Lit l'état partagé : bloquant, à appeler hors de la boucle."""
+        if self.shared is None:
+            return self.free
+        try:
+            return min(self.free, max(0, self.capacity - self.shared.slots_in_use()))
+        except Exception as exc:
+            logger.warning("État partagé illisible : %s", exc)
+            return self.free
+
+    @property
+    def service_s(self) -> float:
+        """Durée moyenne (lissée) d'occupation d'une place."""
+        return self._service_s
+
+    def position(self, ticket: Ticket) -> int:
+        """Rang de service du ticket en attente (1 = prochain servi), 0 s'il est admis."""
+        if ticket.granted:
+            return 0
+        for rank, queued in enumerate(self._dispatch_order(), start=1):
+            if queued is ticket:
+                return rank
+        return 0
+
+    def eta_s(self, ticket: Ticket) -> float:
+        """Estimation grossière de l'attente restante : `position` places à libérer,
+        `capacity` places qui se libèrent en parallèle."""
+        return round(self.position(ticket) * self._service_s / self.capacity, 1)
+
+    def stats(self, available: Optional[int] = None) -> Dict[str, object]:
+        """`available` : déjà lu hors de la boucle, sinon lu ici (bloquant)."""
+        waits = sorted(self._stats.waits)
+        by_priority = {p: sum(len(q) for q in users.values()) for p, users in self._queues.items()}
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "available": self.available() if available is None else available,
+            "queue_depth": self._waiting,
+            "queue_max": self.max_queue,
+            "queue_depth_by_priority": {str(p): n for p, n in sorted(by_priority.items()) if n},
+            "admitted": self._stats.admitted,
+            "rejected": self._stats.rejected,
+            "timed_out": self._stats.timed_out,
+            "wait_s_p50": round(statistics.median(waits), 3) if waits else 0.0,
+            "wait_s_p95": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+            "wait_s_max": round(waits[-1], 3) if waits else 0.0,
+            "service_s_estimate": round(self._service_s, 1),
+        }
+
+    # ── Cycle de vie d'un ticket ─────────────────────────────────────────────
+    async def enqueue(self, key: str, priority: int = PRIORITY_FULL_RUN,
+                      bounded: bool = True) -> Ticket:
+        """Admet tout de suite s'il reste une place (et personne devant), sinon met en file.
+
+        `bounded=False` : hors de la borne de la file, pour les jobs — déjà
+        acceptés, et bornés en amont par `JOB_WORKERS`.
+
+        Raises:
+            QueueFull: file pleine.
+        """
+        ticket = Ticket(key=key, priority=priority, enqueued_at=time.monotonic(),
+                        future=asyncio.get_running_loop().create_future(),
+                        holder=new_holder() if self.shared is not None else "")
+        if self.free and not self._waiting and await self._lease(ticket):
+            self._grant(ticket)
+            return ticket
+        if bounded and self._waiting >= self.max_queue:
+            self._stats.rejected += 1
+            _REFUSED.inc("queue_full")
+            raise QueueFull()
+        users = self._queues.setdefault(priority, OrderedDict())
+        users.setdefault(key, deque()).append(ticket)
+        self._waiting += 1
+        return ticket
+
+    async def wait(self, ticket: Ticket, timeout: float) -> bool:
+        """Attend l'admission au plus `timeout` secondes ; rend True si admis."""
+        if ticket.granted:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), timeout)
+        except asyncio.TimeoutError:
+            if self.shared is not None:
+                await self._dispatch()  # une place a pu se libérer dans un autre worker
+        return ticket.granted
+
+    def abandon(self, ticket: Ticket, timed_out: bool = False) -> None:
+        """Retire un ticket de la file (attente trop longue, client parti) ou libère sa place."""
+        if ticket.granted:
+            self.release(ticket)
+            return
+        tickets = self._queues.get(ticket.priority, {}).get(ticket.key)
+        if tickets and ticket in tickets:
+            self._take(ticket, rotate=False)
+            if timed_out:
+                self._stats.timed_out += 1
+                _REFUSED.inc("timed_out")
+        ticket.released = True
+
+    def release(self, ticket: Ticket) -> None:
+        if ticket.released:
+            return
+        ticket.released = True
+        if not ticket.granted:
+            self.abandon(ticket)
+            return
+        self.in_use -= 1
+        held = time.monotonic() - ticket.granted_at
+        self._service_s += _SERVICE_EWMA_ALPHA * (held - self._service_s)
+        if self.shared is None:
+            self._dispatch_local()
+        else:
+            self._spawn(self._release_and_dispatch(ticket.holder))
+
+    # ── Interne ──────────────────────────────────────────────────────────────
+    def _grant(self, ticket: Ticket) -> None:
+        ticket.granted_at = time.monotonic()
+        self.in_use += 1
+        self._stats.admitted += 1
+        self._stats.waits.append(ticket.granted_at - ticket.enqueued_at)
+        _WAIT_SECONDS.observe(ticket.granted_at - ticket.enqueued_at,
+                              _PRIORITY_LABELS.get(ticket.priority, str(ticket.priority)))
+        if not ticket.future.done():
+            ticket.future.set_result(True)
+
+    async def _lease(self, ticket: Ticket) -> bool:
+        """Bail global, pris dans un thread ; sans état partagé (ou s'il est
+        indisponible), la capacité locale fait foi."""
+        if self.shared is None:
+            return True
+        self._leasing += 1
+        task = asyncio.ensure_future(asyncio.to_thread(self._acquire, ticket.holder))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Requête partie pendant la prise : le bail, s'il est pris, est rendu.
+            task.add_done_callback(
+                lambda t: t.cancelled() or not t.result() or self._return_lease(ticket.holder))
+            raise
+        finally:
+            self._leasing -= 1
+
+    def _acquire(self, holder: str) -> bool:
+        try:
+            return self.shared.acquire_slot(holder, self.capacity, self.lease_ttl_s)
+        except Exception as exc:
+            logger.warning("État partagé indisponible, admission locale : %s", exc)
+            return True
+
+    def _release_lease(self, holder: str) -> None:
+        try:
+            self.shared.release_slot(holder)
+        except Exception as exc:   # le bail expirera de lui-même
+            logger.warning("Bail %s non rendu : %s", holder, exc)
+
+    def _return_lease(self, holder: str) -> None:
+        self._spawn(asyncio.to_thread(self._release_lease, holder))
+
+    async def _release_and_dispatch(self, holder: str) -> None:
+        await asyncio.to_thread(self._release_lease, holder)
+        await self._dispatch()
+
+    def _spawn(self, coro: Coroutine) -> None:
+        """Tâche de fond, gardée référencée jusqu'à sa fin."""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _dispatch_local(self) -> None:
+        while self.free and self._waiting:
+            ticket = self._peek()
+            self._take(ticket)
+            self._grant(ticket)
+
+    async def _dispatch(self) -> None:
+        """Sert la file tant qu'il reste des places, un bail global par ticket."""
+        async with self._dispatch_lock:
+            while self.free and self._waiting:
+                ticket = self._peek()
+                if not await self._lease(ticket):
+                    return             # places prises par d'autres workers
+                if ticket.released:    # abandonné pendant la prise du bail
+                    self._return_lease(ticket.holder)
+                    continue
+                self._take(ticket)
+                self._grant(ticket)
+
+    def _peek(self) -> Ticket:
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            if users:
+                return next(iter(users.values()))[0]
+        raise RuntimeError("file vide")  # pragma: no cover — protégé par `_waiting`
+
+    def _take(self, ticket: Ticket, rotate: bool = True) -> None:
+        """Retire `ticket` de la file ; servi (`rotate`), son utilisateur repasse
+        en fin de tourniquet."""
+        users = self._queues[ticket.priority]
+        tickets = users[ticket.key]
+        tickets.remove(ticket)
+        if not tickets:
+            del users[ticket.key]
+        elif rotate:
+            users.move_to_end(ticket.key)
+        self._waiting -= 1
+
+    def _dispatch_order(self) -> List[Ticket]:
+        """Ordre dans lequel les tickets en attente seraient servis."""
+        order: List[Ticket] = []
+        for priority in sorted(self._queues):
+            lanes = [list(tickets) for tickets in self._queues[priority].values()]
+            depth = max((len(lane) for lane in lanes), default=0)
+            for i in range(depth):
+                order.extend(lane[i] for lane in lanes if i < len(lane))
+        return order
@@ -14,16 +14,14 @@ un filtre oublié exposerait les conversations de tous les abonnés.
 from __future__ import annotations
 
 import hmac
-import time
-from collections import deque
 from dataclasses import dataclass
-from threading import Lock
-from typing import Deque, Dict, Optional
+from typing import Optional
 
 from fastapi import Header
 
-from api.errors import rate_limited, unauthorized
+from api.errors import forbidden, rate_limited, unauthorized
 from api.settings import Settings, get_settings
+from utils.shared_state import MemorySharedState, SharedState, get_shared_state
 
 
 @dataclass(frozen=True)
@@ -57,36 +55,47 @@ def require_principal(
     return Principal(email=x_user_email.strip().lower(), user_id=x_user_id)
 
 
-# ─── Limitation de débit (en mémoire, mono-process) ───────────────────────────
+def require_admin(
+    x_admin_key: Optional[str] = Header(default=None, alias="X-Admin-Key"),
+) -> None:
+    """Routes d'exploitation (`/v1/admin`) : secret propre, jamais celui du proxy."""
+    secrets = get_settings().admin_secrets
+    if not secrets:
+        raise forbidden("L'administration n'est pas activée sur ce service (ADMIN_API_SECRET absent).")
+    if not x_admin_key or not any(hmac.compare_digest(x_admin_key, s) for s in secrets):
+        raise unauthorized("En-tête X-Admin-Key invalide ou absent.")
+
+
+def wants_profile(
+    x_profile: Optional[str] = Header(default=None, alias="X-Profile"),
+) -> bool:
+    """En-tête `X-Profile: 1` : profiler l'exécution (si `PROFILING_ENABLED`)."""
+    if not x_profile or x_profile.strip().lower() in ("0", "false", "no"):
+        return False
+    return get_settings().profiling_enabled
+
+
+# ─── Limitation de débit (partagée entre workers) ─────────────────────────────
 class RateLimiter:
     """Fenêtre glissante par utilisateur : quota horaire + garde-fou par minute.
 
-    Volontairement en mémoire : un seul serveur, quelques workers. Passer à Redis
-    seulement le jour où le service est répliqué (sinon le quota est par worker).
+    Les compteurs vivent dans l'état partagé (`utils/shared_state.py`) : le
+    quota est celui du service, quel que soit le nombre de workers.
     """
 
-    def __init__(self, per_hour: int, burst_per_min: int):
+    def __init__(self, per_hour: int, burst_per_min: int, state: Optional[SharedState] = None):
         self.per_hour = per_hour
         self.burst_per_min = burst_per_min
-        self._hits: Dict[str, Deque[float]] = {}
-        self._lock = Lock()
+        self.state = state or MemorySharedState()
+        self._limits = ((per_hour, 3600.0), (burst_per_min, 60.0))
 
     def check(self, key: str) -> None:
-        now = time.monotonic()
-        with self._lock:
-            hits = self._hits.setdefault(key, deque())
-            while hits and now - hits[0] > 3600:
-                hits.popleft()
-            if len(hits) >= self.per_hour:
-                raise rate_limited(retry_after=int(3600 - (now - hits[0])) + 1)
-            recent = sum(1 for t in hits if now - t < 60)
-            if recent >= self.burst_per_min:
-                raise rate_limited(retry_after=60)
-            hits.append(now)
+        retry_after = self.state.hit(f"user:{key}", self._limits)
+        if retry_after is not None:
+            raise rate_limited(retry_after=int(retry_after) + 1)
 
     def reset(self) -> None:
-        with self._lock:
-            self._hits.clear()
+        self.state.reset()
 
 
 _limiter: Optional[RateLimiter] = None
@@ -96,11 +105,14 @@ def get_rate_limiter(settings: Optional[Settings] = None) -> RateLimiter:
     global _limiter
     if _limiter is None:
         settings = settings or get_settings()
-        _limiter = RateLimiter(settings.rate_limit_per_hour, settings.rate_limit_burst_per_min)
+        _limiter = RateLimiter(settings.rate_limit_per_hour, settings.rate_limit_burst_per_min,
+                               get_shared_state(settings.shared_state_backend, settings.redis_url))
     return _limiter
 
 
 def reset_rate_limiter() -> None:
-    """Tests uniquement."""
+    """Tests uniquement : oublie aussi les compteurs partagés."""
     global _limiter
+    if _limiter is not None:
+        _limiter.reset()
     _limiter = None
@@ -14,6 +14,7 @@ Production (cf. deploy/) :
 """
 from __future__ import annotations
 
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
@@ -24,9 +25,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from api.errors import register_exception_handlers
 from api.logging_conf import configure_logging
 from api.middleware import BodySizeLimitMiddleware, RequestContextMiddleware
-from api.routes import chat, conversations, feedback, health, meta
+from api.routes import admin, chat, conversations, feedback, health, jobs, meta, metrics
 from api.runner import shutdown_pool
 from api.settings import get_settings
+from api.warmup import get_warmup
+from services.jobs import shutdown_job_runner
+from utils import metrics as metrics_registry
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -49,11 +53,21 @@ async def lifespan(app: FastAPI):
     logger.info("Démarrage %s (%s) — %d pipelines simultanés max, protocole AI SDK %s",
                 settings.app_name, settings.environment,
                 settings.max_concurrent_pipelines, settings.ai_sdk_protocol)
+    if settings.metrics_enabled:
+        # Ici et non à l'import : sous gunicorn, chaque worker (après le fork)
+        # lance son propre thread de vidage.
+        metrics_registry.enable()
+    if settings.prewarm == "blocking":
+        await asyncio.to_thread(get_warmup().run)
+    elif settings.prewarm == "background":
+        get_warmup().start()
     try:
         yield
     finally:
         logger.info("Arrêt — attente des pipelines en cours…")
         shutdown_pool(wait=True)
+        shutdown_job_runner(wait=True)
+        metrics_registry.get_registry().stop()
 
 
 def create_app() -> FastAPI:
@@ -86,9 +100,12 @@ def create_app() -> FastAPI:
 
     app.include_router(health.router)
     app.include_router(chat.router)
+    app.include_router(jobs.router)
     app.include_router(conversations.router)
     app.include_router(feedback.router)
     app.include_router(meta.router)
+    app.include_router(admin.router)
+    app.include_router(metrics.router)
     return app
 
 
@@ -0,0 +1,87 @@
+"""
+Routes d'exploitation, protégées par `X-Admin-Key` (`ADMIN_API_SECRET`).
+
+Cache des réponses : après une mise à jour du BOFiP ou une loi de finances,
+les réponses qui citent un texte modifié doivent disparaître sans attendre
+l'expiration — `DELETE /v1/admin/answer-cache?contains=BOI-RPPM-RCM-40-50`.
+
+Cache de l'analyste : même principe, `DELETE /v1/admin/analyst-cache`.
+
+File d'admission : `GET /v1/admin/admission` — places occupées, profondeur de
+file par priorité, refus et temps d'attente (p50/p95/max).
+
+Profils : `GET /v1/admin/profiles/{trace_id}` — profil d'une exécution lancée
+avec `X-Profile: 1`, au format speedscope (https://www.speedscope.app) ou
+résumé (`?format=summary`).
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse
+
+from api.deps import require_admin
+from api.errors import not_found
+from api.runner import get_admission
+from api.schemas import AdmissionStats, AnswerCacheStats, InvalidationResponse
+from api.settings import Settings, get_settings
+from pipeline.analyst_cache import get_analyst_cache
+from pipeline.profiling import get_profile_store
+from services.answer_cache import get_answer_cache
+
+router = APIRouter(prefix="/v1/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/admission", response_model=AdmissionStats)
+async def admission_stats() -> AdmissionStats:
+    # `async` : le contrôleur vit dans la boucle, on le lit depuis la boucle ;
+    # l'état partagé, lui, se lit dans un thread.
+    admission = get_admission()
+    available = await asyncio.to_thread(admission.available)
+    return AdmissionStats(**admission.stats(available))
+
+
+@router.get("/answer-cache", response_model=AnswerCacheStats)
+def answer_cache_stats(settings: Settings = Depends(get_settings)) -> AnswerCacheStats:
+    cache = get_answer_cache(settings.answer_cache_ttl_s, settings.answer_cache_min_similarity)
+    return AnswerCacheStats(enabled=settings.answer_cache_enabled, **cache.stats())
+
+
+@router.delete("/answer-cache", response_model=InvalidationResponse)
+def invalidate_answer_cache(
+    contains: Optional[str] = Query(default=None, min_length=2,
+                                    description="Texte présent dans la question, la réponse ou les sources."),
+    key: Optional[str] = Query(default=None, description="Clé exacte d'une entrée."),
+    settings: Settings = Depends(get_settings),
+) -> InvalidationResponse:
+    """Supprime les entrées ciblées — toutes si aucun filtre n'est donné."""
+    cache = get_answer_cache(settings.answer_cache_ttl_s, settings.answer_cache_min_similarity)
+    return InvalidationResponse(deleted=cache.invalidate(contains=contains, key=key))
+
+
+@router.delete("/analyst-cache", response_model=InvalidationResponse)
+def invalidate_analyst_cache(
+    contains: Optional[str] = Query(default=None, min_length=2,
+                                    description="Texte présent dans la question ou l'analyse."),
+) -> InvalidationResponse:
+    """Supprime les analyses en cache ciblées — toutes si aucun filtre n'est donné."""
+    cache = get_analyst_cache()
+    return InvalidationResponse(deleted=cache.invalidate(contains=contains) if cache is not None else 0)
+
+
+@router.get("/profiles/{trace_id}")
+def get_profile(
+    trace_id: str,
+    format: Literal["speedscope", "summary"] = Query(default="speedscope"),
+) -> Dict[str, Any]:
+    """Profil enregistré d'une exécution ; le JSON speedscope s'ouvre tel quel
+    dans https://www.speedscope.app."""
+    saved = get_profile_store().load(trace_id)
+    if saved is None:
+        raise not_found("Aucun profil enregistré sous cet identifiant de trace.")
+    if format == "summary":
+        return saved["summary"]
+    return JSONResponse(saved["speedscope"], headers={
+        "Content-Disposition": f'attachment; filename="{trace_id}.speedscope.json"'})
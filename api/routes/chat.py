@@ -3,6 +3,12 @@ Endpoint de conversation.
 
 `POST /v1/chat` est un flux SSE au format AI SDK ; `POST /v1/chat/sync` rend la
 même chose en un seul JSON (batch, debug, intégrations tierces).
+`POST /v1/chat/resume` reprend un flux coupé à partir des points de reprise du
+pipeline (`run_id` annoncé par la trame `data-run`).
+
+Quand toutes les places d'exécution sont prises, la requête attend son tour
+(`api/admission.py`) : le flux s'ouvre aussitôt et annonce le rang et l'ETA
+par des trames `data-progress {"step": "file"}`.
 
 Le flux est produit par un générateur **asynchrone** : c'est la seule forme qui
 reçoit le `CancelledError` d'uvicorn à la déconnexion du client — condition de
@@ -10,28 +16,44 @@ l'annulation du pipeline (cf. `api/runner.py`).
 """
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import AsyncIterator
+import time
+from typing import AsyncIterator, Callable, Iterator
 
 from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse
 
-from api.deps import Principal, get_rate_limiter, require_principal
+from api.admission import PRIORITY_FOLLOW_UP, PRIORITY_FULL_RUN
+from api.deps import Principal, get_rate_limiter, require_principal, wants_profile
 from api.errors import ApiError, forbidden, not_found, pipeline_timeout
 from api.logging_conf import bind_conversation, bind_trace, current_request_id
-from api.runner import PipelineSlot, stream_events
-from api.schemas import ChatRequest, ChatSyncResponse
+from api.runner import Coalescing, PipelineSlot, stream_events
+from api.schemas import ChatRequest, ChatSyncResponse, ResumeRequest
 from api.settings import Settings, get_settings
 from api.sse import SSEEncoder, sse_headers
 from pipeline.errors import PipelineDeadlineExceeded
-from pipeline.events import ResultEvent, SourcesEvent, StepEvent, TextDelta
-from services.chat_service import ConversationNotFound, TurnOptions, TurnOutcome, run_turn
+from pipeline.checkpoints import get_checkpoint_store, new_run_id
+from pipeline.events import (
+    AUX_STEP_LABELS, TOTAL_STEPS, PipelineEvent, ResultEvent, SourcesEvent, StepEvent, TextDelta,
+)
+from services.answer_cache import get_answer_cache
+from services.chat_service import (
+    ConversationNotFound, RunNotFound, TurnOptions, TurnOutcome, resume_turn, run_turn,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/v1", tags=["chat"])
 
 
-def _build_options(payload: ChatRequest, settings: Settings) -> TurnOptions:
+def _checkpoint_store(settings: Settings):
+    return get_checkpoint_store(settings.checkpoint_ttl_s) if settings.checkpoints_enabled else None
+
+
+def build_turn_options(payload: ChatRequest, settings: Settings,
+                       profile: bool = False, resumable: bool = True) -> TurnOptions:
+    """`resumable=False` : pas de points de reprise, pour une route qui ne rend
+    pas de `run_id` — ils ne serviraient jamais."""
     opts = payload.options
     if opts.models and not settings.allow_model_override:
         # Le choix du modèle est un levier de coût : jamais exposé au navigateur.
@@ -39,6 +61,10 @@ def _build_options(payload: ChatRequest, settings: Settings) -> TurnOptions:
     if len(payload.question) > settings.max_question_chars:
         raise ApiError(422, "validation_error",
                        f"Question trop longue (max {settings.max_question_chars} caractères).")
+    answer_cache = None
+    if settings.answer_cache_enabled and opts.use_answer_cache is not False:
+        answer_cache = get_answer_cache(settings.answer_cache_ttl_s,
+                                        settings.answer_cache_min_similarity)
     return TurnOptions(
         active_domains=opts.active_domains,
         use_justicelibre=True if opts.use_justicelibre is None else opts.use_justicelibre,
@@ -46,26 +72,47 @@ def _build_options(payload: ChatRequest, settings: Settings) -> TurnOptions:
         models_config=opts.models if settings.allow_model_override else None,
         auto_escalate=settings.followup_auto_escalate,
         deadline_s=settings.pipeline_deadline_s,
+        answer_cache=answer_cache,
+        checkpoints=_checkpoint_store(settings) if resumable else None,
+        profile=profile,
     )
 
 
+async def _check_rate_limit(principal: Principal, settings: Settings) -> None:
+    """Quota de l'utilisateur, hors de la boucle : l'état partagé (SQLite,
+    Redis) se lit par des appels bloquants."""
+    await asyncio.to_thread(get_rate_limiter(settings).check, principal.key)
+
+
+def _priority(payload: ChatRequest) -> int:
+    """Priorité d'admission, sans lire la conversation : une requête qui vise une
+    conversation existante (`conversation_id` explicite, ou historique useChat
+    déjà entamé) est vraisemblablement une question de suivi, servie en
+    quelques secondes."""
+    if payload.require_existing:
+        return PRIORITY_FOLLOW_UP
+    user_turns = [m for m in payload.messages or [] if m.get("role") == "user"]
+    return PRIORITY_FOLLOW_UP if len(user_turns) > 1 else PRIORITY_FULL_RUN
+
+
 @router.post("/chat")
 async def chat(
     payload: ChatRequest,
     principal: Principal = Depends(require_principal),
     settings: Settings = Depends(get_settings),
+    profile: bool = Depends(wants_profile),
 ) -> StreamingResponse:
     """Traite une question et streame la progression puis la réponse (SSE)."""
-    options = _build_options(payload, settings)
-    get_rate_limiter(settings).check(principal.key)
+    options = build_turn_options(payload, settings, profile)
+    await _check_rate_limit(principal, settings)
     bind_conversation(payload.resolved_conversation_id)
 
-    # La place est prise AVANT d'ouvrir le flux : à ce stade un 429 JSON propre
-    # est encore possible, ce qui ne le serait plus une fois les en-têtes envoyés.
-    slot = await PipelineSlot().__aenter__()
-    encoder = SSEEncoder(settings.ai_sdk_protocol)
+    # Place ou rang en file réservé AVANT d'ouvrir le flux : à ce stade un 429
+    # JSON propre est encore possible, ce qui ne le serait plus une fois les
+    # en-têtes envoyés.
+    slot = await PipelineSlot(principal.key, _priority(payload)).reserve()
     outcome = TurnOutcome(conversation_id=payload.resolved_conversation_id or "",
-                          message_id="")
+                          message_id="", run_id=new_run_id())
 
     def make_iterator(cancel):
         return run_turn(
@@ -78,12 +125,72 @@ async def chat(
             outcome=outcome,
         )
 
+    return _sse_response(make_iterator, outcome, slot, settings,
+                         announce_run=options.checkpoints is not None)
+
+
+@router.post("/chat/resume")
+async def chat_resume(
+    payload: ResumeRequest,
+    principal: Principal = Depends(require_principal),
+    settings: Settings = Depends(get_settings),
+    profile: bool = Depends(wants_profile),
+) -> StreamingResponse:
+    """Reprend un tour interrompu : les étapes déjà terminées sont réémises
+    aussitôt (`meta.resumed`), puis le pipeline poursuit là où il s'était arrêté."""
+    checkpoints = _checkpoint_store(settings)
+    request = checkpoints.run(payload.run_id).load_request() if checkpoints else None
+    if request is None or request.get("user_email") != principal.email:
+        raise not_found("Aucune exécution à reprendre sous cet identifiant.")
+    await _check_rate_limit(principal, settings)
+    bind_conversation(request["conversation_id"])
+
+    options = TurnOptions(auto_escalate=settings.followup_auto_escalate,
+                          deadline_s=settings.pipeline_deadline_s, checkpoints=checkpoints,
+                          profile=profile)
+    # Une reprise passe avec les suivis : l'utilisateur a déjà attendu une fois,
+    # et une partie du travail est faite.
+    slot = await PipelineSlot(principal.key, PRIORITY_FOLLOW_UP).reserve()
+    outcome = TurnOutcome(conversation_id=request["conversation_id"], message_id="",
+                          run_id=payload.run_id)
+
+    def make_iterator(cancel):
+        return resume_turn(payload.run_id, user_email=principal.email, options=options,
+                           cancel=cancel, outcome=outcome)
+
+    return _sse_response(make_iterator, outcome, slot, settings, announce_run=True)
+
+
+def _sse_response(
+    make_iterator: Callable[..., Iterator[PipelineEvent]],
+    outcome: TurnOutcome,
+    slot: PipelineSlot,
+    settings: Settings,
+    announce_run: bool,
+) -> StreamingResponse:
+    """Traduit les événements d'un tour en flux SSE, après l'attente de `slot`
+    (réservé par l'appelant) ; libère `slot` à la fin."""
+    encoder = SSEEncoder(settings.ai_sdk_protocol)
+
     async def body() -> AsyncIterator[str]:
-        text_open = False
+        text_open = waited = False
         try:
             yield encoder.start(outcome.message_id or "m_pending")
+            if announce_run:
+                yield encoder.run(outcome.run_id)
+
+            queued_at = time.monotonic()
+            async for position, eta_s in slot.waiting():
+                yield encoder.progress(step="file", label=AUX_STEP_LABELS["file"], status="running",
+                                       progress=0, total=TOTAL_STEPS,
+                                       meta={"position": position, "eta_s": eta_s})
+                waited = True
+            if waited:
+                yield encoder.progress(step="file", label=AUX_STEP_LABELS["file"], status="done",
+                                       progress=0, total=TOTAL_STEPS,
+                                       elapsed_s=round(time.monotonic() - queued_at, 2))
 
-            async for event in stream_events(make_iterator):
+            async for event in stream_events(make_iterator, Coalescing.for_protocol(settings)):
                 if event is None:                       # keep-alive
                     yield encoder.heartbeat()
                 elif isinstance(event, StepEvent):
@@ -117,11 +224,18 @@ async def chat(
                 cost_usd=round(outcome.cost_usd, 5),
                 duration_s=outcome.duration_s,
                 saved=outcome.saved,
+                cached=outcome.cached,
+                resumed=outcome.resumed,
                 request_id=current_request_id(),
+                **({"profile": outcome.profile} if outcome.profile else {}),
             )
 
+        except ApiError as exc:                         # attente d'admission dépassée
+            yield encoder.error(exc.code, exc.message)
         except ConversationNotFound:
             yield encoder.error("not_found", "Conversation introuvable.")
+        except RunNotFound:
+            yield encoder.error("not_found", "Aucune exécution à reprendre sous cet identifiant.")
         except PipelineDeadlineExceeded:
             yield encoder.error("pipeline_timeout", "Le traitement a dépassé le temps imparti.")
         except Exception as exc:  # noqa: BLE001 — un flux ne doit jamais rester pendant
@@ -144,10 +258,11 @@ async def chat_sync(
     payload: ChatRequest,
     principal: Principal = Depends(require_principal),
     settings: Settings = Depends(get_settings),
+    profile: bool = Depends(wants_profile),
 ) -> ChatSyncResponse:
     """Même traitement, rendu en un seul JSON (pas de streaming)."""
-    options = _build_options(payload, settings)
-    get_rate_limiter(settings).check(principal.key)
+    options = build_turn_options(payload, settings, profile, resumable=False)
+    await _check_rate_limit(principal, settings)
     bind_conversation(payload.resolved_conversation_id)
 
     outcome = TurnOutcome(conversation_id=payload.resolved_conversation_id or "",
@@ -164,9 +279,9 @@ async def chat_sync(
             outcome=outcome,
         )
 
-    async with PipelineSlot():
+    async with PipelineSlot(principal.key, _priority(payload)):
         try:
-            async for _ in stream_events(make_iterator):
+            async for _ in stream_events(make_iterator, Coalescing.for_protocol(settings)):
                 pass
         except ConversationNotFound:
             raise not_found("Conversation introuvable.")
@@ -188,4 +303,6 @@ async def chat_sync(
         trace_id=outcome.trace_id,
         cost_usd=round(outcome.cost_usd, 5),
         duration_s=outcome.duration_s,
+        cached=outcome.cached,
+        profile=outcome.profile,
     )
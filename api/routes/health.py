@@ -4,9 +4,10 @@ from __future__ import annotations
 from fastapi import APIRouter, Depends
 
 from api.deps import Principal, require_principal
-from api.runner import free_slots
+from api.runner import free_slots, get_admission
 from api.schemas import HealthResponse, ReadyResponse
 from api.settings import Settings, get_settings
+from api.warmup import get_warmup
 from services.supabase import is_supabase_ready
 
 router = APIRouter(tags=["health"])
@@ -23,17 +24,25 @@ def ready(
     settings: Settings = Depends(get_settings),
     _: Principal = Depends(require_principal),
 ) -> ReadyResponse:
-    """Readiness : secrets présents et Supabase joignable.
+    """Readiness : worker préchauffé, secrets présents et Supabase joignable.
 
     Endpoint `def` (et non `async`) : la sonde Supabase est bloquante, elle doit
     tourner dans le threadpool pour ne pas figer les flux SSE en cours.
     """
     missing = settings.missing_required()
     supabase_ok = is_supabase_ready()
-    status = "ok" if supabase_ok and not missing else "degraded"
+    warmup = get_warmup()
+    if settings.prewarm != "off" and not warmup.warm:
+        status = "warming"
+    else:
+        status = "ok" if supabase_ok and not missing and not warmup.errors else "degraded"
     return ReadyResponse(
         status=status,
         supabase=supabase_ok,
         missing_config=missing,
         free_pipeline_slots=free_slots(),
+        # Lecture d'un entier depuis le threadpool : sûre sans verrou.
+        queue_depth=get_admission().depth,
+        warm=warmup.warm,
+        warmup_s=warmup.durations_s,
     )
@@ -0,0 +1,169 @@
+"""
+Mode job : le tour s'exécute détaché de la connexion HTTP.
+
+    POST   /v1/jobs                   soumet une question (corps de `/v1/chat`) → 202
+    GET    /v1/jobs/{id}              état ; réponse complète une fois terminé
+    GET    /v1/jobs/{id}/events       journal du tour en SSE, à partir d'un rang
+    DELETE /v1/jobs/{id}              annulation
+
+Le flux d'événements n'est pas celui de l'AI SDK : chaque trame porte son rang
+(`id:`), son type (`event:`) et sa charge JSON. Un client coupé se rattache avec
+`?after=<rang>` ou l'en-tête standard `Last-Event-ID`, sans rien perdre ni
+rien recevoir deux fois. Le flux se ferme après la trame `result`.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, Header, Query, status
+from fastapi.responses import StreamingResponse
+
+from api.deps import Principal, get_rate_limiter, require_principal, wants_profile
+from api.errors import capacity_exceeded, not_found
+from api.logging_conf import bind_conversation
+from api.routes.chat import build_turn_options
+from api.runner import JobSlot
+from api.schemas import ChatRequest, ChatSyncResponse, JobOut
+from api.settings import Settings, get_settings
+from api.sse import BASE_HEADERS
+from services.chat_service import TurnOutcome, normalize_conversation_id, run_turn
+from services.jobs import Job, JobQueueFull, get_job_runner, get_job_store, new_job_id
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/v1/jobs", tags=["jobs"])
+
+# Cadence de relecture du journal pendant qu'un job tourne.
+_POLL_S = 0.5
+
+
+def _job_out(job: Job, queue_position: Optional[int] = None) -> JobOut:
+    result = None
+    if job.status == "done" and job.outcome:
+        result = ChatSyncResponse(**{k: v for k, v in job.outcome.items()
+                                     if k in ChatSyncResponse.model_fields})
+    return JobOut(
+        job_id=job.id, status=job.status, conversation_id=job.conversation_id,
+        created_at=job.created_at, started_at=job.started_at, finished_at=job.finished_at,
+        n_events=job.n_events, queue_position=queue_position, result=result, error=job.error,
+    )
+
+
+def _own_job(job_id: str, principal: Principal) -> Job:
+    job = get_job_store().get(job_id, user_email=principal.email)
+    if job is None:
+        raise not_found("Job introuvable.")
+    return job
+
+
+@router.post("", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    payload: ChatRequest,
+    principal: Principal = Depends(require_principal),
+    settings: Settings = Depends(get_settings),
+    profile: bool = Depends(wants_profile),
+) -> JobOut:
+    """Soumet une question ; le tour s'exécute en arrière-plan, sur une place
+    d'exécution prise comme celles des flux (`api.runner.JobSlot`)."""
+    # `async` pour connaître la boucle du contrôle d'admission ; le reste,
+    # bloquant (quotas, base des jobs), passe par un thread.
+    slot = JobSlot(asyncio.get_running_loop(), principal.key)
+    return await asyncio.to_thread(_submit, payload, principal, settings, profile, slot)
+
+
+def _submit(payload: ChatRequest, principal: Principal, settings: Settings, profile: bool,
+            slot: JobSlot) -> JobOut:
+    options = build_turn_options(payload, settings, profile)
+    get_rate_limiter(settings).check(principal.key)
+    conversation_id = normalize_conversation_id(payload.resolved_conversation_id, principal.email)
+    bind_conversation(conversation_id)
+
+    store = get_job_store()
+    store.purge(settings.job_retention_s)
+    runner = get_job_runner(settings.job_workers, settings.job_queue_max)
+    job = store.create(new_job_id(), principal.email, payload.question, conversation_id)
+    outcome = TurnOutcome(conversation_id=conversation_id, message_id="")
+
+    def make_iterator(cancel):
+        return run_turn(
+            payload.question,
+            user_email=principal.email,
+            conversation_id=conversation_id,
+            require_existing=payload.require_existing,
+            options=options,
+            cancel=cancel,
+            outcome=outcome,
+        )
+
+    try:
+        position = runner.submit(job.id, make_iterator, outcome, slot)
+    except JobQueueFull:
+        store.finish(job.id, "failed", error="capacity_exceeded")
+        logger.warning("File des jobs pleine : %d en cours ou en attente", runner.pending)
+        raise capacity_exceeded()
+    return _job_out(job, queue_position=position)
+
+
+@router.get("/{job_id}", response_model=JobOut)
+def get_job(job_id: str, principal: Principal = Depends(require_principal)) -> JobOut:
+    return _job_out(_own_job(job_id, principal))
+
+
+@router.delete("/{job_id}", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
+def cancel_job(
+    job_id: str,
+    principal: Principal = Depends(require_principal),
+    settings: Settings = Depends(get_settings),
+) -> JobOut:
+    """Demande l'annulation ; effective à la prochaine étape du pipeline."""
+    job = _own_job(job_id, principal)
+    if not job.finished:
+        get_job_runner(settings.job_workers, settings.job_queue_max).cancel(job_id)
+    return _job_out(_own_job(job_id, principal))
+
+
+@router.get("/{job_id}/events")
+async def job_events(
+    job_id: str,
+    after: int = Query(default=0, ge=0, description="Rang du dernier événement déjà reçu."),
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+    principal: Principal = Depends(require_principal),
+    settings: Settings = Depends(get_settings),
+) -> StreamingResponse:
+    """Journal du job en SSE, à partir du rang `after`, jusqu'à sa fin."""
+    _own_job(job_id, principal)
+    if last_event_id and last_event_id.isdigit():
+        after = max(after, int(last_event_id))
+    store = get_job_store()
+
+    async def body() -> AsyncIterator[str]:
+        cursor, idle = after, 0.0
+        while True:
+            events = await asyncio.to_thread(store.events, job_id, cursor)
+            for seq, payload in events:
+                cursor = seq
+                yield (f"id: {seq}\nevent: {payload.get('type', 'message')}\n"
+                       f"data: {json.dumps(payload, ensure_ascii=False, separators=(',', ':'))}\n\n")
+                if payload.get("type") == "result":
+                    return
+            if events:
+                idle = 0.0
+                continue
+            job = await asyncio.to_thread(store.get, job_id)
+            if job is None or job.finished:
+                # Le job a pu écrire ses dernières trames entre les deux lectures.
+                if await asyncio.to_thread(store.events, job_id, cursor):
+                    continue
+                # Terminé sans trame `result` (annulé en file, échec interne).
+                final = job.status if job is not None else "failed"
+                yield f"event: end\ndata: {json.dumps({'status': final})}\n\n"
+                return
+            await asyncio.sleep(_POLL_S)
+            idle += _POLL_S
+            if idle >= settings.sse_heartbeat_s:
+                idle = 0.0
+                yield ": ping\n\n"
+
+    return StreamingResponse(body(), media_type="text/event-stream", headers=dict(BASE_HEADERS))
@@ -0,0 +1,28 @@
+"""
+Métriques Prometheus : `GET /metrics` (format d'exposition texte 0.0.4).
+
+Totaux du serveur entier quel que soit le worker qui répond (`utils/metrics.py`).
+Sans authentification, comme `/health` : le service n'écoute que sur la boucle
+locale, Prometheus le lit sur `127.0.0.1:8080`, et nginx refuse `/metrics`
+depuis l'extérieur (`deploy/nginx.conf.example`).
+"""
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from api.errors import not_found
+from api.settings import Settings, get_settings
+from utils import metrics
+
+router = APIRouter(tags=["health"])
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics(settings: Settings = Depends(get_settings)) -> PlainTextResponse:
+    """Endpoint `def` : la lecture du fichier commun est bloquante."""
+    if not settings.metrics_enabled:
+        raise not_found("Métriques désactivées (METRICS_ENABLED=false).")
+    return PlainTextResponse(metrics.render(), media_type=_CONTENT_TYPE)
@@ -21,20 +21,33 @@ un contexte stable), et les événements traversent vers la boucle par
 `loop.call_soon_threadsafe`. Les `copy_context().run` internes du pipeline
 (spécialistes, recherche, scraping, FiscalOnline) continuent de fonctionner tels
 quels.
+
+La rédaction émet un `TextDelta` par fragment du fournisseur — quelques
+caractères, des centaines par réponse. Le pont les **regroupe** (`Coalescing`)
+avant la boucle : un lot part dès qu'il atteint sa taille, ou au plus tard
+après un court délai, même si le fournisseur marque une pause. Une trame SSE
+par lot plutôt que par fragment : moins de passages entre threads, de
+sérialisations JSON et d'écritures socket, à fluidité perçue égale.
 """
 from __future__ import annotations
 
 import asyncio
+import concurrent.futures
 import contextvars
 import logging
 import threading
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
-from typing import AsyncIterator, Callable, Iterator, Optional
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Iterator, List, Optional, Tuple
 
+from api.admission import PRIORITY_FULL_RUN, AdmissionController, QueueFull, Ticket
 from api.errors import capacity_exceeded
-from api.settings import get_settings
+from api.settings import Settings, get_settings
 from pipeline.errors import PipelineCancelled, PipelineDeadlineExceeded
-from pipeline.events import PipelineEvent
+from pipeline.events import PipelineEvent, TextDelta
+from utils import metrics
+from utils.shared_state import get_shared_state
 
 logger = logging.getLogger(__name__)
 
@@ -44,7 +57,7 @@ _DONE = object()
 # jetons avec tous les endpoints `def`. Un pipeline de 5 minutes par jeton
 # affamerait les routes CRUD.
 _pool: Optional[ThreadPoolExecutor] = None
-_slots: Optional[asyncio.Semaphore] = None
+_admission: Optional[AdmissionController] = None
 _slots_lock = threading.Lock()
 
 
@@ -53,23 +66,35 @@ def get_pool() -> ThreadPoolExecutor:
     with _slots_lock:
         if _pool is None:
             settings = get_settings()
-            _pool = ThreadPoolExecutor(
+            _pool = metrics.track_pool("pipeline", ThreadPoolExecutor(
                 max_workers=settings.max_concurrent_pipelines,
                 thread_name_prefix="pipeline",
-            )
+            ))
     return _pool
 
 
-def get_slots() -> asyncio.Semaphore:
-    global _slots
-    if _slots is None:
-        _slots = asyncio.Semaphore(get_settings().max_concurrent_pipelines)
-    return _slots
+def get_admission() -> AdmissionController:
+    global _admission
+    if _admission is None:
+        settings = get_settings()
+        # Bail global : la capacité tient pour tous les workers. Il survit à
+        # un run au plus jusqu'à sa deadline, puis expire s'il n'a pas été rendu.
+        _admission = AdmissionController(
+            settings.max_concurrent_pipelines, settings.admission_queue_max,
+            shared=get_shared_state(settings.shared_state_backend, settings.redis_url),
+            lease_ttl_s=settings.pipeline_deadline_s + 60,
+        )
+    return _admission
 
 
 def free_slots() -> int:
-    sem = get_slots()
-    return getattr(sem, "_value", 0)
+    return get_admission().available()
+
+
+metrics.Gauge("fisca_free_slots", "Places d'exécution libres (serveur entier).",
+              free_slots, mode="local")
+metrics.Gauge("fisca_admission_queue_depth", "Requêtes en file d'admission.",
+              lambda: _admission.depth if _admission is not None else 0)
 
 
 def shutdown_pool(wait: bool = True) -> None:
@@ -81,63 +106,247 @@ def shutdown_pool(wait: bool = True) -> None:
 
 
 class PipelineSlot:
-    """Réserve une place d'exécution ; rend un 429 propre si la file est pleine.
+    """Place d'exécution, attribuée par le contrôle d'admission (`api/admission.py`).
+
+    En deux temps pour le flux SSE :
+
+    - `reserve()` **avant** l'envoi des en-têtes : prend une place libre ou un
+      rang dans la file ; si la file est pleine, un 429 JSON propre est encore
+      possible à ce stade ;
+    - `waiting()` **dans** le flux : rend la position et l'ETA à chaque
+      changement, jusqu'à l'admission — le client voit qu'il attend.
 
-    Acquis **avant** l'envoi des en-têtes SSE : à ce stade on peut encore
-    répondre en JSON, ce qui ne serait plus possible une fois le flux ouvert.
+    `async with PipelineSlot(...)` enchaîne les deux, sans retour d'attente.
     """
 
-    def __init__(self):
-        self._acquired = False
+    def __init__(self, key: str = "", priority: int = PRIORITY_FULL_RUN):
+        self.key = key
+        self.priority = priority
+        self._ticket: Optional[Ticket] = None
 
-    async def __aenter__(self) -> "PipelineSlot":
-        settings = get_settings()
+    async def reserve(self) -> "PipelineSlot":
+        admission = get_admission()
         try:
-            await asyncio.wait_for(get_slots().acquire(), settings.slot_acquire_timeout_s)
-        except asyncio.TimeoutError:
-            logger.warning("Capacité saturée : %d pipelines simultanés",
-                           settings.max_concurrent_pipelines)
-            raise capacity_exceeded()
-        self._acquired = True
+            self._ticket = await admission.enqueue(self.key, self.priority)
+        except QueueFull:
+            logger.warning("Capacité saturée : %d pipelines simultanés, %d en file",
+                           admission.capacity, admission.depth)
+            raise capacity_exceeded(_retry_after(admission))
+        return self
+
+    @property
+    def granted(self) -> bool:
+        return self._ticket is not None and self._ticket.granted
+
+    async def waiting(self) -> AsyncIterator[Tuple[int, float]]:
+        """`(position, eta_s)` à chaque changement de rang, tant que la place
+        n'est pas attribuée.
+
+        Raises:
+            ApiError: `capacity_exceeded` au-delà de `ADMISSION_WAIT_TIMEOUT_S`.
+        """
+        admission = get_admission()
+        ticket = self._ticket
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + get_settings().admission_wait_timeout_s
+        last = None
+        while not ticket.granted:
+            position = admission.position(ticket)
+            if position != last:
+                last = position
+                yield position, admission.eta_s(ticket)
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                admission.abandon(ticket, timed_out=True)
+                logger.warning("Attente d'admission abandonnée après %.0f s (rang %d)",
+                               get_settings().admission_wait_timeout_s, position)
+                raise capacity_exceeded(_retry_after(admission))
+            await admission.wait(ticket, min(remaining, _POSITION_POLL_S))
+
+    async def __aenter__(self) -> "PipelineSlot":
+        await self.reserve()
+        async for _ in self.waiting():
+            pass
         return self
 
     async def __aexit__(self, *_exc) -> None:
         self.release()
 
     def release(self) -> None:
-        if self._acquired:
-            self._acquired = False
-            get_slots().release()
+        if self._ticket is not None:
+            get_admission().release(self._ticket)
+            self._ticket = None
+
+
+class JobSlot:
+    """Place d'exécution d'un job (`services/jobs.py`), prise depuis son thread.
+
+    Un job passe par le même contrôle d'admission que les flux : la capacité
+    (`MAX_CONCURRENT_PIPELINES`, bail global compris) les compte ensemble. Le
+    contrôleur vit dans la boucle : le thread du job y soumet son attente et
+    la suit de loin. Pas d'attente maximale — le job est déjà accepté —, mais
+    une annulation (ou l'arrêt du service) l'interrompt.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, key: str = "",
+                 priority: int = PRIORITY_FULL_RUN):
+        self.loop = loop
+        self.key = key
+        self.priority = priority
+        self._admission: Optional[AdmissionController] = None
+        self._ticket: Optional[Ticket] = None
+
+    def acquire(self, cancelled: Callable[[], bool]) -> bool:
+        """Bloque jusqu'à l'admission ; False si `cancelled()` devient vrai avant."""
+        future = asyncio.run_coroutine_threadsafe(self._wait(), self.loop)
+        while True:
+            try:
+                future.result(timeout=_POSITION_POLL_S)
+                return True
+            except concurrent.futures.TimeoutError:
+                if cancelled():
+                    future.cancel()
+                    self.release()     # rang en file, ou place attribuée entre-temps
+                    return False
+
+    async def _wait(self) -> None:
+        admission = self._admission = get_admission()
+        ticket = self._ticket = await admission.enqueue(self.key, self.priority, bounded=False)
+        while not ticket.granted:
+            await admission.wait(ticket, _POSITION_POLL_S)
+
+    def release(self) -> None:
+        """Rend la place ; appelable depuis n'importe quel thread."""
+        self.loop.call_soon_threadsafe(self._release)
+
+    def _release(self) -> None:
+        if self._ticket is not None:
+            self._admission.abandon(self._ticket)     # libère la place si elle est prise
+            self._ticket = None
+
+
+# Fréquence de réévaluation du rang pendant l'attente (les admissions
+# réveillent le ticket admis, pas ceux qui avancent dans la file).
+_POSITION_POLL_S = 1.0
+
+
+def _retry_after(admission: AdmissionController) -> int:
+    """Délai conseillé : le temps de vider la file actuelle, borné à [5, 300] s."""
+    eta = (admission.depth + 1) * admission.service_s / admission.capacity
+    return int(min(300, max(5, eta)))
+
+
+@dataclass(frozen=True)
+class Coalescing:
+    """Regroupement des `TextDelta` : un lot part à `max_chars` caractères, ou
+    `max_delay_s` après son premier fragment. `max_delay_s <= 0` : désactivé."""
+    max_chars: int
+    max_delay_s: float
+
+    @classmethod
+    def for_protocol(cls, settings: Settings) -> "Coalescing":
+        if settings.ai_sdk_protocol == "v4":
+            return cls(settings.text_coalesce_chars_v4, settings.text_coalesce_ms_v4 / 1000)
+        return cls(settings.text_coalesce_chars_v5, settings.text_coalesce_ms_v5 / 1000)
+
+
+class _Bridge:
+    """Événements du thread du pipeline vers la boucle, texte regroupé.
+
+    Tout passe par une seule file sous verrou (`_ready`), lots de texte
+    compris — l'ordre des événements est préservé. La boucle n'est réveillée
+    que lorsque la file devient non vide : un `call_soon_threadsafe` par lot
+    tant que le consommateur suit, et non par événement. Le délai d'un lot
+    est tenu par un minuteur de la boucle : le thread du pipeline, bloqué
+    dans le fournisseur pendant une pause, ne pourrait pas l'honorer.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, coalescing: Optional[Coalescing]):
+        self.loop = loop
+        self.coalescing = coalescing if coalescing and coalescing.max_delay_s > 0 else None
+        self.wakeup = asyncio.Event()
+        self._ready: Deque[Any] = deque()
+        self._text: List[str] = []
+        self._text_chars = 0
+        self._timer_armed = False
+        self._lock = threading.Lock()
+
+    # ── Côté thread du pipeline ──────────────────────────────────────────────
+    def put(self, event: Any) -> None:
+        arm = False
+        with self._lock:
+            was_empty = not self._ready
+            if self.coalescing is not None and isinstance(event, TextDelta):
+                self._text.append(event.delta)
+                self._text_chars += len(event.delta)
+                if self._text_chars >= self.coalescing.max_chars:
+                    self._flush_text()
+                elif not self._timer_armed:
+                    self._timer_armed = arm = True
+            else:
+                self._flush_text()
+                self._ready.append(event)
+            wake = was_empty and bool(self._ready)
+        if arm:
+            self.loop.call_soon_threadsafe(self.loop.call_later,
+                                           self.coalescing.max_delay_s, self._on_timer)
+        if wake:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def _flush_text(self) -> None:
+        if self._text:
+            self._ready.append(TextDelta("".join(self._text)))
+            self._text.clear()
+            self._text_chars = 0
+
+    # ── Côté boucle ──────────────────────────────────────────────────────────
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer_armed = False
+            self._flush_text()
+            ready = bool(self._ready)
+        if ready:
+            self.wakeup.set()
+
+    def drain(self) -> List[Any]:
+        self.wakeup.clear()
+        with self._lock:
+            events = list(self._ready)
+            self._ready.clear()
+        return events
 
 
 async def stream_events(
     make_iterator: Callable[[threading.Event], Iterator[PipelineEvent]],
+    coalescing: Optional[Coalescing] = None,
 ) -> AsyncIterator[PipelineEvent]:
     """Exécute un générateur bloquant dans un thread et relaie ses événements.
 
     Args:
         make_iterator: fabrique appelée dans le thread worker, recevant le
             `threading.Event` d'annulation à passer au pipeline.
+        coalescing: regroupement des `TextDelta` (voir `Coalescing`) ; None :
+            un événement relayé par fragment.
 
     L'annulation de la tâche asyncio (déconnexion du client) positionne l'event :
     le pipeline s'arrête au prochain point de contrôle, finalise sa trace, et le
     thread est rejoint avant de rendre la main.
     """
     loop = asyncio.get_running_loop()
-    queue: asyncio.Queue = asyncio.Queue(maxsize=512)
+    bridge = _Bridge(loop, coalescing)
     cancel = threading.Event()
 
     def _worker() -> None:
         iterator = make_iterator(cancel)
         try:
             for event in iterator:
-                loop.call_soon_threadsafe(queue.put_nowait, event)
+                bridge.put(event)
         except (PipelineCancelled, PipelineDeadlineExceeded) as exc:
             logger.info("Pipeline interrompu : %s", exc)
-            loop.call_soon_threadsafe(queue.put_nowait, exc)
+            bridge.put(exc)
         except BaseException as exc:  # noqa: BLE001 — relayé tel quel à l'appelant
             logger.exception("Pipeline — échec dans le thread worker")
-            loop.call_soon_threadsafe(queue.put_nowait, exc)
+            bridge.put(exc)
         finally:
             # close() lève GeneratorExit dans le générateur s'il est encore
             # suspendu → finalize_trace s'exécute même sur abandon.
@@ -145,7 +354,7 @@ async def stream_events(
                 iterator.close()
             except Exception:  # pragma: no cover
                 logger.debug("Fermeture du générateur de pipeline en échec", exc_info=True)
-            loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+            bridge.put(_DONE)
 
     # copy_context() capturé sur la boucle : request_id / user_id suivent le
     # worker et apparaissent dans les logs émis par le pipeline.
@@ -155,16 +364,19 @@ async def stream_events(
     heartbeat = get_settings().sse_heartbeat_s
     try:
         while True:
-            try:
-                event = await asyncio.wait_for(queue.get(), heartbeat)
-            except asyncio.TimeoutError:
-                yield None          # signal de keep-alive pour l'encodeur SSE
+            events = bridge.drain()
+            if not events:
+                try:
+                    await asyncio.wait_for(bridge.wakeup.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None          # signal de keep-alive pour l'encodeur SSE
                 continue
-            if event is _DONE:
-                return
-            if isinstance(event, BaseException):
-                raise event
-            yield event
+            for event in events:
+                if event is _DONE:
+                    return
+                if isinstance(event, BaseException):
+                    raise event
+                yield event
     finally:
         cancel.set()
         # shield : sans lui, l'annulation se propagerait au join et on
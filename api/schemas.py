@@ -11,7 +11,7 @@ gardant une API utilisable en `curl`.
 """
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field, model_validator
 
@@ -22,6 +22,8 @@ class ChatOptions(BaseModel):
     active_domains: Optional[List[str]] = None
     use_justicelibre: Optional[bool] = None
     use_fiscalonline: Optional[bool] = None
+    # False → ignore le cache des réponses pour cette question (réponse fraîche).
+    use_answer_cache: Optional[bool] = None
     # Réservé au debug interne : ignoré (et rejeté) si ALLOW_MODEL_OVERRIDE=false.
     models: Optional[Dict[str, str]] = None
 
@@ -73,6 +75,12 @@ class ChatRequest(BaseModel):
         return self
 
 
+class ResumeRequest(BaseModel):
+    """Corps de `/v1/chat/resume` : le `run_id` annoncé par la trame `data-run`."""
+
+    run_id: str = Field(min_length=3, max_length=64)
+
+
 def _last_user_text(messages: List[Dict[str, Any]]) -> str:
     """Extrait le texte du dernier message utilisateur (formats AI SDK v4 et v5)."""
     for msg in reversed(messages):
@@ -117,6 +125,22 @@ class ChatSyncResponse(BaseModel):
     trace_id: Optional[str] = None
     cost_usd: float = 0.0
     duration_s: float = 0.0
+    cached: bool = False
+    profile: Optional[Dict[str, Any]] = None      # en-tête X-Profile
+
+
+class JobOut(BaseModel):
+    """État d'un job (`/v1/jobs`) ; `result` une fois terminé."""
+    job_id: str
+    status: Literal["queued", "running", "done", "failed", "cancelled"]
+    conversation_id: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    n_events: int = 0
+    queue_position: Optional[int] = None
+    result: Optional[ChatSyncResponse] = None
+    error: Optional[str] = None
 
 
 class ConversationSummary(BaseModel):
@@ -147,6 +171,37 @@ class FeedbackRequest(BaseModel):
     trace_id: Optional[str] = None
 
 
+class AnswerCacheStats(BaseModel):
+    enabled: bool
+    entries: int = 0
+    hits: int = 0
+    oldest_age_s: Optional[float] = None
+    ttl_s: float = 0.0
+    min_similarity: float = 0.0
+    semantic: bool = False
+
+
+class AdmissionStats(BaseModel):
+    """Places d'exécution et file d'attente (`api/admission.py`)."""
+    capacity: int
+    in_use: int                # dans ce worker
+    available: int = 0         # pour le serveur entier
+    queue_depth: int
+    queue_max: int
+    queue_depth_by_priority: Dict[str, int] = Field(default_factory=dict)
+    admitted: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    wait_s_p50: float = 0.0
+    wait_s_p95: float = 0.0
+    wait_s_max: float = 0.0
+    service_s_estimate: float = 0.0
+
+
+class InvalidationResponse(BaseModel):
+    deleted: int
+
+
 class OkResponse(BaseModel):
     ok: bool = True
 
@@ -175,3 +230,6 @@ class ReadyResponse(BaseModel):
     supabase: bool
     missing_config: List[str] = Field(default_factory=list)
     free_pipeline_slots: int = 0
+    queue_depth: int = 0
+    warm: bool = True
+    warmup_s: Dict[str, float] = Field(default_factory=dict)
@@ -26,6 +26,8 @@ class Settings(BaseSettings):
     # ── Authentification du proxy fiscalonline ───────────────────────────────
     # Liste séparée par des virgules → permet la rotation de clé sans coupure.
     api_shared_secrets: str = Field(default="", alias="API_SHARED_SECRET")
+    # Secret distinct pour les routes /v1/admin (vide → administration désactivée).
+    admin_api_secrets: str = Field(default="", alias="ADMIN_API_SECRET")
 
     # ── Réseau ───────────────────────────────────────────────────────────────
     # Loopback par défaut : le reverse-proxy du client est la seule entrée.
@@ -38,29 +40,66 @@ class Settings(BaseSettings):
 
     # ── Exécution du pipeline ────────────────────────────────────────────────
     max_concurrent_pipelines: int = 3
-    slot_acquire_timeout_s: float = 2.0
+    # Au-delà des places, file d'attente bornée et équitable (`api/admission.py`) :
+    # une rafale est servie dans la minute plutôt que refusée. File pleine ou
+    # attente dépassée → 429 `capacity_exceeded`.
+    admission_queue_max: int = 20
+    admission_wait_timeout_s: float = 120.0
     # Un run complet mesuré en recette tourne autour de 200-300 s (11 étapes,
     # ~20 appels LLM, recherche et scraping). 600 s laisse la marge nécessaire
     # sans jamais laisser une requête traîner indéfiniment.
     pipeline_deadline_s: float = 600.0
     sse_heartbeat_s: float = 15.0
+    # Fragments de texte regroupés avant l'encodage SSE (`api/runner.py`) : un
+    # lot part à N caractères ou N ms après son premier fragment (0 ms : un
+    # événement par fragment). La trame v5 (JSON typé, réconcilié côté client)
+    # coûte plus qu'une ligne v4 : lots plus grands.
+    text_coalesce_ms_v5: float = 50.0
+    text_coalesce_chars_v5: int = 1024
+    text_coalesce_ms_v4: float = 30.0
+    text_coalesce_chars_v4: int = 512
+    # Jobs détachés (`/v1/jobs`) : pool distinct des flux, avec sa file d'attente.
+    job_workers: int = 2
+    job_queue_max: int = 20
+    job_retention_s: float = 24 * 3600.0
 
     # ── Comportement métier ──────────────────────────────────────────────────
     followup_auto_escalate: bool = True
     allow_model_override: bool = False
     ai_sdk_protocol: Literal["v5", "v4"] = "v5"
+    # Cache des réponses complètes (`services/answer_cache.py`) : une question
+    # déjà traitée — à la formulation près — est servie sans relancer le pipeline.
+    answer_cache_enabled: bool = False
+    answer_cache_ttl_s: float = 7 * 24 * 3600.0
+    answer_cache_min_similarity: float = 0.95
+    # Points de reprise du pipeline (`pipeline/checkpoints.py`) : un flux
+    # interrompu reprend par `POST /v1/chat/resume` au lieu de repartir de zéro.
+    checkpoints_enabled: bool = True
+    checkpoint_ttl_s: float = 3600.0
+    # Profil d'exécution sur demande (en-tête `X-Profile: 1`, `pipeline/profiling.py`).
+    profiling_enabled: bool = True
+    # `GET /metrics` (format Prometheus), agrégé entre workers (`utils/metrics.py`).
+    metrics_enabled: bool = True
+    # Import des dépendances lourdes au démarrage du worker (`api/warmup.py`) :
+    # "blocking" sous gunicorn, "background" derrière une sonde `/ready`.
+    prewarm: Literal["blocking", "background", "off"] = "blocking"
 
     # ── Limites ──────────────────────────────────────────────────────────────
     max_question_chars: int = 4000
     max_body_bytes: int = 64 * 1024
     rate_limit_per_hour: int = 30
     rate_limit_burst_per_min: int = 3
+    # Quotas et places d'exécution partagés entre workers (`utils/shared_state.py`) :
+    # "sqlite" pour un serveur (défaut), "redis" pour un service réparti sur
+    # plusieurs serveurs (`REDIS_URL`), "memory" pour un worker unique.
+    shared_state_backend: Literal["sqlite", "redis", "memory"] = "sqlite"
+    redis_url: str = ""
 
     # ── Observabilité ────────────────────────────────────────────────────────
     log_level: str = "INFO"
     log_format: Literal["json", "text"] = "json"
 
-    @field_validator("api_shared_secrets", "cors_origins", mode="before")
+    @field_validator("api_shared_secrets", "admin_api_secrets", "cors_origins", mode="before")
     @classmethod
     def _strip(cls, v):
         return v.strip() if isinstance(v, str) else v
@@ -69,6 +108,10 @@ class Settings(BaseSettings):
     def shared_secrets(self) -> List[str]:
         return [s.strip() for s in self.api_shared_secrets.split(",") if s.strip()]
 
+    @property
+    def admin_secrets(self) -> List[str]:
+        return [s.strip() for s in self.admin_api_secrets.split(",") if s.strip()]
+
     @property
     def cors_origin_list(self) -> List[str]:
         return [o.strip() for o in self.cors_origins.split(",") if o.strip()]
@@ -86,6 +129,8 @@ class Settings(BaseSettings):
                             ("SERPAPI_API_KEY", serpapi_key)):
             if not value:
                 missing.append(name)
+        if self.shared_state_backend == "redis" and not self.redis_url:
+            missing.append("REDIS_URL")
         return missing
 
 
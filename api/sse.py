@@ -100,6 +100,11 @@ class SSEEncoder:
             data["meta"] = meta
         return self._data_part("progress", data, transient=True, part_id=PROGRESS_PART_ID)
 
+    def run(self, run_id: str) -> str:
+        """Identifiant de l'exécution, à présenter à `/v1/chat/resume` si le flux
+        est coupé avant la fin."""
+        return self._data_part("run", {"run_id": run_id}, transient=True)
+
     def sources(self, sources: List[Dict[str, Any]]) -> str:
         return self._data_part("sources", {"sources": sources})
 
@@ -0,0 +1,109 @@
+"""
+Préchauffage du worker.
+
+Les dépendances lourdes ne sont plus importées avec `api.main` mais au premier
+usage : litellm (`utils/llm.py`, plusieurs secondes à lui seul), trafilatura
+(`legal_scraper.py`), pandas (`utils/fiscalonline.py`, déjà importé à la
+demande par le pipeline) et le SDK Supabase (`services/supabase.py`). Le hook
+`lifespan` les charge aussitôt le worker démarré, pour que la première requête
+n'en paie pas le coût — ce qui compte sous gunicorn, qui recycle ses workers
+toutes les ~200 requêtes (`max_requests`).
+
+Deux modes (`PREWARM`) :
+
+* `blocking` (défaut) : le démarrage attend la fin du préchauffage. Sous
+  gunicorn, les workers partagent la socket d'écoute : un worker recyclé
+  n'accepte rien tant qu'il est froid, ses voisins servent à sa place ;
+* `background` : le worker sert aussitôt et `/ready` annonce `warming`
+  jusqu'à la fin — pour un worker unique derrière une sonde de disponibilité.
+  Une requête arrivée entre-temps attend l'import en cours, sans le refaire.
+
+Une étape en échec est journalisée sans bloquer le démarrage : la dépendance
+sera importée (et l'erreur levée) au premier usage. `python -m bench.imports`
+mesure ce qu'il reste à l'import de `api.main`.
+"""
+from __future__ import annotations
+
+import importlib
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _litellm() -> None:
+    from utils.llm import warm
+
+    warm()
+
+
+def _supabase() -> None:
+    from services.supabase import get_supabase_client
+
+    get_supabase_client()
+
+
+STEPS: Tuple[Tuple[str, Callable[[], object]], ...] = (
+    ("litellm", _litellm),
+    ("trafilatura", lambda: importlib.import_module("trafilatura")),
+    ("fiscalonline", lambda: importlib.import_module("utils.fiscalonline")),
+    ("supabase", _supabase),
+)
+
+
+@dataclass
+class Warmup:
+    """État du préchauffage du worker."""
+    state: str = "cold"                 # cold | warming | warm
+    durations_s: Dict[str, float] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def warm(self) -> bool:
+        return self.state == "warm"
+
+    def run(self) -> "Warmup":
+        """Exécute les étapes une à une ; idempotent."""
+        with self._lock:
+            if self.state != "cold":
+                return self
+            self.state = "warming"
+        t0 = time.perf_counter()
+        for name, step in STEPS:
+            t_step = time.perf_counter()
+            try:
+                step()
+            except Exception as exc:
+                self.errors[name] = f"{type(exc).__name__}: {exc}"
+                logger.warning("Préchauffage — %s en échec : %s", name, exc)
+            self.durations_s[name] = round(time.perf_counter() - t_step, 3)
+        self.state = "warm"
+        logger.info("Préchauffage terminé en %.1fs (%s)", time.perf_counter() - t0,
+                    ", ".join(f"{k} {v:.2f}s" for k, v in self.durations_s.items()))
+        return self
+
+    def start(self) -> threading.Thread:
+        """Lance `run` dans un thread (mode `background`)."""
+        thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        thread.start()
+        return thread
+
+
+_warmup: Optional[Warmup] = None
+
+
+def get_warmup() -> Warmup:
+    global _warmup
+    if _warmup is None:
+        _warmup = Warmup()
+    return _warmup
+
+
+def reset_warmup() -> None:
+    """Tests : repart d'un worker froid."""
+    global _warmup
+    _warmup = None
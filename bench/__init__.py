@@ -0,0 +1 @@
+"""Bancs d'essai de performance, hors suite de tests (`python -m bench.<module>`)."""
@@ -0,0 +1,118 @@
+"""
+Audit du temps d'import de `api.main` : le démarrage à froid d'un worker.
+
+Chaque mesure lance un interpréteur neuf avec `python -X importtime` ; on
+garde, module par module, la médiane de `--repeat` mesures. Rapporte le cumul
+de la cible, les modules au cumul le plus lourd et le temps propre agrégé par
+paquet de premier niveau, puis vérifie le budget de régression :
+
+  * le cumul de la cible reste sous `--budget-ms` (`IMPORT_BUDGET_MS`) ;
+  * aucun module de `DEFERRED` n'est importé : ils le sont au premier usage,
+    ou au préchauffage du worker (`api/warmup.py`).
+
+Code de sortie 1 si le budget est dépassé : utilisable tel quel en CI.
+
+Usage :
+    python -m bench.imports
+    python -m bench.imports --top 30 --repeat 5
+    python -m bench.imports --target pipeline.core --budget-ms 600
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# Importés au premier usage : leur présence à l'import de l'API est une régression.
+DEFERRED = ("litellm", "trafilatura", "supabase", "pandas", "langfuse")
+# ≈0,7 s mesuré après report des imports lourds (litellm seul en coûtait 3,4).
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _measure(target: str) -> Dict[str, Tuple[int, int, int]]:
+    """Un import à froid : module → (propre µs, cumul µs, profondeur)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {target}"],
+                          cwd=_ROOT, capture_output=True, text=True)
+    if proc.returncode:
+        raise SystemExit(f"import {target} en échec :\n{proc.stderr[-2000:]}")
+    modules = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            own, cumulative, indent, name = m.groups()
+            modules[name] = (int(own), int(cumulative), len(indent) // 2)
+    return modules
+
+
+def run(target: str, repeat: int, top: int) -> Dict[str, object]:
+    samples = [_measure(target) for _ in range(repeat)]
+    names = set.intersection(*(set(s) for s in samples))
+
+    def _median(name: str, i: int) -> float:
+        return statistics.median(s[name][i] for s in samples) / 1000
+
+    modules = [{"module": name, "depth": samples[0][name][2],
+                "self_ms": round(_median(name, 0), 1), "cumul_ms": round(_median(name, 1), 1)}
+               for name in names]
+    modules.sort(key=lambda r: r["cumul_ms"], reverse=True)
+
+    packages: Dict[str, float] = defaultdict(float)
+    for name in names:
+        packages[name.split(".")[0]] += _median(name, 0)
+    package_rows = [{"package": p, "self_ms": round(ms, 1), "modules": sum(
+        1 for n in names if n.split(".")[0] == p)} for p, ms in packages.items()]
+    package_rows.sort(key=lambda r: r["self_ms"], reverse=True)
+
+    return {
+        "total_ms": round(_median(target, 1), 1) if target in names else 0.0,
+        "modules": len(names),
+        "rows": modules[:top],
+        "packages": package_rows[:top],
+        "deferred_loaded": sorted(p for p in DEFERRED if p in packages),
+    }
+
+
+def print_table(rows: List[Dict[str, float]]) -> None:
+    cols = list(rows[0].keys())
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in cols]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(cols, widths)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Audit du temps d'import de l'API (-X importtime).")
+    ap.add_argument("--target", default="api.main", help="Module à importer.")
+    ap.add_argument("--repeat", type=int, default=3, help="Imports à froid (médiane).")
+    ap.add_argument("--top", type=int, default=20, help="Lignes par tableau.")
+    ap.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS,
+                    help="Cumul maximal de l'import de la cible.")
+    args = ap.parse_args()
+
+    out = run(args.target, args.repeat, args.top)
+    print(f"import {args.target} — {out['total_ms']} ms, {out['modules']} modules "
+          f"(médiane de {args.repeat})\n")
+    print_table(out["rows"])
+    print()
+    print_table(out["packages"])
+
+    failures = []
+    if out["total_ms"] > args.budget_ms:
+        failures.append(f"{out['total_ms']} ms > budget de {args.budget_ms:g} ms")
+    if out["deferred_loaded"]:
+        failures.append("importés trop tôt : " + ", ".join(out["deferred_loaded"]))
+    print("\nbudget :", "; ".join(failures) if failures else f"OK (≤ {args.budget_ms:g} ms)")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Banc d'essai mémoire de `utils.llm.llm_call_stream`.
+
+Simule `--streams` rédactions concurrentes de `--tokens` tokens chacune (un
+fragment LiteLLM `ModelResponseStream` par token ou presque, puis le fragment
+d'usage final), consommées jusqu'au bout, et mesure sous tracemalloc le pic
+de mémoire allouée, ramené à un flux.
+
+`buffered` est la lecture d'origine (chaque fragment conservé, réponse
+reconstruite par `litellm.stream_chunk_builder` pour l'usage et le coût),
+gardée ici comme référence ; `current` est `llm_call_stream` tel quel.
+
+Usage :
+    python -m bench.llm_stream
+    python -m bench.llm_stream --tokens 8000 --streams 3
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import threading
+import time
+import tracemalloc
+from typing import Dict, Iterator, List
+
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import litellm  # noqa: E402
+from litellm.types.utils import Delta, ModelResponseStream, StreamingChoices, Usage  # noqa: E402
+
+from utils import llm  # noqa: E402
+
+MODES = ("buffered", "current")
+MODEL = "gpt-4o"
+_WORDS = "le taux réduit de TVA s'applique aux travaux d'amélioration des logements".split()
+
+
+def _fake_completion(tokens: int) -> Iterator[ModelResponseStream]:
+    """Flux réaliste : fragments de 1 à 3 mots, créés au fil de l'eau."""
+    emitted = 0
+    while emitted < tokens:
+        n = 1 + emitted % 3
+        text = " ".join(_WORDS[(emitted + i) % len(_WORDS)] for i in range(n)) + " "
+        emitted += n
+        yield ModelResponseStream(choices=[StreamingChoices(delta=Delta(content=text))],
+                                  model=MODEL)
+    yield ModelResponseStream(choices=[StreamingChoices(delta=Delta(content=None))], model=MODEL,
+                              usage=Usage(prompt_tokens=12000, completion_tokens=emitted,
+                                          total_tokens=12000 + emitted))
+
+
+def _buffered_stream(**kwargs) -> Iterator[str]:
+    """Lecture d'origine, pour comparaison."""
+    chunks = []
+    for chunk in litellm.completion(**kwargs):
+        chunks.append(chunk)
+        try:
+            delta = chunk.choices[0].delta.content
+        except Exception:
+            delta = None
+        if delta:
+            yield delta
+    rebuilt = litellm.stream_chunk_builder(chunks, messages=kwargs["messages"])
+    llm._extract_cost(rebuilt, MODEL)
+
+
+def _consume(mode: str, out: List[int]) -> None:
+    messages = [{"role": "user", "content": "question"}]
+    if mode == "buffered":
+        stream = _buffered_stream(model=MODEL, messages=messages, stream=True)
+    else:
+        stream = llm.llm_call_stream(MODEL, messages=messages, agent_name="redactionnel")
+    out.append(sum(len(delta) for delta in stream))
+
+
+def run(mode: str, tokens: int, streams: int) -> Dict[str, float]:
+    original = litellm.completion
+    litellm.completion = lambda **kwargs: _fake_completion(tokens)
+    try:
+        sizes: List[int] = []
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=_consume, args=(mode, sizes)) for _ in range(streams)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        litellm.completion = original
+    return {
+        "mode": mode,
+        "streams": streams,
+        "chars": sum(sizes) // max(1, len(sizes)),
+        "peak_kb_per_stream": round(peak / 1024 / streams, 1),
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+def print_table(rows: List[Dict[str, float]]) -> None:
+    cols = list(rows[0].keys())
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in cols]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(cols, widths)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Banc d'essai mémoire des appels LLM streamés.")
+    ap.add_argument("--tokens", type=int, default=4000, help="Tokens générés par flux.")
+    ap.add_argument("--streams", type=int, default=3, help="Flux concurrents.")
+    ap.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = ap.parse_args()
+
+    llm._init_once()
+    print(f"{args.streams} flux concurrents de {args.tokens} tokens\n")
+    print_table([run(m, args.tokens, args.streams) for m in args.modes])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""
+Banc de charge du service FastAPI : combien de flux `/v1/chat` simultanés un
+worker tient-il ?
+
+Le vrai service (`api.main:app`) est lancé sous uvicorn ou sous gunicorn
+(`deploy/gunicorn_conf.py`), en sous-processus, face à des serveurs factices
+(`stubs.py`) qui imitent tous ses fournisseurs externes, avec des latences
+paramétrables : passerelle LLM compatible OpenAI (appels bloquants et
+streamés), SerpAPI, JusticeLibre (MCP) et sites cibles du scraping. Des
+centaines de clients SSE concurrents (`driver.py`) mesurent débit, latence
+des événements, taux de 429, threads et mémoire du service.
+
+Usage :
+    python -m bench.loadtest
+    python -m bench.loadtest --clients 300 --max-pipelines 3 8 --servers uvicorn gunicorn
+    python -m bench.loadtest --llm lognormal:1.5:0.4 --tokens-per-s 40 --site uniform:0.2:2
+    python -m bench.loadtest.stubs --port 9100          # serveurs factices seuls
+"""
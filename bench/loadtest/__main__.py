@@ -0,0 +1,3 @@
+from bench.loadtest.driver import main
+
+main()
@@ -0,0 +1,324 @@
+"""
+Pilote du banc de charge : lance le service, l'inonde de flux SSE, mesure.
+
+Pour chaque serveur (`--servers`) et chaque valeur de `MAX_CONCURRENT_PIPELINES`
+(`--max-pipelines`), le service est démarré à froid dans un sous-processus,
+branché sur les serveurs factices (`bench/loadtest/stubs.py`), puis `--clients`
+clients SSE concurrents enchaînent `--requests` appels `POST /v1/chat` (une
+adresse e-mail et une question distinctes par appel : ni quota utilisateur,
+ni cache de réponses). Mesures :
+
+  * débit : rédactions complètes par minute ;
+  * `ttfb` : envoi → première trame (le flux s'ouvre avant l'admission) ;
+  * `first_text` : envoi → premier fragment de la réponse ;
+  * `lag` : retard d'un événement de bout en bout — du marqueur horodaté émis
+    par le faux LLM à sa réception par le client, à travers normalisation,
+    regroupement et encodage SSE (p50 / p99) ;
+  * taux de 429 (file d'admission pleine ou attente trop longue) et erreurs ;
+  * threads et RSS maximum de l'arbre de processus du service (maître
+    gunicorn compris), relevés dans `/proc` — Linux seulement.
+
+Le service est piloté par HTTP réel et non par un client ASGI en processus :
+`httpx.ASGITransport` rend le corps d'une réponse streamée d'un seul bloc,
+ce qui rendrait la latence des événements immesurable, et le service
+partagerait le GIL et la boucle des clients.
+
+Les quotas utilisateur sont relevés pour ne pas masquer la capacité ; la
+file d'admission garde ses réglages (`--env ADMISSION_QUEUE_MAX=…` pour la
+faire varier, comme tout autre réglage de `api/settings.py`).
+
+Usage :
+    python -m bench.loadtest
+    python -m bench.loadtest --clients 300 --requests 600 --max-pipelines 3 6 12
+    python -m bench.loadtest --servers gunicorn --workers 2 --env ADMISSION_QUEUE_MAX=50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from bench.loadtest.stubs import MARKER, StubConfig, StubServer, free_port, wait_http
+
+SERVERS = ("uvicorn", "gunicorn")
+SECRET = "loadtest"
+QUESTION = ("Quel régime de TVA s'applique à la revente de biens d'occasion "
+            "par un assujetti revendeur ? (cas {i})")
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Jamais transmises au service : il ne doit joindre que les serveurs factices.
+_SCRUBBED = ("LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY", "SUPABASE_URL", "SUPABASE_KEY",
+             "FIRECRAWL_API_KEY", "REDIS_URL", "HTTPS_PROXY", "https_proxy")
+
+
+@dataclass
+class _Outcome:
+    status: int = 0
+    ttfb_s: Optional[float] = None
+    first_text_s: Optional[float] = None
+    total_s: float = 0.0
+    finished: bool = False
+    error: Optional[str] = None
+    lags_s: List[float] = field(default_factory=list)
+
+
+def _pct(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def _round(value: Optional[float], scale: float = 1.0, digits: int = 2):
+    return "—" if value is None else round(value * scale, digits)
+
+
+# ─── Processus du service ─────────────────────────────────────────────────────
+def _server_env(stubs: StubServer, max_pipelines: int, workers: int, port: int,
+                data_dir: str, extra: Dict[str, str]) -> Dict[str, str]:
+    env = {k: v for k, v in os.environ.items() if k not in _SCRUBBED}
+    env.update(stubs.env())
+    env.update({
+        "OPENAI_API_KEY": SECRET, "GOOGLE_API_KEY": SECRET, "ANTHROPIC_API_KEY": SECRET,
+        "SERPAPI_API_KEY": SECRET, "API_SHARED_SECRET": SECRET,
+        "API_HOST": "127.0.0.1", "API_PORT": str(port), "WEB_CONCURRENCY": str(workers),
+        "MAX_CONCURRENT_PIPELINES": str(max_pipelines),
+        "RATE_LIMIT_PER_HOUR": "1000000", "RATE_LIMIT_BURST_PER_MIN": "1000000",
+        "ANSWER_CACHE_ENABLED": "false",
+        "LOG_LEVEL": "WARNING", "GUNICORN_GRACEFUL_TIMEOUT": "5",
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+        # Bases et index hors du dépôt : chaque scénario part à froid.
+        "CACHE_DB_PATH": os.path.join(data_dir, "cache.sqlite"),
+        "JOBS_DB_PATH": os.path.join(data_dir, "jobs.sqlite"),
+        "SHARED_STATE_PATH": os.path.join(data_dir, "shared_state.sqlite"),
+        "METRICS_PATH": os.path.join(data_dir, "metrics.sqlite"),
+        "LOCAL_CORPUS_PATH": os.path.join(data_dir, "corpus.sqlite"),
+        "DENSE_INDEX_DIR": os.path.join(data_dir, "dense"),
+    })
+    env.update(extra)
+    return env
+
+
+def _server_cmd(server: str, port: int) -> List[str]:
+    if server == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "api.main:app", "-c", "deploy/gunicorn_conf.py"]
+    return [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1",
+            "--port", str(port), "--no-access-log", "--log-level", "warning"]
+
+
+def _process_tree(root: int) -> List[int]:
+    parents: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Le nom du processus (2e champ) peut contenir des espaces.
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+    tree, todo = [], [root]
+    while todo:
+        pid = todo.pop()
+        tree.append(pid)
+        todo.extend(parents.get(pid, []))
+    return tree
+
+
+def _usage(root: int) -> Dict[str, int]:
+    """Threads et RSS (Ko) cumulés de l'arbre de processus."""
+    threads = rss_kb = 0
+    for pid in _process_tree(root):
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("Threads:"):
+                        threads += int(line.split()[1])
+                    elif line.startswith("VmRSS:"):
+                        rss_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return {"threads": threads, "rss_kb": rss_kb}
+
+
+# ─── Clients SSE ──────────────────────────────────────────────────────────────
+async def _one(client, url: str, i: int) -> _Outcome:
+    out = _Outcome()
+    headers = {"X-API-Key": SECRET, "X-User-Email": f"charge-{i}@loadtest.invalid"}
+    body = {"message": QUESTION.format(i=i), "options": {"use_fiscalonline": False}}
+    text, scanned = "", 0
+    t0 = time.perf_counter()
+    try:
+        async with client.stream("POST", url, json=body, headers=headers) as resp:
+            out.status = resp.status_code
+            if resp.status_code != 200:
+                await resp.aread()
+                return out
+            async for line in resp.aiter_lines():
+                now = time.perf_counter()
+                if out.ttfb_s is None:
+                    out.ttfb_s = now - t0
+                if not line.startswith("data: ") or line == "data: [DONE]":
+                    continue
+                frame = json.loads(line[6:])
+                kind = frame.get("type")
+                if kind == "text-delta":
+                    wall = time.time()
+                    if out.first_text_s is None:
+                        out.first_text_s = now - t0
+                    text += frame["delta"]
+                    for m in MARKER.finditer(text, scanned):
+                        out.lags_s.append(wall - float(m.group(1)))
+                        scanned = m.end()
+                elif kind == "error":
+                    out.error = frame.get("errorCode") or "error"
+                elif kind == "finish":
+                    out.finished = True
+    except Exception as exc:
+        out.error = type(exc).__name__
+    finally:
+        out.total_s = time.perf_counter() - t0
+    return out
+
+
+async def _drive(base_url: str, clients: int, requests: int, ramp_s: float, root: int,
+                 timeout_s: float) -> Dict[str, object]:
+    import httpx
+
+    outcomes: List[_Outcome] = []
+    peak = {"threads": 0, "rss_kb": 0}
+    counter = iter(range(requests))
+    stop = asyncio.Event()
+
+    async def _sample():
+        while not stop.is_set():
+            for key, value in _usage(root).items():
+                peak[key] = max(peak[key], value)
+            await asyncio.sleep(0.25)
+
+    limits = httpx.Limits(max_connections=clients + 10, max_keepalive_connections=clients)
+    timeout = httpx.Timeout(timeout_s, connect=30.0)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def _client(k: int):
+            if ramp_s:
+                await asyncio.sleep(ramp_s * k / clients)
+            for i in counter:
+                outcomes.append(await _one(client, f"{base_url}/v1/chat", i))
+
+        sampler = asyncio.create_task(_sample())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(_client(k) for k in range(clients)))
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        await sampler
+    return {"outcomes": outcomes, "elapsed_s": elapsed, **peak}
+
+
+# ─── Scénario ─────────────────────────────────────────────────────────────────
+def run(server: str, max_pipelines: int, clients: int, requests: int, stubs: StubServer,
+        workers: int = 1, ramp_s: float = 0.0, timeout_s: float = 600.0,
+        extra_env: Optional[Dict[str, str]] = None) -> Dict[str, object]:
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix="fisca-loadtest-") as data_dir:
+        env = _server_env(stubs, max_pipelines, workers, port, data_dir, extra_env or {})
+        with open(os.path.join(data_dir, "server.log"), "wb") as log:
+            proc = subprocess.Popen(_server_cmd(server, port), cwd=_ROOT, env=env,
+                                    stdout=subprocess.DEVNULL, stderr=log)
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                t0 = time.perf_counter()
+                wait_http(f"{base_url}/health", 120, proc)
+                startup_s = time.perf_counter() - t0
+                idle = _usage(proc.pid)
+                measured = asyncio.run(_drive(base_url, clients, requests, ramp_s, proc.pid,
+                                              timeout_s))
+            except Exception:
+                log.flush()
+                with open(log.name, "rb") as f:
+                    sys.stderr.write(f.read()[-4000:].decode("utf-8", "replace"))
+                raise
+            finally:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+    outcomes: List[_Outcome] = measured["outcomes"]
+    ok = [o for o in outcomes if o.status == 200 and o.finished and not o.error]
+    rejected = sum(1 for o in outcomes if o.status == 429)
+    lags = [lag for o in ok for lag in o.lags_s]
+    return {
+        "server": f"{server}×{workers}" if server == "gunicorn" else server,
+        "pipelines": max_pipelines,
+        "clients": clients,
+        "ok": len(ok),
+        "429_pct": round(100 * rejected / max(1, len(outcomes)), 1),
+        "errors": len(outcomes) - len(ok) - rejected,
+        "per_min": round(len(ok) / measured["elapsed_s"] * 60, 1),
+        "ttfb_p50": _round(_pct([o.ttfb_s for o in ok], 0.5)),
+        "ttfb_p99": _round(_pct([o.ttfb_s for o in ok], 0.99)),
+        "text_p50": _round(_pct([o.first_text_s for o in ok if o.first_text_s], 0.5)),
+        "text_p99": _round(_pct([o.first_text_s for o in ok if o.first_text_s], 0.99)),
+        "lag_p50_ms": _round(_pct(lags, 0.5), 1000, 1),
+        "lag_p99_ms": _round(_pct(lags, 0.99), 1000, 1),
+        "threads": f"{idle['threads']}→{measured['threads']}",
+        "rss_mb": f"{idle['rss_kb'] // 1024}→{measured['rss_kb'] // 1024}",
+        "startup_s": round(startup_s, 1),
+    }
+
+
+def print_table(rows: List[Dict[str, float]]) -> None:
+    cols = list(rows[0].keys())
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in cols]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(cols, widths)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Banc de charge du service /v1/chat (SSE).")
+    ap.add_argument("--servers", nargs="+", default=list(SERVERS), choices=list(SERVERS))
+    ap.add_argument("--max-pipelines", nargs="+", type=int, default=[3, 8],
+                    help="Valeurs de MAX_CONCURRENT_PIPELINES à comparer.")
+    ap.add_argument("--workers", type=int, default=2, help="Workers gunicorn (WEB_CONCURRENCY).")
+    ap.add_argument("--clients", type=int, default=200, help="Clients SSE simultanés.")
+    ap.add_argument("--requests", type=int, help="Appels au total (défaut : un par client).")
+    ap.add_argument("--ramp-s", type=float, default=0.0,
+                    help="Étalement du démarrage des clients (0 : tous d'un coup).")
+    ap.add_argument("--timeout-s", type=float, default=600.0, help="Budget d'un appel.")
+    ap.add_argument("--env", action="append", default=[], metavar="CLÉ=VALEUR",
+                    help="Réglage supplémentaire du service (répétable).")
+    StubConfig.add_arguments(ap)
+    args = ap.parse_args()
+
+    extra = dict(item.split("=", 1) for item in args.env)
+    config = StubConfig.from_args(args)
+    requests = args.requests or args.clients
+    print(f"{args.clients} clients, {requests} appels — LLM {config.llm}, "
+          f"{config.tokens_per_s:g} tokens/s, recherche {config.search}, JL {config.jl}, "
+          f"sites {config.site}\n")
+    rows = []
+    with StubServer(config) as stubs:
+        for server in args.servers:
+            for max_pipelines in args.max_pipelines:
+                rows.append(run(server, max_pipelines, args.clients, requests, stubs,
+                                workers=args.workers, ramp_s=args.ramp_s,
+                                timeout_s=args.timeout_s, extra_env=extra))
+        calls = stubs.stats()
+    print_table(rows)
+    print("\nappels servis :", ", ".join(f"{k}={v}" for k, v in calls.items()
+                                         if not k.startswith("site:")),
+          f"pages={sum(v for k, v in calls.items() if k.startswith('site:'))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+"""
+Serveurs factices des fournisseurs externes du pipeline, pour le banc de charge.
+
+Une seule application ASGI, servie par uvicorn dans un processus à part (le
+service mesuré et les clients n'en partagent ni le GIL ni la boucle) :
+
+  * `POST /v1/chat/completions` — passerelle LLM compatible OpenAI
+    (`LLM_API_BASE`). La réponse dépend de l'agent appelant (en-tête
+    `X-Agent`) : JSON de l'analyste, routage de l'orchestrateur, listes de
+    requêtes, classement du ranker (verbeux ou compact, ids repris du
+    prompt)… La rédaction streamée embarque toutes les `marker_every`
+    fragments un marqueur `[[t:<epoch>]]` posé à l'émission : le client
+    en déduit le retard de bout en bout d'un événement ;
+  * `GET /search` — SerpAPI (`SERPAPI_ENDPOINT`), liens `http://` vers les
+    domaines officiels ;
+  * `POST /mcp` — JusticeLibre, JSON-RPC (`JL_MCP_URL`) ;
+  * sites cibles du scraping, servis en mandataire HTTP (`HTTP_PROXY`) : toute
+    requête dont l'hôte n'est pas local reçoit une page HTML de `page_kb` Ko.
+
+Chaque famille a sa distribution de latence (`Latency`). `GET /stats` rend le
+nombre d'appels servis par route et par agent.
+
+Usage :
+    python -m bench.loadtest.stubs --port 9100
+    python -m bench.loadtest.stubs --port 9100 --llm fixed:0.5 --tokens-per-s 100
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, fields
+from typing import Dict, Iterator, List, Optional, Tuple
+
+LOCAL_HOSTS = ("127.0.0.1", "localhost")
+MARKER = re.compile(r"\[\[t:(\d+\.\d+)\]\]")
+
+_ARITY = {"fixed": 1, "uniform": 2, "lognormal": 2, "exp": 1}
+_DOMAINS = ("legifrance.gouv.fr", "bofip.impots.gouv.fr", "senat.fr", "assemblee-nationale.fr")
+_AGENTS = ("AGENT_TVA_INDIRECTES", "AGENT_ENTREPRISES_IS", "AGENT_PATRIMOINE_TRANSMISSION")
+_WORDS = (
+    "le régime de la TVA sur la marge s'applique aux livraisons de biens d'occasion "
+    "réalisées par un assujetti revendeur ; l'assiette est constituée de la différence "
+    "entre le prix de vente et le prix d'achat, conformément à l'article 297 A du CGI "
+    "et à la doctrine BOI-TVA-SECT-90 ; à défaut, le droit commun s'applique."
+).split()
+
+
+# ─── Latences ─────────────────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class Latency:
+    """Distribution de latence (secondes), décrite par une spécification texte :
+    `fixed:0.2`, `uniform:0.1:0.5`, `lognormal:0.8:0.4` (médiane, sigma),
+    `exp:0.3` (moyenne)."""
+    kind: str
+    params: Tuple[float, ...]
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, *args = spec.split(":")
+        if _ARITY.get(kind) != len(args):
+            raise ValueError(f"Latence invalide : {spec!r} (attendu : fixed:s, uniform:a:b, "
+                             "lognormal:médiane:sigma ou exp:moyenne)")
+        return cls(kind, tuple(float(a) for a in args))
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        mean = self.params[0]
+        return rng.expovariate(1 / mean) if mean > 0 else 0.0
+
+    def __str__(self) -> str:
+        return ":".join([self.kind, *(f"{p:g}" for p in self.params)])
+
+
+@dataclass
+class StubConfig:
+    """Comportement des serveurs factices ; chaque champ est une option CLI."""
+    llm: Latency = Latency.parse("lognormal:0.8:0.4")       # appel bloquant / premier token
+    tokens_per_s: float = 60.0          # débit d'un flux LLM
+    tokens_per_chunk: int = 3           # mots par fragment streamé
+    answer_tokens: int = 600            # longueur de la rédaction
+    marker_every: int = 20              # fragments entre deux marqueurs horodatés
+    search: Latency = Latency.parse("lognormal:0.6:0.3")
+    jl: Latency = Latency.parse("lognormal:0.3:0.3")
+    site: Latency = Latency.parse("lognormal:0.4:0.5")
+    page_kb: int = 40                   # taille d'une page scrapée
+    results_per_query: int = 3          # liens SerpAPI par requête
+    keep_ratio: float = 0.5             # part des candidats retenus par le ranker
+    seed: int = 0
+
+    @classmethod
+    def add_arguments(cls, ap: argparse.ArgumentParser) -> None:
+        for f in fields(cls):
+            default = getattr(cls, f.name)
+            kind = Latency.parse if isinstance(default, Latency) else type(default)
+            ap.add_argument(f"--{f.name.replace('_', '-')}", type=kind, default=default,
+                            help=f"(défaut : {default})")
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> "StubConfig":
+        return cls(**{f.name: getattr(args, f.name) for f in fields(cls)})
+
+    def to_argv(self) -> List[str]:
+        argv: List[str] = []
+        for f in fields(self):
+            argv += [f"--{f.name.replace('_', '-')}", str(getattr(self, f.name))]
+        return argv
+
+
+# ─── Contenu des réponses LLM ─────────────────────────────────────────────────
+def _dumps(payload) -> str:
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def _words(rng: random.Random, n: int) -> str:
+    start = rng.randrange(len(_WORDS))
+    return " ".join(_WORDS[(start + i) % len(_WORDS)] for i in range(n))
+
+
+def _queries(rng: random.Random, n: int, site: str = "") -> List[str]:
+    prefix = f"site:{site} " if site else ""
+    return [f"{prefix}{_words(rng, 6)} {rng.randrange(10_000)}" for _ in range(n)]
+
+
+def _ranking(body: Dict, rng: random.Random, keep_ratio: float) -> str:
+    system = body["messages"][0]["content"]
+    ids = re.findall(r"'id': '(r\d+)'", body["messages"][-1]["content"])
+    scored = [(i, rng.random() < keep_ratio) for i in ids]
+    if "FORMAT DE SORTIE STRICT (COMPACT)" in system:
+        return "\n".join(f"{i}:0.92:K:{_words(rng, 4)}" if keep else f"{i}:0.20"
+                         for i, keep in scored)
+    return _dumps({"results": [{"id": i, "keep": keep, "score": 0.92 if keep else 0.2,
+                                "reason": _words(rng, 12)} for i, keep in scored]})
+
+
+def llm_content(agent: str, body: Dict, config: StubConfig, rng: random.Random) -> str:
+    """Réponse complète d'un agent, au format que le pipeline sait décoder."""
+    if agent == "analyste":
+        return _dumps({
+            "concepts_clefs_T0": [_words(rng, 5) for _ in range(3)],
+            "concepts_miroirs_Tplus1": [_words(rng, 5) for _ in range(2)],
+            "axes_de_recherche_serp": _queries(rng, 4),
+            "points_d_attention_legiste": [_words(rng, 8) for _ in range(2)],
+        })
+    if agent == "orchestrateur":
+        agents = rng.sample(_AGENTS, 2)
+        return _dumps({"selected_agents": agents, "scores": {a: 0.9 for a in agents},
+                       "double_detention_triggered": False})
+    if agent == "verificateur":
+        return _dumps({"legislation": _queries(rng, 2), "doctrine": _queries(rng, 2)})
+    if agent == "generaliste":
+        return repr(_queries(rng, 4))
+    if agent == "jurisprudence":
+        return repr(_queries(rng, 2, "legifrance.gouv.fr"))
+    if agent == "ranker":
+        return _ranking(body, rng, config.keep_ratio)
+    if agent == "redactionnel":
+        return "".join(_answer(config, rng, markers=False))
+    return "\n".join(f"- {_words(rng, 8)}" for _ in range(6))
+
+
+def _answer(config: StubConfig, rng: random.Random, markers: bool = True) -> Iterator[str]:
+    """Rédaction JSON, fragment par fragment. Les marqueurs sont horodatés à
+    l'itération : c'est-à-dire à l'émission quand le flux est cadencé."""
+    yield '```json\n{"reponse_redigee": "## En résumé\\n\\n'
+    n_chunks = max(1, config.answer_tokens // config.tokens_per_chunk)
+    for i in range(n_chunks):
+        if markers and i % config.marker_every == 0:
+            yield f"[[t:{time.time():.6f}]] "
+        yield _words(rng, config.tokens_per_chunk) + ("\\n\\n" if i % 15 == 14 else " ")
+    yield '", "points_cles": ' + _dumps([_words(rng, 6), _words(rng, 6)]) + "}\n```"
+
+
+def _split(text: str, size: int) -> Iterator[str]:
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+# ─── Application ASGI ─────────────────────────────────────────────────────────
+def _host(scope) -> str:
+    for name, value in scope.get("headers", []):
+        if name == b"host":
+            return value.decode("latin-1").rsplit(":", 1)[0]
+    return LOCAL_HOSTS[0]
+
+
+def _page(host: str, path: str, config: StubConfig, rng: random.Random) -> str:
+    title = f"{host}{path}"
+    paragraphs: List[str] = []
+    size = 0
+    while size < config.page_kb * 1024:
+        p = f"<p>{_words(rng, 60)}</p>"
+        paragraphs.append(p)
+        size += len(p)
+    return (f"<html><head><title>{title}</title></head><body><nav>Accueil</nav>"
+            f"<h1>{title}</h1><div class=\"contenu\"><article class=\"bofip-content\">"
+            f"{''.join(paragraphs)}</article></div></body></html>")
+
+
+def build_app(config: StubConfig):
+    """Application ASGI des serveurs factices."""
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import HTMLResponse, JSONResponse, StreamingResponse
+    from starlette.routing import Route
+
+    rng = random.Random(config.seed)
+    stats: Counter = Counter()
+    chunk_gap = config.tokens_per_chunk / config.tokens_per_s if config.tokens_per_s > 0 else 0.0
+
+    def _usage(body: Dict, text: str) -> Dict[str, int]:
+        prompt = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        completion = max(1, len(text) // 4)
+        return {"prompt_tokens": prompt, "completion_tokens": completion,
+                "total_tokens": prompt + completion}
+
+    def _chunk(cid: str, model: str, delta: Dict, finish: Optional[str] = None) -> str:
+        return "data: " + _dumps({
+            "id": cid, "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+        }) + "\n\n"
+
+    async def completions(request: Request):
+        body = await request.json()
+        agent = request.headers.get("x-agent", "llm_call")
+        model = body.get("model", "stub")
+        stats[f"llm:{agent}"] += 1
+        await asyncio.sleep(config.llm.sample(rng))
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        if not body.get("stream"):
+            text = llm_content(agent, body, config, rng)
+            return JSONResponse({
+                "id": cid, "object": "chat.completion", "created": int(time.time()),
+                "model": model, "usage": _usage(body, text),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+            })
+
+        if agent == "redactionnel":
+            pieces = _answer(config, rng)
+        else:
+            pieces = _split(llm_content(agent, body, config, rng), config.tokens_per_chunk * 5)
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+        async def _stream():
+            sent: List[str] = []
+            yield _chunk(cid, model, {"role": "assistant", "content": ""})
+            for piece in pieces:
+                sent.append(piece)
+                yield _chunk(cid, model, {"content": piece})
+                if chunk_gap and not piece.startswith("[[t:"):
+                    await asyncio.sleep(chunk_gap)
+            yield _chunk(cid, model, {}, finish="stop")
+            if include_usage:
+                yield "data: " + _dumps({"id": cid, "object": "chat.completion.chunk",
+                                         "created": int(time.time()), "model": model,
+                                         "choices": [], "usage": _usage(body, "".join(sent))}) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(_stream(), media_type="text/event-stream")
+
+    async def search(request: Request):
+        stats["search"] += 1
+        await asyncio.sleep(config.search.sample(rng))
+        query = request.query_params.get("q", "")
+        site = re.search(r"site:(\S+)", query)
+        results = []
+        for i in range(config.results_per_query):
+            domain = site.group(1) if site else _DOMAINS[(len(query) + i) % len(_DOMAINS)]
+            slug = uuid.uuid5(uuid.NAMESPACE_URL, f"{query}#{i}").hex[:16]
+            results.append({"position": i + 1, "title": _words(rng, 8),
+                            "link": f"http://www.{domain}/loadtest/{slug}",
+                            "snippet": _words(rng, 25)})
+        return JSONResponse({"organic_results": results})
+
+    async def mcp(request: Request):
+        payload = await request.json()
+        method = payload.get("method", "")
+        stats[f"mcp:{payload.get('params', {}).get('name', method)}"] += 1
+        if "id" not in payload:                     # notification
+            return JSONResponse({}, status_code=202)
+        if method == "initialize":
+            result = {"protocolVersion": "2024-11-05", "capabilities": {"tools": {}},
+                      "serverInfo": {"name": "justicelibre-stub", "version": "1"}}
+            return JSONResponse({"jsonrpc": "2.0", "id": payload["id"], "result": result},
+                                headers={"Mcp-Session-Id": uuid.uuid4().hex})
+        await asyncio.sleep(config.jl.sample(rng))
+        name = payload.get("params", {}).get("name", "")
+        if name.startswith("search_"):
+            query = payload["params"].get("arguments", {}).get("query", "")
+            text = _dumps([{
+                "id": f"CETATEXT{uuid.uuid5(uuid.NAMESPACE_URL, f'{name}{query}{i}').int % 10**12:012d}",
+                "titre": _words(rng, 8), "resume": _words(rng, 30),
+                "texte": " ".join(_words(rng, 60) for _ in range(10)),
+            } for i in range(2)])
+        else:
+            text = f"JusticeLibre (banc de charge) — {_words(rng, 40)}"
+        return JSONResponse({"jsonrpc": "2.0", "id": payload["id"],
+                             "result": {"content": [{"type": "text", "text": text}]}})
+
+    async def health(request: Request):
+        return JSONResponse({"status": "ok"})
+
+    async def get_stats(request: Request):
+        return JSONResponse(dict(sorted(stats.items())))
+
+    api = Starlette(routes=[
+        Route("/v1/chat/completions", completions, methods=["POST"]),
+        Route("/search", search),
+        Route("/mcp", mcp, methods=["POST"]),
+        Route("/health", health),
+        Route("/stats", get_stats),
+    ])
+
+    async def app(scope, receive, send):
+        # Requête relayée par `HTTP_PROXY` : l'hôte est celui du site visé.
+        if scope["type"] == "http" and _host(scope) not in LOCAL_HOSTS:
+            host = _host(scope)
+            stats[f"site:{host}"] += 1
+            await asyncio.sleep(config.site.sample(rng))
+            response = HTMLResponse(_page(host, scope["path"], config, rng))
+            await response(scope, receive, send)
+            return
+        await api(scope, receive, send)
+
+    return app
+
+
+# ─── Processus serveur ────────────────────────────────────────────────────────
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((LOCAL_HOSTS[0], 0))
+        return sock.getsockname()[1]
+
+
+def wait_http(url: str, timeout_s: float, proc: Optional[subprocess.Popen] = None) -> None:
+    """Attend qu'`url` réponde 200 ; lève si le processus meurt avant."""
+    import httpx
+
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"{url} : le processus s'est arrêté (code {proc.returncode})")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} ne répond pas après {timeout_s:.0f}s")
+
+
+class StubServer:
+    """Serveurs factices dans un sous-processus uvicorn.
+
+        with StubServer(StubConfig()) as stubs:
+            env = {**os.environ, **stubs.env()}
+    """
+
+    def __init__(self, config: StubConfig, port: Optional[int] = None):
+        self.config = config
+        self.port = port or free_port()
+        self.url = f"http://{LOCAL_HOSTS[0]}:{self.port}"
+        self._proc: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "StubServer":
+        self._proc = subprocess.Popen(
+            [sys.executable, "-m", "bench.loadtest.stubs", "--port", str(self.port),
+             *self.config.to_argv()],
+            cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        )
+        try:
+            wait_http(f"{self.url}/health", 30, self._proc)
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+
+    def stats(self) -> Dict[str, int]:
+        import httpx
+
+        return httpx.get(f"{self.url}/stats", timeout=5).json()
+
+    def env(self) -> Dict[str, str]:
+        """Variables d'environnement qui branchent le service sur les serveurs factices."""
+        proxy = self.url
+        local = ",".join(LOCAL_HOSTS)
+        return {
+            "LLM_API_BASE": f"{self.url}/v1",
+            "LLM_API_KEY": "loadtest",
+            "SERPAPI_ENDPOINT": f"{self.url}/search",
+            "JL_MCP_URL": f"{self.url}/mcp",
+            "HTTP_PROXY": proxy, "http_proxy": proxy,
+            "NO_PROXY": local, "no_proxy": local,
+        }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serveurs factices du banc de charge.")
+    ap.add_argument("--port", type=int, default=9100)
+    StubConfig.add_arguments(ap)
+    args = ap.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(build_app(StubConfig.from_args(args)), host=LOCAL_HOSTS[0], port=args.port,
+                log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
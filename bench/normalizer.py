@@ -0,0 +1,165 @@
+"""
+Micro-banc d'essai de `pipeline.normalizer.RedactionNormalizer`.
+
+Une rédaction JSON de `--chars` caractères de markdown (accents, guillemets,
+retours ligne, emoji) est découpée aux frontières aléatoires d'un flux LLM
+(1 à `--max-chunk` caractères) puis normalisée chunk par chunk. Trois
+encodages de la valeur :
+
+  * `utf8`   : `ensure_ascii=False`, le cas courant (peu d'échappements) ;
+  * `ascii`  : `ensure_ascii=True`, chaque accent en `\\uXXXX` ;
+  * `escapes`: `ascii` sur un texte dense en accents et emoji (paires de
+    substitution), le pire cas.
+
+`legacy` est l'extracteur d'origine (parcours caractère par caractère), gardé
+ici comme référence ; `current` est le module tel quel. Chaque passe vérifie
+que le texte rendu est identique à `json.loads`.
+
+Usage :
+    python -m bench.normalizer
+    python -m bench.normalizer --chars 50000 --max-chunk 8 --repeat 20
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from typing import Dict, List
+
+from pipeline import normalizer
+from pipeline.normalizer import _SIMPLE_ESCAPES, JsonStringFieldExtractor, RedactionNormalizer
+
+IMPLS = ("legacy", "current")
+PAYLOADS = ("utf8", "ascii", "escapes")
+
+_PLAIN = (
+    "## Analyse\n\nLe régime « Dutreil » permet un abattement de 75 % sur la "
+    'valeur des titres (article 787 B du CGI, dit "pacte Dutreil").\n'
+    "- Assiette : 1 000 000 €\n- Chemin : C:\\Users\\doc.pdf\n\n"
+)
+_DENSE = "Échéance 📅 — pénalité € à 10 % ; délai réduit 🧾 « été » ! "
+
+
+class _LegacyExtractor(JsonStringFieldExtractor):
+    """Parcours d'origine, caractère par caractère, pour comparaison."""
+
+    def _consume_value(self, chunk: str) -> str:
+        buf = self._esc + chunk
+        self._esc = ""
+        out: List[str] = []
+        i = 0
+        n = len(buf)
+
+        while i < n:
+            c = buf[i]
+
+            if c == "\\":
+                if i + 1 >= n:
+                    self._esc = buf[i:]
+                    break
+                nxt = buf[i + 1]
+                if nxt == "u":
+                    if i + 6 > n:
+                        self._esc = buf[i:]
+                        break
+                    hex4 = buf[i + 2:i + 6]
+                    try:
+                        out.append(chr(int(hex4, 16)))
+                    except ValueError:
+                        out.append(buf[i:i + 6])
+                    i += 6
+                    continue
+                out.append(_SIMPLE_ESCAPES.get(nxt, nxt))
+                i += 2
+                continue
+
+            if c == '"':
+                self._state = "DONE"
+                self._tail.append(buf[i + 1:])
+                break
+
+            out.append(c)
+            i += 1
+
+        decoded = "".join(out)
+        self._out.append(decoded)
+        return decoded
+
+
+def _payload(kind: str, chars: int) -> str:
+    base = _DENSE if kind == "escapes" else _PLAIN
+    value = (base * (chars // len(base) + 1))[:chars]
+    obj = {"question": "Quel régime ?", "reponse_redigee": value,
+           "points_cles": ["Délai de 4 ans", "Risque d'abus de droit"]}
+    return "```json\n" + json.dumps(obj, ensure_ascii=kind != "utf8") + "\n```"
+
+
+def _split(raw: str, max_chunk: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    chunks, i = [], 0
+    while i < len(raw):
+        step = rng.randint(1, max_chunk)
+        chunks.append(raw[i:i + step])
+        i += step
+    return chunks
+
+
+def run(impl: str, kind: str, chars: int, max_chunk: int, repeat: int) -> Dict[str, float]:
+    raw = _payload(kind, chars)
+    expected = json.loads(raw[len("```json\n"):-len("\n```")])["reponse_redigee"]
+    splits = [_split(raw, max_chunk, seed) for seed in range(repeat)]
+
+    original = normalizer.JsonStringFieldExtractor
+    if impl == "legacy":
+        normalizer.JsonStringFieldExtractor = _LegacyExtractor
+    try:
+        elapsed = 0.0
+        for chunks in splits:
+            t0 = time.perf_counter()
+            norm = RedactionNormalizer()
+            for chunk in chunks:
+                norm.feed(chunk)
+            text, _ = norm.finish()
+            elapsed += time.perf_counter() - t0
+            # L'extracteur d'origine rend les emoji en deux demi-caractères.
+            if impl == "current" or kind != "escapes":
+                assert text == expected, f"{impl}/{kind} : texte différent de json.loads"
+    finally:
+        normalizer.JsonStringFieldExtractor = original
+
+    return {
+        "impl": impl,
+        "payload": kind,
+        "raw_kb": round(len(raw) / 1024, 1),
+        "chunks": len(splits[0]),
+        "ms_per_answer": round(elapsed / repeat * 1000, 2),
+        "mchars_s": round(len(raw) * repeat / elapsed / 1e6, 1),
+    }
+
+
+def print_table(rows: List[Dict[str, float]]) -> None:
+    cols = list(rows[0].keys())
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in cols]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(cols, widths)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Micro-banc d'essai du normaliseur rédactionnel.")
+    ap.add_argument("--chars", type=int, default=50_000, help="Taille de la réponse markdown.")
+    ap.add_argument("--max-chunk", type=int, default=16,
+                    help="Taille maximale d'un chunk (frontières aléatoires).")
+    ap.add_argument("--repeat", type=int, default=10, help="Découpages aléatoires par mesure.")
+    ap.add_argument("--impls", nargs="+", default=list(IMPLS), choices=list(IMPLS))
+    ap.add_argument("--payloads", nargs="+", default=list(PAYLOADS), choices=list(PAYLOADS))
+    args = ap.parse_args()
+
+    print(f"Réponse de {args.chars} caractères, chunks de 1 à {args.max_chunk}\n")
+    print_table([run(i, k, args.chars, args.max_chunk, args.repeat)
+                 for k in args.payloads for i in args.impls])
+
+
+if __name__ == "__main__":
+    main()
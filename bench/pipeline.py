@@ -0,0 +1,133 @@
+"""
+Banc d'essai hors ligne du pipeline complet (`pipeline.core.run_pipeline`).
+
+`record` exécute les questions pour de vrai et consigne tous les appels
+externes dans une cassette (`bench/replay.py`) ; `replay` rejoue ensuite
+`--runs` exécutions (questions prises à tour de rôle) sur `--concurrency`
+threads, sans réseau ni clé d'API, avec les latences enregistrées — ou
+mises à l'échelle par `--time-scale` (0 : instantané, ce qui isole le coût
+CPU du pipeline lui-même). Rapporte p50 / p95 de chaque étape
+(`PipelineResult.timings`) et du run complet, et la correspondance de la
+cassette (`hit` : empreinte identique, `route` : repli sur le même agent ou
+le même hôte, `miss`).
+
+Le cache de l'analyste est désactivé : chaque run exécute toutes les étapes.
+
+Usage :
+    python -m bench.pipeline record --cassette tva --questions questions.txt
+    python -m bench.pipeline replay --cassette tva --runs 20 --concurrency 4
+    python -m bench.pipeline replay --cassette tva --runs 50 --concurrency 8 --time-scale 0
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from bench.replay import cassette
+
+# Clés factices : `run_pipeline` refuse de démarrer sans elles, et le SDK
+# Firecrawl n'est instancié que si la sienne est présente.
+_OFFLINE_KEYS = ("OPENAI_API_KEY", "GOOGLE_API_KEY", "SERPAPI_API_KEY", "FIRECRAWL_API_KEY")
+
+
+def _offline_env() -> None:
+    for name in _OFFLINE_KEYS:
+        os.environ.setdefault(name, "replay")
+    # Pas de trace Langfuse pendant un rejeu.
+    for name in ("LANGFUSE_PUBLIC_KEY", "LANGFUSE_SECRET_KEY"):
+        os.environ.pop(name, None)
+
+
+def _read_questions(path: str) -> List[str]:
+    if path.endswith(".txt"):
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    from eval.dataset import load_golden
+
+    return [case.question for case in load_golden(path)]
+
+
+def _pct(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[int(q * (len(ordered) - 1))], 2)
+
+
+def run(name: str, mode: str, runs: Optional[int], concurrency: int, time_scale: float = 1.0,
+        questions: Optional[List[str]] = None, strict: bool = False) -> Dict[str, object]:
+    from pipeline.core import run_pipeline
+
+    if mode == "replay":
+        _offline_env()
+    with cassette(name, mode, time_scale=time_scale, strict=strict) as tape:
+        questions = questions or tape.questions
+        if not questions:
+            raise SystemExit("Aucune question : --questions à l'enregistrement.")
+        for question in questions:
+            tape.note_question(question)
+        runs = runs or len(questions)
+
+        def _one(i: int):
+            return run_pipeline(questions[i % len(questions)], use_analyst_cache=False)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(_one, range(runs)))
+        elapsed = time.perf_counter() - t0
+
+    steps: Dict[str, List[float]] = {}
+    for result in results:
+        for step, seconds in result.timings.items():
+            steps.setdefault(step, []).append(seconds)
+    rows = [{"step": step, "n": len(values), "p50_s": _pct(values, 0.5),
+             "p95_s": _pct(values, 0.95)} for step, values in steps.items()]
+    wall = [r.wall_clock_s for r in results]
+    rows.append({"step": "total", "n": len(wall), "p50_s": _pct(wall, 0.5),
+                 "p95_s": _pct(wall, 0.95)})
+    return {
+        "runs": runs,
+        "rows": rows,
+        "runs_per_min": round(runs / elapsed * 60, 1),
+        "errors": sum(1 for r in results if r.error),
+        "cassette": dict(sorted(tape.stats.items())),
+    }
+
+
+def print_table(rows: List[Dict[str, float]]) -> None:
+    cols = list(rows[0].keys())
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in cols]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(cols, widths)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Banc d'essai hors ligne du pipeline (cassettes).")
+    ap.add_argument("mode", choices=["record", "replay"])
+    ap.add_argument("--cassette", required=True, help="Nom de cassette (bench/.cassettes/) ou chemin.")
+    ap.add_argument("--questions", help="Fichier .txt (une question par ligne) ou golden dataset.")
+    ap.add_argument("--runs", type=int, help="Exécutions (défaut : une par question).")
+    ap.add_argument("--concurrency", type=int, default=1, help="Exécutions simultanées.")
+    ap.add_argument("--time-scale", type=float, default=1.0,
+                    help="Facteur des latences rejouées (0 : instantané).")
+    ap.add_argument("--strict", action="store_true",
+                    help="Rejeu à empreinte identique uniquement (pas de repli par route).")
+    args = ap.parse_args()
+
+    questions = _read_questions(args.questions) if args.questions else None
+    if args.mode == "record" and not questions:
+        ap.error("--questions est requis pour enregistrer une cassette")
+
+    out = run(args.cassette, args.mode, args.runs, args.concurrency, args.time_scale,
+              questions, args.strict)
+    print(f"{args.mode} — {out['runs']} exécutions, {args.concurrency} simultanées, "
+          f"time-scale {args.time_scale}\n")
+    print_table(out["rows"])
+    print(f"\n{out['runs_per_min']} runs/min, {out['errors']} en erreur")
+    print("cassette :", ", ".join(f"{k}={v}" for k, v in out["cassette"].items()) or "—")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Banc d'essai des quotas (`utils/shared_state.py`) à grand nombre d'utilisateurs.
+
+Rejoue un trafic synthétique — `--users` utilisateurs distincts, popularité en
+loi de Zipf, horloge simulée qui avance de `--span` secondes sur l'essai — et
+mesure pour chaque backend : débit, latence par appel (p50 / p99), mémoire
+allouée (tracemalloc) et nombre d'utilisateurs encore suivis à la fin (effet
+de l'éviction des inactifs).
+
+(`-1` : backend sans décompte, SQLite purgeant de son côté.)
+
+`deque` est la fenêtre d'origine (une deque d'horodatages par utilisateur,
+comptage linéaire de la dernière minute sous verrou global), gardée ici comme
+référence.
+
+Usage :
+    python -m bench.rate_limiter
+    python -m bench.rate_limiter --users 100000 --calls 500000 --threads 4
+    python -m bench.rate_limiter --backends memory sqlite --span 7200
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from utils.shared_state import Limits, MemorySharedState, SQLiteSharedState
+
+LIMITS: Limits = ((30, 3600.0), (3, 60.0))
+BACKENDS = ("memory", "sqlite", "deque")
+
+
+class _DequeLimiter:
+    """Fenêtre d'origine, pour comparaison."""
+
+    def __init__(self):
+        self._hits: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limits: Limits, now: Optional[float] = None) -> Optional[float]:
+        (per_hour, _), (burst, _) = limits
+        with self._lock:
+            hits = self._hits.setdefault(key, deque())
+            while hits and now - hits[0] > 3600:
+                hits.popleft()
+            if len(hits) >= per_hour:
+                return 3600 - (now - hits[0])
+            if sum(1 for t in hits if now - t < 60) >= burst:
+                return 60.0
+            hits.append(now)
+            return None
+
+    def keys(self) -> int:
+        return len(self._hits)
+
+
+def _make(backend: str, tmpdir: str):
+    if backend == "memory":
+        return MemorySharedState()
+    if backend == "sqlite":
+        return SQLiteSharedState(os.path.join(tmpdir, "bench.sqlite"))
+    return _DequeLimiter()
+
+
+def _traffic(users: int, calls: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) ** 0.8 for rank in range(users)]
+    # Chaque utilisateur apparaît au moins une fois : `users` clés distinctes.
+    keys = [f"u{i}" for i in range(users)]
+    keys += rng.choices(keys, weights=weights, k=max(0, calls - users))
+    rng.shuffle(keys)
+    return keys
+
+
+def _replay(limiter, keys: List[str], span_s: float, threads: int) -> Tuple[List[float], int]:
+    """Rejoue `keys` sur `threads` threads ; rend les latences et le nombre de refus."""
+    start_clock = 1_000_000.0
+    step = span_s / max(1, len(keys))
+    latencies: List[float] = []
+    refused = [0]
+    lock = threading.Lock()
+
+    def _worker(offset: int) -> None:
+        local, local_refused = [], 0
+        for i in range(offset, len(keys), threads):
+            t0 = time.perf_counter()
+            if limiter.hit(keys[i], LIMITS, now=start_clock + i * step) is not None:
+                local_refused += 1
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+            refused[0] += local_refused
+
+    pool = [threading.Thread(target=_worker, args=(n,)) for n in range(threads)]
+    for th in pool:
+        th.start()
+    for th in pool:
+        th.join()
+    return latencies, refused[0]
+
+
+def run(backend: str, keys: List[str], span_s: float, threads: int = 1) -> Dict[str, float]:
+    """Deux passes : l'une chronométrée, l'autre sous tracemalloc (qui fausserait
+    les temps)."""
+    with tempfile.TemporaryDirectory(prefix="bench-rl-") as tmpdir:
+        limiter = _make(backend, tmpdir)
+        t0 = time.perf_counter()
+        latencies, refused = _replay(limiter, keys, span_s, threads)
+        elapsed = time.perf_counter() - t0
+        tracked = limiter.keys() if hasattr(limiter, "keys") else -1
+
+    with tempfile.TemporaryDirectory(prefix="bench-rl-") as tmpdir:
+        tracemalloc.start()
+        _replay(_make(backend, tmpdir), keys, span_s, 1)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "calls": len(keys),
+        "ops_s": round(len(keys) / elapsed),
+        "p50_us": round(statistics.median(latencies) * 1e6, 1),
+        "p99_us": round(latencies[int(0.99 * (len(latencies) - 1))] * 1e6, 1),
+        "peak_mb": round(peak / 1e6, 1),
+        "refused": refused,
+        "tracked_keys": tracked,
+    }
+
+
+def print_table(rows: List[Dict[str, float]]) -> None:
+    cols = list(rows[0].keys())
+    widths = [max(len(c), *(len(str(r[c])) for r in rows)) for c in cols]
+    print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(w) for c, w in zip(cols, widths)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Banc d'essai des quotas par utilisateur.")
+    ap.add_argument("--users", type=int, default=100_000, help="Utilisateurs distincts.")
+    ap.add_argument("--calls", type=int, default=300_000, help="Appels au total.")
+    ap.add_argument("--span", type=float, default=2 * 3600.0,
+                    help="Durée simulée du trafic (s) ; au-delà d'une heure, l'éviction joue.")
+    ap.add_argument("--threads", type=int, default=1)
+    ap.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    args = ap.parse_args()
+
+    keys = _traffic(args.users, args.calls)
+    print(f"{len(keys)} appels, {args.users} utilisateurs, {args.span:.0f} s simulées, "
+          f"{args.threads} thread(s)\n")
+    print_table([run(b, keys, args.span, args.threads) for b in args.backends])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Enregistrement et rejeu des entrées-sorties externes du pipeline.
+
+Un run complet appelle ~20 fois un LLM, SerpAPI, JusticeLibre (MCP),
+FiscalOnline, les sites scrapés par `LegalScraper` et, en repli, Firecrawl :
+impossible à mesurer sans payer ni dépendre du réseau. Sous `cassette(...)`,
+ces appels sont interceptés à la frontière des bibliothèques :
+
+  * `litellm.completion` (bloquant et streamé) ;
+  * `requests.Session.request` — SerpAPI, JusticeLibre, FiscalOnline et
+    `LegalScraper` passent tous par `requests` ;
+  * `firecrawl.V1FirecrawlApp.scrape_url`.
+
+En enregistrement, chaque appel réel est rejoué à l'identique pour l'appelant
+et consigné dans la cassette (JSON Lines, `bench/.cassettes/`) avec sa
+latence — et, pour un flux, l'instant de chaque fragment. En rejeu, la
+réponse est servie depuis la cassette après la même attente, multipliée par
+`time_scale` (0 : instantané).
+
+Correspondance : par empreinte de la requête (modèle et messages, ou méthode,
+URL, paramètres et corps). Les secrets (`api_key`…) et l'identifiant de
+requête JSON-RPC n'entrent pas dans l'empreinte et ne sont pas enregistrés.
+Faute d'empreinte identique — un prompt qui cite l'année en cours, par
+exemple —, on sert l'appel suivant de la même route (modèle et agent, ou
+hôte et chemin), sauf en mode `strict`. Une requête enregistrée plusieurs
+fois est resservie à tour de rôle.
+
+    with cassette("tva", "record"):
+        run_pipeline(question)
+    with cassette("tva", "replay", time_scale=0.5) as tape:
+        run_pipeline(question)
+        print(tape.stats)
+
+Point d'entrée des mesures : `python -m bench.pipeline`.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, Iterator, List
+from urllib.parse import urlparse
+
+import litellm
+import requests
+from litellm.types.utils import Delta, ModelResponseStream, StreamingChoices, Usage
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_DIR = os.path.join(os.path.dirname(__file__), ".cassettes")
+MODES = ("record", "replay")
+
+# Paramètres jamais enregistrés ni pris dans l'empreinte.
+_SECRET_PARAMS = {"api_key", "apikey", "key", "token", "access_token"}
+
+
+class ReplayMiss(LookupError):
+    """Aucun appel enregistré ne correspond à la requête rejouée."""
+
+
+class ReplayedError(RuntimeError):
+    """Erreur enregistrée, relevée à l'identique (au type près) en rejeu."""
+
+
+def cassette_path(name: str) -> str:
+    """Chemin d'une cassette : un nom nu est rangé dans `bench/.cassettes/`."""
+    if os.sep in name or name.endswith(".jsonl"):
+        return name
+    return os.path.join(CASSETTE_DIR, f"{name}.jsonl")
+
+
+def _digest(*parts) -> str:
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+def _scrub(params):
+    if isinstance(params, dict):
+        return {k: v for k, v in params.items() if k.lower() not in _SECRET_PARAMS}
+    return params
+
+
+class Cassette:
+    """Appels enregistrés d'une cassette, servis par empreinte ou par route."""
+
+    def __init__(self, path: str, mode: str, *, time_scale: float = 1.0, strict: bool = False):
+        if mode not in MODES:
+            raise ValueError(f"mode inconnu : {mode!r} (attendu : {', '.join(MODES)})")
+        self.path = path
+        self.mode = mode
+        self.time_scale = time_scale
+        self.strict = strict
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._by_key: Dict[str, List[dict]] = defaultdict(list)
+        self._by_route: Dict[str, List[dict]] = defaultdict(list)
+        self._cursor: Counter = Counter()
+        self._questions: List[str] = []
+
+        if mode == "replay":
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            open(path, "w", encoding="utf-8").close()
+
+    # ── Cassette ─────────────────────────────────────────────────────────────
+    @property
+    def questions(self) -> List[str]:
+        """Questions notées à l'enregistrement (`note_question`), dans l'ordre."""
+        return list(self._questions)
+
+    def note_question(self, question: str) -> None:
+        if self.mode == "record" and question not in self._questions:
+            self._questions.append(question)
+            self._write({"kind": "question", "question": question})
+
+    def _load(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["kind"] == "question":
+                    self._questions.append(entry["question"])
+                    continue
+                self._by_key[entry["key"]].append(entry)
+                self._by_route[entry["route"]].append(entry)
+        logger.info("cassette %s — %d appels enregistrés", self.path,
+                    sum(len(v) for v in self._by_key.values()))
+
+    def _write(self, entry: dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def _save(self, kind: str, key: str, route: str, latency_s: float, **data) -> None:
+        self.stats[f"{kind}:recorded"] += 1
+        self._write({"kind": kind, "key": key, "route": route,
+                     "latency_s": round(latency_s, 4), **data})
+
+    def _take(self, kind: str, key: str, route: str) -> dict:
+        with self._lock:
+            for index, pool, outcome in ((key, self._by_key, "hit"),
+                                         (route, self._by_route, "route")):
+                entries = pool.get(index)
+                if entries:
+                    entry = entries[self._cursor[index] % len(entries)]
+                    self._cursor[index] += 1
+                    self.stats[f"{kind}:{outcome}"] += 1
+                    return entry
+                if self.strict:
+                    break
+            self.stats[f"{kind}:miss"] += 1
+        raise ReplayMiss(f"{kind} non enregistré : {route}")
+
+    def _wait(self, seconds: float) -> None:
+        if seconds > 0 and self.time_scale > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def _raise(self, entry: dict) -> None:
+        error = entry.get("error")
+        if error:
+            self._wait(entry["latency_s"])
+            cls = getattr(requests.exceptions, error["type"], None) if entry["kind"] == "http" else None
+            if not (isinstance(cls, type) and issubclass(cls, Exception)):
+                cls = ReplayedError
+            raise cls(f"{error['type']}: {error['message']}")
+
+    @contextmanager
+    def _outer(self):
+        """Appel intercepté en cours : ses appels internes (le SDK Firecrawl
+        passe par `requests`) ne sont pas enregistrés une seconde fois."""
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+        try:
+            yield
+        finally:
+            self._local.depth -= 1
+
+    def _nested(self) -> bool:
+        return getattr(self._local, "depth", 0) > 0
+
+    # ── LLM ──────────────────────────────────────────────────────────────────
+    def _wrap_completion(self, real):
+        def completion(*args, **kwargs):
+            stream = bool(kwargs.get("stream"))
+            kind = "llm_stream" if stream else "llm"
+            metadata = kwargs.get("metadata") or {}
+            route = f"{kind} {kwargs.get('model')} {metadata.get('generation_name', '')}".strip()
+            key = _digest(kind, kwargs.get("model"), kwargs.get("messages"),
+                          kwargs.get("response_format"), kwargs.get("temperature"),
+                          kwargs.get("max_tokens"))
+
+            if self.mode == "replay":
+                entry = self._take(kind, key, route)
+                return self._replay_stream(entry) if stream else self._replay_llm(entry)
+
+            t0 = time.perf_counter()
+            try:
+                response = real(*args, **kwargs)
+            except Exception as exc:
+                self._save(kind, key, route, time.perf_counter() - t0,
+                           error={"type": type(exc).__name__, "message": str(exc)[:500]})
+                raise
+            if stream:
+                return self._record_stream(key, route, response, t0)
+            usage = getattr(response, "usage", None)
+            hidden = getattr(response, "_hidden_params", None) or {}
+            try:
+                text = response.choices[0].message.content
+            except Exception:
+                text = None
+            self._save(kind, key, route, time.perf_counter() - t0,
+                       model=getattr(response, "model", None), text=text,
+                       usage=[int(getattr(usage, "prompt_tokens", 0) or 0),
+                              int(getattr(usage, "completion_tokens", 0) or 0)],
+                       cost=hidden.get("response_cost"))
+            return response
+        return completion
+
+    def _record_stream(self, key: str, route: str, response, t0: float) -> Iterator:
+        chunks: List[list] = []
+        usage = [0, 0]
+        try:
+            for chunk in response:
+                u = getattr(chunk, "usage", None)
+                if u is not None:
+                    usage = [max(usage[0], int(getattr(u, "prompt_tokens", 0) or 0)),
+                             max(usage[1], int(getattr(u, "completion_tokens", 0) or 0))]
+                try:
+                    delta = chunk.choices[0].delta.content
+                except Exception:
+                    delta = None
+                if delta:
+                    chunks.append([round(time.perf_counter() - t0, 4), delta])
+                yield chunk
+        except Exception as exc:
+            self._save("llm_stream", key, route, time.perf_counter() - t0, chunks=chunks,
+                       usage=usage, error={"type": type(exc).__name__, "message": str(exc)[:500]})
+            raise
+        self._save("llm_stream", key, route, time.perf_counter() - t0, chunks=chunks, usage=usage)
+
+    def _replay_llm(self, entry: dict):
+        self._raise(entry)
+        self._wait(entry["latency_s"])
+        prompt_tokens, completion_tokens = entry["usage"]
+        response = litellm.ModelResponse(
+            model=entry.get("model"),
+            choices=[{"index": 0, "finish_reason": "stop",
+                      "message": {"role": "assistant", "content": entry["text"]}}],
+            usage=Usage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                        total_tokens=prompt_tokens + completion_tokens),
+        )
+        if entry.get("cost") is not None:
+            response._hidden_params["response_cost"] = entry["cost"]
+        return response
+
+    def _replay_stream(self, entry: dict) -> Iterator[ModelResponseStream]:
+        t0 = time.perf_counter()
+        for offset, text in entry["chunks"]:
+            if self.time_scale > 0:
+                time.sleep(max(0.0, t0 + offset * self.time_scale - time.perf_counter()))
+            yield ModelResponseStream(choices=[StreamingChoices(delta=Delta(content=text))])
+        if entry.get("error"):
+            raise ReplayedError(f"{entry['error']['type']}: {entry['error']['message']}")
+        if self.time_scale > 0:
+            time.sleep(max(0.0, t0 + entry["latency_s"] * self.time_scale - time.perf_counter()))
+        prompt_tokens, completion_tokens = entry["usage"]
+        yield ModelResponseStream(
+            choices=[StreamingChoices(delta=Delta(content=None))],
+            usage=Usage(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                        total_tokens=prompt_tokens + completion_tokens),
+        )
+
+    # ── HTTP (requests) ──────────────────────────────────────────────────────
+    def _wrap_request(self, real):
+        def request(session, method, url, *args, **kwargs):
+            if self._nested():
+                return real(session, method, url, *args, **kwargs)
+            params = kwargs.get("params", args[0] if args else None)
+            data = kwargs.get("data", args[1] if len(args) > 1 else None)
+            body = kwargs.get("json")
+            if isinstance(body, dict):
+                body = {k: v for k, v in body.items() if k != "id"}   # id JSON-RPC
+            parsed = urlparse(url)
+            route = f"http {method.upper()} {parsed.netloc}{parsed.path}"
+            key = _digest("http", method.upper(), url, _scrub(params), body, data)
+
+            if self.mode == "replay":
+                entry = self._take("http", key, route)
+                self._raise(entry)
+                self._wait(entry["latency_s"])
+                return _build_response(entry)
+
+            t0 = time.perf_counter()
+            try:
+                with self._outer():
+                    resp = real(session, method, url, *args, **kwargs)
+            except Exception as exc:
+                self._save("http", key, route, time.perf_counter() - t0,
+                           error={"type": type(exc).__name__, "message": str(exc)[:500]})
+                raise
+            content = resp.content or b""
+            try:
+                body_fields = {"text": content.decode("utf-8")}
+            except UnicodeDecodeError:
+                body_fields = {"b64": base64.b64encode(content).decode("ascii")}
+            self._save("http", key, route, time.perf_counter() - t0,
+                       url=resp.url, status=resp.status_code, reason=resp.reason,
+                       encoding=resp.encoding,
+                       headers={k: v for k, v in resp.headers.items()
+                                if k.lower() != "set-cookie"},
+                       **body_fields)
+            return resp
+        return request
+
+    # ── Firecrawl ────────────────────────────────────────────────────────────
+    def _wrap_scrape(self, real):
+        def scrape_url(app, url, *args, **kwargs):
+            route = f"firecrawl {urlparse(url).netloc}"
+            key = _digest("firecrawl", url)
+            if self.mode == "replay":
+                entry = self._take("firecrawl", key, route)
+                self._raise(entry)
+                self._wait(entry["latency_s"])
+                return SimpleNamespace(markdown=entry["markdown"])
+
+            t0 = time.perf_counter()
+            try:
+                with self._outer():
+                    result = real(app, url, *args, **kwargs)
+            except Exception as exc:
+                self._save("firecrawl", key, route, time.perf_counter() - t0,
+                           error={"type": type(exc).__name__, "message": str(exc)[:500]})
+                raise
+            self._save("firecrawl", key, route, time.perf_counter() - t0,
+                       markdown=getattr(result, "markdown", None))
+            return result
+        return scrape_url
+
+
+def _build_response(entry: dict) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = entry["status"]
+    resp.reason = entry.get("reason") or ""
+    resp.url = entry["url"]
+    resp.encoding = entry.get("encoding")
+    resp.headers = CaseInsensitiveDict(entry.get("headers") or {})
+    if "b64" in entry:
+        resp._content = base64.b64decode(entry["b64"])
+    else:
+        resp._content = entry.get("text", "").encode("utf-8")
+    return resp
+
+
+@contextmanager
+def cassette(name: str, mode: str = "replay", *, time_scale: float = 1.0,
+             strict: bool = False) -> Iterator[Cassette]:
+    """Intercepte les appels externes le temps du bloc (tous threads confondus).
+
+    Args:
+        name: nom de cassette (rangée dans `bench/.cassettes/`) ou chemin.
+        mode: "record" (appels réels, consignés — la cassette est réécrite)
+            ou "replay" (aucun appel réseau).
+        time_scale: facteur appliqué aux latences enregistrées en rejeu.
+        strict: en rejeu, exige une empreinte identique (pas de repli par route).
+    """
+    tape = Cassette(cassette_path(name), mode, time_scale=time_scale, strict=strict)
+    patches = [(litellm, "completion", tape._wrap_completion),
+               (requests.Session, "request", tape._wrap_request)]
+    try:
+        from firecrawl import V1FirecrawlApp
+        patches.append((V1FirecrawlApp, "scrape_url", tape._wrap_scrape))
+    except ImportError:  # pragma: no cover — SDK optionnel
+        pass
+
+    originals = [(owner, attr, getattr(owner, attr)) for owner, attr, _ in patches]
+    for owner, attr, wrap in patches:
+        setattr(owner, attr, wrap(getattr(owner, attr)))
+    try:
+        yield tape
+    finally:
+        for owner, attr, original in originals:
+            setattr(owner, attr, original)
@@ -3,7 +3,8 @@ Cache disque des exécutions du pipeline.
 
 Une exécution du pipeline est COÛTEUSE (recherche web + scraping + ~9 appels LLM).
 On met donc en cache le `PipelineResult` par clé = hash(question + config de modèles +
-use_justicelibre). Cela permet de ré-évaluer / d'ajuster les métriques (qui, elles,
+use_justicelibre [+ format de sortie du ranker, s'il n'est pas celui par défaut]
+[+ rédaction streamée]). Cela permet de ré-évaluer / d'ajuster les métriques (qui, elles,
 sont rapides) sans relancer tout le pipeline.
 
 Même esprit que le `bofip_cache/` existant. Dossier : eval/.cache/ (gitignoré).
@@ -24,11 +25,15 @@ logger = logging.getLogger(__name__)
 CACHE_DIR = os.path.join(os.path.dirname(__file__), ".cache")
 
 
-def _key(question: str, models_config: Dict[str, str], use_justicelibre: bool) -> str:
-    payload = json.dumps(
-        {"q": question, "m": dict(sorted(models_config.items())), "jl": use_justicelibre},
-        ensure_ascii=False, sort_keys=True,
-    )
+def _key(question: str, models_config: Dict[str, str], use_justicelibre: bool,
+         ranker_output: Optional[str] = None, stream_redaction: bool = False) -> str:
+    payload = {"q": question, "m": dict(sorted(models_config.items())), "jl": use_justicelibre}
+    # Ajouté seulement hors défaut : les entrées existantes restent valides.
+    if ranker_output and ranker_output != "verbose":
+        payload["ro"] = ranker_output
+    if stream_redaction:
+        payload["sr"] = True
+    payload = json.dumps(payload, ensure_ascii=False, sort_keys=True)
     return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:20]
 
 
@@ -42,14 +47,19 @@ def run_pipeline_cached(
     use_justicelibre: bool = True,
     config_name: Optional[str] = None,
     force: bool = False,
+    ranker_output: Optional[str] = None,
+    stream_redaction: bool = False,
 ) -> PipelineResult:
     """Comme `run_pipeline`, mais sert le cache disque si disponible.
 
     Args:
         force: ignore le cache et recalcule (puis réécrit).
+        ranker_output: format de sortie du ranker ("verbose" / "compact").
+        stream_redaction: rédactionnel streamé, comme dans l'API — mesure le
+            premier token et le débit (`PipelineResult.llm_stream`).
     """
     os.makedirs(CACHE_DIR, exist_ok=True)
-    key = _key(question, models_config, use_justicelibre)
+    key = _key(question, models_config, use_justicelibre, ranker_output, stream_redaction)
     path = _path(key)
 
     if not force and os.path.exists(path):
@@ -65,8 +75,13 @@ def run_pipeline_cached(
     # use_fiscalonline=False : l'évaluation mesure le pipeline sur sources publiques
     # (c'était le comportement historique de `run_pipeline`). L'activer changerait
     # les réponses ET la clé de cache — ce serait une décision d'évaluation à part.
+    # use_analyst_cache=False : chaque config paie son analyste ; sinon celles qui
+    # partagent le modèle de l'analyste afficheraient un coût et une latence
+    # quasi nuls après la première, faussant la comparaison.
     result = run_pipeline(question, models_config, use_justicelibre=use_justicelibre,
-                          config_name=config_name, use_fiscalonline=False)
+                          config_name=config_name, use_fiscalonline=False,
+                          ranker_output=ranker_output or "verbose",
+                          stream_redaction=stream_redaction, use_analyst_cache=False)
     # On ne met en cache que les exécutions réussies (réponse non vide, pas d'erreur).
     if not result.error and result.answer_text:
         try:
@@ -5,7 +5,8 @@ Pour chaque config (eval/configs.py) × chaque question du golden set :
   - exécute le pipeline (avec cache) ;
   - mesure la couverture d'articles (DÉTERMINISTE, gratuite — toujours) ;
   - mesure la couverture des éléments attendus (GEval, LLM-juge — option --quality-judge) ;
-  - relève coût et latence (capturés par la couche utils.llm).
+  - relève coût et latence (capturés par la couche utils.llm) ; avec --stream-redaction,
+    la latence perçue du rédactionnel : premier token et débit (tokens/s).
 Sort une table comparative (console + CSV), triable.
 
 Tracing : chaque exécution est déjà tracée dans Langfuse (callback LiteLLM, taggée par
@@ -15,6 +16,8 @@ Langfuse sont présentes, les scores qualité sont attachés aux traces (best-ef
 Usage :
     python -m eval.compare --dataset golden.csv --configs baseline gemini3-pro claude
     python -m eval.compare --dataset golden.csv --configs baseline claude --quality-judge gpt-4o --limit 10
+    python -m eval.compare --dataset golden.csv --configs baseline --ranker-outputs verbose compact
+    python -m eval.compare --dataset golden.csv --configs baseline claude --stream-redaction
 """
 from __future__ import annotations
 
@@ -34,6 +37,7 @@ from eval.configs import get_config, CONFIGS
 from eval.cache import run_pipeline_cached
 from eval.metrics import article_coverage, make_element_coverage_metric
 from eval.run_eval import build_test_case, _source_blobs
+from agents.ranker import RANKER_OUTPUTS
 
 
 def _maybe_langfuse_score(trace_id, name, value, comment=""):
@@ -47,15 +51,19 @@ def _maybe_langfuse_score(trace_id, name, value, comment=""):
         logging.debug("Langfuse score non envoyé : %s", exc)
 
 
-def evaluate_config(config_name: str, cases, use_jl: bool, judge_model: str = None, force=False):
+def evaluate_config(config_name: str, cases, use_jl: bool, judge_model: str = None, force=False,
+                    ranker_output: str = "verbose", stream_redaction: bool = False):
     """Exécute le pipeline + mesures pour une config sur tout le golden set."""
     models = get_config(config_name)
     element_metric = make_element_coverage_metric(judge_model) if judge_model else None
 
-    art_recalls, elem_scores, costs, latencies = [], [], [], []
+    art_recalls, elem_scores, costs, latencies, ranker_latencies = [], [], [], [], []
+    ttfts, throughputs = [], []
     for c in cases:
         result = run_pipeline_cached(c.question, models, use_justicelibre=use_jl,
-                                     config_name=config_name, force=force)
+                                     config_name=config_name, force=force,
+                                     ranker_output=ranker_output,
+                                     stream_redaction=stream_redaction)
         # Couverture d'articles sur les SOURCES conservées (juge LLM si fourni)
         art = (article_coverage(c.question, c.expected_articles, _source_blobs(result),
                                 judge_model=judge_model)["recall"]
@@ -76,31 +84,45 @@ def evaluate_config(config_name: str, cases, use_jl: bool, judge_model: str = No
 
         costs.append(result.total_cost_usd)
         latencies.append(result.wall_clock_s)
+        if "ranker" in result.timings:
+            ranker_latencies.append(result.timings["ranker"])
+        stream = result.llm_stream.get("redactionnel") or {}
+        if stream.get("ttft_s") is not None:
+            ttfts.append(stream["ttft_s"])
+        if stream.get("output_tokens_per_s"):
+            throughputs.append(stream["output_tokens_per_s"])
 
     def _mean(xs):
         return sum(xs) / len(xs) if xs else 0.0
 
     return {
-        "config": config_name,
+        "config": config_name if ranker_output == "verbose" else f"{config_name}+{ranker_output}",
         "n": len(cases),
         "article_recall": _mean(art_recalls),
         "element_coverage": _mean(elem_scores) if elem_scores else None,
         "cost_total": sum(costs),
         "cost_mean": _mean(costs),
         "latency_mean": _mean(latencies),
+        "ranker_latency_mean": _mean(ranker_latencies),
+        "ttft_mean": _mean(ttfts) if ttfts else None,
+        "tokens_per_s_mean": _mean(throughputs) if throughputs else None,
     }
 
 
 def print_table(rows):
-    headers = ["config", "n", "article_recall", "element_cov", "cost_total($)", "cost/q($)", "latence_moy(s)"]
+    headers = ["config", "n", "article_recall", "element_cov", "cost_total($)", "cost/q($)", "latence_moy(s)",
+               "ranker_moy(s)", "1er_token(s)", "tokens/s"]
     print("\n" + "  ".join(f"{h:>14}" for h in headers))
     print("  ".join("-" * 14 for _ in headers))
     for r in rows:
         elem = f"{r['element_coverage']:.2f}" if r["element_coverage"] is not None else "—"
+        ttft = f"{r['ttft_mean']:.2f}" if r["ttft_mean"] is not None else "—"
+        tps = f"{r['tokens_per_s_mean']:.0f}" if r["tokens_per_s_mean"] is not None else "—"
         print("  ".join([
             f"{r['config']:>14}", f"{r['n']:>14}", f"{r['article_recall']:>14.2f}",
             f"{elem:>14}", f"{r['cost_total']:>14.4f}", f"{r['cost_mean']:>14.5f}",
-            f"{r['latency_mean']:>14.1f}",
+            f"{r['latency_mean']:>14.1f}", f"{r['ranker_latency_mean']:>14.1f}",
+            f"{ttft:>14}", f"{tps:>14}",
         ]))
 
 
@@ -121,6 +143,10 @@ def main():
     ap.add_argument("--ids", nargs="+", default=None, help="Ne traiter que ces ids de questions (ex. q3 q7).")
     ap.add_argument("--sample-stratified", type=int, default=0,
                     help="Échantillon de N questions équilibré par difficulté (déterministe).")
+    ap.add_argument("--ranker-outputs", nargs="+", default=["verbose"], choices=list(RANKER_OUTPUTS),
+                    help="Formats de sortie du ranker à comparer (chaque format × chaque config).")
+    ap.add_argument("--stream-redaction", action="store_true",
+                    help="Rédactionnel streamé comme dans l'API : mesure premier token et débit.")
     ap.add_argument("--no-jl", action="store_true")
     ap.add_argument("--force", action="store_true")
     ap.add_argument("--out", default="eval/comparison.csv")
@@ -138,9 +164,12 @@ def main():
 
     rows = []
     for cfg in args.configs:
-        logging.info("=== Config : %s ===", cfg)
-        rows.append(evaluate_config(cfg, cases, use_jl=not args.no_jl,
-                                    judge_model=args.quality_judge, force=args.force))
+        for ranker_output in args.ranker_outputs:
+            logging.info("=== Config : %s (ranker %s) ===", cfg, ranker_output)
+            rows.append(evaluate_config(cfg, cases, use_jl=not args.no_jl,
+                                        judge_model=args.quality_judge, force=args.force,
+                                        ranker_output=ranker_output,
+                                        stream_redaction=args.stream_redaction))
 
     # Tri : meilleure qualité d'articles d'abord, puis coût croissant.
     rows.sort(key=lambda r: (-r["article_recall"], r["cost_mean"]))
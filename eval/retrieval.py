@@ -0,0 +1,158 @@
+"""
+Rappel des retrievers : index dense et corpus lexical face à SerpAPI.
+
+Pour chaque question du golden set, les requêtes sont celles que le pipeline
+enverrait à l'index dense : `axes_de_recherche_serp` + `concepts_clefs_T0` de
+l'analyste (relus dans le cache du pipeline, `eval/cache.py` ; l'analyste est
+donc exécuté une fois par question au plus). Chaque retriever reçoit les
+mêmes requêtes, et l'on mesure le recall des articles attendus dans ses
+résultats (titre + URL, matching déterministe d'`eval.articles`), le nombre de
+résultats et la latence.
+
+Retrievers : `serpapi` (domaines officiels), `lexical` (`utils.corpus`),
+`dense` (`utils.dense`) et `hybride` (lexical + dense). Un retriever
+indisponible (index absent, clé manquante) est signalé et sauté.
+
+Usage :
+    python -m eval.retrieval --dataset golden.csv
+    python -m eval.retrieval --dataset golden.csv --retrievers dense lexical --k 5 --nprobe 16
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import logging
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-7s %(message)s", datefmt="%H:%M:%S")
+for _lib in ("urllib3", "httpx", "httpcore", "LiteLLM", "google", "openai"):
+    logging.getLogger(_lib).setLevel(logging.WARNING)
+
+import utils.dense as dense
+from eval.articles import coverage
+from eval.cache import run_pipeline_cached
+from eval.configs import get_config
+from eval.dataset import load_golden, stratified_sample
+from utils.api_keys import get_api_keys
+from utils.corpus import get_corpus, search_corpus
+from utils.search import OFFICIAL_DOMAINS, search_official_sources
+
+RETRIEVERS = ("serpapi", "lexical", "dense", "hybride")
+
+
+def _available(name: str, serpapi_key: str) -> bool:
+    if name == "serpapi":
+        return bool(serpapi_key)
+    if name == "lexical":
+        return get_corpus() is not None
+    if name == "dense":
+        return dense.get_dense_index() is not None
+    return get_corpus() is not None and dense.get_dense_index() is not None
+
+
+def _retrieve(name: str, queries, k: int, serpapi_key: str, nprobe: int):
+    if name == "serpapi":
+        return search_official_sources(queries, serpapi_key, max_results_per_query=k,
+                                       active_domains=OFFICIAL_DOMAINS)
+    if name == "lexical":
+        return search_corpus(queries, max_results_per_query=k)
+    if name == "dense":
+        return dense.search_dense(queries, max_results_per_query=k, min_score=0.0, nprobe=nprobe)
+    return search_corpus(queries, max_results_per_query=k) + \
+        dense.search_dense(queries, max_results_per_query=k, min_score=0.0, nprobe=nprobe)
+
+
+def evaluate_retrievers(cases, retrievers, config_name="baseline", k=3, use_jl=True,
+                        nprobe=dense.DENSE_NPROBE):
+    """Une ligne par retriever : recall moyen, résultats et latence moyens."""
+    _, _, serpapi_key = get_api_keys()
+    active = []
+    for name in retrievers:
+        if _available(name, serpapi_key):
+            active.append(name)
+        else:
+            logging.warning("Retriever %s indisponible — ignoré", name)
+
+    models = get_config(config_name)
+    stats = {name: {"recalls": [], "n_results": [], "latencies": []} for name in active}
+    for c in cases:
+        if not c.expected_articles:
+            continue
+        result = run_pipeline_cached(c.question, models, use_justicelibre=use_jl, config_name=config_name)
+        queries = dense.dense_queries(result.analyste)
+        if not queries:
+            logging.warning("Cas %s : aucune requête d'analyste — ignoré", c.id)
+            continue
+        for name in active:
+            t0 = time.time()
+            found = _retrieve(name, queries, k, serpapi_key, nprobe)
+            stats[name]["latencies"].append(time.time() - t0)
+            stats[name]["n_results"].append(len(found))
+            blobs = [f"{r.get('title', '')} | {r.get('url', '')}" for r in found]
+            stats[name]["recalls"].append(coverage(c.expected_articles, blobs)["recall"])
+
+    def _mean(xs):
+        return sum(xs) / len(xs) if xs else 0.0
+
+    return [{
+        "retriever": name,
+        "n": len(s["recalls"]),
+        "article_recall": _mean(s["recalls"]),
+        "results_mean": _mean(s["n_results"]),
+        "latency_mean": _mean(s["latencies"]),
+    } for name, s in stats.items()]
+
+
+def print_table(rows):
+    headers = ["retriever", "n", "article_recall", "resultats_moy", "latence_moy(s)"]
+    print("\n" + "  ".join(f"{h:>14}" for h in headers))
+    print("  ".join("-" * 14 for _ in headers))
+    for r in rows:
+        print("  ".join([
+            f"{r['retriever']:>14}", f"{r['n']:>14}", f"{r['article_recall']:>14.2f}",
+            f"{r['results_mean']:>14.1f}", f"{r['latency_mean']:>14.3f}",
+        ]))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rappel des retrievers (dense / lexical / SerpAPI).")
+    ap.add_argument("--dataset", required=True)
+    ap.add_argument("--config", default="baseline", help="Config dont l'analyste fournit les requêtes.")
+    ap.add_argument("--retrievers", nargs="+", default=list(RETRIEVERS), choices=list(RETRIEVERS))
+    ap.add_argument("--k", type=int, default=3, help="Résultats par requête.")
+    ap.add_argument("--nprobe", type=int, default=dense.DENSE_NPROBE, help="Listes IVF visitées par requête.")
+    ap.add_argument("--limit", type=int, default=0)
+    ap.add_argument("--ids", nargs="+", default=None)
+    ap.add_argument("--sample-stratified", type=int, default=0)
+    ap.add_argument("--no-jl", action="store_true")
+    ap.add_argument("--out", default="eval/retrieval.csv")
+    args = ap.parse_args()
+
+    cases = load_golden(args.dataset)
+    if args.ids:
+        wanted = set(args.ids)
+        cases = [c for c in cases if c.id in wanted]
+    if args.sample_stratified:
+        cases = stratified_sample(cases, args.sample_stratified)
+    if args.limit:
+        cases = cases[:args.limit]
+    print(f"Rappel des retrievers sur {len(cases)} questions | k={args.k}")
+
+    rows = evaluate_retrievers(cases, args.retrievers, config_name=args.config, k=args.k,
+                               use_jl=not args.no_jl, nprobe=args.nprobe)
+    if not rows:
+        print("Aucun retriever disponible.")
+        return
+    rows.sort(key=lambda r: -r["article_recall"])
+    print_table(rows)
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        w.writeheader()
+        w.writerows(rows)
+    print(f"\nTable écrite : {args.out}")
+
+
+if __name__ == "__main__":
+    main()
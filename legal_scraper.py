@@ -15,7 +15,6 @@ Sites supportés:
 """
 
 import requests
-import trafilatura
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse, urljoin
 import time
@@ -26,6 +25,8 @@ from dataclasses import dataclass
 from pathlib import Path
 import json
 
+from utils import metrics, profiler
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -41,6 +42,14 @@ class ScrapedContent:
     timestamp: str
     raw_html: str
 
+def _extract(html: str) -> Optional[str]:
+    """`trafilatura.extract` avec mise en forme. Import paresseux : trafilatura
+    (et lxml) pèsent sur le démarrage du worker, pas seulement au scraping."""
+    import trafilatura
+
+    return trafilatura.extract(html, include_formatting=True)
+
+
 class LegalScraper:
     """Scraper principal pour les sites juridiques et fiscaux français"""
     
@@ -92,7 +101,8 @@ class LegalScraper:
             logger.info(f"Scraping de l'URL: {url}")
             
             # Délai pour respecter les bonnes pratiques
-            time.sleep(self.delay)
+            with profiler.span("scrape.delay", "sleep"):
+                time.sleep(self.delay)
             
             # Referer spécifique pour Légifrance (réduit les 403)
             extra_headers = {}
@@ -100,26 +110,28 @@ class LegalScraper:
                 extra_headers['Referer'] = 'https://www.legifrance.gouv.fr/'
                 extra_headers['Sec-Fetch-Site'] = 'same-origin'
 
-            response = self.session.get(url, timeout=self.timeout, headers=extra_headers)
-            response.raise_for_status()
-            response.encoding = response.apparent_encoding
+            with metrics.http_call("scrape", urlparse(url).netloc):
+                response = self.session.get(url, timeout=self.timeout, headers=extra_headers)
+                response.raise_for_status()
+                response.encoding = response.apparent_encoding
             
             # Détermination du type de site
             site_type = self.get_site_type(url)
             
             # Scraping spécialisé selon le site
-            if site_type == 'legislation':
-                return self._scrape_legifrance(url, response)
-            elif site_type == 'fiscal':
-                return self._scrape_fiscal_site(url, response)
-            elif site_type == 'jurisprudence':
-                return self._scrape_jurisprudence_site(url, response)
-            elif site_type == 'parlementaire':
-                return self._scrape_parliamentary_site(url, response)
-            elif site_type == 'jurisprudence_eu':
-                return self._scrape_curia(url, response)
-            else:
-                return self._scrape_generic(url, response)
+            with profiler.span(f"extract {site_type}", "extract"):
+                if site_type == 'legislation':
+                    return self._scrape_legifrance(url, response)
+                elif site_type == 'fiscal':
+                    return self._scrape_fiscal_site(url, response)
+                elif site_type == 'jurisprudence':
+                    return self._scrape_jurisprudence_site(url, response)
+                elif site_type == 'parlementaire':
+                    return self._scrape_parliamentary_site(url, response)
+                elif site_type == 'jurisprudence_eu':
+                    return self._scrape_curia(url, response)
+                else:
+                    return self._scrape_generic(url, response)
                 
         except Exception as e:
             logger.error(f"Erreur lors du scraping de {url}: {str(e)}")
@@ -142,7 +154,7 @@ class LegalScraper:
             content = main_content.get_text(strip=True)
         else:
             # Fallback avec trafilatura
-            content = trafilatura.extract(response.text, include_formatting=True) or ""
+            content = _extract(response.text) or ""
         
         # Métadonnées spécifiques à Legifrance
         metadata = self._extract_legifrance_metadata(soup)
@@ -216,10 +228,10 @@ class LegalScraper:
                 content = "\n".join(content_parts)
             else:
                 # Fallback avec trafilatura si aucun sélecteur spécifique ne fonctionne
-                content = trafilatura.extract(response.text, include_formatting=True) or ""
+                content = _extract(response.text) or ""
         else:
             # Fallback avec trafilatura pour les autres sites fiscaux
-            content = trafilatura.extract(response.text, include_formatting=True) or ""
+            content = _extract(response.text) or ""
         
         metadata = self._extract_fiscal_metadata(soup, url)
         
@@ -265,7 +277,7 @@ class LegalScraper:
         
         # Fallback si aucun contenu n'a été extrait
         if not content:
-            content = trafilatura.extract(response.text, include_formatting=True) or ""
+            content = _extract(response.text) or ""
         
         metadata = self._extract_jurisprudence_metadata(soup, url)
         
@@ -346,7 +358,7 @@ class LegalScraper:
         # Si toujours pas de contenu, essayer trafilatura
         if not content:
             try:
-                content = trafilatura.extract(html_text, include_formatting=True) or ""
+                content = _extract(html_text) or ""
                 if content and len(content) > 100:
                     logger.info("Contenu extrait avec trafilatura")
                 else:
@@ -389,7 +401,7 @@ class LegalScraper:
         if main_content:
             content = main_content.get_text(strip=True)
         else:
-            content = trafilatura.extract(response.text, include_formatting=True) or ""
+            content = _extract(response.text) or ""
         
         metadata = self._extract_parliamentary_metadata(soup, url)
         
@@ -429,7 +441,7 @@ class LegalScraper:
             content = main_content.get_text(strip=True)
         else:
             # Fallback avec trafilatura
-            content = trafilatura.extract(response.text, include_formatting=True) or ""
+            content = _extract(response.text) or ""
 
         # Extraction des métadonnées CJUE
         metadata = self._extract_curia_metadata(soup, url)
@@ -479,7 +491,7 @@ class LegalScraper:
             title = title_elem.get_text(strip=True)
         
         # Extraction du contenu avec trafilatura
-        content = trafilatura.extract(response.text, include_formatting=True) or ""
+        content = _extract(response.text) or ""
         
         metadata = {
             'language': 'fr',
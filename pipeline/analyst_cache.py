@@ -0,0 +1,110 @@
+"""
+Cache de la sortie de l'analyste (texte brut + JSON parsé).
+
+L'analyse conditionne tout l'aval (routage, requêtes, sélection des passages)
+et coûte un appel complet au modèle de l'analyste. Or la même question revient
+souvent à l'identique : nouvel essai après une déconnexion, escalade d'un suivi
+qui repose la question, relances d'évaluation. L'entrée est identifiée par
+l'empreinte de la question normalisée, le modèle et la version du prompt
+(`agents.analyste.ANALYST_PROMPT_VERSION`), avec une durée de vie
+(`ANALYST_CACHE_TTL_S`, 0 = désactivé).
+
+Le stockage est le magasin SQLite partagé des caches (`utils.ttl_store`).
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Optional
+
+from agents.analyste import ANALYST_PROMPT_VERSION
+from utils.ttl_store import CACHE_DB_PATH, TTLStore
+
+logger = logging.getLogger(__name__)
+
+ANALYST_CACHE_PATH = os.getenv("ANALYST_CACHE_PATH", CACHE_DB_PATH)
+ANALYST_CACHE_TTL_S = float(os.getenv("ANALYST_CACHE_TTL_S", str(7 * 24 * 3600)))
+
+_NAMESPACE = "analyst"
+
+
+def normalize_question(question: str) -> str:
+    """Minuscules, sans accents ni ponctuation, espaces réduits."""
+    text = unicodedata.normalize("NFKD", question or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^\w%€]+", " ", text).split())
+
+
+def question_fingerprint(question: str) -> str:
+    return hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()[:24]
+
+
+@dataclass
+class CachedAnalysis:
+    raw: str
+    analyst_json: dict
+    age_s: float
+
+
+class AnalystCache:
+    def __init__(self, store: TTLStore, ttl_s: float = ANALYST_CACHE_TTL_S):
+        self.store = store
+        self.ttl_s = ttl_s
+
+    @staticmethod
+    def _namespace(model_name: str) -> str:
+        return f"{_NAMESPACE}:{model_name}:v{ANALYST_PROMPT_VERSION}"
+
+    def get(self, question: str, model_name: str) -> Optional[CachedAnalysis]:
+        entry = self.store.get(self._namespace(model_name), question_fingerprint(question))
+        if entry is None:
+            return None
+        value = entry["value"]
+        return CachedAnalysis(raw=value["raw"], analyst_json=value["json"],
+                              age_s=round(time.time() - entry["created_at"], 1))
+
+    def put(self, question: str, model_name: str, raw: str, analyst_json: dict) -> None:
+        # Une analyse illisible n'est pas conservée : le prochain essai la régénère.
+        if not analyst_json:
+            return
+        self.store.put(self._namespace(model_name), question_fingerprint(question),
+                       {"raw": raw, "json": analyst_json, "question": question}, self.ttl_s)
+
+    def invalidate(self, contains: Optional[str] = None) -> int:
+        return self.store.delete(f"{_NAMESPACE}:", contains=contains)
+
+    def stats(self) -> dict:
+        return {**self.store.stats(f"{_NAMESPACE}:"), "ttl_s": self.ttl_s}
+
+
+_cache: Optional[AnalystCache] = None
+_cache_checked = False
+_cache_lock = threading.Lock()
+
+
+def get_analyst_cache() -> Optional[AnalystCache]:
+    """Cache partagé, ou None s'il est désactivé (TTL nul) ou inutilisable."""
+    global _cache, _cache_checked
+    if _cache_checked:
+        return _cache
+    with _cache_lock:
+        if not _cache_checked:
+            if ANALYST_CACHE_TTL_S > 0:
+                try:
+                    _cache = AnalystCache(TTLStore(ANALYST_CACHE_PATH))
+                except Exception as exc:
+                    logger.warning("Cache de l'analyste indisponible (%s) : %s", ANALYST_CACHE_PATH, exc)
+            _cache_checked = True
+    return _cache
+
+
+def reset_analyst_cache() -> None:
+    """Tests uniquement."""
+    global _cache, _cache_checked
+    _cache, _cache_checked = None, False
@@ -0,0 +1,114 @@
+"""
+Points de reprise d'une exécution du pipeline.
+
+À la déconnexion du client SSE, `api.runner.stream_events` annule le pipeline :
+sans reprise, un nouvel essai repartait de l'analyste et repayait chaque appel
+LLM — plusieurs minutes de travail perdues sur une connexion mobile instable.
+
+Chaque étape terminée (analyse, routage, spécialistes, vérification, requêtes,
+jurisprudence, recherche, ranking, scraping, FiscalOnline) enregistre sa sortie
+sous l'identifiant de l'exécution (`run_id`), avec la durée et les
+métadonnées de son événement de fin. À la reprise, `run_pipeline_stream`
+relit ces sorties, réémet aussitôt les événements des étapes déjà faites
+(`meta.resumed = true`) et poursuit à partir de la première étape manquante.
+
+Les étapes déterministes et rapides (déduplication, sélection des passages) ne
+sont pas enregistrées : elles sont recalculées. La rédaction non plus : une
+réponse interrompue est rédigée de nouveau en entier.
+
+Stockage : le magasin SQLite partagé des caches (`utils.ttl_store`), un espace
+de noms `run:<run_id>` par exécution, purgé à l'expiration (`ttl_s`).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import uuid
+from typing import Any, Dict, Optional
+
+from utils.ttl_store import CACHE_DB_PATH, TTLStore
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", CACHE_DB_PATH)
+
+_NAMESPACE = "run"
+# Clé réservée : paramètres du tour, de quoi le relancer à l'identique.
+_REQUEST_KEY = "_request"
+
+
+class RunCheckpoints:
+    """Points de reprise d'une exécution (`run_id`)."""
+
+    def __init__(self, store: TTLStore, run_id: str, ttl_s: float):
+        self.store = store
+        self.run_id = run_id
+        self.ttl_s = ttl_s
+
+    @property
+    def _namespace(self) -> str:
+        return f"{_NAMESPACE}:{self.run_id}"
+
+    def load(self, step: str) -> Optional[Dict[str, Any]]:
+        """`{"state", "elapsed_s", "meta"}` de l'étape, ou None si elle n'a pas abouti."""
+        try:
+            entry = self.store.get(self._namespace, step)
+        except Exception as exc:  # une reprise impossible n'empêche pas d'exécuter
+            logger.warning("Point de reprise %s/%s illisible : %s", self.run_id, step, exc)
+            return None
+        return entry["value"] if entry else None
+
+    def save(self, step: str, state: Dict[str, Any], elapsed_s: float,
+             meta: Optional[Dict[str, Any]] = None) -> None:
+        try:
+            self.store.put(self._namespace, step,
+                           {"state": state, "elapsed_s": round(elapsed_s, 2), "meta": meta or {}},
+                           self.ttl_s)
+        except Exception as exc:
+            logger.warning("Point de reprise %s/%s non enregistré : %s", self.run_id, step, exc)
+
+    def load_request(self) -> Optional[Dict[str, Any]]:
+        entry = self.store.get(self._namespace, _REQUEST_KEY)
+        return entry["value"] if entry else None
+
+    def save_request(self, request: Dict[str, Any]) -> None:
+        self.store.put(self._namespace, _REQUEST_KEY, request, self.ttl_s)
+
+    def clear(self) -> None:
+        """L'exécution a abouti : plus rien à reprendre."""
+        self.store.delete(self._namespace)
+
+
+class CheckpointStore:
+    """Fabrique des `RunCheckpoints`, sur un magasin partagé."""
+
+    def __init__(self, store: TTLStore, ttl_s: float):
+        self.store = store
+        self.ttl_s = ttl_s
+
+    def run(self, run_id: str) -> RunCheckpoints:
+        return RunCheckpoints(self.store, run_id, self.ttl_s)
+
+
+_store: Optional[CheckpointStore] = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store(ttl_s: float) -> CheckpointStore:
+    """Instance partagée par le process (le fichier l'est entre workers)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore(TTLStore(CHECKPOINT_PATH), ttl_s)
+    return _store
+
+
+def reset_checkpoint_store() -> None:
+    """Tests uniquement."""
+    global _store
+    _store = None
+
+
+def new_run_id() -> str:
+    return f"r_{uuid.uuid4().hex[:16]}"
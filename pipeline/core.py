@@ -20,6 +20,7 @@ agrège coût / tokens / latence par agent (et trace Langfuse si configuré).
 from __future__ import annotations
 
 import ast
+import json
 import logging
 import threading
 import time
@@ -41,18 +42,23 @@ from agents.specialises import (
 from agents.generaliste import agent_generaliste
 from agents.verificateur import agent_verificateur
 from agents.jurisprudence_dork import generate_jurisprudence_dork
-from agents.ranker import agent_ranker
+from agents.ranker import RANKER_OUTPUT, agent_ranker, speculative_candidates
 from agents.redactionnel import agent_redactionnel, agent_redactionnel_stream
+from pipeline.analyst_cache import CachedAnalysis, get_analyst_cache
+from pipeline.checkpoints import RunCheckpoints
 from pipeline.errors import PipelineCancelled, PipelineDeadlineExceeded
 from pipeline.events import (
-    PipelineEvent, ResultEvent, SourcesEvent, TextDelta,
+    PipelineEvent, ResultEvent, SourcesEvent, StepEvent, TextDelta,
     public_sources, step_finished, step_started,
 )
 from pipeline.normalizer import RedactionNormalizer
+from utils import metrics, profiler
 from utils.api_keys import get_api_keys
 from utils.json_utils import clean_json_codefence, lire_json_beton
+from utils.legal_ids import LegalIdIndex, legal_ids, legal_refs
 from utils.llm import finalize_trace, llm_trace, trace_step
-from utils.scraper_utils import scrapper
+from utils.passages import select_passages
+from utils.scraper_utils import ScrapeSession
 from utils.search import OFFICIAL_DOMAINS, search_with_fallback
 
 logger = logging.getLogger(__name__)
@@ -142,6 +148,11 @@ class PipelineResult:
     fiscalonline_count: int = 0
     cancelled: bool = False
     is_follow_up: bool = False
+    # Résumé du profil (`pipeline.profiling`), si l'exécution a été profilée.
+    profile: Optional[dict] = None
+    # Latence perçue des appels streamés, par agent (`utils.llm.StreamStats`) :
+    # premier token, écarts entre fragments, débit en tokens/s.
+    llm_stream: dict = field(default_factory=dict)
 
 
 # ─── Point d'entrée streamé ───────────────────────────────────────────────────
@@ -157,6 +168,11 @@ def run_pipeline_stream(
     trace: Optional[TraceOptions] = None,
     cancel: Optional[threading.Event] = None,
     deadline_s: Optional[float] = None,
+    use_passages: bool = True,
+    ranker_output: Optional[str] = None,
+    analysis: Optional[dict] = None,
+    use_analyst_cache: bool = True,
+    checkpoints: Optional[RunCheckpoints] = None,
 ) -> Iterator[PipelineEvent]:
     """Exécute le pipeline en émettant sa progression.
 
@@ -174,6 +190,19 @@ def run_pipeline_stream(
         cancel: `threading.Event` — testé aux frontières d'étape et à chaque
             fragment de rédaction ; lève `PipelineCancelled`.
         deadline_s: budget de temps global en secondes.
+        use_passages: ne transmet au rédactionnel que les passages les plus
+            pertinents de chaque document (`utils.passages`) au lieu du
+            contenu scrapé entier.
+        ranker_output: format de sortie du ranker, "verbose" ou "compact"
+            (None → `agents.ranker.RANKER_OUTPUT`).
+        analysis: sortie JSON de l'analyste déjà disponible pour cette
+            question (escalade d'un suivi qui la repose) — l'analyste n'est
+            pas rappelé.
+        use_analyst_cache: consulte et alimente le cache de l'analyste
+            (`pipeline.analyst_cache`, actif si `ANALYST_CACHE_TTL_S` > 0).
+        checkpoints: points de reprise de l'exécution (`pipeline.checkpoints`) :
+            chaque étape terminée y est enregistrée, et une étape déjà
+            enregistrée n'est pas réexécutée (son événement de fin est réémis).
 
     Yields:
         StepEvent, SourcesEvent, TextDelta, puis un ResultEvent final.
@@ -204,6 +233,23 @@ def run_pipeline_stream(
         if deadline is not None and time.time() > deadline:
             raise PipelineDeadlineExceeded(step, deadline_s)
 
+    def _resumed(step: str) -> Optional[dict]:
+        return checkpoints.load(step) if checkpoints is not None else None
+
+    def _finished(step: str, elapsed_s: float, state: dict, **meta) -> StepEvent:
+        """Événement de fin d'étape, après enregistrement du point de reprise."""
+        if checkpoints is not None:
+            checkpoints.save(step, state, elapsed_s, meta)
+        return _done(step, elapsed_s, **meta)
+
+    def _done(step: str, elapsed_s: float, status: str = "done", **meta) -> StepEvent:
+        """Fin d'une étape exécutée (pas rejouée) : sa durée alimente les métriques."""
+        metrics.STEP_SECONDS.observe(elapsed_s, step, status)
+        return step_finished(step, elapsed_s, status=status, **meta)
+
+    def _replayed(step: str, saved: dict) -> StepEvent:
+        return step_finished(step, saved["elapsed_s"], resumed=True, **saved["meta"])
+
     # État accumulé, lu par la construction du résultat / des replis d'erreur.
     analyst_json: dict = {}
     selected_agents: List[str] = []
@@ -216,6 +262,7 @@ def run_pipeline_stream(
 
     fisca_executor: Optional[ThreadPoolExecutor] = None
     fisca_future = None
+    scrape_session: Optional[ScrapeSession] = None
 
     logger.info("PIPELINE START — question: %r", question[:120])
 
@@ -229,18 +276,47 @@ def run_pipeline_stream(
         try:
             # ── 1. Analyste ──────────────────────────────────────────────────
             _checkpoint("analyse")
-            yield step_started("analyse")
-            t0 = time.time()
-            result_analyste = agent_analyste(question, google_key, model_name=models["analyste"])
-            analyst_json = lire_json_beton(result_analyste)
-            timings["analyste"] = time.time() - t0
-            yield step_finished("analyse", timings["analyste"], chars=len(result_analyste or ""))
+            saved = _resumed("analyse")
+            if saved is not None:
+                result_analyste, analyst_json = saved["state"]["raw"], saved["state"]["json"]
+                yield _replayed("analyse", saved)
+            else:
+                yield step_started("analyse")
+                t0 = time.time()
+                analyst_cache = get_analyst_cache() if use_analyst_cache else None
+                cached = None
+                if analysis:
+                    cached = CachedAnalysis(raw=json.dumps(analysis, ensure_ascii=False),
+                                            analyst_json=analysis, age_s=0.0)
+                    cache_source = "conversation"
+                elif analyst_cache is not None:
+                    cached = analyst_cache.get(question, models["analyste"])
+                    cache_source = "cache"
+                    metrics.cache_lookup("analyst", cached is not None)
+                if cached is not None:
+                    result_analyste, analyst_json = cached.raw, cached.analyst_json
+                    logger.info("Analyste : sortie réutilisée (%s, %.0fs)", cache_source, cached.age_s)
+                    cache_meta = {"cache": "hit", "cache_source": cache_source, "age_s": cached.age_s}
+                else:
+                    result_analyste = agent_analyste(question, google_key, model_name=models["analyste"])
+                    analyst_json = lire_json_beton(result_analyste)
+                    if analyst_cache is not None:
+                        try:
+                            analyst_cache.put(question, models["analyste"], result_analyste, analyst_json)
+                        except Exception as exc:
+                            logger.warning("Cache de l'analyste : écriture impossible : %s", exc)
+                    cache_meta = {"cache": "miss"} if analyst_cache is not None else {}
+                timings["analyste"] = time.time() - t0
+                yield _finished("analyse", timings["analyste"],
+                                {"raw": result_analyste, "json": analyst_json},
+                                chars=len(result_analyste or ""), **cache_meta)
 
             # ── 1b. FiscalOnline en parallèle ────────────────────────────────
             # copy_context() propage la trace LLM courante au worker : sans elle,
             # la ContextVar ne franchit pas la frontière de thread et les appels
             # LLM de FiscalOnline seraient orphelins (coût non agrégé).
-            if use_fiscalonline:
+            saved_fiscalonline = _resumed("fiscalonline") if use_fiscalonline else None
+            if use_fiscalonline and saved_fiscalonline is None:
                 from utils.fiscalonline import main_fiscalonline
                 fisca_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fiscalonline")
                 fisca_future = fisca_executor.submit(
@@ -250,17 +326,23 @@ def run_pipeline_stream(
 
             # ── 2. Orchestrateur ─────────────────────────────────────────────
             _checkpoint("routage")
-            yield step_started("routage")
-            t0 = time.time()
-            routing = lire_json_beton(
-                agent_orchestrateur(question, result_analyste, openai_key,
-                                    model_name=models["orchestrateur"])
-            )
-            selected_agents = routing.get("selected_agents", [])
-            scores = routing.get("scores", {})
-            timings["orchestrateur"] = time.time() - t0
-            trace_step("routage", output={"selected_agents": selected_agents, "scores": scores})
-            yield step_finished("routage", timings["orchestrateur"], agents=selected_agents)
+            saved = _resumed("routage")
+            if saved is not None:
+                selected_agents = saved["state"]["selected_agents"]
+                yield _replayed("routage", saved)
+            else:
+                yield step_started("routage")
+                t0 = time.time()
+                routing = lire_json_beton(
+                    agent_orchestrateur(question, result_analyste, openai_key,
+                                        model_name=models["orchestrateur"])
+                )
+                selected_agents = routing.get("selected_agents", [])
+                scores = routing.get("scores", {})
+                timings["orchestrateur"] = time.time() - t0
+                trace_step("routage", output={"selected_agents": selected_agents, "scores": scores})
+                yield _finished("routage", timings["orchestrateur"],
+                                {"selected_agents": selected_agents}, agents=selected_agents)
 
             valid_agents = [n for n in selected_agents if n in AGENT_FUNCTIONS]
             if not valid_agents:
@@ -282,79 +364,75 @@ def run_pipeline_stream(
 
             # ── 3. Agents spécialisés (parallèle) ────────────────────────────
             _checkpoint("specialistes")
-            yield step_started("specialistes", agents=valid_agents)
-            t0 = time.time()
-            results: Dict[str, str] = {}
-
-            def _call_specialist(name: str):
-                return name, AGENT_FUNCTIONS[name](
-                    question, result_analyste, google_key,
-                    available_domain=active_domains, model_name=models["specialises"],
-                )
-
-            # Pas de `with` : son __exit__ attend TOUS les workers, ce qui annulerait
-            # l'effet du budget ci-dessous. On rend la main dès le budget écoulé et
-            # on laisse les retardataires mourir en arrière-plan (threads daemon).
-            executor = ThreadPoolExecutor(max_workers=max(1, len(valid_agents)),
-                                          thread_name_prefix="specialiste")
-            try:
-                # copy_context() doit être évalué ICI (thread principal), pas côté worker.
-                futures = [executor.submit(copy_context().run, _call_specialist, n)
-                           for n in valid_agents]
-                try:
-                    for future in as_completed(futures, timeout=SPECIALISTS_TIMEOUT_S):
-                        name, res = future.result()
-                        if res:
-                            results[name] = res
-                except FuturesTimeout:
-                    logger.warning(
-                        "Spécialistes — budget %ss dépassé, on poursuit avec %d/%d réponses",
-                        SPECIALISTS_TIMEOUT_S, len(results), len(valid_agents),
-                    )
-            finally:
-                executor.shutdown(wait=False, cancel_futures=True)
-            timings["specialises"] = time.time() - t0
-            trace_step("specialistes", output={n: results.get(n) for n in valid_agents},
-                       metadata={"repondants": list(results.keys()), "demandes": valid_agents})
-            yield step_finished("specialistes", timings["specialises"],
+            saved = _resumed("specialistes")
+            if saved is not None:
+                results: Dict[str, str] = saved["state"]["results"]
+                yield _replayed("specialistes", saved)
+            else:
+                yield step_started("specialistes", agents=valid_agents)
+                t0 = time.time()
+                results = _run_specialists(question, result_analyste, google_key, valid_agents,
+                                           active_domains, models["specialises"])
+                timings["specialises"] = time.time() - t0
+                trace_step("specialistes", output={n: results.get(n) for n in valid_agents},
+                           metadata={"repondants": list(results.keys()), "demandes": valid_agents})
+                yield _finished("specialistes", timings["specialises"], {"results": results},
                                 repondants=len(results), demandes=len(valid_agents))
 
             # ── 4. Vérificateur ──────────────────────────────────────────────
             _checkpoint("verification")
-            yield step_started("verification")
-            t0 = time.time()
-            verified_sources = lire_json_beton(
-                agent_verificateur(question, result_analyste, results, google_key,
-                                   model_name=models["verificateur"])
-            )
-            total_verified = sum(len(v) for v in verified_sources.values() if isinstance(v, list))
-            timings["verificateur"] = time.time() - t0
-            trace_step("verification", output=verified_sources,
-                       metadata={"total_sources": total_verified})
-            yield step_finished("verification", timings["verificateur"], sources=total_verified)
+            saved = _resumed("verification")
+            if saved is not None:
+                verified_sources = saved["state"]["verified_sources"]
+                yield _replayed("verification", saved)
+            else:
+                yield step_started("verification")
+                t0 = time.time()
+                verified_sources = lire_json_beton(
+                    agent_verificateur(question, result_analyste, results, google_key,
+                                       model_name=models["verificateur"])
+                )
+                total_verified = sum(len(v) for v in verified_sources.values() if isinstance(v, list))
+                timings["verificateur"] = time.time() - t0
+                trace_step("verification", output=verified_sources,
+                           metadata={"total_sources": total_verified})
+                yield _finished("verification", timings["verificateur"],
+                                {"verified_sources": verified_sources}, sources=total_verified)
 
             # ── 5. Généraliste (requêtes de recherche) ───────────────────────
             _checkpoint("requetes")
-            yield step_started("requetes")
-            t0 = time.time()
-            queries = agent_generaliste(question, openai_key, active_domains=active_domains,
-                                        model_name=models["generaliste"])
-            timings["generaliste"] = time.time() - t0
-            trace_step("requetes_generaliste", output=queries, metadata={"n_requetes": len(queries)})
-            yield step_finished("requetes", timings["generaliste"], n_requetes=len(queries))
+            saved = _resumed("requetes")
+            if saved is not None:
+                queries = saved["state"]["queries"]
+                yield _replayed("requetes", saved)
+            else:
+                yield step_started("requetes")
+                t0 = time.time()
+                queries = agent_generaliste(question, openai_key, active_domains=active_domains,
+                                            model_name=models["generaliste"])
+                timings["generaliste"] = time.time() - t0
+                trace_step("requetes_generaliste", output=queries, metadata={"n_requetes": len(queries)})
+                yield _finished("requetes", timings["generaliste"], {"queries": queries},
+                                n_requetes=len(queries))
 
             # ── 5b. Jurisprudence (Google Dork Cour de cassation) ────────────
             _checkpoint("jurisprudence")
-            yield step_started("jurisprudence")
-            t0 = time.time()
-            jurisprudence_queries = _parse_dork_queries(
-                generate_jurisprudence_dork(question, result_analyste, google_key,
-                                            model_name=models["jurisprudence"])
-            )
-            timings["jurisprudence"] = time.time() - t0
-            trace_step("requetes_jurisprudence", output=jurisprudence_queries,
-                       metadata={"n_requetes": len(jurisprudence_queries)})
-            yield step_finished("jurisprudence", timings["jurisprudence"],
+            saved = _resumed("jurisprudence")
+            if saved is not None:
+                jurisprudence_queries = saved["state"]["queries"]
+                yield _replayed("jurisprudence", saved)
+            else:
+                yield step_started("jurisprudence")
+                t0 = time.time()
+                jurisprudence_queries = _parse_dork_queries(
+                    generate_jurisprudence_dork(question, result_analyste, google_key,
+                                                model_name=models["jurisprudence"])
+                )
+                timings["jurisprudence"] = time.time() - t0
+                trace_step("requetes_jurisprudence", output=jurisprudence_queries,
+                           metadata={"n_requetes": len(jurisprudence_queries)})
+                yield _finished("jurisprudence", timings["jurisprudence"],
+                                {"queries": jurisprudence_queries},
                                 n_requetes=len(jurisprudence_queries))
 
             # ── 6. Concaténation des requêtes ────────────────────────────────
@@ -366,85 +444,162 @@ def run_pipeline_stream(
 
             # ── 7. Recherche (JusticeLibre MCP + SerpAPI) ────────────────────
             _checkpoint("recherche")
-            yield step_started("recherche", n_requetes=len(full_queries))
-            t0 = time.time()
-            structured_results = search_with_fallback(
-                full_queries, serpapi_key,
-                active_domains=active_domains,
-                use_justicelibre=use_justicelibre,
-                analyst_json=analyst_json,
-            )
-            n_jl = sum(1 for r in structured_results if r.get("_jl_source") == "justicelibre")
-            timings["search"] = time.time() - t0
-            trace_step("recherche", metadata={
-                "n_requetes": len(full_queries), "n_resultats_bruts": len(structured_results),
-                "justicelibre": n_jl, "serpapi": len(structured_results) - n_jl,
-                "use_justicelibre": use_justicelibre,
-            })
-            yield step_finished("recherche", timings["search"],
-                                resultats=len(structured_results), justicelibre=n_jl)
+            saved = _resumed("recherche")
+            if saved is not None:
+                structured_results = saved["state"]["results"]
+                yield _replayed("recherche", saved)
+            else:
+                yield step_started("recherche", n_requetes=len(full_queries))
+                t0 = time.time()
+                structured_results = search_with_fallback(
+                    full_queries, serpapi_key,
+                    active_domains=active_domains,
+                    use_justicelibre=use_justicelibre,
+                    analyst_json=analyst_json,
+                )
+                n_jl = sum(1 for r in structured_results if r.get("_jl_source") == "justicelibre")
+                n_corpus = sum(1 for r in structured_results if r.get("_corpus_source"))
+                n_dense = sum(1 for r in structured_results if "_dense_score" in r)
+                timings["search"] = time.time() - t0
+                trace_step("recherche", metadata={
+                    "n_requetes": len(full_queries), "n_resultats_bruts": len(structured_results),
+                    "justicelibre": n_jl, "corpus": n_corpus, "dense": n_dense,
+                    "serpapi": len(structured_results) - n_jl - n_corpus - n_dense,
+                    "use_justicelibre": use_justicelibre,
+                })
+                yield _finished("recherche", timings["search"], {"results": structured_results},
+                                resultats=len(structured_results), justicelibre=n_jl,
+                                corpus=n_corpus, dense=n_dense)
 
             # ── 8. Déduplication ─────────────────────────────────────────────
             yield step_started("deduplication")
-            seen, unique = set(), []
+            # Sur l'identité juridique du document (`utils.legal_ids`) : même
+            # article Légifrance ou même BOI sous plusieurs URL, variantes
+            # d'URL confondues (`utils.urls`). Entre deux doublons, on garde
+            # celui dont le contenu est déjà fourni (JusticeLibre) : il n'aura
+            # pas à être scrapé, en lui reportant les passages désignés par
+            # l'index dense (`_passages`). Chaque candidat est étiqueté
+            # `legal_refs` (identifiants, et article désigné par le titre).
+            id_index = LegalIdIndex()
+            seen: Dict[str, int] = {}
+            unique = []
             for res in structured_results:
-                url = res.get("url")
-                if url and url not in seen:
+                if not res.get("url"):
+                    continue
+                ids = legal_ids(res)
+                key = id_index.key_for(res, ids)
+                res = {**res, "legal_refs": sorted(legal_refs(res, ids))}
+                if key not in seen:
+                    seen[key] = len(unique)
                     unique.append(res)
-                    seen.add(url)
+                    continue
+                kept = unique[seen[key]]
+                if res.get("content") and not kept.get("content"):
+                    kept, res = res, kept
+                passages = list(dict.fromkeys(kept.get("_passages", []) + res.get("_passages", [])))
+                unique[seen[key]] = {**kept, "_passages": passages} if passages else kept
             trace_step("deduplication", metadata={"avant": len(structured_results),
                                                   "apres": len(unique)})
-            yield step_finished("deduplication", 0.0, avant=len(structured_results),
-                                apres=len(unique))
+            yield _done("deduplication", 0.0, avant=len(structured_results),
+                        apres=len(unique))
 
             # ── 9. Ranking ───────────────────────────────────────────────────
             _checkpoint("ranking")
-            yield step_started("ranking", candidats=len(unique))
-            t0 = time.time()
-            ranked = agent_ranker(question, unique, result_analyste, results, openai_key,
-                                  model=models["ranker"])
-            ranked_keep = [x for x in ranked
-                           if x.get("keep") and x.get("score", 0) >= RANK_KEEP_THRESHOLD]
-            if not ranked_keep:
+            saved = _resumed("ranking")
+            n_anticipes = 0
+            if saved is not None:
+                ranked_keep = saved["state"]["ranked_keep"]
+                yield _replayed("ranking", saved)
+            else:
+                yield step_started("ranking", candidats=len(unique))
+                t0 = time.time()
+                # Scraping anticipé pendant le classement : spéculatif d'abord, sur
+                # les sources officielles les mieux placées ; puis, le ranker étant
+                # streamé, chaque source retenue au seuil haut dès que le modèle l'a
+                # notée.
+                scrape_session = ScrapeSession()
+                scrape_session.prefetch(speculative_candidates(unique, question, analyst_json))
+
+                def _prefetch(doc: dict) -> None:
+                    if doc.get("keep") and doc.get("score", 0) >= RANK_KEEP_THRESHOLD:
+                        scrape_session.submit(doc)
+
+                ranked = agent_ranker(question, unique, result_analyste, results, openai_key,
+                                      model=models["ranker"], analyst_json=analyst_json,
+                                      output=ranker_output, on_result=_prefetch)
+                n_anticipes = scrape_session.submitted
+                n_prefiltre = sum(1 for x in ranked if x.get("_prefiltre"))
                 ranked_keep = [x for x in ranked
-                               if x.get("keep") and x.get("score", 0) >= RANK_FALLBACK_THRESHOLD]
-                logger.warning("Seuil %.1f → 0 résultat, repli %.1f → %d résultats",
-                               RANK_KEEP_THRESHOLD, RANK_FALLBACK_THRESHOLD, len(ranked_keep))
-            timings["ranker"] = time.time() - t0
-            trace_step("ranking", output=[{"url": x.get("url"), "score": x.get("score"),
-                                           "reason": x.get("reason")} for x in ranked_keep],
-                       metadata={"candidats": len(unique), "retenues": len(ranked_keep)})
-            yield step_finished("ranking", timings["ranker"],
-                                candidats=len(unique), retenues=len(ranked_keep))
+                               if x.get("keep") and x.get("score", 0) >= RANK_KEEP_THRESHOLD]
+                if not ranked_keep:
+                    ranked_keep = [x for x in ranked
+                                   if x.get("keep") and x.get("score", 0) >= RANK_FALLBACK_THRESHOLD]
+                    logger.warning("Seuil %.1f → 0 résultat, repli %.1f → %d résultats",
+                                   RANK_KEEP_THRESHOLD, RANK_FALLBACK_THRESHOLD, len(ranked_keep))
+                timings["ranker"] = time.time() - t0
+                trace_step("ranking", output=[{"url": x.get("url"), "score": x.get("score"),
+                                               "reason": x.get("reason")} for x in ranked_keep],
+                           metadata={"candidats": len(unique), "retenues": len(ranked_keep),
+                                     "ecartes_prefiltre": n_prefiltre,
+                                     "sortie": ranker_output or RANKER_OUTPUT,
+                                     "scraping_anticipe": n_anticipes})
+                yield _finished("ranking", timings["ranker"], {"ranked_keep": ranked_keep},
+                                candidats=len(unique), retenues=len(ranked_keep),
+                                ecartes_prefiltre=n_prefiltre)
 
             # ── 10. Scraping ─────────────────────────────────────────────────
             _checkpoint("scraping")
-            yield step_started("scraping", urls=len(ranked_keep))
-            t0 = time.time()
-            doc_enriched = scrapper(ranked_keep)
-            n_ok = sum(1 for d in doc_enriched if d.get("content"))
-            timings["scraping"] = time.time() - t0
-            trace_step("scraping", metadata={"urls_avec_contenu": n_ok,
-                                             "urls_total": len(doc_enriched)})
-            yield step_finished("scraping", timings["scraping"],
-                                avec_contenu=n_ok, total=len(doc_enriched))
+            saved = _resumed("scraping")
+            if saved is not None:
+                doc_enriched = saved["state"]["docs"]
+                yield _replayed("scraping", saved)
+            else:
+                yield step_started("scraping", urls=len(ranked_keep))
+                t0 = time.time()
+                if scrape_session is None:          # ranking repris : rien d'anticipé
+                    scrape_session = ScrapeSession()
+                doc_enriched = scrape_session.results(ranked_keep)
+                scrape_session.close()
+                n_ok = sum(1 for d in doc_enriched if d.get("content"))
+                timings["scraping"] = time.time() - t0
+                scrape_stats = scrape_session.stats()
+                trace_step("scraping", metadata={"urls_avec_contenu": n_ok,
+                                                 "urls_total": len(doc_enriched),
+                                                 "anticipes": n_anticipes, **scrape_stats})
+                yield _finished("scraping", timings["scraping"], {"docs": doc_enriched},
+                                avec_contenu=n_ok, total=len(doc_enriched),
+                                anticipes=n_anticipes, **scrape_stats)
 
             # ── 10b. Fusion des articles FiscalOnline ────────────────────────
-            if fisca_future is not None:
+            if saved_fiscalonline is not None:
+                doc_fiscalonline = saved_fiscalonline["state"]["docs"]
+                doc_enriched = doc_fiscalonline + doc_enriched
+                yield _replayed("fiscalonline", saved_fiscalonline)
+            elif fisca_future is not None:
                 t0 = time.time()
                 try:
                     doc_fiscalonline = fisca_future.result(timeout=FISCALONLINE_TIMEOUT_S) or []
                     doc_enriched = doc_fiscalonline + doc_enriched
-                    yield step_finished("fiscalonline", time.time() - t0,
-                                        articles=len(doc_fiscalonline))
+                    yield _finished("fiscalonline", time.time() - t0, {"docs": doc_fiscalonline},
+                                    articles=len(doc_fiscalonline))
                 except Exception as exc:
                     logger.warning("FiscalOnline — récupération des articles échouée : %s", exc)
-                    yield step_finished("fiscalonline", time.time() - t0, status="error",
-                                        error=str(exc))
+                    yield _done("fiscalonline", time.time() - t0, status="error",
+                                error=str(exc))
+
+            # ── 10c. Sélection des passages ──────────────────────────────────
+            # Le rédactionnel ne reçoit que les paragraphes utiles : c'est ce qui
+            # fait baisser ses tokens d'entrée et son délai avant premier token.
+            passages_meta: Dict[str, int] = {}
+            if use_passages and doc_enriched:
+                t0 = time.time()
+                doc_enriched, passages_meta = select_passages(doc_enriched, question, analyst_json)
+                timings["passages"] = time.time() - t0
+                trace_step("passages", metadata=passages_meta)
 
             # ── 11. Rédactionnel ─────────────────────────────────────────────
             _checkpoint("redaction")
-            yield step_started("redaction", docs=len(doc_enriched))
+            yield step_started("redaction", docs=len(doc_enriched), **passages_meta)
             yield SourcesEvent(sources=public_sources(doc_fiscalonline + ranked_keep))
             t0 = time.time()
 
@@ -478,7 +633,11 @@ def run_pipeline_stream(
                         len(raw_answer or ""), (raw_answer or "")[:200],
                     )
             timings["redactionnel"] = time.time() - t0
-            yield step_finished("redaction", timings["redactionnel"], chars=len(answer_text))
+            stream = ctx.stream_stats().get("redactionnel") if stream_redaction else None
+            yield _done("redaction", timings["redactionnel"], chars=len(answer_text),
+                        **({"ttft_s": stream["ttft_s"],
+                            "tokens_per_s": stream["output_tokens_per_s"],
+                            "gap_p95_s": stream["gap_p95_s"]} if stream else {}))
 
             logger.info("PIPELINE TERMINE en %.1fs — %d sources, %.4f USD",
                         time.time() - t_total, len(ranked_keep), ctx.total_cost)
@@ -502,6 +661,7 @@ def run_pipeline_stream(
                 wall_clock_s=time.time() - t_total,
                 cost_by_agent=ctx.cost_by_agent(),
                 timings=timings,
+                llm_stream=ctx.stream_stats(),
                 n_sources_raw=len(structured_results),
                 n_sources_kept=len(ranked_keep),
                 raw_response=reponse if isinstance(reponse, dict) else {},
@@ -539,16 +699,55 @@ def run_pipeline_stream(
                 total_output_tokens=ctx.total_output_tokens,
                 wall_clock_s=time.time() - t_total,
                 cost_by_agent=ctx.cost_by_agent(), timings=timings,
+                llm_stream=ctx.stream_stats(),
                 error=f"{type(exc).__name__}: {exc}",
             ))
 
         finally:
             if fisca_executor is not None:
                 fisca_executor.shutdown(wait=False, cancel_futures=True)
+            if scrape_session is not None:
+                scrape_session.close()
             if not finalized:
                 finalize_trace(metadata={"incomplete": True})
 
 
+def _run_specialists(question: str, result_analyste: str, google_key: str,
+                     agents: List[str], active_domains: List[str], model_name: str) -> Dict[str, str]:
+    """Interroge les agents spécialisés en parallèle, dans la limite de
+    `SPECIALISTS_TIMEOUT_S` ; rend les réponses non vides par agent."""
+    results: Dict[str, str] = {}
+
+    def _call_specialist(name: str):
+        return name, AGENT_FUNCTIONS[name](
+            question, result_analyste, google_key,
+            available_domain=active_domains, model_name=model_name,
+        )
+
+    # Pas de `with` : son __exit__ attend TOUS les workers, ce qui annulerait
+    # l'effet du budget ci-dessous. On rend la main dès le budget écoulé et
+    # on laisse les retardataires mourir en arrière-plan (threads daemon).
+    executor = ThreadPoolExecutor(max_workers=max(1, len(agents)),
+                                  thread_name_prefix="specialiste")
+    try:
+        # copy_context() doit être évalué ICI (thread appelant), pas côté worker.
+        call = profiler.bind(_call_specialist, "specialistes")
+        futures = [executor.submit(copy_context().run, call, n) for n in agents]
+        try:
+            for future in as_completed(futures, timeout=SPECIALISTS_TIMEOUT_S):
+                name, res = future.result()
+                if res:
+                    results[name] = res
+        except FuturesTimeout:
+            logger.warning(
+                "Spécialistes — budget %ss dépassé, on poursuit avec %d/%d réponses",
+                SPECIALISTS_TIMEOUT_S, len(results), len(agents),
+            )
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
 # ─── Point d'entrée bloquant (éval, CLI) ──────────────────────────────────────
 def run_pipeline(
     question: str,
@@ -560,12 +759,17 @@ def run_pipeline(
     use_fiscalonline: Optional[bool] = None,
     trace: Optional[TraceOptions] = None,
     deadline_s: Optional[float] = None,
+    use_passages: bool = True,
+    ranker_output: Optional[str] = None,
+    use_analyst_cache: bool = True,
+    stream_redaction: bool = False,
 ) -> PipelineResult:
     """Exécute le pipeline complet et retourne le `PipelineResult`.
 
     Draine `run_pipeline_stream(stream_redaction=False)` : le rédactionnel est
     appelé en mode bloquant `json_mode=True`, comme historiquement, pour que le
-    chemin d'évaluation reste inchangé.
+    chemin d'évaluation reste inchangé. `stream_redaction=True` reprend le
+    chemin de l'API, et mesure la latence perçue (`PipelineResult.llm_stream`).
     """
     result: Optional[PipelineResult] = None
     try:
@@ -575,10 +779,13 @@ def run_pipeline(
             active_domains=active_domains,
             use_justicelibre=use_justicelibre,
             use_fiscalonline=use_fiscalonline,
-            stream_redaction=False,
+            stream_redaction=stream_redaction,
             config_name=config_name,
             trace=trace,
             deadline_s=deadline_s,
+            use_passages=use_passages,
+            ranker_output=ranker_output,
+            use_analyst_cache=use_analyst_cache,
         ):
             if isinstance(event, ResultEvent):
                 result = event.result
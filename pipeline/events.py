@@ -42,6 +42,8 @@ AUX_STEP_LABELS: Dict[str, str] = {
     "fiscalonline": "Récupération des articles FiscalOnline",
     "suivi":        "Analyse de votre question de suivi",
     "escalade":     "Nouvelle recherche complète nécessaire",
+    "cache":        "Réponse déjà rédigée pour une question identique",
+    "file":         "En attente d'une place d'exécution",
 }
 
 
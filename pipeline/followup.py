@@ -116,6 +116,7 @@ def build_contexte(
     sources: List[Dict],
     analyse: Dict,
     previous: Optional[Dict] = None,
+    analyse_question: Optional[str] = None,
 ) -> Dict:
     """Construit / rafraîchit le `contexte_conversation` après un tour.
 
@@ -124,6 +125,9 @@ def build_contexte(
     conversation raisonnaient indéfiniment sur le premier échange. Ici la
     question et la réponse initiales sont conservées (elles ancrent le sujet),
     mais l'historique récent est ajouté et les sources sont rafraîchies.
+
+    `analyse_question` est la question dont `analyse` est la sortie (tour
+    passé par le pipeline complet) ; un suivi garde celle du contexte précédent.
     """
     historique = list((previous or {}).get("historique", []))
     historique.append({"question": question, "reponse": (answer or "")[:2000]})
@@ -133,5 +137,7 @@ def build_contexte(
         "reponse_initial": (previous or {}).get("reponse_initial", answer),
         "sources": sources,
         "analyse": analyse,
+        "analyse_question": analyse_question or (previous or {}).get("analyse_question")
+        or (previous or {}).get("question_initial", question),
         "historique": historique[-MAX_HISTORIQUE_TOURS:],
     }
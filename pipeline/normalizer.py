@@ -28,6 +28,7 @@ from __future__ import annotations
 import json
 import logging
 import re
+from json.decoder import scanstring as _scanstring
 from typing import List, Optional, Tuple
 
 from utils.json_utils import clean_json_codefence, lire_json_beton
@@ -43,6 +44,14 @@ _SIMPLE_ESCAPES = {
 # Nombre de caractères observés avant de trancher entre JSON et markdown.
 _SNIFF_CHARS = 48
 
+# Seuls caractères qui interrompent une valeur JSON (parcours de repli : tout
+# le reste est copié par tranches entières).
+_VALUE_SPECIAL = re.compile(r'["\\]')
+_FENCED_JSON = re.compile(r"^```(?:json)?\s*\{")
+_MARKDOWN_MARKERS = re.compile(r"^```(?:markdown|md)?\s*\n?|\n?```\s*$")
+_POINTS_CLES_JSON = re.compile(r'"points_cles"\s*:\s*(\[.*?\])', re.S)
+_POINTS_CLES_TAG = re.compile(r"<points_cles>(.*?)</points_cles>", re.S)
+
 
 class JsonStringFieldExtractor:
     """Extrait au fil de l'eau la valeur (string) d'un champ d'un flux JSON.
@@ -52,7 +61,13 @@ class JsonStringFieldExtractor:
       * les champs qui précèdent celui recherché (ici `question`) ;
       * le nom de la clé coupé entre deux chunks (buffer glissant `_pre`) ;
       * une séquence d'échappement coupée entre deux chunks, y compris un
-        `\\uXXXX` réparti sur jusqu'à six chunks (buffer `_esc`).
+        `\\uXXXX` réparti sur jusqu'à six chunks (buffer `_esc`) ;
+      * une paire de substitution `\\uD83D\\uDE00` (emoji) : recomposée en un
+        seul caractère, comme le ferait `json.loads`.
+
+    Aucun parcours caractère par caractère : un chunk sans `\\` est copié
+    jusqu'au guillemet fermant (`str.find`), un chunk avec échappements est
+    décodé par le décodeur C de `json` (`python -m bench.normalizer`).
     """
 
     def __init__(self, field: str = "reponse_redigee"):
@@ -61,14 +76,19 @@ class JsonStringFieldExtractor:
         self._state = "SEEK"
         self._pre = ""          # buffer de recherche de la clé
         self._esc = ""          # échappement partiel reporté au chunk suivant
+        self._esc_need = 0      # longueur à atteindre pour pouvoir le décoder
         self._out: List[str] = []
-        self.tail = ""          # tout ce qui suit la valeur (→ points_cles)
+        self._tail: List[str] = []   # tout ce qui suit la valeur (→ points_cles)
 
     # ── API publique ─────────────────────────────────────────────────────────
     @property
     def text(self) -> str:
         return "".join(self._out)
 
+    @property
+    def tail(self) -> str:
+        return "".join(self._tail)
+
     @property
     def done(self) -> bool:
         return self._state == "DONE"
@@ -81,8 +101,10 @@ class JsonStringFieldExtractor:
         """Consomme un chunk brut et retourne le markdown décodé à émettre."""
         if not chunk:
             return ""
+        if self._state == "VALUE":
+            return self._consume_value(chunk)
         if self._state == "DONE":
-            self.tail += chunk
+            self._tail.append(chunk)
             return ""
         if self._state == "SEEK":
             chunk = self._seek(chunk)
@@ -118,46 +140,215 @@ class JsonStringFieldExtractor:
         return rest
 
     def _consume_value(self, chunk: str) -> str:
-        buf = self._esc + chunk
-        self._esc = ""
+        if self._esc:
+            buf = self._esc + chunk
+            if len(buf) < self._esc_need:            # toujours incomplet
+                self._esc = buf
+                return ""
+            self._esc = ""
+        else:
+            buf = chunk
+
+        if "\\" not in buf:                         # chemin rapide : aucun échappement
+            end = buf.find('"')
+            if end >= 0:
+                self._state = "DONE"
+                self._tail.append(buf[end + 1:])
+                buf = buf[:end]
+            self._out.append(buf)
+            return buf
+
+        # Échappements : le décodeur C de `json` traite d'un bloc tout ce qui
+        # précède un éventuel échappement coupé en fin de chunk (reporté dans
+        # `_esc`) ; une séquence malformée, qu'il refuse, fait retomber sur le
+        # parcours Python.
+        n = cut = len(buf)
+        k = buf.rfind("\\", n - 6 if n > 6 else 0)
+        if k >= 0 and (k + 1 == n or (buf[k + 1] == "u" and k + 6 > n)):
+            start = k
+            while start and buf[start - 1] == "\\":
+                start -= 1
+            if not (k - start) % 2:                  # pas un `\\` échappé
+                if not k:                            # rien d'autre à décoder
+                    self._esc, self._esc_need = buf, 2 if n == 1 else 6
+                    return ""
+                cut = k
+        try:
+            decoded, end = _scanstring(buf[:cut] + '"' if cut < n else buf + '"', 0, False)
+        except ValueError:
+            decoded = self._decode_escapes_slow(buf)
+            self._out.append(decoded)
+            return decoded
+
+        if end <= cut:                               # fin de la valeur
+            self._state = "DONE"
+            self._tail.append(buf[end:])
+        else:
+            rest = buf[cut:]
+            if decoded and "\ud800" <= decoded[-1] <= "\udbff" and buf[cut - 6:cut - 4] == "\\u":
+                # Moitié haute d'une paire en fin de chunk : la basse peut suivre.
+                decoded, rest = decoded[:-1], buf[cut - 6:]
+                self._esc_need = 12 if rest[6:8] == "\\u" else 8
+            elif rest:
+                self._esc_need = 2 if rest == "\\" else 6
+            self._esc = rest
+        self._out.append(decoded)
+        return decoded
+
+    def _decode_escapes_slow(self, buf: str) -> str:
+        """Parcours d'échappement en échappement, tolérant aux séquences malformées."""
         out: List[str] = []
         i = 0
         n = len(buf)
+        search = _VALUE_SPECIAL.search
 
-        while i < n:
-            c = buf[i]
+        while True:
+            match = search(buf, i)
+            if match is None:
+                out.append(buf[i:])
+                break
+            j = match.start()
+            if j > i:
+                out.append(buf[i:j])
 
-            if c == "\\":
-                if i + 1 >= n:                       # `\` en fin de chunk
-                    self._esc = buf[i:]
-                    break
-                nxt = buf[i + 1]
-                if nxt == "u":
-                    if i + 6 > n:                    # `\uXX…` incomplet
-                        self._esc = buf[i:]
-                        break
-                    hex4 = buf[i + 2:i + 6]
-                    try:
-                        out.append(chr(int(hex4, 16)))
-                    except ValueError:               # échappement malformé
-                        out.append(buf[i:i + 6])
-                    i += 6
-                    continue
+            if buf[j] == '"':                        # fin de la valeur
+                self._state = "DONE"
+                self._tail.append(buf[j + 1:])
+                break
+
+            if j + 1 >= n:                           # `\` en fin de chunk
+                self._esc, self._esc_need = buf[j:], 2
+                break
+            nxt = buf[j + 1]
+            if nxt != "u":
                 out.append(_SIMPLE_ESCAPES.get(nxt, nxt))
-                i += 2
+                i = j + 2
                 continue
 
-            if c == '"':                             # fin de la valeur
-                self._state = "DONE"
-                self.tail = buf[i + 1:]
+            if j + 6 > n:                            # `\uXX…` incomplet
+                self._esc, self._esc_need = buf[j:], 6
                 break
+            try:
+                code = int(buf[j + 2:j + 6], 16)
+            except ValueError:                       # échappement malformé
+                out.append(buf[j:j + 6])
+                i = j + 6
+                continue
+            i = j + 6
+            if 0xD800 <= code <= 0xDBFF:             # moitié haute d'une paire
+                low = buf[i:i + 6]
+                if len(low) < 6 and "\\u".startswith(low[:2]):
+                    self._esc, self._esc_need = buf[j:], 8 if len(low) < 2 else 12
+                    break
+                if low.startswith("\\u"):
+                    try:
+                        low_code = int(low[2:], 16)
+                    except ValueError:
+                        low_code = 0
+                    if 0xDC00 <= low_code <= 0xDFFF:
+                        code = 0x10000 + ((code - 0xD800) << 10) + (low_code - 0xDC00)
+                        i += 6
+            out.append(chr(code))
 
-            out.append(c)
-            i += 1
+        return "".join(out)
 
-        decoded = "".join(out)
-        self._out.append(decoded)
-        return decoded
+
+class JsonArrayObjectExtractor:
+    """Extrait au fil de l'eau les objets complets d'un tableau JSON.
+
+    Pendant de `JsonStringFieldExtractor` pour une sortie du type
+    `{"results": [{…}, {…}]}` (ranker) : chaque objet est rendu dès que son
+    accolade fermante arrive, sans attendre la fin de la génération.
+
+    Machine à états SEEK → ARRAY → DONE. Dans ARRAY, on suit la profondeur
+    d'accolades et l'état « dans une chaîne » (guillemets échappés compris) :
+    une accolade à l'intérieur d'une `reason` ne ferme rien. Un objet
+    indécodable est ignoré — l'appelant retombe sur le parse du texte complet.
+    """
+
+    def __init__(self, field: str = "results"):
+        self._key = f'"{field}"'
+        self._state = "SEEK"
+        self._pre = ""          # buffer de recherche de la clé et du `[`
+        self._obj: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.count = 0          # objets rendus
+
+    @property
+    def done(self) -> bool:
+        return self._state == "DONE"
+
+    def feed(self, chunk: str) -> List[dict]:
+        """Consomme un chunk brut et retourne les objets complétés par ce chunk."""
+        if not chunk or self._state == "DONE":
+            return []
+        if self._state == "SEEK":
+            chunk = self._seek(chunk)
+            if chunk is None:
+                return []
+        return self._consume_array(chunk)
+
+    def _seek(self, chunk: str) -> Optional[str]:
+        """Cherche `"champ" : [` ; retourne le reste du chunk une fois trouvé."""
+        self._pre += chunk
+        idx = self._pre.find(self._key)
+        if idx < 0:
+            keep = len(self._key)
+            if len(self._pre) > keep:
+                self._pre = self._pre[-keep:]
+            return None
+        after = self._pre[idx + len(self._key):]
+        bracket = after.find("[")
+        if bracket < 0:
+            return None                  # `: [` pas encore arrivé
+        if ":" not in after[:bracket]:
+            self._pre = after[bracket + 1:]
+            return None
+        self._state = "ARRAY"
+        self._pre = ""
+        return after[bracket + 1:]
+
+    def _consume_array(self, chunk: str) -> List[dict]:
+        out: List[dict] = []
+        for c in chunk:
+            if self._depth == 0:
+                if c == "{":
+                    self._depth = 1
+                    self._obj = [c]
+                elif c == "]":
+                    self._state = "DONE"
+                    break
+                continue
+
+            self._obj.append(c)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+                continue
+            if c == '"':
+                self._in_string = True
+            elif c == "{":
+                self._depth += 1
+            elif c == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = "".join(self._obj)
+                    self._obj = []
+                    try:
+                        obj = json.loads(raw)
+                    except json.JSONDecodeError:
+                        logger.debug("Objet JSON indécodable ignoré : %r", raw[:120])
+                        continue
+                    if isinstance(obj, dict):
+                        self.count += 1
+                        out.append(obj)
+        return out
 
 
 class RedactionNormalizer:
@@ -186,6 +377,8 @@ class RedactionNormalizer:
             return ""
         self._raw.append(chunk)
 
+        if self.mode == self.MODE_JSON:                # cas courant, sans détour
+            return self._extractor.feed(chunk)
         if self.mode == self.MODE_UNKNOWN:
             self._sniff += chunk
             if len(self._sniff) < _SNIFF_CHARS and not self._looks_decidable(self._sniff):
@@ -251,7 +444,7 @@ class RedactionNormalizer:
         stripped = head.lstrip()
         if stripped.startswith("{") or self._key_in(head):
             return self.MODE_JSON
-        if re.match(r"^```(?:json)?\s*\{", stripped):
+        if _FENCED_JSON.match(stripped):
             return self.MODE_JSON
         if stripped.startswith("```json"):
             return self.MODE_JSON
@@ -263,14 +456,14 @@ class RedactionNormalizer:
     @staticmethod
     def _strip_markdown_markers(chunk: str) -> str:
         """Retire un éventuel fence ```markdown en mode passthrough."""
-        return re.sub(r"^```(?:markdown|md)?\s*\n?|\n?```\s*$", "", chunk)
+        return _MARKDOWN_MARKERS.sub("", chunk)
 
     def _points_cles(self) -> List[str]:
         """Récupère `points_cles` : depuis la queue du JSON, ou un bloc balisé."""
         if self.mode == self.MODE_JSON and self._extractor is not None:
             tail = self._extractor.tail
             if tail:
-                match = re.search(r'"points_cles"\s*:\s*(\[.*?\])', tail, re.S)
+                match = _POINTS_CLES_JSON.search(tail)
                 if match:
                     try:
                         parsed = json.loads(match.group(1))
@@ -281,7 +474,7 @@ class RedactionNormalizer:
             return []
 
         text = "".join(self._md)
-        match = re.search(r"<points_cles>(.*?)</points_cles>", text, re.S)
+        match = _POINTS_CLES_TAG.search(text)
         if not match:
             return []
         return [
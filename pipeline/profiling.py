@@ -0,0 +1,113 @@
+"""
+Profil d'une exécution du pipeline, à la demande.
+
+`profile_events` enveloppe `run_pipeline_stream` : il active un profil
+(`utils.profiler`) pour toute l'exécution, fait de chaque étape
+(`StepEvent` running → done) un span `step:<étape>` sous lequel se rangent les
+spans des appels (LLM, HTTP, extraction, parsing JSON), puis :
+
+- renseigne `PipelineResult.profile` avec le résumé (chemin critique,
+  répartition par catégorie) ;
+- enregistre le profil complet sous l'identifiant de trace, pour
+  `GET /v1/admin/profiles/{trace_id}` (export speedscope).
+
+Stockage : le magasin SQLite partagé des caches (`utils.ttl_store`), durée de
+vie `PROFILE_TTL_S`.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+from pipeline.events import PipelineEvent, ResultEvent, StepEvent
+from utils import profiler
+from utils.ttl_store import CACHE_DB_PATH, TTLStore
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PATH = os.getenv("PROFILE_PATH", CACHE_DB_PATH)
+PROFILE_TTL_S = float(os.getenv("PROFILE_TTL_S", str(24 * 3600)))
+
+_NAMESPACE = "profile"
+
+
+class ProfileStore:
+    """Profils enregistrés, par identifiant de trace."""
+
+    def __init__(self, store: TTLStore, ttl_s: float = PROFILE_TTL_S):
+        self.store = store
+        self.ttl_s = ttl_s
+
+    def save(self, profile: profiler.Profile) -> None:
+        try:
+            self.store.put(_NAMESPACE, profile.trace_id,
+                           {"summary": profile.summary(), "speedscope": profile.to_speedscope()},
+                           self.ttl_s)
+        except Exception as exc:  # un profil perdu ne doit pas casser le tour
+            logger.warning("Profil %s non enregistré : %s", profile.trace_id, exc)
+
+    def load(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """`{"summary", "speedscope"}`, ou None si absent ou expiré."""
+        entry = self.store.get(_NAMESPACE, trace_id)
+        return entry["value"] if entry else None
+
+
+_store: Optional[ProfileStore] = None
+_store_lock = threading.Lock()
+
+
+def get_profile_store() -> ProfileStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ProfileStore(TTLStore(PROFILE_PATH))
+    return _store
+
+
+def reset_profile_store() -> None:
+    """Tests uniquement."""
+    global _store
+    _store = None
+
+
+def profile_events(events: Iterator[PipelineEvent],
+                   store: Optional[ProfileStore] = None) -> Iterator[PipelineEvent]:
+    """Réémet `events` en profilant l'exécution (voir le docstring du module).
+
+    Le profil s'active au premier `next()` : le générateur enveloppé doit être
+    créé mais pas encore démarré (sa trace LLM reprend alors le profil).
+    """
+    profile: Optional[profiler.Profile] = None
+    try:
+        with profiler.profiling() as profile:
+            steps: Dict[str, profiler.Span] = {}
+            for event in events:
+                if isinstance(event, StepEvent):
+                    _on_step(profile, steps, event)
+                elif isinstance(event, ResultEvent):
+                    for span in steps.values():
+                        profile.close(span, status="unfinished")
+                    steps.clear()
+                    profile.trace_id = profile.trace_id or (event.result.trace_id or "")
+                    event.result.profile = profile.summary()
+                yield event
+    finally:
+        if profile is not None and profile.trace_id:
+            (store or get_profile_store()).save(profile)
+
+
+def _on_step(profile: profiler.Profile, steps: Dict[str, profiler.Span], event: StepEvent) -> None:
+    """Étape commencée : span ouvert, parent des appels qui suivent. Étape
+    finie : span fermé, les appels reviennent à l'étape encore ouverte (les
+    étapes peuvent se chevaucher — FiscalOnline tourne en arrière-plan)."""
+    if event.status == "running":
+        if event.step not in steps:
+            steps[event.step] = profile.open(f"step:{event.step}", "step")
+    else:
+        span = steps.pop(event.step, None)
+        if span is None:                           # étape rejouée depuis un point de reprise
+            return
+        profile.close(span, status=event.status)
+    profiler.set_parent(next(reversed(steps.values()), None))
@@ -0,0 +1,157 @@
+"""
+Cache des réponses complètes, devant `run_pipeline_stream`.
+
+Beaucoup d'abonnés posent la même question à la formulation près (retrait d'un
+PEA, conditions du pacte Dutreil…) : le pipeline complet coûte plusieurs
+minutes et une vingtaine d'appels LLM pour produire une réponse déjà rédigée la
+veille.
+
+Une entrée est identifiée par la question **normalisée** (casse, accents,
+ponctuation) et sa **portée** : domaines actifs, modèles, JusticeLibre,
+FiscalOnline — une réponse rédigée sur d'autres sources n'est pas la même
+réponse. À la recherche :
+
+1. correspondance exacte de la question normalisée ;
+2. sinon, similarité cosinus des embeddings (`utils.dense.Encoder`) au-dessus
+   d'un seuil strict, dans la même portée. Sans `sentence-transformers`, seule
+   la correspondance exacte est active.
+
+Seules les premières questions d'une conversation sont mises en cache : une
+question de suivi n'a de sens que dans son contexte.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from pipeline.analyst_cache import normalize_question, question_fingerprint
+from pipeline.core import PipelineResult
+from utils.ttl_store import CACHE_DB_PATH, TTLStore
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", CACHE_DB_PATH)
+
+_NAMESPACE = "answer"
+# Champs du PipelineResult conservés : de quoi rejouer la réponse et
+# reconstruire le contexte de conversation (pas le contenu scrapé).
+_STORED_FIELDS = ("question", "answer_text", "points_cles", "analyste", "sources",
+                  "selected_agents", "models_config", "n_sources_raw", "n_sources_kept",
+                  "fiscalonline_count")
+
+
+def answer_scope(active_domains: Optional[List[str]], models_config: Optional[Dict[str, str]],
+                 use_justicelibre: bool, use_fiscalonline: Optional[bool]) -> str:
+    """Empreinte courte de tout ce qui, hors question, change la réponse."""
+    payload = json.dumps({
+        "d": sorted(active_domains) if active_domains is not None else None,
+        "m": dict(sorted((models_config or {}).items())),
+        "jl": use_justicelibre, "fo": use_fiscalonline,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass
+class CacheHit:
+    result: PipelineResult
+    key: str
+    similarity: float          # 1.0 pour une correspondance exacte
+    age_s: float
+
+
+class AnswerCache:
+    """Cache question → `PipelineResult` (voir le docstring du module)."""
+
+    def __init__(self, store: TTLStore, ttl_s: float, min_similarity: float = 0.95,
+                 encoder=None, semantic: bool = True):
+        self.store = store
+        self.ttl_s = ttl_s
+        self.min_similarity = min_similarity
+        self._encoder = encoder
+        self._semantic = semantic
+
+    def _namespace(self, scope: str) -> str:
+        return f"{_NAMESPACE}:{scope}"
+
+    @staticmethod
+    def key(question: str) -> str:
+        return question_fingerprint(question)
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        if not self._semantic:
+            return None
+        if self._encoder is None:
+            try:
+                import sentence_transformers  # noqa: F401
+                from utils.dense import Encoder
+                self._encoder = Encoder()
+            except ImportError:
+                logger.info("Cache de réponses : sentence-transformers absent — correspondance exacte seule")
+                self._semantic = False
+                return None
+        return self._encoder.encode([normalize_question(question)])[0]
+
+    def lookup(self, question: str, scope: str) -> Optional[CacheHit]:
+        namespace = self._namespace(scope)
+        key, similarity = self.key(question), 1.0
+        entry = self.store.get(namespace, key)
+        if entry is None:
+            vector = self._embed(question)
+            if vector is None:
+                return None
+            keys, matrix = self.store.vectors(namespace)
+            if not keys:
+                return None
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.min_similarity:
+                return None
+            key, similarity = keys[best], float(scores[best])
+            entry = self.store.get(namespace, key)
+            if entry is None:
+                return None
+        result = PipelineResult(**{f: entry["value"][f] for f in _STORED_FIELDS if f in entry["value"]},
+                                scraped_context=[])
+        return CacheHit(result=result, key=key, similarity=round(similarity, 4),
+                        age_s=round(time.time() - entry["created_at"], 1))
+
+    def put(self, question: str, scope: str, result: PipelineResult) -> None:
+        data = asdict(result)
+        value = {f: data[f] for f in _STORED_FIELDS}
+        self.store.put(self._namespace(scope), self.key(question), value, self.ttl_s,
+                       vector=self._embed(question))
+
+    def invalidate(self, contains: Optional[str] = None, key: Optional[str] = None) -> int:
+        """Supprime les entrées (toutes, celles dont le contenu mentionne `contains`, ou `key`)."""
+        return self.store.delete(f"{_NAMESPACE}:", key=key, contains=contains)
+
+    def stats(self) -> Dict:
+        return {**self.store.stats(f"{_NAMESPACE}:"), "ttl_s": self.ttl_s,
+                "min_similarity": self.min_similarity, "semantic": self._semantic}
+
+
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache(ttl_s: float, min_similarity: float) -> AnswerCache:
+    """Instance partagée par le process (le fichier l'est entre workers)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache(TTLStore(ANSWER_CACHE_PATH), ttl_s, min_similarity)
+    return _cache
+
+
+def reset_answer_cache() -> None:
+    """Tests uniquement."""
+    global _cache
+    _cache = None
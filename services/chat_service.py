@@ -11,6 +11,10 @@ Décision de routage :
     contexte présent                                     → agent de suivi
         └─ necessite_nouvelle_recherche → enchaîne sur le pipeline complet
 
+Reprise (`resume_turn`) : un tour dont le pipeline complet a été interrompu
+(déconnexion) est relancé à l'identique sous le même `run_id` ; les étapes déjà
+terminées sont relues dans les points de reprise (`pipeline.checkpoints`).
+
 Le `contexte_conversation` ne quitte jamais le serveur : le front n'envoie qu'un
 `conversation_id`.
 """
@@ -20,15 +24,20 @@ import logging
 import threading
 import time
 import uuid
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from typing import Any, Dict, Iterator, List, Optional
 
+from pipeline.analyst_cache import normalize_question
+from pipeline.checkpoints import CheckpointStore, new_run_id
 from pipeline.core import PipelineResult, TraceOptions, run_pipeline_stream
 from pipeline.events import (
     AUX_STEP_LABELS, PipelineEvent, ResultEvent, SourcesEvent, StepEvent, TextDelta,
     public_sources,
 )
 from pipeline.followup import FollowUpResult, build_contexte, run_follow_up
+from pipeline.profiling import profile_events
+from services.answer_cache import AnswerCache, answer_scope
+from utils import metrics
 from utils.conversations import load_conversation, save_conversation
 
 logger = logging.getLogger(__name__)
@@ -42,6 +51,10 @@ class ConversationNotFound(Exception):
     """Conversation inexistante — ou appartenant à un autre utilisateur."""
 
 
+class RunNotFound(Exception):
+    """Exécution inconnue, expirée ou terminée — ou appartenant à un autre utilisateur."""
+
+
 # Espace de noms pour dériver un UUID stable d'un identifiant client.
 _CONVERSATION_NS = uuid.UUID("6f9b1c2e-0a4d-4f8b-9c3e-5d7a1b2c3d4e")
 
@@ -76,6 +89,16 @@ class TurnOptions:
     models_config: Optional[Dict[str, str]] = None
     auto_escalate: bool = True
     deadline_s: Optional[float] = None
+    # Cache des réponses complètes (premières questions seulement) ; None = désactivé.
+    answer_cache: Optional[AnswerCache] = None
+    # Points de reprise du pipeline complet ; None = désactivés.
+    checkpoints: Optional[CheckpointStore] = None
+    # Profile le pipeline complet (`pipeline.profiling`).
+    profile: bool = False
+
+# Options d'un tour enregistrées avec ses points de reprise (relancé à l'identique).
+_RESUMABLE_OPTIONS = ("active_domains", "use_justicelibre", "use_fiscalonline",
+                      "models_config", "deadline_s")
 
 
 @dataclass
@@ -93,6 +116,10 @@ class TurnOutcome:
     duration_s: float = 0.0
     error: Optional[str] = None
     saved: bool = False
+    cached: bool = False
+    run_id: str = ""
+    resumed: bool = False
+    profile: Optional[Dict[str, Any]] = None
 
 
 def run_turn(
@@ -104,6 +131,7 @@ def run_turn(
     options: Optional[TurnOptions] = None,
     cancel: Optional[threading.Event] = None,
     outcome: Optional[TurnOutcome] = None,
+    resume: Optional[Dict[str, Any]] = None,
 ) -> Iterator[PipelineEvent]:
     """Traite un tour de conversation et émet les événements correspondants.
 
@@ -115,6 +143,9 @@ def run_turn(
             existe (champ `conversation_id` explicite) → 404 si absente.
         outcome: objet renseigné au fil de l'eau (l'appelant le lit après le
             flux, y compris si le client s'est déconnecté).
+        resume: tour enregistré à reprendre (cf. `resume_turn`) : le suivi et
+            le cache sont court-circuités, le pipeline complet repart de ses
+            points de reprise.
 
     Raises:
         ConversationNotFound: `require_existing` et conversation introuvable
@@ -139,6 +170,16 @@ def run_turn(
     outcome = outcome if outcome is not None else TurnOutcome(conversation_id, "")
     outcome.conversation_id = conversation_id
     outcome.message_id = f"m_{uuid.uuid4().hex[:16]}"
+    outcome.run_id = outcome.run_id or new_run_id()
+    if resume is not None:
+        # Le tour interrompu a pu être persisté à moitié : il est remplacé, et
+        # le contexte est celui sur lequel il avait été lancé.
+        messages = _without_turn(messages, resume["message_id"])
+        contexte = resume["contexte"]
+        outcome.message_id = resume["message_id"]
+        outcome.run_id = resume["run_id"]
+        outcome.escalated = resume["escalated"]
+        outcome.resumed = True
 
     trace = TraceOptions(
         session_id=conversation_id,
@@ -151,10 +192,12 @@ def run_turn(
     sources: List[Dict[str, Any]] = []
     analyse: Dict = (contexte or {}).get("analyse", {})
     run_full = True
+    reuse_analysis: Optional[Dict] = None
+    analyse_question: Optional[str] = None     # question dont `analyse` est issue, si ce tour l'a produite
 
     try:
         # ── Chemin de suivi ──────────────────────────────────────────────────
-        if contexte:
+        if contexte and resume is None:
             yield StepEvent(step="suivi", label=AUX_STEP_LABELS["suivi"], status="running")
             follow: FollowUpResult = run_follow_up(
                 question, contexte,
@@ -186,14 +229,64 @@ def run_turn(
                     yield TextDelta(fragment)
             else:
                 outcome.escalated = True
+                # La question reposée telle quelle : l'analyse du contexte vaut
+                # toujours, le pipeline n'a pas à rappeler l'analyste.
+                analysed = contexte.get("analyse_question") or contexte.get("question_initial", "")
+                if analyse and normalize_question(question) == normalize_question(analysed):
+                    reuse_analysis = analyse
                 yield StepEvent(step="escalade", label=AUX_STEP_LABELS["escalade"],
                                 status="running",
                                 meta={"raison": "necessite_nouvelle_recherche"})
 
+        # ── Réponse en cache (première question d'une conversation) ─────────
+        cache = options.answer_cache if not contexte and resume is None else None
+        scope = answer_scope(options.active_domains, options.models_config,
+                             options.use_justicelibre, options.use_fiscalonline)
+        if run_full and cache is not None:
+            t_cache = time.time()
+            try:
+                hit = cache.lookup(question, scope)
+            except Exception as exc:  # le cache ne doit jamais empêcher de répondre
+                logger.warning("Cache de réponses — lecture en échec : %s", exc)
+                hit = None
+            metrics.cache_lookup("answer", hit is not None)
+            if hit is not None:
+                run_full = False
+                answer = hit.result.answer_text
+                points_cles = hit.result.points_cles
+                sources = hit.result.sources
+                analyse = hit.result.analyste
+                analyse_question = question
+                outcome.cached = True
+                yield StepEvent(step="cache", label=AUX_STEP_LABELS["cache"], status="done",
+                                elapsed_s=round(time.time() - t_cache, 2),
+                                meta={"similarite": hit.similarity, "age_s": hit.age_s})
+                yield SourcesEvent(sources=public_sources(sources))
+                for fragment in _replay(answer):
+                    if cancel is not None and cancel.is_set():
+                        break
+                    yield TextDelta(fragment)
+
         # ── Pipeline complet ─────────────────────────────────────────────────
         if run_full:
             result: Optional[PipelineResult] = None
-            for event in run_pipeline_stream(
+            checkpoints = (options.checkpoints.run(outcome.run_id)
+                           if options.checkpoints is not None else None)
+            if checkpoints is not None and resume is None:
+                try:
+                    checkpoints.save_request({
+                        "run_id": outcome.run_id, "user_email": user_email,
+                        "question": question, "conversation_id": conversation_id,
+                        "message_id": outcome.message_id, "contexte": contexte,
+                        "escalated": outcome.escalated, "analysis": reuse_analysis,
+                        "options": {k: getattr(options, k) for k in _RESUMABLE_OPTIONS},
+                    })
+                except Exception as exc:
+                    logger.warning("Tour non reprenable (%s) : %s", outcome.run_id, exc)
+                    checkpoints = None
+            if resume is not None:
+                reuse_analysis = resume.get("analysis")
+            events = run_pipeline_stream(
                 question,
                 models_config=options.models_config,
                 active_domains=options.active_domains,
@@ -203,7 +296,12 @@ def run_turn(
                 trace=trace,
                 cancel=cancel,
                 deadline_s=options.deadline_s,
-            ):
+                analysis=reuse_analysis,
+                checkpoints=checkpoints,
+            )
+            if options.profile:
+                events = profile_events(events)
+            for event in events:
                 if isinstance(event, ResultEvent):
                     result = event.result
                     continue
@@ -214,9 +312,18 @@ def run_turn(
                 points_cles = result.points_cles
                 sources = result.sources
                 analyse = result.analyste
+                analyse_question = question
                 outcome.trace_id = result.trace_id
                 outcome.cost_usd = result.total_cost_usd
                 outcome.error = result.error
+                outcome.profile = result.profile
+                if cache is not None and result.answer_text and not result.error:
+                    try:
+                        cache.put(question, scope, result)
+                    except Exception as exc:
+                        logger.warning("Cache de réponses — écriture en échec : %s", exc)
+                if checkpoints is not None and not result.error:
+                    checkpoints.clear()
 
         outcome.answer = answer
         outcome.points_cles = points_cles
@@ -237,6 +344,7 @@ def run_turn(
                 points_cles=points_cles,
                 sources=sources,
                 analyse=analyse,
+                analyse_question=analyse_question,
                 previous_contexte=contexte,
                 message_id=outcome.message_id,
                 trace_id=outcome.trace_id,
@@ -244,11 +352,50 @@ def run_turn(
             )
 
 
+def resume_turn(
+    run_id: str,
+    *,
+    user_email: str,
+    options: Optional[TurnOptions] = None,
+    cancel: Optional[threading.Event] = None,
+    outcome: Optional[TurnOutcome] = None,
+) -> Iterator[PipelineEvent]:
+    """Reprend un tour interrompu à partir de ses points de reprise.
+
+    La question, la conversation et les options sont celles du tour d'origine ;
+    seuls `checkpoints`, `auto_escalate` et `answer_cache` viennent d'`options`.
+
+    Raises:
+        RunNotFound: aucun tour reprenable sous ce `run_id` pour cet utilisateur.
+    """
+    options = options or TurnOptions()
+    request = options.checkpoints.run(run_id).load_request() if options.checkpoints else None
+    if request is None or request.get("user_email") != user_email:
+        raise RunNotFound(run_id)
+    yield from run_turn(
+        request["question"],
+        user_email=user_email,
+        conversation_id=request["conversation_id"],
+        options=replace(options, **request["options"]),
+        cancel=cancel,
+        outcome=outcome,
+        resume=request,
+    )
+
+
 # ─── Persistance ──────────────────────────────────────────────────────────────
+def _without_turn(messages: List[Dict], message_id: str) -> List[Dict]:
+    """`messages` sans le tour (question + réponse) dont la réponse porte `message_id`."""
+    for i, message in enumerate(messages):
+        if i and message.get("role") == "assistant" and message.get("id") == message_id:
+            return messages[:i - 1] + messages[i + 1:]
+    return messages
+
+
 def _persist(*, conversation_id: str, user_email: str, messages: List[Dict],
              question: str, answer: str, points_cles: List[str],
-             sources: List[Dict], analyse: Dict, previous_contexte: Optional[Dict],
-             message_id: str, trace_id: Optional[str], is_follow_up: bool) -> bool:
+             sources: List[Dict], analyse: Dict, analyse_question: Optional[str],
+             previous_contexte: Optional[Dict], message_id: str, trace_id: Optional[str], is_follow_up: bool) -> bool:
     messages = messages + [
         {"role": "user", "content": question},
         {
@@ -261,7 +408,8 @@ def _persist(*, conversation_id: str, user_email: str, messages: List[Dict],
             "is_follow_up": is_follow_up,
         },
     ]
-    contexte = build_contexte(question, answer, sources, analyse, previous_contexte)
+    contexte = build_contexte(question, answer, sources, analyse, previous_contexte,
+                              analyse_question=analyse_question)
     try:
         return save_conversation(conversation_id, messages, contexte, user_email=user_email)
     except Exception as exc:  # pragma: no cover — la persistance ne doit pas casser le tour
@@ -0,0 +1,421 @@
+"""
+Exécution détachée des tours de conversation (« jobs »).
+
+Un run complet dure plusieurs minutes ; en mode flux, il vit et meurt avec la
+connexion HTTP, et une requête qui ne trouve pas de place reçoit un 429
+immédiat. En mode job, la question est soumise, le tour s'exécute dans un pool
+borné indépendant des connexions (les soumissions en excès patientent dans une
+file, bornée elle aussi), et le client revient quand il veut :
+
+* l'état et, à la fin, la réponse complète (`JobStore.get`) ;
+* le journal des événements du tour, relu à partir de n'importe quel rang
+  (`JobStore.events`) — c'est ce qui permet de se rattacher au flux après une
+  coupure sans rien perdre.
+
+Le journal est en SQLite (WAL) : un job lancé par un worker gunicorn se suit
+depuis n'importe quel autre. L'annulation passe aussi par la base, pour la même
+raison ; le worker qui exécute le job la relève à chaque étape.
+
+Un job en cours occupe une place d'exécution comme un flux : le runner la
+prend (`slot`, fourni par l'API : `api.runner.JobSlot`) avant de démarrer le
+tour, et les jobs attendent leur tour derrière elle plutôt que de tourner à
+côté. Sans `slot` (tests, scripts), seul `JOB_WORKERS` borne l'exécution.
+
+Sans import FastAPI, comme `services.chat_service`.
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Protocol, Set, Tuple
+
+from pipeline.errors import PipelineCancelled, PipelineDeadlineExceeded
+from pipeline.events import PipelineEvent, SourcesEvent, StepEvent, TextDelta
+from services.chat_service import ConversationNotFound, TurnOutcome
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "data/jobs.sqlite")
+
+# Fragments de texte regroupés avant écriture : une ligne par fragment du
+# modèle ferait des centaines de commits par réponse pour rien.
+TEXT_FLUSH_CHARS = 200
+TEXT_FLUSH_S = 0.5
+
+TERMINAL_STATUSES = ("done", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id                TEXT PRIMARY KEY,
+    user_email        TEXT NOT NULL,
+    status            TEXT NOT NULL,          -- queued | running | done | failed | cancelled
+    question          TEXT NOT NULL,
+    conversation_id   TEXT,
+    created_at        REAL NOT NULL,
+    started_at        REAL,
+    finished_at       REAL,
+    cancel_requested  INTEGER NOT NULL DEFAULT 0,
+    outcome           TEXT,                   -- JSON (TurnOutcome) une fois terminé
+    error             TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id   TEXT NOT NULL,
+    seq      INTEGER NOT NULL,
+    payload  TEXT NOT NULL,                   -- JSON
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobQueueFull(Exception):
+    """Toutes les places d'exécution et de file d'attente sont prises."""
+
+
+class ExecutionSlot(Protocol):
+    """Place d'exécution prise par le thread du job (`api.runner.JobSlot`)."""
+
+    def acquire(self, cancelled: Callable[[], bool]) -> bool:
+        """Bloque jusqu'à l'obtention ; False si `cancelled()` devient vrai avant."""
+
+    def release(self) -> None: ...
+
+
+@dataclass
+class Job:
+    id: str
+    user_email: str
+    status: str
+    question: str
+    conversation_id: Optional[str]
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    n_events: int = 0
+    outcome: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+
+def new_job_id() -> str:
+    return f"j_{uuid.uuid4().hex[:16]}"
+
+
+def event_payload(event: PipelineEvent) -> Optional[Dict[str, Any]]:
+    """Forme journalisée d'un événement du tour (None : non journalisé)."""
+    if isinstance(event, StepEvent):
+        return {"type": "progress", **asdict(event)}
+    if isinstance(event, SourcesEvent):
+        return {"type": "sources", "sources": event.sources}
+    if isinstance(event, TextDelta):
+        return {"type": "text", "delta": event.delta}
+    return None
+
+
+class JobStore:
+    """Jobs et journaux d'événements ; une connexion SQLite par thread."""
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_id: str, user_email: str, question: str,
+               conversation_id: Optional[str]) -> Job:
+        job = Job(id=job_id, user_email=user_email, status="queued", question=question,
+                  conversation_id=conversation_id, created_at=time.time())
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO jobs (id, user_email, status, question, conversation_id, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job.id, job.user_email, job.status, job.question, job.conversation_id, job.created_at),
+        )
+        conn.commit()
+        return job
+
+    def get(self, job_id: str, user_email: Optional[str] = None) -> Optional[Job]:
+        """Job `job_id` — None s'il n'existe pas ou appartient à un autre utilisateur."""
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (user_email is not None and row["user_email"] != user_email):
+            return None
+        n_events = conn.execute("SELECT COUNT(*) FROM job_events WHERE job_id = ?",
+                                (job_id,)).fetchone()[0]
+        return Job(
+            id=row["id"], user_email=row["user_email"], status=row["status"],
+            question=row["question"], conversation_id=row["conversation_id"],
+            created_at=row["created_at"], started_at=row["started_at"],
+            finished_at=row["finished_at"], n_events=n_events,
+            outcome=json.loads(row["outcome"]) if row["outcome"] else None, error=row["error"],
+        )
+
+    def start(self, job_id: str) -> None:
+        self._update(job_id, status="running", started_at=time.time())
+
+    def finish(self, job_id: str, status: str, outcome: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> None:
+        self._update(job_id, status=status, finished_at=time.time(),
+                     outcome=json.dumps(outcome, ensure_ascii=False, default=str) if outcome else None,
+                     error=error)
+
+    def _update(self, job_id: str, **fields) -> None:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        conn = self._conn()
+        conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+        conn.commit()
+
+    def request_cancel(self, job_id: str) -> None:
+        self._update(job_id, cancel_requested=1)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        row = self._conn().execute("SELECT cancel_requested FROM jobs WHERE id = ?",
+                                   (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def append(self, job_id: str, payload: Dict[str, Any]) -> int:
+        """Ajoute un événement au journal ; rend son rang (à partir de 1)."""
+        conn = self._conn()
+        seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?",
+                           (job_id,)).fetchone()[0]
+        conn.execute("INSERT INTO job_events (job_id, seq, payload) VALUES (?, ?, ?)",
+                     (job_id, seq, json.dumps(payload, ensure_ascii=False, default=str)))
+        conn.commit()
+        return seq
+
+    def events(self, job_id: str, after: int = 0, limit: int = 500) -> List[Tuple[int, Dict[str, Any]]]:
+        """Événements de rang > `after`, dans l'ordre."""
+        rows = self._conn().execute(
+            "SELECT seq, payload FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (job_id, after, limit),
+        ).fetchall()
+        return [(row["seq"], json.loads(row["payload"])) for row in rows]
+
+    def purge(self, older_than_s: float) -> int:
+        """Supprime les jobs terminés depuis plus de `older_than_s` et leur journal."""
+        cutoff = time.time() - older_than_s
+        conn = self._conn()
+        ids = [row[0] for row in conn.execute(
+            f"SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ? "
+            f"AND status IN ({', '.join('?' for _ in TERMINAL_STATUSES)})",
+            (cutoff, *TERMINAL_STATUSES),
+        )]
+        for job_id in ids:
+            conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        conn.commit()
+        return len(ids)
+
+
+class JobRunner:
+    """Pool borné d'exécution des jobs, avec une file d'attente bornée."""
+
+    def __init__(self, store: JobStore, workers: int, queue_max: int):
+        self.store = store
+        self.workers = max(1, workers)
+        self.queue_max = max(0, queue_max)
+        self._pool = metrics.track_pool("jobs", ThreadPoolExecutor(max_workers=self.workers,
+                                                                   thread_name_prefix="job"))
+        self._cancels: Dict[str, threading.Event] = {}
+        self._started: Set[str] = set()    # jobs ayant obtenu leur place
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Jobs de ce process en cours ou en attente."""
+        with self._lock:
+            return len(self._cancels)
+
+    def submit(
+        self,
+        job_id: str,
+        make_iterator: Callable[[threading.Event], Iterator[PipelineEvent]],
+        outcome: TurnOutcome,
+        slot: Optional[ExecutionSlot] = None,
+    ) -> int:
+        """Place le job en file ; rend sa position d'attente (0 = exécuté tout de suite).
+
+        `slot` : place d'exécution à obtenir avant de démarrer le tour ; la
+        position ne compte que la file de ce pool.
+
+        Raises:
+            JobQueueFull: plus aucune place, ni d'exécution ni d'attente.
+        """
+        with self._lock:
+            if len(self._cancels) >= self.workers + self.queue_max:
+                raise JobQueueFull()
+            cancel = threading.Event()
+            self._cancels[job_id] = cancel
+            position = max(0, len(self._cancels) - self.workers)
+        # Contexte de la requête (request_id, utilisateur) repris dans les logs du job.
+        ctx = contextvars.copy_context()
+        self._pool.submit(ctx.run, self._run, job_id, make_iterator, outcome, cancel, slot)
+        return position
+
+    def cancel(self, job_id: str) -> None:
+        self.store.request_cancel(job_id)
+        with self._lock:
+            cancel = self._cancels.get(job_id)
+        if cancel is not None:
+            cancel.set()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Arrêt : les jobs en cours finissent (`wait`), ceux en file sont abandonnés
+        — y compris ceux qui attendent leur place d'exécution."""
+        with self._lock:
+            self._stopping = True
+            for job_id, cancel in self._cancels.items():
+                if not wait or job_id not in self._started:
+                    cancel.set()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        with self._lock:
+            abandoned, self._cancels = list(self._cancels), {}
+        for job_id in abandoned:
+            self.store.finish(job_id, "failed", error="service_stopped")
+
+    def _run(self, job_id: str, make_iterator, outcome: TurnOutcome,
+             cancel: threading.Event, slot: Optional[ExecutionSlot] = None) -> None:
+        def _cancelled() -> bool:
+            return cancel.is_set() or self.store.cancel_requested(job_id)
+
+        admitted = False
+        try:
+            if not _cancelled():
+                admitted = slot.acquire(_cancelled) if slot is not None else True
+            if not admitted:
+                if self._stopping:
+                    self.store.finish(job_id, "failed", error="service_stopped")
+                else:
+                    self.store.finish(job_id, "cancelled")
+                return
+            with self._lock:
+                self._started.add(job_id)
+            self.store.start(job_id)
+            self._execute(job_id, make_iterator, outcome, cancel)
+        except Exception:  # pragma: no cover — le job ne doit jamais rester « running »
+            logger.exception("Job %s — échec inattendu", job_id)
+            self.store.finish(job_id, "failed", error="internal_error")
+        finally:
+            if admitted and slot is not None:
+                slot.release()
+            with self._lock:
+                self._cancels.pop(job_id, None)
+                self._started.discard(job_id)
+
+    def _execute(self, job_id: str, make_iterator, outcome: TurnOutcome,
+                 cancel: threading.Event) -> None:
+        text, text_since = "", time.time()
+
+        def _flush() -> None:
+            nonlocal text
+            if text:
+                self.store.append(job_id, {"type": "text", "delta": text})
+                text = ""
+
+        iterator = make_iterator(cancel)
+        try:
+            for event in iterator:
+                if isinstance(event, TextDelta):
+                    if not text:
+                        text_since = time.time()
+                    text += event.delta
+                    if len(text) >= TEXT_FLUSH_CHARS or time.time() - text_since >= TEXT_FLUSH_S:
+                        _flush()
+                    continue
+                payload = event_payload(event)
+                if payload is None:
+                    continue
+                _flush()
+                self.store.append(job_id, payload)
+                # Annulation demandée depuis un autre worker : relevée à chaque étape.
+                if isinstance(event, StepEvent) and self.store.cancel_requested(job_id):
+                    cancel.set()
+            _flush()
+        except PipelineCancelled:
+            _flush()
+            self.store.append(job_id, {"type": "error", "code": "cancelled",
+                                       "message": "Job annulé."})
+            self.store.finish(job_id, "cancelled", outcome=asdict(outcome))
+            return
+        except PipelineDeadlineExceeded:
+            _flush()
+            self.store.append(job_id, {"type": "error", "code": "pipeline_timeout",
+                                       "message": "Le traitement a dépassé le temps imparti."})
+            self.store.finish(job_id, "failed", outcome=asdict(outcome), error="pipeline_timeout")
+            return
+        except ConversationNotFound:
+            self.store.append(job_id, {"type": "error", "code": "not_found",
+                                       "message": "Conversation introuvable."})
+            self.store.finish(job_id, "failed", error="not_found")
+            return
+        finally:
+            iterator.close()
+
+        if cancel.is_set() and not outcome.answer:
+            status = "cancelled"
+        elif outcome.error and not outcome.answer:
+            status = "failed"
+        else:
+            status = "done"
+        if outcome.error:
+            self.store.append(job_id, {"type": "error", "code": "pipeline_failed",
+                                       "message": outcome.error})
+        self.store.append(job_id, {"type": "result", "status": status, **asdict(outcome)})
+        self.store.finish(job_id, status, outcome=asdict(outcome),
+                          error="pipeline_failed" if status == "failed" else None)
+
+
+_store: Optional[JobStore] = None
+_runner: Optional[JobRunner] = None
+_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    global _store
+    with _lock:
+        if _store is None:
+            _store = JobStore(JOBS_DB_PATH)
+    return _store
+
+
+def get_job_runner(workers: int, queue_max: int) -> JobRunner:
+    """Pool partagé par le process (créé au premier job)."""
+    global _runner
+    store = get_job_store()
+    with _lock:
+        if _runner is None:
+            _runner = JobRunner(store, workers, queue_max)
+    return _runner
+
+
+def shutdown_job_runner(wait: bool = True) -> None:
+    global _runner
+    with _lock:
+        runner, _runner = _runner, None
+    if runner is not None:
+        runner.shutdown(wait=wait)
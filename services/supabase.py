@@ -7,26 +7,32 @@ par requête. Ici le client est mis en cache pour la durée du process.
 
 `reset_supabase_client()` existe pour les tests (et pour recharger après une
 rotation de secrets sans redémarrer).
+
+Le SDK n'est importé qu'à la création du client : préchauffée au démarrage du
+worker (`api/warmup.py`), elle ne pèse plus sur l'import de `api.main`.
 """
 import logging
 from functools import lru_cache
-from typing import Optional
-
-from supabase import Client, create_client
+from typing import TYPE_CHECKING, Optional
 
 from utils.api_keys import get_supabase_config
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 logger = logging.getLogger(__name__)
 
 
 @lru_cache(maxsize=1)
-def get_supabase_client() -> Optional[Client]:
+def get_supabase_client() -> Optional["Client"]:
     """Retourne le client Supabase partagé, ou None si non configuré."""
     url, key = get_supabase_config()
     if not url or not key:
         logger.warning("Supabase non configuré (SUPABASE_URL / SUPABASE_KEY manquants).")
         return None
     try:
+        from supabase import create_client
+
         return create_client(url, key)
     except Exception as exc:
         logger.error("Supabase — création du client échouée : %s", exc)
@@ -9,6 +9,7 @@ qualité des réponses (c'est le rôle de `eval/`).
 from __future__ import annotations
 
 import os
+import tempfile
 from typing import Dict, List, Optional
 
 import pytest
@@ -20,6 +21,14 @@ os.environ.setdefault("LOG_LEVEL", "WARNING")
 os.environ.setdefault("OPENAI_API_KEY", "sk-test")
 os.environ.setdefault("GOOGLE_API_KEY", "goog-test")
 os.environ.setdefault("SERPAPI_API_KEY", "serp-test")
+# Pas de préchauffage : la plomberie HTTP se teste sans importer litellm & co.
+os.environ.setdefault("PREWARM", "off")
+# Caches et points de reprise hors de l'arborescence du dépôt.
+_TMP = tempfile.mkdtemp(prefix="fisca-tests-")
+os.environ.setdefault("CACHE_DB_PATH", os.path.join(_TMP, "cache.sqlite"))
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(_TMP, "jobs.sqlite"))
+os.environ.setdefault("SHARED_STATE_PATH", os.path.join(_TMP, "shared_state.sqlite"))
+os.environ.setdefault("METRICS_PATH", os.path.join(_TMP, "metrics.sqlite"))
 
 API_KEY = "secret-de-test"
 USER_A = {"X-API-Key": API_KEY, "X-User-Email": "a@fiscalonline.fr"}
@@ -143,12 +152,14 @@ def client(monkeypatch):
     from api.deps import reset_rate_limiter
     from api.main import create_app
     from api.settings import reset_settings
+    from utils.shared_state import reset_shared_state
     import api.runner as runner
 
     reset_settings()
     reset_rate_limiter()
+    reset_shared_state()
     runner._pool = None
-    runner._slots = None
+    runner._admission = None
 
     # raise_server_exceptions=False : on veut observer la réponse HTTP réellement
     # produite par le handler d'exception, pas voir l'exception remonter dans le test.
@@ -0,0 +1,84 @@
+"""Contrôle d'admission : file bornée, priorités, équité entre utilisateurs."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from api.admission import PRIORITY_FOLLOW_UP, PRIORITY_FULL_RUN, AdmissionController, QueueFull
+
+from tests.conftest import USER_A, frames_of_type, sse_frames
+
+
+def test_suivis_d_abord_puis_tourniquet_entre_utilisateurs():
+    async def scenario():
+        admission = AdmissionController(capacity=1, max_queue=10)
+        running = await admission.enqueue("a", PRIORITY_FULL_RUN)
+        a1 = await admission.enqueue("a", PRIORITY_FULL_RUN)
+        a2 = await admission.enqueue("a", PRIORITY_FULL_RUN)
+        b1 = await admission.enqueue("b", PRIORITY_FULL_RUN)
+        c1 = await admission.enqueue("c", PRIORITY_FOLLOW_UP)
+        assert running.granted and admission.depth == 4
+        assert [admission.position(t) for t in (c1, a1, b1, a2)] == [1, 2, 3, 4]
+
+        served, current = [], running
+        for _ in range(4):
+            admission.release(current)
+            current = next(t for t in (a1, a2, b1, c1) if t.granted and t not in served)
+            served.append(current)
+        return served, (a1, a2, b1, c1), admission
+
+    served, (a1, a2, b1, c1), admission = asyncio.run(scenario())
+    assert served == [c1, a1, b1, a2]
+    assert admission.stats()["admitted"] == 5
+
+
+def test_file_pleine_et_abandon():
+    async def scenario():
+        admission = AdmissionController(capacity=1, max_queue=2)
+        await admission.enqueue("a")
+        first, second = await admission.enqueue("b"), await admission.enqueue("c")
+        with pytest.raises(QueueFull):
+            await admission.enqueue("d")
+        admission.abandon(first, timed_out=True)          # client parti ou attente dépassée
+        assert admission.position(second) == 1
+        assert await admission.wait(second, 0.01) is False
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["queue_depth"] == 1
+    assert stats["rejected"] == 1 and stats["timed_out"] == 1
+
+
+def test_l_attente_est_levee_a_la_liberation():
+    async def scenario():
+        admission = AdmissionController(capacity=1, max_queue=5, service_s=60.0)
+        running = await admission.enqueue("a")
+        queued = await admission.enqueue("b")
+        assert admission.eta_s(queued) == 60.0
+        asyncio.get_running_loop().call_later(0.01, admission.release, running)
+        return await admission.wait(queued, 1.0), admission
+
+    granted, admission = asyncio.run(scenario())
+    assert granted is True
+    assert admission.in_use == 1 and admission.depth == 0
+
+
+def test_le_flux_annonce_le_rang_puis_abandonne_apres_l_attente_maximale(
+        client, store, fake_pipeline, monkeypatch):
+    import api.runner as runner
+    from api.settings import get_settings
+
+    monkeypatch.setattr(get_settings(), "admission_wait_timeout_s", 0.2)
+    runner._admission = AdmissionController(capacity=1, max_queue=5)
+    runner._admission.in_use = 1                  # place occupée par un autre run
+
+    r = client.post("/v1/chat", json={"message": "q"}, headers=USER_A)
+    assert r.status_code == 200                   # le flux est ouvert, la requête attend
+    frames = sse_frames(r.text)
+    queued = [f for f in frames_of_type(frames, "data-progress") if f["data"]["step"] == "file"]
+    assert queued[0]["data"]["meta"]["position"] == 1
+    assert "eta_s" in queued[0]["data"]["meta"]
+    assert frames_of_type(frames, "error")[0]["errorCode"] == "capacity_exceeded"
+    assert fake_pipeline == []
+    assert runner._admission.depth == 0 and runner._admission.stats()["timed_out"] == 1
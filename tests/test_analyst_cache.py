@@ -0,0 +1,88 @@
+"""Cache de l'analyste et réutilisation de l'analyse à l'escalade."""
+from __future__ import annotations
+
+from pipeline.analyst_cache import AnalystCache, normalize_question
+from pipeline.followup import build_contexte
+from utils.ttl_store import TTLStore
+
+from tests.conftest import USER_A
+
+
+def _cache(tmp_path, ttl_s=3600):
+    return AnalystCache(TTLStore(str(tmp_path / "cache.sqlite")), ttl_s=ttl_s)
+
+
+def test_normalisation_ignore_casse_accents_et_ponctuation():
+    assert normalize_question("  Quel est le TAUX de TVA ?") == normalize_question("quel est le taux de tva")
+    assert normalize_question("Plus-value à 30 %") == "plus value a 30 %"
+
+
+def test_analyse_relue_pour_la_meme_question(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("Quel taux de TVA pour des travaux ?", "gemini", '{"axes": ["tva"]}', {"axes": ["tva"]})
+
+    hit = cache.get("quel taux de tva pour des travaux", "gemini")
+    assert hit is not None
+    assert hit.analyst_json == {"axes": ["tva"]}
+    assert hit.raw == '{"axes": ["tva"]}'
+    # Autre modèle d'analyste : autre entrée.
+    assert cache.get("Quel taux de TVA pour des travaux ?", "claude") is None
+
+
+def test_analyse_illisible_non_conservee(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("question", "gemini", "pas du JSON", {})
+    assert cache.get("question", "gemini") is None
+
+
+def test_entree_expiree_ignoree(tmp_path):
+    cache = _cache(tmp_path, ttl_s=-1)
+    cache.put("question", "gemini", "{}", {"axes": []})
+    assert cache.get("question", "gemini") is None
+
+
+def test_invalidation_par_contenu(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("pacte Dutreil", "gemini", "{}", {"axes": ["dutreil"]})
+    cache.put("taux de TVA", "gemini", "{}", {"axes": ["tva"]})
+    assert cache.invalidate(contains="dutreil") == 1
+    assert cache.get("taux de TVA", "gemini") is not None
+
+
+def test_contexte_retient_la_question_analysee():
+    premier = build_contexte("Question A ?", "réponse", [], {"axes": ["a"]}, analyse_question="Question A ?")
+    suivi = build_contexte("Et pour B ?", "réponse", [], {"axes": ["a"]}, premier)
+    assert suivi["analyse_question"] == "Question A ?"
+
+
+def test_escalade_sur_la_meme_question_reutilise_l_analyse(client, store, fake_pipeline, fake_followup):
+    r = client.post("/v1/chat/sync", headers=USER_A, json={"message": "Quel taux de TVA ?"})
+    conversation_id = r.json()["conversation_id"]
+    assert fake_pipeline[0]["analysis"] is None
+
+    fake_followup(answer_text="", points_cles=[], necessite_nouvelle_recherche=True, trace_id="t")
+    client.post("/v1/chat/sync", headers=USER_A,
+                json={"message": "quel taux de TVA", "conversation_id": conversation_id})
+    assert fake_pipeline[1]["analysis"] == {"axes": ["tva"]}
+
+    client.post("/v1/chat/sync", headers=USER_A,
+                json={"message": "Et pour un local commercial ?", "conversation_id": conversation_id})
+    assert fake_pipeline[2]["analysis"] is None
+
+
+def test_l_evaluation_n_utilise_pas_le_cache_de_l_analyste(tmp_path, monkeypatch):
+    """Comparaison de configs : chacune paie son analyste (coût, latence)."""
+    from types import SimpleNamespace
+
+    import eval.cache as eval_cache
+
+    appels = []
+
+    def _run_pipeline(question, models_config, **kwargs):
+        appels.append(kwargs)
+        return SimpleNamespace(error="non mis en cache", answer_text="")
+
+    monkeypatch.setattr(eval_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(eval_cache, "run_pipeline", _run_pipeline)
+    eval_cache.run_pipeline_cached("Quel taux de TVA ?", {})
+    assert appels[0]["use_analyst_cache"] is False
@@ -0,0 +1,103 @@
+"""
+Cache des réponses complètes : identité de question, portée, durée de vie,
+invalidation, et service par `/v1/chat` sans relancer le pipeline.
+"""
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+import services.answer_cache as answer_cache
+from pipeline.core import PipelineResult
+from services.answer_cache import AnswerCache, answer_scope, normalize_question
+from tests.conftest import USER_A, USER_B, frames_of_type, meta_of, sse_frames, streamed_text
+from utils.ttl_store import TTLStore
+
+ADMIN = {"X-Admin-Key": "admin-de-test"}
+
+
+class _FauxEncodeur:
+    """Deux questions « proches » partagent le même vecteur."""
+
+    def encode(self, texts):
+        return np.array([[1.0, 0.0] if "pea" in t else [0.0, 1.0] for t in texts], dtype=np.float32)
+
+
+def _resultat(question="Retrait d'un PEA ?"):
+    return PipelineResult(question=question, answer_text="Le plan est clos.", points_cles=["5 ans"],
+                          analyste={}, sources=[{"title": "BOI-RPPM-RCM-40-50", "url": "https://bofip.impots.gouv.fr/x"}],
+                          scraped_context=["contenu lourd"], selected_agents=["AGENT_PARTICULIERS_REVENUS"])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnswerCache(TTLStore(str(tmp_path / "cache.sqlite")), ttl_s=3600, min_similarity=0.95,
+                       encoder=_FauxEncodeur())
+
+
+def test_normalisation_de_la_question():
+    assert normalize_question("Retrait d’un PEA avant 5 ANS ?") == normalize_question("retrait d'un pea avant 5 ans")
+
+
+def test_correspondance_exacte_puis_semantique(cache):
+    scope = answer_scope(None, None, True, None)
+    cache.put("Retrait d'un PEA ?", scope, _resultat())
+
+    hit = cache.lookup("retrait d’un PEA", scope)
+    assert hit.similarity == 1.0
+    assert hit.result.answer_text == "Le plan est clos."
+    assert hit.result.scraped_context == []          # le contenu scrapé n'est pas conservé
+
+    assert cache.lookup("Que se passe-t-il si je retire de mon PEA ?", scope).similarity == pytest.approx(1.0)
+    assert cache.lookup("Taux de TVA sur les travaux", scope) is None
+    # Autre portée (domaines) : pas la même réponse.
+    assert cache.lookup("Retrait d'un PEA ?", answer_scope(["legifrance.gouv.fr"], None, True, None)) is None
+
+
+def test_expiration_et_invalidation(cache, tmp_path):
+    scope = answer_scope(None, None, True, None)
+    expire = AnswerCache(cache.store, ttl_s=-1, encoder=_FauxEncodeur())
+    expire.put("Retrait d'un PEA ?", scope, _resultat())
+    assert cache.lookup("Retrait d'un PEA ?", scope) is None
+
+    cache.put("Retrait d'un PEA ?", scope, _resultat())
+    assert cache.invalidate(contains="boi-rppm-rcm") == 1
+    assert cache.lookup("Retrait d'un PEA ?", scope) is None
+
+
+@pytest.fixture
+def cache_actif(monkeypatch, tmp_path):
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "true")
+    monkeypatch.setenv("ADMIN_API_SECRET", ADMIN["X-Admin-Key"])
+    monkeypatch.setattr(answer_cache, "ANSWER_CACHE_PATH", str(tmp_path / "cache.sqlite"))
+    answer_cache.reset_answer_cache()
+    yield
+    answer_cache.reset_answer_cache()
+
+
+def test_question_repetee_servie_depuis_le_cache(cache_actif, client, store, fake_pipeline):
+    premier = sse_frames(client.post("/v1/chat", json={"message": "Quel taux de TVA ?"}, headers=USER_A).text)
+    assert meta_of(premier)["cached"] is False
+
+    second = sse_frames(client.post("/v1/chat", json={"message": "quel taux de tva"}, headers=USER_B).text)
+    assert len(fake_pipeline) == 1
+    assert meta_of(second)["cached"] is True
+    assert streamed_text(second) == streamed_text(premier)
+    assert frames_of_type(second, "data-sources")
+    assert meta_of(second)["saved"] is True           # la conversation est bien créée
+
+    # Réponse fraîche demandée explicitement.
+    client.post("/v1/chat", json={"message": "Quel taux de TVA ?", "options": {"use_answer_cache": False}},
+                headers=USER_A)
+    assert len(fake_pipeline) == 2
+
+
+def test_invalidation_par_l_administration(cache_actif, client, store, fake_pipeline):
+    client.post("/v1/chat", json={"message": "Quel taux de TVA ?"}, headers=USER_A)
+    assert client.delete("/v1/admin/answer-cache", headers=USER_A).status_code == 401
+    assert client.get("/v1/admin/answer-cache", headers=ADMIN).json()["entries"] == 1
+
+    r = client.delete("/v1/admin/answer-cache", params={"contains": "bofip.impots.gouv.fr/x"}, headers=ADMIN)
+    assert r.json() == {"deleted": 1}
+    client.post("/v1/chat", json={"message": "Quel taux de TVA ?"}, headers=USER_A)
+    assert len(fake_pipeline) == 2
@@ -6,6 +6,9 @@ propriétés que l'évaluation ne couvre pas et dont dépend la mise en producti
 """
 from __future__ import annotations
 
+import asyncio
+import time
+
 import pytest
 
 from tests.conftest import (
@@ -146,6 +149,49 @@ def test_le_texte_streame_est_du_markdown_pas_du_json(client, store, fake_pipeli
     assert not text.lstrip().startswith("{")
 
 
+def _relay(make_iterator, coalescing):
+    """(instant de réception, événement) relayés par `stream_events`."""
+    from api.runner import stream_events
+
+    async def _collect():
+        t0, out = time.perf_counter(), []
+        async for event in stream_events(make_iterator, coalescing):
+            if event is not None:
+                out.append((time.perf_counter() - t0, event))
+        return out
+    return asyncio.run(_collect())
+
+
+def test_les_fragments_de_texte_sont_regroupes_dans_l_ordre(client):
+    from api.runner import Coalescing
+    from pipeline.events import TextDelta, step_finished
+
+    def make_iterator(cancel):
+        for i in range(300):
+            yield TextDelta(f"{i % 10}")
+        yield step_finished("redaction", 1.0)
+
+    events = [e for _, e in _relay(make_iterator, Coalescing(max_chars=64, max_delay_s=0.05))]
+    deltas = [e for e in events if isinstance(e, TextDelta)]
+    assert "".join(d.delta for d in deltas) == "0123456789" * 30
+    assert len(deltas) <= 300 // 64 + 1
+    assert events[-1].step == "redaction"               # après tout le texte
+
+
+def test_un_lot_incomplet_part_pendant_une_pause_du_fournisseur(client):
+    from api.runner import Coalescing
+    from pipeline.events import TextDelta
+
+    def make_iterator(cancel):
+        yield TextDelta("Le taux ")
+        time.sleep(0.4)                                 # fournisseur muet
+        yield TextDelta("est de 20 %.")
+
+    events = _relay(make_iterator, Coalescing(max_chars=1024, max_delay_s=0.05))
+    assert [e.delta for _, e in events] == ["Le taux ", "est de 20 %."]
+    assert events[0][0] < 0.3                           # sans attendre le fragment suivant
+
+
 def test_les_sources_ne_contiennent_jamais_le_contenu_scrape(client, store, fake_pipeline):
     frames = sse_frames(client.post(CHAT, json={"message": "q"}, headers=USER_A).text)
     for frame in frames_of_type(frames, "data-sources"):
@@ -270,16 +316,13 @@ def test_chat_sync_rend_la_reponse_complete(client, store, fake_pipeline):
 
 # ─── Capacité ─────────────────────────────────────────────────────────────────
 def test_au_dela_de_la_capacite_le_service_repond_429(client, store, monkeypatch):
-    """Les places sont bornées : la requête en trop est refusée proprement,
-    pas mise en file jusqu'au timeout du navigateur."""
-    import asyncio
-
+    """Places et file d'attente bornées : la requête en trop est refusée
+    proprement, pas mise en file jusqu'au timeout du navigateur."""
     import api.runner as runner
-    from api.settings import get_settings
+    from api.admission import AdmissionController
 
-    settings = get_settings()
-    monkeypatch.setattr(settings, "slot_acquire_timeout_s", 0.05)
-    runner._slots = asyncio.Semaphore(0)          # toutes les places occupées
+    runner._admission = AdmissionController(capacity=1, max_queue=0)
+    runner._admission.in_use = 1                  # toutes les places occupées, file nulle
 
     r = client.post(CHAT, json={"message": "q"}, headers=USER_A)
     assert r.status_code == 429
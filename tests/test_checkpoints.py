@@ -0,0 +1,133 @@
+"""Points de reprise : un pipeline interrompu repart de sa dernière étape terminée."""
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from pipeline.checkpoints import CheckpointStore, get_checkpoint_store
+from pipeline.errors import PipelineCancelled
+from pipeline.events import ResultEvent, StepEvent
+from utils.ttl_store import TTLStore
+
+from tests.conftest import USER_A, USER_B, frames_of_type, meta_of, sse_frames
+
+RESUME = "/v1/chat/resume"
+
+
+@pytest.fixture
+def agents(monkeypatch):
+    """Agents du pipeline réel remplacés par des réponses fixes ; compte les appels."""
+    import pipeline.core as core
+
+    calls = {"analyste": 0, "ranker": 0, "redactionnel": 0}
+
+    def _analyste(*_a, **_k):
+        calls["analyste"] += 1
+        return '{"axes_de_recherche_serp": ["taux TVA travaux"]}'
+
+    def _ranker(question, unique, *_a, **_k):
+        calls["ranker"] += 1
+        return [{**doc, "keep": True, "score": 0.9} for doc in unique]
+
+    def _redactionnel(*_a, **_k):
+        calls["redactionnel"] += 1
+        return '{"reponse_redigee": "Le taux est de 10 %.", "points_cles": []}'
+
+    monkeypatch.setattr(core, "get_api_keys", lambda: ("sk", "goog", "serp"))
+    monkeypatch.setattr(core, "agent_analyste", _analyste)
+    monkeypatch.setattr(core, "agent_orchestrateur",
+                        lambda *_a, **_k: '{"selected_agents": ["AGENT_TVA_INDIRECTES"]}')
+    monkeypatch.setitem(core.AGENT_FUNCTIONS, "AGENT_TVA_INDIRECTES", lambda *_a, **_k: "Taux réduit.")
+    monkeypatch.setattr(core, "agent_verificateur", lambda *_a, **_k: '{"tva": ["article 279-0 bis CGI"]}')
+    monkeypatch.setattr(core, "agent_generaliste", lambda *_a, **_k: ["taux TVA travaux"])
+    monkeypatch.setattr(core, "generate_jurisprudence_dork", lambda *_a, **_k: "[]")
+    monkeypatch.setattr(core, "search_with_fallback", lambda *_a, **_k: [
+        {"url": "https://bofip.impots.gouv.fr/bofip/1", "title": "BOI-TVA-LIQ-30-20-90",
+         "content": "Taux de 10 % pour les travaux."},
+    ])
+    monkeypatch.setattr(core, "speculative_candidates", lambda *_a, **_k: [])
+    monkeypatch.setattr(core, "agent_ranker", _ranker)
+    monkeypatch.setattr(core, "agent_redactionnel", _redactionnel)
+    return calls
+
+
+def _run(checkpoints, cancel=None):
+    from pipeline.core import run_pipeline_stream
+
+    return run_pipeline_stream(
+        "Quel taux de TVA pour des travaux ?", stream_redaction=False, use_justicelibre=False,
+        use_fiscalonline=False, use_passages=False, use_analyst_cache=False,
+        checkpoints=checkpoints, cancel=cancel,
+    )
+
+
+def test_reprise_apres_interruption_sans_rappeler_les_agents(tmp_path, agents):
+    checkpoints = CheckpointStore(TTLStore(str(tmp_path / "cache.sqlite")), ttl_s=3600).run("r_test")
+    cancel = threading.Event()
+    with pytest.raises(PipelineCancelled):
+        for event in _run(checkpoints, cancel):
+            if isinstance(event, StepEvent) and event.step == "ranking" and event.status == "done":
+                cancel.set()                         # déconnexion juste après le ranking
+    assert agents == {"analyste": 1, "ranker": 1, "redactionnel": 0}
+
+    events = list(_run(checkpoints))
+    assert agents == {"analyste": 1, "ranker": 1, "redactionnel": 1}
+    repris = [e.step for e in events if isinstance(e, StepEvent) and e.meta.get("resumed")]
+    assert repris == ["analyse", "routage", "specialistes", "verification", "requetes",
+                      "jurisprudence", "recherche", "ranking"]
+    result = events[-1].result
+    assert isinstance(events[-1], ResultEvent)
+    assert result.answer_text == "Le taux est de 10 %."
+    assert result.analyste == {"axes_de_recherche_serp": ["taux TVA travaux"]}
+
+
+def test_le_flux_annonce_son_run_id(client, store, fake_pipeline):
+    frames = sse_frames(client.post("/v1/chat", json={"message": "q"}, headers=USER_A).text)
+    runs = frames_of_type(frames, "data-run")
+    assert runs and runs[0]["data"]["run_id"].startswith("r_")
+    assert fake_pipeline[0]["checkpoints"].run_id == runs[0]["data"]["run_id"]
+
+
+def test_le_tour_synchrone_n_ecrit_pas_de_points_de_reprise(client, store, fake_pipeline):
+    """Sans `run_id` rendu, `/v1/chat/sync` ne peut pas être repris."""
+    assert client.post("/v1/chat/sync", json={"message": "q"}, headers=USER_A).status_code == 200
+    assert fake_pipeline[0]["checkpoints"] is None
+
+
+def _interrupted_run(run_id: str, conversation_id: str, user_email: str = "a@fiscalonline.fr"):
+    get_checkpoint_store(3600).run(run_id).save_request({
+        "run_id": run_id, "user_email": user_email, "question": "Quel taux de TVA ?",
+        "conversation_id": conversation_id, "message_id": "m_interrompu", "contexte": None,
+        "escalated": False, "analysis": None,
+        "options": {"active_domains": None, "use_justicelibre": False, "use_fiscalonline": None,
+                    "models_config": None, "deadline_s": None},
+    })
+
+
+def test_reprise_rejoue_le_tour_et_remplace_la_reponse_partielle(client, store, fake_pipeline):
+    cid = "5b0f3f8e-6a44-4c39-9d0e-2f0c1a7b9e11"
+    store.save(cid, [{"role": "user", "content": "Quel taux de TVA ?"},
+                     {"role": "assistant", "content": "## En rés", "id": "m_interrompu"}],
+               None, user_email="a@fiscalonline.fr")
+    _interrupted_run("r_interrompu", cid)
+
+    frames = sse_frames(client.post(RESUME, json={"run_id": "r_interrompu"}, headers=USER_A).text)
+    meta = meta_of(frames)
+    assert meta["resumed"] is True
+    assert meta["message_id"] == "m_interrompu"
+    call = fake_pipeline[-1]
+    assert call["question"] == "Quel taux de TVA ?"
+    assert call["use_justicelibre"] is False
+    messages = store.rows[cid]["messages"]
+    assert [m["role"] for m in messages] == ["user", "assistant"]
+    assert messages[1]["content"].startswith("## En résumé")
+    # Tour abouti : plus rien à reprendre.
+    assert client.post(RESUME, json={"run_id": "r_interrompu"}, headers=USER_A).status_code == 404
+
+
+def test_reprise_reservee_a_son_auteur(client, store, fake_pipeline):
+    _interrupted_run("r_autrui", "5b0f3f8e-6a44-4c39-9d0e-2f0c1a7b9e12")
+    assert client.post(RESUME, json={"run_id": "r_autrui"}, headers=USER_B).status_code == 404
+    assert client.post(RESUME, json={"run_id": "r_inconnu"}, headers=USER_A).status_code == 404
+    assert fake_pipeline == []
@@ -0,0 +1,92 @@
+"""
+Corpus local : ingestion LEGI / BOFiP, recherche plein texte, lecture par URL.
+
+Les fixtures reproduisent la structure des publications réelles (article LEGI
+XML rangé sous le LEGITEXT du code, export BOFiP CSV à `;`) en miniature.
+"""
+from __future__ import annotations
+
+import pytest
+
+import utils.corpus as corpus
+from utils.corpus_ingest import build_corpus
+
+CGI = "LEGITEXT000006069577"
+
+ARTICLE_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<ARTICLE>
+<META><META_COMMUN><ID>{id}</ID><NATURE>Article</NATURE></META_COMMUN>
+<META_SPEC><META_ARTICLE><NUM>{num}</NUM><ETAT>{etat}</ETAT><DATE_DEBUT>2024-01-01</DATE_DEBUT>
+</META_ARTICLE></META_SPEC></META>
+<CONTEXTE><TEXTE cid="{cid}"><TITRE_TXT>Code général des impôts</TITRE_TXT></TEXTE></CONTEXTE>
+<BLOC_TEXTUEL><CONTENU><p>{texte}</p></CONTENU></BLOC_TEXTUEL>
+</ARTICLE>"""
+
+BOFIP_CSV = (
+    "identifiant_juridique;titre;permalien;debut_de_validite;contenu\n"
+    "BOI-RPPM-RCM-40-50-20240110;RPPM - Plan d'épargne en actions;"
+    "https://bofip.impots.gouv.fr/bofip/5360-PGP.html/identifiant=BOI-RPPM-RCM-40-50-20240110;"
+    "2024-01-10;\"<p>10</p><p>Un retrait du plan d'épargne en actions avant cinq ans "
+    "entraîne la clôture du plan.</p>\"\n"
+)
+
+
+def _article(tmp_path, art_id, num, texte, etat="VIGUEUR", cid=CGI):
+    d = tmp_path / "legi" / "code_en_vigueur" / cid / "article" / "LEGI" / "ARTI"
+    d.mkdir(parents=True, exist_ok=True)
+    (d / f"{art_id}.xml").write_text(
+        ARTICLE_XML.format(id=art_id, num=num, texte=texte, etat=etat, cid=cid), encoding="utf-8")
+
+
+@pytest.fixture
+def corpus_local(tmp_path, monkeypatch):
+    _article(tmp_path, "LEGIARTI000006308740", "150-0 A",
+             "Les gains nets retirés des cessions à titre onéreux de valeurs mobilières sont soumis à l'impôt.")
+    _article(tmp_path, "LEGIARTI000006308999", "150-0 A", "Version abrogée.", etat="ABROGE")
+    _article(tmp_path, "LEGIARTI000099999999", "1", "Article d'un autre code.", cid="LEGITEXT000006070721")
+    csv_path = tmp_path / "bofip.csv"
+    csv_path.write_text(BOFIP_CSV, encoding="utf-8")
+
+    db = tmp_path / "corpus.sqlite"
+    counts = build_corpus(str(db), legi=str(tmp_path / "legi"), bofip=str(csv_path))
+    monkeypatch.setattr(corpus, "LOCAL_CORPUS_PATH", str(db))
+    monkeypatch.setattr(corpus, "_corpus", None)
+    monkeypatch.setattr(corpus, "_corpus_checked", False)
+    return counts
+
+
+def test_ingestion_articles_en_vigueur_des_codes_retenus(corpus_local):
+    assert corpus_local == {"legi": 1, "bofip": 1}
+
+
+def test_recherche_rend_le_contenu(corpus_local):
+    results = corpus.search_corpus(["retrait du plan d'épargne en actions"])
+    assert results[0]["source_domain"] == "bofip.impots.gouv.fr"
+    assert results[0]["content"].splitlines()[0] == "10"  # paragraphes BOFiP préservés
+    assert results[0]["_corpus_source"] == "bofip"
+
+    results = corpus.search_corpus(["cessions de valeurs mobilières"], active_domains=["legifrance.gouv.fr"])
+    assert [r["title"] for r in results] == ["Article 150-0 A - Code général des impôts"]
+
+
+def test_lecture_par_url_equivalente(corpus_local):
+    assert "gains nets" in corpus.corpus_content(
+        "https://www.legifrance.gouv.fr/codes/id/LEGIARTI000006308740;jsessionid=ABC")
+    assert "clôture du plan" in corpus.corpus_content("https://bofip.impots.gouv.fr/bofip/5360-PGP.html")
+    assert corpus.corpus_content("https://www.legifrance.gouv.fr/codes/article_lc/LEGIARTI000000000001") is None
+
+
+def test_nouvelle_ingestion_vue_sans_redemarrage(corpus_local, tmp_path):
+    lecteur = corpus.get_corpus()
+    assert lecteur.count() == 2                    # connexion ouverte sur l'ancienne base
+    # Réingestion : BOFiP seul, fichier substitué atomiquement.
+    build_corpus(corpus.LOCAL_CORPUS_PATH, bofip=str(tmp_path / "bofip.csv"))
+    assert lecteur.count() == 1
+
+
+def test_corpus_absent(monkeypatch, tmp_path):
+    monkeypatch.setattr(corpus, "LOCAL_CORPUS_PATH", str(tmp_path / "absent.sqlite"))
+    monkeypatch.setattr(corpus, "_corpus", None)
+    monkeypatch.setattr(corpus, "_corpus_checked", False)
+    assert corpus.search_corpus(["PEA"]) == []
+    assert corpus.corpus_content("https://bofip.impots.gouv.fr/bofip/5360-PGP.html") is None
@@ -0,0 +1,93 @@
+"""
+Retriever dense : quantification int8, index IVF, résultats au format pipeline.
+
+Le modèle d'embeddings est remplacé par un encodeur déterministe (sac de mots
+haché) : ce qui est testé, c'est la chaîne d'indexation et de recherche.
+"""
+from __future__ import annotations
+
+import zlib
+
+import numpy as np
+import pytest
+
+import utils.dense as dense
+from utils.passages import tokenize
+
+
+class _FauxEncodeur:
+    model_name = "faux"
+
+    def encode(self, texts):
+        out = np.zeros((len(texts), 64), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in tokenize(text):
+                out[i, zlib.crc32(token.encode()) % 64] += 1.0
+        return dense._normalize(out)
+
+
+_REMPLISSAGE = "Texte générique sur la taxe foncière des collectivités. " * 6
+
+
+def _docs():
+    return [
+        {"title": "BOI-RPPM-PVBMI-50-10", "url": "https://bofip.impots.gouv.fr/bofip/1-PGP.html",
+         "domain": "bofip.impots.gouv.fr",
+         "content": f"\n10\n{_REMPLISSAGE}\n20\nLe transfert du domicile fiscal hors de France "
+                    f"entraîne l'imposition des plus-values latentes sur les titres détenus. {_REMPLISSAGE}"},
+        {"title": "BOI-RPPM-RCM-40-50", "url": "https://bofip.impots.gouv.fr/bofip/2-PGP.html",
+         "domain": "bofip.impots.gouv.fr",
+         "content": f"\n10\n{_REMPLISSAGE}\n20\nUn retrait du plan d'épargne en actions avant cinq ans "
+                    f"entraîne la clôture du plan. {_REMPLISSAGE}"},
+    ] + [
+        {"title": f"Document {i}", "url": f"https://exemple.fr/{i}", "domain": "exemple.fr",
+         "content": f"Considérations diverses numéro {i} sur la fiscalité locale. " * 10}
+        for i in range(20)
+    ]
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    out = str(tmp_path / "dense")
+    stats = dense.build_dense_index(out, _docs(), encoder=_FauxEncodeur(), nlist=4, batch_size=8)
+    idx = dense.DenseIndex(out, encoder=_FauxEncodeur())
+    monkeypatch.setattr(dense, "_index", idx)
+    monkeypatch.setattr(dense, "_index_checked", True)
+    return idx, stats
+
+
+def test_quantification_int8():
+    v = dense._normalize(np.random.default_rng(0).normal(size=(50, 64)).astype(np.float32))
+    q, scales = dense.quantize(v)
+    assert q.dtype == np.int8
+    np.testing.assert_allclose(q * scales[:, None], v, atol=0.01)
+
+
+def test_ivf_complet_equivaut_a_la_recherche_exacte(index):
+    idx, stats = index
+    assert stats["nlist"] == 4 and len(idx) == stats["passages"]
+    assert isinstance(idx.vectors, np.memmap)
+    requete = _FauxEncodeur().encode(["plus-values latentes transfert du domicile"])
+    exact = (np.asarray(idx.vectors, dtype=np.float32) * idx.scales[:, None]) @ requete[0]
+    hits = idx.search_vectors(requete, k=3, nprobe=4)[0]
+    assert [pid for pid, _ in hits] == list(np.argsort(-exact)[:3])
+
+
+def test_recherche_dense_depuis_l_analyste(index):
+    analyste = {"axes_de_recherche_serp": ["imposition des plus-values latentes lors du transfert de domicile"],
+                "concepts_clefs_T0": ["retrait du plan d'épargne en actions"]}
+    queries = dense.dense_queries(analyste)
+    assert len(queries) == 2
+    results = dense.search_dense(queries, max_results_per_query=1, min_score=0.1)
+    assert {r["url"] for r in results} == {"https://bofip.impots.gouv.fr/bofip/1-PGP.html",
+                                           "https://bofip.impots.gouv.fr/bofip/2-PGP.html"}
+    assert all(r["_passages"] == ["§ 20"] and "content" not in r for r in results)
+
+    assert dense.search_dense(queries, active_domains=["legifrance.gouv.fr"], min_score=0.1) == []
+
+
+def test_index_absent(tmp_path, monkeypatch):
+    monkeypatch.setattr(dense, "DENSE_INDEX_DIR", str(tmp_path / "absent"))
+    monkeypatch.setattr(dense, "_index", None)
+    monkeypatch.setattr(dense, "_index_checked", False)
+    assert dense.search_dense(["PEA"]) == []
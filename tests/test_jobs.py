@@ -0,0 +1,125 @@
+"""Mode job : exécution détachée, journal d'événements, reprise à un rang donné."""
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+import pytest
+
+from pipeline.events import TextDelta, step_finished
+from services.chat_service import TurnOutcome
+from services.jobs import JobQueueFull, JobRunner, JobStore
+
+from tests.conftest import USER_A, USER_B
+
+
+def _wait_done(client, job_id, headers=USER_A, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/v1/jobs/{job_id}", headers=headers).json()
+        if job["status"] in ("done", "failed", "cancelled"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} non terminé")
+
+
+def _sse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "data" in fields:
+            events.append((fields.get("id"), fields.get("event"), json.loads(fields["data"])))
+    return events
+
+
+def test_job_soumis_puis_recupere(client, store, fake_pipeline):
+    r = client.post("/v1/jobs", json={"message": "Quel taux de TVA ?"}, headers=USER_A)
+    assert r.status_code == 202
+    job_id = r.json()["job_id"]
+
+    job = _wait_done(client, job_id)
+    assert job["status"] == "done"
+    assert job["result"]["answer"].startswith("## En résumé")
+    assert job["conversation_id"] in store.rows
+
+    events = _sse_events(client.get(f"/v1/jobs/{job_id}/events", headers=USER_A).text)
+    types = [e[1] for e in events]
+    assert types[0] == "progress" and "sources" in types and "text" in types
+    assert types[-1] == "result"
+    assert [int(e[0]) for e in events] == list(range(1, len(events) + 1))
+
+    # Rattachement à partir d'un rang : seules les trames suivantes.
+    suite = _sse_events(client.get(f"/v1/jobs/{job_id}/events",
+                                   headers={**USER_A, "Last-Event-ID": "3"}).text)
+    assert [int(e[0]) for e in suite] == list(range(4, len(events) + 1))
+
+
+def test_job_invisible_pour_un_autre_utilisateur(client, store, fake_pipeline):
+    job_id = client.post("/v1/jobs", json={"message": "q"}, headers=USER_A).json()["job_id"]
+    _wait_done(client, job_id)
+    assert client.get(f"/v1/jobs/{job_id}", headers=USER_B).status_code == 404
+    assert client.get(f"/v1/jobs/{job_id}/events", headers=USER_B).status_code == 404
+    assert client.delete(f"/v1/jobs/{job_id}", headers=USER_B).status_code == 404
+
+
+def _blocking_turn(release: threading.Event):
+    def make_iterator(cancel):
+        def _events():
+            yield step_finished("analyse", 0.1)
+            while not release.wait(0.01):
+                if cancel.is_set():
+                    from pipeline.errors import PipelineCancelled
+                    raise PipelineCancelled("routage")
+            yield TextDelta("Réponse.")
+        return _events()
+    return make_iterator
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_file_bornee_et_annulation(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    runner = JobRunner(store, workers=1, queue_max=1)
+    release = threading.Event()
+    try:
+        for job_id in ("j_1", "j_2"):
+            store.create(job_id, "a@x.fr", "q", None)
+        assert runner.submit("j_1", _blocking_turn(release), TurnOutcome("c", "")) == 0
+        assert runner.submit("j_2", _blocking_turn(release), TurnOutcome("c", "")) == 1
+        with pytest.raises(JobQueueFull):
+            runner.submit("j_3", _blocking_turn(release), TurnOutcome("c", ""))
+
+        _wait_for(lambda: store.events("j_1"))          # j_1 démarré
+        runner.cancel("j_1")
+        _wait_for(lambda: store.get("j_1").status == "cancelled")
+        assert store.get("j_1").status == "cancelled"
+        assert store.events("j_1")[-1][1]["code"] == "cancelled"
+    finally:
+        release.set()
+        runner.shutdown(wait=True)
+    assert store.get("j_2").status == "done"
+    # Texte regroupé et trame finale.
+    assert [p["type"] for _, p in store.events("j_2")] == ["progress", "text", "result"]
+
+
+def test_le_job_attend_une_place_d_execution(client, store, fake_pipeline):
+    import api.runner as runner
+    from api.admission import AdmissionController
+
+    runner._admission = admission = AdmissionController(capacity=1, max_queue=0)
+    held = client.portal.call(admission.enqueue, "autre")      # place prise par un flux
+
+    job_id = client.post("/v1/jobs", json={"message": "q"}, headers=USER_A).json()["job_id"]
+    time.sleep(0.2)
+    assert client.get(f"/v1/jobs/{job_id}", headers=USER_A).json()["status"] == "queued"
+    assert fake_pipeline == [] and admission.depth == 1          # file non bornée pour les jobs
+
+    client.portal.call(admission.release, held)
+    assert _wait_done(client, job_id)["status"] == "done"
+    _wait_for(lambda: admission.in_use == 0)
+    assert admission.in_use == 0 and admission.stats()["admitted"] == 2
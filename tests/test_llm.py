@@ -0,0 +1,66 @@
+"""Couche LLM : usage, coût et latence perçue des appels streamés."""
+from __future__ import annotations
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils import llm
+
+
+def _chunk(text, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=text))] if text is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+def test_stream_mesure_premier_token_ecarts_et_debit(monkeypatch):
+    def _completion(**kwargs):
+        time.sleep(0.05)                      # attente du premier token
+        for i, text in enumerate(["Le ", "taux ", "", "est ", "de 20 %."]):
+            time.sleep(0.01 if i != 3 else 0.04)
+            yield _chunk(text)
+        # Fragment d'usage final (stream_options.include_usage) : sans texte.
+        yield _chunk(None, SimpleNamespace(prompt_tokens=120, completion_tokens=40))
+
+    monkeypatch.setattr(llm.litellm, "completion", _completion)
+    monkeypatch.setattr(llm.litellm, "stream_chunk_builder",
+                        lambda *a, **k: pytest.fail("réponse reconstruite inutile"))
+
+    with llm.llm_trace(trace_id="t-stream") as ctx:
+        text = "".join(llm.llm_call_stream("gpt-4o", prompt="q", agent_name="redactionnel"))
+
+    assert text == "Le taux est de 20 %."
+    record = ctx.records[-1]
+    assert (record.input_tokens, record.output_tokens) == (120, 40)
+    # Tarif gpt-4o de la table LiteLLM : 2,5 $ / 10 $ par million de tokens.
+    assert record.cost_usd == pytest.approx(120 * 2.5e-6 + 40 * 1e-5)
+    stats = record.stream
+    assert stats.chunks == 4                  # le fragment vide ne compte pas
+    assert stats.ttft_s == pytest.approx(0.06, abs=0.03)
+    assert stats.gap_max_s >= 0.04 > stats.gap_p50_s
+    assert stats.output_tokens_per_s == pytest.approx(40 / stats.generation_s)
+    meta = ctx.stream_stats()["redactionnel"]
+    assert meta["chunks"] == 4 and meta["ttft_s"] == round(stats.ttft_s, 3)
+
+
+def test_stream_sans_texte():
+    stats = llm.StreamStats.measure(0.0, [], 1.0)
+    assert stats.ttft_s is None and stats.chunks == 0 and stats.gap_p95_s == 0.0
+
+
+def test_passerelle_compatible_openai(monkeypatch):
+    seen = {}
+
+    def _completion(**kwargs):
+        seen.update(kwargs)
+        return llm.litellm.ModelResponse(
+            choices=[{"index": 0, "message": {"role": "assistant", "content": "ok"}}])
+
+    monkeypatch.setattr(llm.litellm, "completion", _completion)
+    monkeypatch.setattr(llm, "LLM_API_BASE", "http://127.0.0.1:9100/v1")
+    assert llm.llm_call("gpt-4o", prompt="q", agent_name="ranker").text == "ok"
+    # Nom LiteLLM d'origine (openai/gpt-4o) transmis tel quel à la passerelle.
+    assert seen["model"] == "openai/openai/gpt-4o"
+    assert seen["api_base"] == "http://127.0.0.1:9100/v1"
+    assert seen["extra_headers"] == {"X-Agent": "ranker"}
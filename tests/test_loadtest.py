@@ -0,0 +1,40 @@
+"""Serveurs factices du banc de charge : des réponses que le pipeline sait décoder."""
+from __future__ import annotations
+
+import ast
+import random
+
+import pytest
+
+from agents.ranker import parse_compact
+from bench.loadtest.stubs import MARKER, Latency, StubConfig, _answer, llm_content
+from pipeline.normalizer import RedactionNormalizer
+from utils.json_utils import lire_json_beton
+
+
+def test_specification_de_latence():
+    rng = random.Random(0)
+    assert Latency.parse("fixed:0.2").sample(rng) == 0.2
+    assert 0.1 <= Latency.parse("uniform:0.1:0.5").sample(rng) <= 0.5
+    assert str(Latency.parse("lognormal:0.8:0.4")) == "lognormal:0.8:0.4"
+    with pytest.raises(ValueError):
+        Latency.parse("lognormal:0.8")
+
+
+def test_reponses_decodables_par_le_pipeline():
+    rng, config = random.Random(0), StubConfig(answer_tokens=90, marker_every=5)
+    assert lire_json_beton(llm_content("analyste", {}, config, rng))["axes_de_recherche_serp"]
+    assert lire_json_beton(llm_content("orchestrateur", {}, config, rng))["selected_agents"]
+    assert len(ast.literal_eval(llm_content("generaliste", {}, config, rng))) == 4
+
+    ranker = {"messages": [{"role": "system", "content": "FORMAT DE SORTIE STRICT (COMPACT)"},
+                           {"role": "user", "content": str({"candidates": [
+                               {"id": "r1"}, {"id": "r2"}, {"id": "r3"}]})}]}
+    assert [r["id"] for r in parse_compact(llm_content("ranker", ranker, config, rng))] == \
+        ["r1", "r2", "r3"]
+
+    norm = RedactionNormalizer()
+    streamed = "".join(norm.feed(piece) for piece in _answer(config, rng))
+    text, points = norm.finish()
+    assert streamed == text and len(points) == 2
+    assert len(MARKER.findall(text)) == 6
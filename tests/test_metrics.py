@@ -0,0 +1,87 @@
+"""Métriques Prometheus : exposition, agrégation entre workers, endpoint."""
+from __future__ import annotations
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import metrics
+
+from tests.conftest import USER_A
+
+
+def test_exposition_histogramme_compteur_et_jauge():
+    registry = metrics.Registry()
+    saved, metrics._registry = metrics._registry, registry
+    try:
+        hist = metrics.Histogram("t_step_seconds", "Durée.", ("step",), buckets=(1.0, 10.0))
+        hist.observe(0.5, "analyse")
+        hist.observe(4.0, "analyse")
+        hist.observe(50.0, "analyse")
+        counter = metrics.Counter("t_errors_total", "Erreurs.", ("host",))
+        counter.inc('legi"france')
+        metrics.Gauge("t_depth", "File.", lambda: {("pool",): 3.0}, ("name",))
+        text = registry.render()
+    finally:
+        metrics._registry = saved
+
+    assert 't_step_seconds_bucket{step="analyse",le="1"} 1' in text
+    assert 't_step_seconds_bucket{step="analyse",le="10"} 2' in text      # cumulatif
+    assert 't_step_seconds_bucket{step="analyse",le="+Inf"} 3' in text
+    assert 't_step_seconds_count{step="analyse"} 3' in text
+    assert 't_step_seconds_sum{step="analyse"} 54.5' in text
+    assert 't_errors_total{host="legi\\"france"} 1' in text              # échappement
+    assert 't_depth{name="pool"} 3' in text
+    assert "# TYPE t_step_seconds histogram" in text
+
+
+def _worker_adds(path, n):
+    registry = metrics.Registry(path)
+    for _ in range(n):
+        registry.add(("t_calls_total", ("serpapi",), ""), 1.0)
+    registry.flush()
+
+
+def test_les_compteurs_s_additionnent_entre_workers(tmp_path):
+    # Aucune connexion ouverte avant le fork (comme les workers gunicorn).
+    path = str(tmp_path / "metrics.sqlite")
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_worker_adds, args=(path, 250)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=30)
+
+    reader = metrics.Registry(path)
+    # Jauge laissée par un worker disparu : ignorée.
+    reader._conn().execute("INSERT INTO gauges VALUES (2147483646, 't_depth', '', 7, ?)",
+                           (time.time(),))
+    samples, gauges = reader.collect()
+    assert samples[("t_calls_total", ("serpapi",), "")] == 1000
+    assert ("t_depth", ()) not in gauges
+
+
+def test_profondeur_de_file_des_pools_suivis():
+    release = threading.Event()
+    pool = metrics.track_pool("t-pool", ThreadPoolExecutor(max_workers=1))
+    try:
+        for _ in range(3):
+            pool.submit(release.wait)
+        time.sleep(0.05)
+        assert metrics._pool_queue_depths()[("t-pool",)] == 2
+    finally:
+        release.set()
+        pool.shutdown(wait=True)
+
+
+def test_endpoint_metrics(client, store, fake_pipeline):
+    r = client.post("/v1/chat/sync", json={"message": "q"}, headers=USER_A)
+    assert r.status_code == 200
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "\nfisca_free_slots 3\n" in r.text          # toutes rendues (défaut : 3)
+    assert 'fisca_admission_wait_seconds_count{priority="full_run"}' in r.text
+    assert "# TYPE fisca_pipeline_step_seconds histogram" in r.text
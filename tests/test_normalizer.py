@@ -10,7 +10,9 @@ import json
 
 import pytest
 
-from pipeline.normalizer import JsonStringFieldExtractor, RedactionNormalizer
+from pipeline.normalizer import (
+    JsonArrayObjectExtractor, JsonStringFieldExtractor, RedactionNormalizer,
+)
 
 # Markdown réaliste : accents, guillemets, retours ligne, backslash, listes.
 MARKDOWN = (
@@ -122,6 +124,32 @@ def test_json_tronque_rend_ce_qui_a_ete_recu():
     assert "###" not in text
 
 
+def test_paire_de_substitution_recomposee_quelle_que_soit_la_coupure():
+    """`ensure_ascii` écrit un emoji en deux `\\uXXXX` : un seul caractère rendu."""
+    valeur = "Délai 📅 : 4 ans \ud800 isolé"
+    raw = json.dumps({"reponse_redigee": valeur, "points_cles": []}, ensure_ascii=True)
+    for cut in range(len(raw)):
+        norm = RedactionNormalizer()
+        streamed = norm.feed(raw[:cut]) + norm.feed(raw[cut:])
+        assert streamed == norm.finish()[0] == valeur, f"coupure à l'offset {cut}"
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_decoupage_aleatoire_sur_une_longue_reponse(seed):
+    import random
+
+    rng = random.Random(seed)
+    valeur = (MARKDOWN + ' \\ "x" \t 💶\n') * 40
+    raw = json.dumps({"reponse_redigee": valeur, "points_cles": POINTS},
+                     ensure_ascii=bool(seed % 2))
+    norm, i = RedactionNormalizer(), 0
+    while i < len(raw):
+        step = rng.randint(1, 40)
+        norm.feed(raw[i:i + step])
+        i += step
+    assert norm.finish() == (json.loads(raw)["reponse_redigee"], POINTS)
+
+
 # ─── Mode markdown (filet de sécurité) ───────────────────────────────────────
 def test_passthrough_si_le_modele_sort_du_format_json():
     raw = MARKDOWN
@@ -177,3 +205,30 @@ def test_extracteur_signale_la_fin_de_valeur():
     ext.feed(RAW_BARE)
     assert ext.done
     assert '"points_cles"' in ext.tail
+
+
+# ─── Objets d'un tableau (ranker streamé) ────────────────────────────────────
+RANKING = {"results": [
+    {"id": "r1", "keep": True, "score": 0.92, "reason": 'accolade } et "guillemets" \\ dans la raison'},
+    {"id": "r2", "keep": False, "score": 0.1, "reason": "hors assiette — régime distinct"},
+]}
+
+
+@pytest.mark.parametrize("size", CHUNK_SIZES)
+@pytest.mark.parametrize("ascii_only", [False, True], ids=["utf8", "ascii-escapes"])
+def test_objets_du_tableau_rendus_a_l_identique(size, ascii_only):
+    raw = f"```json\n{json.dumps(RANKING, ensure_ascii=ascii_only)}\n```"
+    ext = JsonArrayObjectExtractor("results")
+    objets = []
+    for chunk in _chunks(raw, size):
+        objets.extend(ext.feed(chunk))
+    assert objets == RANKING["results"]
+    assert ext.done
+
+
+def test_objet_rendu_des_son_accolade_fermante():
+    raw = json.dumps(RANKING, ensure_ascii=False)
+    coupure = raw.index('{"id": "r2"')
+    ext = JsonArrayObjectExtractor("results")
+    assert [o["id"] for o in ext.feed(raw[:coupure])] == ["r1"]
+    assert [o["id"] for o in ext.feed(raw[coupure:])] == ["r2"]
@@ -0,0 +1,69 @@
+"""
+Sélection des passages transmis au rédactionnel.
+
+Le découpage doit suivre la structure juridique du document (paragraphes
+BOFiP, articles Légifrance) pour que chaque extrait reste attribuable, et la
+sélection ne doit jamais toucher aux documents courts.
+"""
+from __future__ import annotations
+
+from utils.passages import select_passages, split_passages, tokenize
+
+_REMPLISSAGE = "Texte générique sur la taxe foncière et les collectivités. " * 8
+
+
+def _bofip() -> str:
+    paras = "\n".join(f"\n{n}\n{_REMPLISSAGE}" for n in range(10, 400, 10))
+    return (
+        "TITRE: BOI-RPPM-RCM-40-50\n"
+        + paras
+        + "\n400\nUn retrait du plan d'épargne en actions (PEA) avant cinq ans "
+        "entraîne la clôture du plan, sauf exceptions prévues par la loi.\n"
+    )
+
+
+def test_decoupage_bofip_par_paragraphe_numerote():
+    labels = [p.label for p in split_passages(_bofip(), "bofip.impots.gouv.fr")]
+    assert "§ 20" in labels
+    assert labels[-1] == "§ 400"
+
+
+def test_decoupage_legifrance_sur_texte_aplati():
+    contenu = (
+        "Code général des impôtsArticle 150-0 A Les gains nets retirés de cessions "
+        + "a " * 200
+        + "Article 150-0 B ter Le report d'imposition "
+        + "b " * 200
+    )
+    labels = [p.label for p in split_passages(contenu, "legifrance.gouv.fr")]
+    assert labels == ["Article 150-0 A", "Article 150-0 B ter"]
+
+
+def test_normalisation_francaise():
+    assert tokenize("Les Impositions") == tokenize("imposition")
+    assert "pea" in tokenize("du PEA")
+
+
+def test_selection_garde_le_passage_pertinent_et_son_repere():
+    docs = [{"title": "BOFiP PEA", "source_domain": "bofip.impots.gouv.fr", "content": _bofip()}]
+    out, stats = select_passages(docs, "Retrait d'un PEA avant cinq ans", {})
+    assert out[0]["_passages"] == ["§ 400"]
+    assert out[0]["content"].startswith("[§ 400]\n")
+    assert stats["chars_apres"] < stats["chars_avant"]
+    # Le document d'origine n'est pas modifié.
+    assert docs[0]["content"] == _bofip()
+
+
+def test_le_passage_de_l_index_dense_est_retenu_d_abord():
+    """Le § trouvé par l'index dense ne partage aucun mot avec la question."""
+    docs = [{"title": "BOFiP PEA", "source_domain": "bofip.impots.gouv.fr", "content": _bofip(),
+             "_passages": ["§ 20"]}]
+    out, _ = select_passages(docs, "Retrait d'un PEA avant cinq ans", {}, per_doc=2)
+    assert out[0]["_passages"] == ["§ 20", "§ 400"]
+
+
+def test_document_court_transmis_entier():
+    docs = [{"title": "Note", "source_domain": "exemple.fr", "content": "Réponse courte sur le PEA."}]
+    out, stats = select_passages(docs, "PEA", {})
+    assert out[0]["content"] == docs[0]["content"]
+    assert stats["docs_decoupes"] == 0
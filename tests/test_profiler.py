@@ -0,0 +1,82 @@
+"""Profil d'exécution : spans imbriqués, chemin critique, export speedscope."""
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import profiler
+
+from tests.conftest import USER_A
+
+ADMIN = {"X-Admin-Key": "admin-de-test"}
+
+
+def _nested_ok(events):
+    """Les événements O/C d'une piste speedscope s'imbriquent strictement."""
+    stack = []
+    for event in events:
+        if event["type"] == "O":
+            stack.append(event["frame"])
+        elif not stack or stack.pop() != event["frame"]:
+            return False
+    return not stack
+
+
+def test_chemin_critique_suit_le_travail_le_plus_long():
+    with profiler.profiling("t-1") as profile:
+        with profiler.span("step:recherche", "step"):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                fast = pool.submit(profiler.bind(time.sleep, "search"), 0.01)
+                with profiler.span("GET lent", "http"):
+                    time.sleep(0.05)
+                fast.result()
+        with profiler.span("json", "parse"):
+            time.sleep(0.001)
+        assert profiler.current() is profile
+    assert profiler.current() is None
+
+    summary = profile.summary()
+    names = [e["name"] for e in summary["critical_path"]]
+    assert names.index("step:recherche") < names.index("GET lent") < names.index("json")
+    # Les temps propres du chemin critique recomposent la durée totale.
+    assert sum(e["ms"] for e in summary["critical_path"]) == pytest.approx(summary["total_ms"], abs=1)
+    assert summary["by_category"]["http"]["critical_ms"] >= 45
+    # Temps CPU mesuré, bien inférieur au temps réel d'une attente réseau.
+    assert summary["by_category"]["http"]["cpu_ms"] < summary["by_category"]["http"]["wall_ms"]
+
+    worker = next(s for s in profile.spans if s.name == "queue:search")
+    step = next(s for s in profile.spans if s.name == "step:recherche")
+    assert worker.parent == step.id and worker.thread != step.thread
+
+    export = profile.to_speedscope()
+    assert len(export["profiles"]) == 2                 # thread principal + worker
+    assert all(_nested_ok(p["events"]) for p in export["profiles"])
+
+
+def test_inactif_les_spans_ne_font_rien():
+    with profiler.span("GET x", "http") as current:
+        assert current is None
+    assert profiler.bind(len, "pool") is len
+    assert profiler.record("ttft", "llm.ttft", 0.0, 1.0) is None
+
+
+def test_x_profile_rend_le_resume_et_enregistre_le_profil(client, store, fake_pipeline, monkeypatch):
+    monkeypatch.setenv("ADMIN_API_SECRET", ADMIN["X-Admin-Key"])
+    from api.settings import reset_settings
+    reset_settings()
+
+    r = client.post("/v1/chat/sync", json={"message": "q"}, headers={**USER_A, "X-Profile": "1"})
+    assert r.status_code == 200
+    summary = r.json()["profile"]
+    assert summary["trace_id"] == "fisca-test-trace"
+    assert {"step:analyse", "step:scraping"} <= {e["name"] for e in summary["critical_path"]}
+
+    export = client.get("/v1/admin/profiles/fisca-test-trace", headers=ADMIN).json()
+    assert export["shared"]["frames"] and export["profiles"][0]["unit"] == "milliseconds"
+    assert client.get("/v1/admin/profiles/inconnu", headers=ADMIN).status_code == 404
+
+    # Sans l'en-tête, aucun profil.
+    r = client.post("/v1/chat/sync", json={"message": "q"}, headers=USER_A)
+    assert r.json()["profile"] is None
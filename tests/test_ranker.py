@@ -0,0 +1,112 @@
+"""
+Ranker : pré-filtre déterministe et classement par lots.
+
+Le LLM est remplacé par un faux `llm_call` qui note chaque candidat selon son
+id. Ce qui est testé : aucun candidat n'est perdu (écartés et oubliés sont
+rendus avec leur raison), les ids restent globaux d'un lot à l'autre, et la
+fusion trie bien par score.
+"""
+from __future__ import annotations
+
+import ast
+import json
+import re
+
+import pytest
+
+import agents.ranker as ranker
+
+
+class _Res:
+    def __init__(self, text):
+        self.text = text
+
+
+@pytest.fixture
+def faux_llm(monkeypatch):
+    appels = []
+
+    def _llm_call(model, messages, **kwargs):
+        candidats = ast.literal_eval(messages[1]["content"])["candidates"]
+        appels.append([c["id"] for c in candidats])
+        results = [
+            {"id": c["id"], "keep": True, "score": int(c["id"][1:]) / 100, "reason": "ok"}
+            for c in candidats
+            if c["id"] != "r3"  # le modèle « oublie » un candidat
+        ]
+        return _Res(json.dumps({"results": results}))
+
+    monkeypatch.setattr(ranker, "llm_call", _llm_call)
+    return appels
+
+
+def _resultat(i, url=None, domain="bofip.impots.gouv.fr"):
+    return {"title": f"Plan d'épargne en actions {i}", "snippet": "retrait du PEA",
+            "url": url or f"https://{domain}/bofip/{i}-PGP.html", "source_domain": domain}
+
+
+def test_pre_filtre_ecarte_la_navigation_et_le_hors_sujet():
+    resultats = [
+        _resultat(1),
+        _resultat(2, url="https://www.legifrance.gouv.fr/search/all?query=pea", domain="legifrance.gouv.fr"),
+        {"title": "Recette de cuisine", "snippet": "gratin", "url": "https://blog.exemple.fr/gratin",
+         "source_domain": "blog.exemple.fr"},
+    ]
+    kept, dropped = ranker.prefilter(resultats, "Retrait d'un PEA", {})
+    assert [r["url"] for r in kept] == [resultats[0]["url"]]
+    assert len(dropped) == 2
+    assert all(d["keep"] is False and d["reason"].startswith("Pré-filtre") for d in dropped)
+
+
+def test_classement_par_lots_sans_perte(faux_llm):
+    resultats = [_resultat(i) for i in range(1, 26)]
+    ranked = ranker.agent_ranker("Retrait d'un PEA", resultats, "{}", [], "sk-test", shard_size=10)
+
+    assert [len(lot) for lot in faux_llm] == [10, 10, 5]
+    assert faux_llm[1][0] == "r11"  # ids globaux
+    assert len(ranked) == len(resultats)
+    oublie = next(r for r in ranked if r["url"] == resultats[2]["url"])
+    assert oublie["keep"] is False and "Non classé" in oublie["reason"]
+    scores = [r["score"] for r in ranked]
+    assert scores == sorted(scores, reverse=True)
+    assert re.search(r"25-PGP", ranked[0]["url"])
+
+
+def test_sortie_compacte_tronquee(monkeypatch):
+    # Réponse coupée en plein milieu : ce qui a été émis est noté, le reste est « Non classé ».
+    monkeypatch.setattr(ranker, "llm_call",
+                        lambda *a, **k: _Res("r1:0.91:K:assiette du régime\nr2 : 0,20\nr3:0."))
+    resultats = [_resultat(i) for i in range(1, 4)]
+    ranked = ranker.agent_ranker("Retrait d'un PEA", resultats, "{}", [], "sk-test", output="compact")
+
+    par_url = {r["url"]: r for r in ranked}
+    assert par_url[resultats[0]["url"]]["keep"] is True
+    assert par_url[resultats[0]["url"]]["reason"] == "assiette du régime"
+    assert par_url[resultats[1]["url"]]["keep"] is False
+    assert par_url[resultats[1]["url"]]["score"] == pytest.approx(0.2)
+    assert "Non classé" in par_url[resultats[2]["url"]]["reason"]
+
+
+def test_classement_streame_notifie_au_fil_de_l_eau(monkeypatch):
+    notifies = []
+    monkeypatch.setattr(ranker, "llm_call", lambda *a, **k: pytest.fail("appel bloquant inattendu"))
+
+    def _stream(model_name, messages, **kwargs):
+        candidats = ast.literal_eval(messages[1]["content"])["candidates"]
+        raw = json.dumps({"results": [
+            {"id": c["id"], "keep": True, "score": 0.9, "reason": "ok"} for c in candidats
+        ]})
+        for i in range(0, len(raw), 7):
+            # Le premier objet doit être notifié avant la fin du flux.
+            if i > raw.index("r2"):
+                assert notifies, "aucune notification avant la fin de la génération"
+            yield raw[i:i + 7]
+
+    monkeypatch.setattr(ranker, "llm_call_stream", _stream)
+    resultats = [_resultat(i) for i in range(1, 4)]
+    ranked = ranker.agent_ranker("Retrait d'un PEA", resultats, "{}", [], "sk-test",
+                                 on_result=notifies.append)
+
+    assert sorted(d["url"] for d in notifies) == sorted(r["url"] for r in resultats)
+    assert all("title" in d for d in notifies)  # candidats enrichis
+    assert len(ranked) == 3
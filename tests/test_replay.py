@@ -0,0 +1,84 @@
+"""Cassettes du banc d'essai : enregistrement puis rejeu des appels externes, sans réseau."""
+from __future__ import annotations
+
+import pytest
+import requests
+from litellm.types.utils import Delta, ModelResponseStream, StreamingChoices, Usage
+
+from bench import replay
+from utils import llm
+
+
+def _fake_completion(**kwargs):
+    usage = Usage(prompt_tokens=50, completion_tokens=7, total_tokens=57)
+    if kwargs.get("stream"):
+        def _chunks():
+            for text in ["Le taux ", "est de ", "20 %."]:
+                yield ModelResponseStream(choices=[StreamingChoices(delta=Delta(content=text))])
+            yield ModelResponseStream(choices=[StreamingChoices(delta=Delta(content=None))],
+                                      usage=usage)
+        return _chunks()
+    return llm.litellm.ModelResponse(
+        model="gpt-4o", usage=usage,
+        choices=[{"index": 0, "message": {"role": "assistant", "content": '{"ok": true}'}}],
+    )
+
+
+def _fake_request(session, method, url, **kwargs):
+    resp = requests.Response()
+    resp.status_code, resp.url, resp.encoding = 200, url, "utf-8"
+    resp.headers["Content-Type"] = "application/json"
+    resp._content = '{"organic_results": [{"title": "Régime"}]}'.encode("utf-8")
+    return resp
+
+
+def _offline(*args, **kwargs):
+    pytest.fail("appel réseau pendant un rejeu")
+
+
+def _calls(prompt="Quel taux ?"):
+    blocking = llm.llm_call("gpt-4o", prompt=prompt, agent_name="analyste").text
+    streamed = "".join(llm.llm_call_stream("gpt-4o", prompt=prompt, agent_name="redactionnel"))
+    data = requests.get("https://serpapi.com/search",
+                        params={"q": prompt, "api_key": "secret"}).json()
+    return blocking, streamed, data
+
+
+def test_rejeu_identique_sans_reseau_et_sans_secret(monkeypatch, tmp_path):
+    path = str(tmp_path / "tape.jsonl")
+    monkeypatch.setattr(llm.litellm, "completion", _fake_completion)
+    monkeypatch.setattr(requests.Session, "request", _fake_request)
+    with replay.cassette(path, "record") as tape:
+        recorded = _calls()
+    assert tape.stats == {"llm:recorded": 1, "llm_stream:recorded": 1, "http:recorded": 1}
+    assert "secret" not in open(path, encoding="utf-8").read()
+
+    monkeypatch.setattr(llm.litellm, "completion", _offline)
+    monkeypatch.setattr(requests.Session, "request", _offline)
+    with llm.llm_trace(trace_id="t-replay") as ctx:
+        with replay.cassette(path, "replay", time_scale=0) as tape:
+            assert _calls() == recorded
+    assert recorded == ('{"ok": true}', "Le taux est de 20 %.",
+                        {"organic_results": [{"title": "Régime"}]})
+    assert tape.stats == {"llm:hit": 1, "llm_stream:hit": 1, "http:hit": 1}
+    assert [(r.input_tokens, r.output_tokens) for r in ctx.records] == [(50, 7), (50, 7)]
+    # Interception levée à la sortie du bloc.
+    assert llm.litellm.completion is _offline
+
+
+def test_repli_par_route_sauf_en_mode_strict(monkeypatch, tmp_path):
+    path = str(tmp_path / "tape.jsonl")
+    monkeypatch.setattr(llm.litellm, "completion", _fake_completion)
+    monkeypatch.setattr(requests.Session, "request", _fake_request)
+    with replay.cassette(path, "record"):
+        _calls()
+
+    monkeypatch.setattr(llm.litellm, "completion", _offline)
+    # Prompt différent (l'année en cours, par exemple) : même agent, même hôte.
+    with replay.cassette(path, "replay", time_scale=0) as tape:
+        assert _calls("Quel taux en 2031 ?")[1] == "Le taux est de 20 %."
+    assert tape.stats == {"llm:route": 1, "llm_stream:route": 1, "http:route": 1}
+
+    with replay.cassette(path, "replay", time_scale=0, strict=True):
+        with pytest.raises(replay.ReplayMiss):
+            llm.llm_call("gpt-4o", prompt="Quel taux en 2031 ?", agent_name="analyste")
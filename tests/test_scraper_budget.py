@@ -73,3 +73,87 @@ def test_le_contenu_prerempli_est_conserve(scraper_borne):
 
 def test_liste_vide(scraper_borne):
     assert scraper_utils.scrapper([]) == []
+
+
+def test_session_soumission_anticipee_sans_doublon(scraper_borne, monkeypatch):
+    """Une URL soumise pendant le ranking n'est pas scrapée une seconde fois."""
+    appels = []
+
+    class _Compteur(_FakeScraper):
+        def scrape_url(self, url):
+            appels.append(url)
+            return super().scrape_url(url)
+
+    monkeypatch.setattr(scraper_utils, "LegalScraper", lambda *a, **k: _Compteur())
+    with scraper_utils.ScrapeSession() as session:
+        assert session.submit(DOCS[0])
+        assert not session.submit(dict(DOCS[0], score=0.9))
+        result = session.results([DOCS[2], DOCS[0]])
+    assert [d["content"] for d in result] == [f"contenu de {DOCS[2]['url']}", f"contenu de {DOCS[0]['url']}"]
+    assert sorted(appels) == sorted([DOCS[0]["url"], DOCS[2]["url"]])
+
+
+def test_session_speculation_mesuree(scraper_borne):
+    """Le scraping spéculatif sert de cache ; le gaspillage est compté."""
+    with scraper_utils.ScrapeSession() as session:
+        assert session.prefetch([DOCS[0], DOCS[2]]) == 2
+        time.sleep(0.2)                       # les deux spéculations ont abouti
+        result = session.results([DOCS[0]])
+        stats = session.stats()
+    assert result[0]["content"] == f"contenu de {DOCS[0]['url']}"
+    assert stats["speculatifs"] == 2 and stats["speculatifs_utiles"] == 1
+    assert stats["taux_succes"] == 1.0
+    assert stats["taux_gaspillage"] == 0.5
+
+
+def test_speculation_bornee_en_octets(scraper_borne, monkeypatch):
+    monkeypatch.setattr(scraper_utils, "SCRAPE_PREFETCH_MAX_BYTES", 1)
+    monkeypatch.setattr(scraper_utils, "SCRAPE_PREFETCH_MAX_WORKERS", 1)
+    with scraper_utils.ScrapeSession() as session:
+        session.prefetch([DOCS[0], DOCS[2]])
+        time.sleep(0.2)
+        # La seconde spéculation a été abandonnée (budget épuisé) : demandée
+        # ensuite, elle est relancée pour de bon.
+        result = session.results([DOCS[2]])
+        stats = session.stats()
+    assert result[0]["content"] == f"contenu de {DOCS[2]['url']}"
+    assert stats["taux_gaspillage"] == 1.0
+
+
+def test_speculation_abandonnee_non_comptee_comme_utile(scraper_borne, monkeypatch):
+    monkeypatch.setattr(scraper_utils, "SCRAPE_PREFETCH_MAX_BYTES", 1)
+    monkeypatch.setattr(scraper_utils, "SCRAPE_PREFETCH_MAX_WORKERS", 1)
+    with scraper_utils.ScrapeSession() as session:
+        session.prefetch([DOCS[0], DOCS[2]])
+        time.sleep(0.2)
+        session.results([DOCS[0], DOCS[2]])   # DOCS[2] : jamais scrapé en spéculation
+        stats = session.stats()
+    assert stats["speculatifs"] == 2 and stats["speculatifs_utiles"] == 1
+    assert stats["taux_succes"] == 0.5
+
+
+def test_speculations_en_file_reprises_par_le_pool_principal(scraper_borne, monkeypatch):
+    """Demandées avant d'avoir démarré, les spéculations ne restent pas
+    cantonnées aux SCRAPE_PREFETCH_MAX_WORKERS threads de la spéculation."""
+    import threading
+
+    en_cours, pic = [0], [0]
+    verrou = threading.Lock()
+
+    class _Concurrent(_FakeScraper):
+        def scrape_url(self, url):
+            with verrou:
+                en_cours[0] += 1
+                pic[0] = max(pic[0], en_cours[0])
+            time.sleep(0.2)
+            with verrou:
+                en_cours[0] -= 1
+            return super().scrape_url(url)
+
+    monkeypatch.setattr(scraper_utils, "LegalScraper", lambda *a, **k: _Concurrent())
+    docs = [{"url": f"https://exemple.fr/page-{i}", "title": str(i)} for i in range(8)]
+    with scraper_utils.ScrapeSession() as session:
+        session.prefetch(docs)
+        result = session.results(docs)
+    assert all(d["content"] for d in result)
+    assert pic[0] > scraper_utils.SCRAPE_PREFETCH_MAX_WORKERS
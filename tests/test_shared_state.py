@@ -0,0 +1,167 @@
+"""État partagé entre workers : quotas et places d'exécution globaux."""
+from __future__ import annotations
+
+import multiprocessing
+import threading
+import time
+from array import array
+
+import pytest
+
+from utils.shared_state import (
+    MemorySharedState, RedisSharedState, SQLiteSharedState, ring_hit,
+)
+
+LIMITS = ((5, 3600.0), (2, 60.0))
+
+
+class LocalRedis:
+    """Substitut local de Redis : le sous-ensemble de commandes utilisé."""
+
+    def __init__(self):
+        self.data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            value, expires = self.data.get(name, (None, None))
+            if expires is not None and expires <= time.time():
+                self.data.pop(name, None)
+                return None
+            return value
+
+    def set(self, name, value, nx=False, px=None):
+        if nx and self.get(name) is not None:
+            return None
+        with self._lock:
+            self.data[name] = (value.encode() if isinstance(value, str) else value,
+                               time.time() + px / 1000 if px else None)
+        return True
+
+    def delete(self, name):
+        with self._lock:
+            return 1 if self.data.pop(name, None) else 0
+
+
+def test_anneau_quota_horaire_et_rafale():
+    ring, head = array("d"), 0
+    accepted = []
+    for t in (0, 1, 70, 71, 140, 141, 200):
+        ring, head, retry = ring_hit(ring, head, LIMITS, 1000.0 + t)
+        accepted.append(retry is None)
+    # 2/minute : le 3e appel à t=70 passe (fenêtre glissée) ; 5/heure : le 6e est refusé.
+    assert accepted == [True, True, True, True, True, False, False]
+    _, _, retry = ring_hit(ring, head, LIMITS, 1200.0)
+    assert retry == pytest.approx(3600 - 200)
+
+
+def test_anneau_redimensionne_sans_perdre_l_historique():
+    ring, head = array("d"), 0
+    for t in range(3):
+        ring, head, _ = ring_hit(ring, head, ((3, 3600.0),), 1000.0 + t)
+    ring, head, retry = ring_hit(ring, head, ((2, 3600.0),), 1010.0)
+    assert retry is not None and len(ring) == 2
+
+
+@pytest.mark.parametrize("make", [
+    MemorySharedState,
+    lambda: RedisSharedState(LocalRedis()),
+], ids=["memoire", "redis"])
+def test_backends_quota_et_places(make):
+    state = make()
+    hits = [state.hit("u", LIMITS, now=1000.0 + i) for i in range(3)]
+    assert hits[:2] == [None, None] and hits[2] == pytest.approx(58.0)   # rafale de 2/minute
+    assert state.hit("v", LIMITS, now=1002.0) is None          # quota par clé
+    assert state.acquire_slot("h1", 1, 60) and not state.acquire_slot("h2", 1, 60)
+    state.release_slot("h1")
+    assert state.acquire_slot("h2", 1, 60) and state.slots_in_use() == 1
+
+
+def _worker_hits(path, n, out):
+    state = SQLiteSharedState(path)
+    out.put(sum(state.hit("abonne", ((20, 3600.0),)) is None for _ in range(n)))
+
+
+def test_sqlite_quota_global_entre_processus(tmp_path):
+    """Quatre « workers » concurrents se partagent un seul quota de 20."""
+    path = str(tmp_path / "shared.sqlite")
+    SQLiteSharedState(path)
+    ctx = multiprocessing.get_context("fork")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_worker_hits, args=(path, 10, out)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(timeout=30)
+    assert sum(out.get(timeout=5) for _ in procs) == 20
+
+
+def test_sqlite_places_globales_et_baux_orphelins(tmp_path):
+    path = str(tmp_path / "shared.sqlite")
+    worker_1, worker_2 = SQLiteSharedState(path), SQLiteSharedState(path)
+    assert worker_1.acquire_slot("a", 2, 60) and worker_2.acquire_slot("b", 2, 60)
+    assert not worker_2.acquire_slot("c", 2, 60)
+    # Bail d'un worker mort sans l'avoir rendu : repris à la demande suivante.
+    worker_1._conn().execute("UPDATE slot_leases SET pid = 2147483646 WHERE holder = 'a'")
+    assert worker_2.acquire_slot("c", 2, 60)
+    assert worker_1.slots_in_use() == 2
+
+
+def test_la_capacite_tient_entre_controleurs(tmp_path):
+    """Deux workers (deux contrôleurs d'admission) pour trois places au total."""
+    import asyncio
+
+    from api.admission import AdmissionController
+
+    async def scenario():
+        shared = SQLiteSharedState(str(tmp_path / "shared.sqlite"))
+        worker_1 = AdmissionController(3, 5, shared=shared)
+        worker_2 = AdmissionController(3, 5, shared=shared)
+        held = [await worker_1.enqueue("a"), await worker_1.enqueue("b"),
+                await worker_2.enqueue("c")]
+        queued = await worker_2.enqueue("d")
+        assert all(t.granted for t in held) and not queued.granted
+        worker_1.release(held[0])                     # place rendue par l'autre worker
+        return await worker_2.wait(queued, 0.05)
+
+    assert asyncio.run(scenario()) is True
+
+
+def test_les_baux_se_prennent_hors_de_la_boucle():
+    """Un état partagé lent (verrou disputé) ne fige pas la boucle du worker."""
+    import asyncio
+
+    from api.admission import AdmissionController
+
+    class Lent(MemorySharedState):
+        def acquire_slot(self, holder, capacity, ttl_s):
+            time.sleep(0.2)
+            return super().acquire_slot(holder, capacity, ttl_s)
+
+    async def scenario():
+        admission = AdmissionController(1, 5, shared=Lent())
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beating = asyncio.ensure_future(heartbeat())
+        ticket = await admission.enqueue("a")
+        beating.cancel()
+        return ticket.granted, ticks
+
+    granted, ticks = asyncio.run(scenario())
+    assert granted and ticks >= 5
+
+
+def test_memoire_evince_les_utilisateurs_inactifs():
+    state = MemorySharedState(stripes=1)
+    for i in range(100):
+        state.hit(f"u{i}", LIMITS, now=1000.0 + i)
+    assert state.keys() == 100
+    # Une heure plus tard, un seul appel suffit à purger les fenêtres échues.
+    state.hit("u_nouveau", LIMITS, now=1000.0 + 3600 + 50)
+    assert state.keys() == 51          # u50…u99 encore dans la fenêtre, + le nouveau
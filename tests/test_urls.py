@@ -0,0 +1,87 @@
+"""
+Canonicalisation des URL et identité juridique des sources : les variantes
+d'une même source se confondent, deux sources distinctes jamais.
+"""
+from __future__ import annotations
+
+import pytest
+
+from utils.urls import canonical_url, clean_url
+
+ARTICLE = "legifrance:LEGIARTI000006308740"
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.legifrance.gouv.fr/codes/article_lc/LEGIARTI000006308740",
+    "https://www.legifrance.gouv.fr/codes/id/LEGIARTI000006308740/",
+    "https://www.legifrance.gouv.fr/codes/article_lc/LEGIARTI000006308740;jsessionid=A1B2?utm_source=x",
+    "https://legifrance.gouv.fr/affichCodeArticle.do?idArticle=LEGIARTI000006308740&cidTexte=LEGITEXT000006069577",
+])
+def test_variantes_legifrance(url):
+    assert canonical_url(url) == ARTICLE
+
+
+def test_version_datee_distincte():
+    url = "https://www.legifrance.gouv.fr/codes/article_lc/LEGIARTI000006308740/2019-01-01"
+    assert canonical_url(url) == f"{ARTICLE}@2019-01-01"
+
+
+@pytest.mark.parametrize("url", [
+    "https://bofip.impots.gouv.fr/bofip/2041-PGP.html/identifiant=BOI-IR-LIQ-20-20-20230215",
+    "https://bofip.impots.gouv.fr/bofip/2041-PGP.html",
+    "http://bofip.impots.gouv.fr/bofip/2041-PGP",
+])
+def test_variantes_bofip(url):
+    assert canonical_url(url) == "bofip:2041-PGP"
+
+
+def test_url_generique_normalisee():
+    a = canonical_url("https://www.senat.fr/rap/l19-140/?b=2&a=1&utm_medium=mail#haut")
+    b = canonical_url("https://senat.fr/rap/l19-140?a=1&b=2")
+    assert a == b
+    assert canonical_url("https://senat.fr/rap/l19-141") != b
+
+
+def test_nettoyage_firecrawl():
+    url = "https://www.legifrance.gouv.fr/juri/id/JURITEXT000007041234;jsessionid=XYZ?cid=12"
+    assert clean_url(url) == "https://www.legifrance.gouv.fr/juri/id/JURITEXT000007041234"
+
+
+# ─── Identité juridique ──────────────────────────────────────────────────────
+def test_meme_boi_sous_deux_urls():
+    from utils.legal_ids import LegalIdIndex
+
+    index = LegalIdIndex()
+    a = {"url": "https://bofip.impots.gouv.fr/bofip/2041-PGP.html/identifiant=BOI-RPPM-PVBMI-20-10-20-20190628",
+         "title": "BOI-RPPM-PVBMI-20-10-20-20190628 Article 150-0 A du CGI"}
+    b = {"url": "https://bofip.impots.gouv.fr/bofip/ext/boi-rppm-pvbmi-20-10-20",
+         "title": "RPPM - PVBMI - BOI-RPPM-PVBMI-20-10-20"}
+    article = {"url": "https://www.legifrance.gouv.fr/codes/article_lc/LEGIARTI000006308740",
+               "title": "Article 150-0 A - Code général des impôts - Légifrance"}
+    assert index.key_for(a) == index.key_for(b)
+    # La BOI cite l'article dans son titre, mais n'est pas l'article.
+    assert index.key_for(article) != index.key_for(a)
+
+
+def test_versions_d_un_article_distinctes():
+    from utils.legal_ids import LegalIdIndex, legal_refs
+
+    title = "Article 150-0 A - Code général des impôts"
+    en_vigueur = {"url": "https://www.legifrance.gouv.fr/codes/article_lc/LEGIARTI000047000000",
+                  "title": title}
+    ancienne = {"url": "https://www.legifrance.gouv.fr/codes/article_lc/LEGIARTI000006308740/2019-01-01",
+                "title": title}
+    index = LegalIdIndex()
+    assert index.key_for(ancienne) != index.key_for(en_vigueur)
+    # Le titre reste une référence pour le ranker.
+    assert "cgi:150-0a" in legal_refs(en_vigueur) & legal_refs(ancienne)
+
+
+def test_decision_sous_deux_urls():
+    from utils.legal_ids import legal_ids
+
+    jade = {"url": "https://www.legifrance.gouv.fr/ceta/id/CETATEXT000032712345",
+            "title": "Conseil d'État, 8ème - 3ème chambres réunies, 13/06/2016, 389134"}
+    ce = {"url": "https://www.conseil-etat.fr/fr/arianeweb/CE/decision/2016-06-13/389134",
+          "title": "CE, 13 juin 2016, n° 389134"}
+    assert "juris#389134" in legal_ids(jade) & legal_ids(ce)
@@ -0,0 +1,56 @@
+"""Démarrage à froid : imports lourds différés, préchauffage au démarrage du worker."""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from api import warmup
+from bench.imports import DEFERRED
+from tests.conftest import USER_A
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_de_l_api_sans_dependances_lourdes():
+    code = ("import sys, api.main; "
+            f"print(sorted({{m.split('.')[0] for m in sys.modules}} & set({DEFERRED!r})))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True,
+                         text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+@pytest.fixture
+def prechauffage(monkeypatch):
+    """Préchauffage en arrière-plan, étapes factices pilotées par le test."""
+    gate = threading.Event()
+
+    def _boom():
+        raise ImportError("No module named 'supabase'")
+
+    monkeypatch.setenv("PREWARM", "background")
+    monkeypatch.setattr(warmup, "STEPS", (("litellm", gate.wait), ("supabase", _boom)))
+    warmup.reset_warmup()
+    yield gate
+    gate.set()
+    warmup.reset_warmup()
+
+
+def test_ready_annonce_le_prechauffage(prechauffage, client):
+    body = client.get("/ready", headers=USER_A).json()
+    assert (body["status"], body["warm"]) == ("warming", False)
+    assert client.get("/health").status_code == 200      # le worker sert déjà
+
+    prechauffage.set()
+    deadline = time.monotonic() + 5
+    while not warmup.get_warmup().warm and time.monotonic() < deadline:
+        time.sleep(0.01)
+    body = client.get("/ready", headers=USER_A).json()
+    assert body["warm"] and set(body["warmup_s"]) == {"litellm", "supabase"}
+    # Étape en échec : signalée, sans empêcher le démarrage.
+    assert body["status"] == "degraded"
+    assert "supabase" in warmup.get_warmup().errors
@@ -0,0 +1,227 @@
+"""
+Corpus local CGI / LPF / BOFiP : premier niveau de recherche, sans réseau.
+
+Les textes de référence sont publiés en masse — dumps LEGI de la DILA, export
+open data du BOFiP. Chaque question payait pourtant SerpAPI puis le scraping
+pour les atteindre. Ce module interroge un index **SQLite FTS5** construit hors
+ligne par `utils.corpus_ingest` :
+
+    python -m utils.corpus_ingest --legi legi.tar.gz --bofip bofip-vigueur.csv
+
+* `search_corpus` rend des résultats au format du pipeline, `content` déjà
+  rempli (comme ceux de JusticeLibre) : ni scraping, ni appel SerpAPI pour
+  les domaines couverts ;
+* `corpus_content` sert le texte d'une URL Légifrance / BOFiP trouvée par
+  ailleurs (SerpAPI), par identité juridique — le scraping devient une lecture.
+
+La base est ouverte en lecture seule, une connexion par thread, avec
+`mmap_size` : les pages chaudes restent dans le cache du système, partagé entre
+workers. Une nouvelle ingestion remplace le fichier : chaque connexion est
+rouverte dès que le fichier change (inode, date), sans redémarrer le service.
+Absente (`LOCAL_CORPUS_PATH`), le corpus est simplement ignoré.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from utils.passages import tokenize
+from utils.urls import canonical_url
+
+logger = logging.getLogger(__name__)
+
+LOCAL_CORPUS_PATH = os.getenv("LOCAL_CORPUS_PATH", "data/corpus.sqlite")
+# Taille de la projection mémoire (octets) ; 0 la désactive.
+CORPUS_MMAP_BYTES = int(os.getenv("CORPUS_MMAP_BYTES", str(1 << 30)))
+# Résultats par requête.
+CORPUS_RESULTS_PER_QUERY = int(os.getenv("CORPUS_RESULTS_PER_QUERY", "3"))
+# Domaines entièrement couverts par le corpus : retirés du périmètre SerpAPI
+# dès que le corpus répond. Légifrance n'y figure pas par défaut (la
+# jurisprudence et le JORF n'y sont pas ingérés).
+CORPUS_SERP_EXCLUDED_DOMAINS = [
+    d.strip() for d in os.getenv("CORPUS_SERP_EXCLUDED_DOMAINS", "bofip.impots.gouv.fr").split(",")
+    if d.strip()
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id          INTEGER PRIMARY KEY,
+    source      TEXT NOT NULL,          -- "legi" | "bofip"
+    ref         TEXT NOT NULL,          -- LEGIARTI… | BOI-…
+    title       TEXT NOT NULL,
+    url         TEXT NOT NULL,
+    domain      TEXT NOT NULL,
+    version     TEXT,                   -- date de début de vigueur / publication
+    content     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aliases (   -- identités juridiques → document
+    key         TEXT PRIMARY KEY,
+    doc_id      INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, content,
+    content='documents', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key         TEXT PRIMARY KEY,
+    value       TEXT
+);
+"""
+
+
+class LocalCorpus:
+    """Accès en lecture à l'index du corpus local."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        """Connexion du thread, rouverte si le fichier a été remplacé depuis :
+        l'ancienne lirait l'inode supprimé jusqu'à la fin du process."""
+        try:
+            st = os.stat(self.path)
+            version = (st.st_ino, st.st_mtime_ns)
+        except OSError:
+            version = None
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and version is not None and version != self._local.version:
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            conn.row_factory = sqlite3.Row
+            if CORPUS_MMAP_BYTES:
+                conn.execute(f"PRAGMA mmap_size={int(CORPUS_MMAP_BYTES)}")
+            self._local.conn, self._local.version = conn, version
+        return conn
+
+    def search(self, query: str, limit: int = CORPUS_RESULTS_PER_QUERY,
+               domains: Optional[List[str]] = None) -> List[Dict]:
+        """Recherche plein texte (BM25, titre pondéré) ; rend des documents complets."""
+        match = _fts_query(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT d.id, d.title, d.url, d.domain, d.ref, d.source, d.content, "
+            "snippet(documents_fts, 1, '', '', '…', 32) AS snippet "
+            "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+            "WHERE documents_fts MATCH ?"
+        )
+        params: list = [match]
+        if domains is not None:
+            if not domains:
+                return []
+            sql += f" AND d.domain IN ({','.join('?' * len(domains))})"
+            params.extend(domains)
+        sql += " ORDER BY bm25(documents_fts, 5.0, 1.0) LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self._conn().execute(sql, params)]
+
+    def content_for(self, key: str) -> Optional[str]:
+        """Texte du document d'identité `key` (URL canonique ou clé juridique)."""
+        row = self._conn().execute(
+            "SELECT d.content FROM aliases a JOIN documents d ON d.id = a.doc_id WHERE a.key = ?",
+            (key,),
+        ).fetchone()
+        return row["content"] if row else None
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+
+def _fts_query(text: str) -> str:
+    """Requête FTS5 : mots significatifs de la question, en OU (classés par BM25).
+
+    FTS5 n'a pas de racinisation française : on interroge en préfixe sur les
+    racines de `utils.passages.tokenize` (« titres » → `titr*`, qui trouve
+    aussi « titre »).
+    """
+    terms = []
+    for token in tokenize(text):
+        token = re.sub(r"[^a-z0-9]", "", token)
+        if len(token) >= 3 and token not in terms:
+            terms.append(token)
+    return " OR ".join(f"{t}*" for t in terms[:24])
+
+
+_corpus: Optional[LocalCorpus] = None
+_corpus_checked = False
+_corpus_lock = threading.Lock()
+
+
+def get_corpus() -> Optional[LocalCorpus]:
+    """Corpus local, ou None s'il n'a pas été construit sur cette machine."""
+    global _corpus, _corpus_checked
+    if _corpus_checked:
+        return _corpus
+    with _corpus_lock:
+        if not _corpus_checked:
+            if LOCAL_CORPUS_PATH and os.path.exists(LOCAL_CORPUS_PATH):
+                try:
+                    corpus = LocalCorpus(LOCAL_CORPUS_PATH)
+                    logger.info("Corpus local : %d documents (%s)", corpus.count(), LOCAL_CORPUS_PATH)
+                    _corpus = corpus
+                except sqlite3.Error as exc:
+                    logger.warning("Corpus local illisible (%s) : %s", LOCAL_CORPUS_PATH, exc)
+            else:
+                logger.info("Corpus local absent (%s) — recherche web seule", LOCAL_CORPUS_PATH)
+            _corpus_checked = True
+    return _corpus
+
+
+def search_corpus(
+    queries: List[str],
+    max_results_per_query: int = CORPUS_RESULTS_PER_QUERY,
+    active_domains: Optional[List[str]] = None,
+) -> List[Dict]:
+    """Interroge le corpus local ; résultats au format du pipeline, `content` rempli."""
+    corpus = get_corpus()
+    if corpus is None:
+        return []
+    results: List[Dict] = []
+    seen = set()
+    for query in queries:
+        clean_query = query.split(' — ')[0]
+        try:
+            rows = corpus.search(clean_query, max_results_per_query, active_domains)
+        except sqlite3.Error as exc:
+            logger.warning("Corpus local — requête en échec (%r) : %s", clean_query[:80], exc)
+            continue
+        for position, row in enumerate(rows, start=1):
+            if row["id"] in seen:
+                continue
+            seen.add(row["id"])
+            results.append({
+                "query": query,
+                "title": row["title"],
+                "url": row["url"],
+                "snippet": row["snippet"],
+                "source_domain": row["domain"],
+                "position": position,
+                "content": row["content"],
+                "_corpus_source": row["source"],
+            })
+    return results
+
+
+def corpus_content(url: str) -> Optional[str]:
+    """Texte d'une URL Légifrance / BOFiP présente dans le corpus local, sinon None."""
+    corpus = get_corpus()
+    if corpus is None or not url:
+        return None
+    key = canonical_url(url)
+    if not key.startswith(("legifrance:", "bofip:")):
+        return None
+    try:
+        # Une URL datée (`…@AAAA-MM-JJ`) n'a pas d'alias : le corpus ne tient
+        # que la version en vigueur, l'ancienne version sera scrapée.
+        return corpus.content_for(key)
+    except sqlite3.Error as exc:
+        logger.warning("Corpus local — lecture en échec (%s) : %s", key, exc)
+        return None
@@ -0,0 +1,240 @@
+"""
+Construction du corpus local (`utils.corpus`) à partir des publications en masse.
+
+Sources :
+
+* **LEGI** (DILA) — dump `.tar.gz` ou arborescence déjà extraite. Seuls les
+  articles en vigueur des codes retenus sont lus (`--code`, défaut CGI et
+  LPF) : le chemin des fichiers porte le LEGITEXT du code, inutile de parser
+  le reste du dump ;
+* **BOFiP** — export open data « BOFiP-Impôts en vigueur » (CSV). Les noms de
+  colonnes varient d'une livraison à l'autre : on accepte les principales
+  variantes.
+
+La base est écrite dans un fichier temporaire puis substituée atomiquement
+(`os.replace`) : les workers qui la lisent passent à la nouvelle version à
+leur requête suivante (`LocalCorpus` rouvre ses connexions), sans jamais voir
+un index à moitié construit.
+
+Usage :
+    python -m utils.corpus_ingest --legi Freemium_legi_global.tar.gz --bofip bofip-vigueur.csv
+    python -m utils.corpus_ingest --legi ./legi/ --code LEGITEXT000006069577 --out data/corpus.sqlite
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import datetime
+import html
+import logging
+import os
+import re
+import sqlite3
+import sys
+import tarfile
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.corpus import LOCAL_CORPUS_PATH, SCHEMA
+from utils.legal_ids import canonical_keys
+from utils.urls import canonical_url
+
+logger = logging.getLogger(__name__)
+
+# Codes ingérés par défaut : LEGITEXT → libellé court (clé de `canonical_keys`).
+DEFAULT_CODES = {
+    "LEGITEXT000006069577": "CGI",
+    "LEGITEXT000006069583": "LPF",
+}
+
+# Colonnes de l'export BOFiP (variantes connues, la première trouvée l'emporte).
+_BOFIP_COLUMNS = {
+    "ref": ("identifiant_juridique", "Identifiant juridique", "identifiant"),
+    "title": ("titre", "Titre", "title"),
+    "url": ("permalien", "Permalien", "url"),
+    "version": ("debut_de_validite", "Date de début de validité", "date_de_publication"),
+    "content": ("contenu_html", "contenu", "Contenu", "content"),
+}
+
+
+# ─── Texte ────────────────────────────────────────────────────────────────────
+_BLOCK_TAGS_RE = re.compile(r"(?i)<\s*(?:br|/p|/div|/li|/h\d|/tr|/table)\s*/?>")
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def html_to_text(fragment: str) -> str:
+    """HTML → texte, un bloc par ligne (les numéros de paragraphe BOFiP restent
+    seuls sur leur ligne, ce qu'attend `utils.passages`)."""
+    text = _BLOCK_TAGS_RE.sub("\n", fragment or "")
+    text = html.unescape(_TAG_RE.sub("", text))
+    lines = [re.sub(r"[ \t\u00a0]+", " ", line).strip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+# ─── LEGI ─────────────────────────────────────────────────────────────────────
+def _legi_members(source: str, codes: Dict[str, str]) -> Iterator[Tuple[str, bytes]]:
+    """(chemin, contenu XML) des articles des codes retenus, dump tar ou dossier."""
+    def wanted(path: str) -> bool:
+        return path.endswith(".xml") and "/article/" in path and any(c in path for c in codes)
+
+    if os.path.isdir(source):
+        for root, _dirs, files in os.walk(source):
+            for name in files:
+                path = os.path.join(root, name).replace(os.sep, "/")
+                if wanted(path):
+                    with open(path, "rb") as f:
+                        yield path, f.read()
+        return
+    with tarfile.open(source, "r:*") as tar:
+        for member in tar:
+            if member.isfile() and wanted(member.name):
+                f = tar.extractfile(member)
+                if f is not None:
+                    yield member.name, f.read()
+
+
+def parse_legi_article(xml: bytes, codes: Dict[str, str]) -> Optional[Dict]:
+    """Document du corpus pour un article LEGI en vigueur, sinon None."""
+    root = ET.fromstring(xml)
+    article_id = root.findtext("META/META_COMMUN/ID") or ""
+    meta = root.find("META/META_SPEC/META_ARTICLE")
+    if not article_id.startswith("LEGIARTI") or meta is None:
+        return None
+    if (meta.findtext("ETAT") or "").upper() != "VIGUEUR":
+        return None
+    texte = root.find("CONTEXTE/TEXTE")
+    cid = texte.get("cid") if texte is not None else ""
+    if cid not in codes:
+        return None
+    code_title = (texte.findtext("TITRE_TXT") or "").strip() or codes[cid]
+    num = (meta.findtext("NUM") or "").strip()
+
+    bloc = root.find("BLOC_TEXTUEL/CONTENU")
+    body = ET.tostring(bloc, encoding="unicode") if bloc is not None else ""
+    content = html_to_text(body)
+    if not content:
+        return None
+    title = f"Article {num} - {code_title}" if num else code_title
+    return {
+        "source": "legi",
+        "ref": article_id,
+        "title": title,
+        "url": f"https://www.legifrance.gouv.fr/codes/article_lc/{article_id}",
+        "domain": "legifrance.gouv.fr",
+        "version": meta.findtext("DATE_DEBUT"),
+        "content": f"{title}\n\n{content}",
+        # Identité par l'URL, et « cgi:150-0a » pour les rapprochements par citation.
+        "aliases": {k for k in canonical_keys(f"article {num} {codes[cid]}") if ":" in k} if num else set(),
+    }
+
+
+def iter_legi(source: str, codes: Dict[str, str]) -> Iterator[Dict]:
+    for path, xml in _legi_members(source, codes):
+        try:
+            doc = parse_legi_article(xml, codes)
+        except ET.ParseError as exc:
+            logger.warning("LEGI — XML illisible (%s) : %s", path, exc)
+            continue
+        if doc:
+            yield doc
+
+
+# ─── BOFiP ────────────────────────────────────────────────────────────────────
+def iter_bofip(path: str) -> Iterator[Dict]:
+    csv.field_size_limit(sys.maxsize)
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        sample = f.read(8192)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(f, dialect=dialect)
+        columns = {field: next((c for c in names if c in (reader.fieldnames or [])), None)
+                   for field, names in _BOFIP_COLUMNS.items()}
+        missing = [field for field in ("ref", "content") if columns[field] is None]
+        if missing:
+            raise ValueError(f"Export BOFiP : colonnes introuvables ({', '.join(missing)}) "
+                             f"parmi {reader.fieldnames}")
+        for row in reader:
+            ref = re.sub(r"-\d{8}$", "", (row.get(columns["ref"]) or "").strip())
+            content = html_to_text(row.get(columns["content"]) or "")
+            if not ref or not content:
+                continue
+            title = (row.get(columns["title"]) or "").strip() if columns["title"] else ""
+            url = (row.get(columns["url"]) or "").strip() if columns["url"] else ""
+            yield {
+                "source": "bofip",
+                "ref": ref,
+                "title": f"{ref} {title}".strip(),
+                "url": url or f"https://bofip.impots.gouv.fr/bofip/ext/{ref}",
+                "domain": "bofip.impots.gouv.fr",
+                "version": (row.get(columns["version"]) or "").strip() if columns["version"] else None,
+                "content": content,
+                "aliases": {f"bofip:{ref.upper()}"} | {k for k in canonical_keys(ref) if k.startswith("boi")},
+            }
+
+
+# ─── Écriture ─────────────────────────────────────────────────────────────────
+def build_corpus(out: str, legi: Optional[str] = None, bofip: Optional[str] = None,
+                 codes: Optional[Dict[str, str]] = None) -> Dict[str, int]:
+    """Construit la base `out` (remplacée atomiquement) ; rend les volumes par source."""
+    codes = codes or DEFAULT_CODES
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    tmp = f"{out}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    counts = {"legi": 0, "bofip": 0}
+    try:
+        conn.executescript(SCHEMA)
+        sources: List[Iterator[Dict]] = []
+        if legi:
+            sources.append(iter_legi(legi, codes))
+        if bofip:
+            sources.append(iter_bofip(bofip))
+        for docs in sources:
+            for doc in docs:
+                cur = conn.execute(
+                    "INSERT INTO documents (source, ref, title, url, domain, version, content) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (doc["source"], doc["ref"], doc["title"], doc["url"], doc["domain"],
+                     doc["version"], doc["content"]),
+                )
+                doc_id = cur.lastrowid
+                for key in {canonical_url(doc["url"])} | doc["aliases"]:
+                    conn.execute("INSERT OR IGNORE INTO aliases (key, doc_id) VALUES (?, ?)",
+                                 (key, doc_id))
+                counts[doc["source"]] += 1
+        conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+            ("built_at", datetime.datetime.now().isoformat(timespec="seconds")),
+            ("legi_source", legi or ""), ("bofip_source", bofip or ""),
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, out)
+    return counts
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-7s %(message)s")
+    ap = argparse.ArgumentParser(description="Construit le corpus local CGI / LPF / BOFiP (SQLite FTS5).")
+    ap.add_argument("--legi", help="Dump LEGI (.tar.gz) ou dossier extrait.")
+    ap.add_argument("--bofip", help="Export open data BOFiP en vigueur (CSV).")
+    ap.add_argument("--code", action="append", default=None,
+                    help="LEGITEXT d'un code à ingérer (répétable ; défaut : CGI et LPF).")
+    ap.add_argument("--out", default=LOCAL_CORPUS_PATH)
+    args = ap.parse_args()
+    if not (args.legi or args.bofip):
+        ap.error("au moins une source (--legi ou --bofip) est requise")
+
+    codes = {c: DEFAULT_CODES.get(c, c) for c in args.code} if args.code else DEFAULT_CODES
+    counts = build_corpus(args.out, legi=args.legi, bofip=args.bofip, codes=codes)
+    print(f"Corpus écrit : {args.out} — {counts['legi']} articles LEGI, {counts['bofip']} documents BOFiP")
+
+
+if __name__ == "__main__":
+    main()
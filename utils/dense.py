@@ -0,0 +1,459 @@
+"""
+Recherche sémantique (vecteurs denses) sur les passages du corpus local.
+
+La recherche lexicale (`utils.corpus`, FTS5) rate les questions posées en
+langage courant : « je revends mes actions après être parti à l'étranger » ne
+partage aucun mot avec le § de BOFiP sur l'exit tax. Ce module ajoute un second
+retriever, par similarité d'embeddings :
+
+* **Passages** — chaque document du corpus (et, en option, des documents
+  supplémentaires en JSONL : jurisprudence exportée, etc.) est découpé par
+  `utils.passages.split_passages` : § BOFiP, articles, considérants.
+* **Encodage** — modèle sentence-transformers multilingue, exécutable sur CPU
+  (`DENSE_MODEL`), par lots (`DENSE_BATCH_SIZE`). Dépendance optionnelle :
+  sans `sentence-transformers`, le retriever est simplement désactivé.
+* **Stockage** — vecteurs normalisés quantifiés en int8 (un facteur d'échelle
+  par vecteur), dans un `.npy` ouvert en `mmap_mode="r"` : 4× moins de place
+  qu'en float32, pages partagées entre workers par le cache du système.
+* **Index ANN** — IVF en NumPy pur : k-means sphérique sur un échantillon,
+  listes inversées triées par centroïde. Une requête ne lit que les
+  `DENSE_NPROBE` listes les plus proches.
+
+Construction (après `utils.corpus_ingest`) :
+
+    python -m utils.dense --corpus data/corpus.sqlite --out data/dense
+    python -m utils.dense --docs jurisprudence.jsonl --out data/dense
+
+`search_dense` interroge l'index avec les `axes_de_recherche_serp` et
+`concepts_clefs_T0` de l'analyste (`dense_queries`) et rend des résultats au
+format du pipeline, le repère du passage trouvé dans `_passages`.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.passages import split_passages
+
+logger = logging.getLogger(__name__)
+
+DENSE_INDEX_DIR = os.getenv("DENSE_INDEX_DIR", "data/dense")
+# Modèle multilingue compact (384 dimensions, ~120 Mo) : raisonnable sur CPU.
+DENSE_MODEL = os.getenv("DENSE_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+DENSE_BATCH_SIZE = int(os.getenv("DENSE_BATCH_SIZE", "64"))
+# Listes inversées visitées par requête (rappel ↑, latence ↑).
+DENSE_NPROBE = int(os.getenv("DENSE_NPROBE", "8"))
+DENSE_RESULTS_PER_QUERY = int(os.getenv("DENSE_RESULTS_PER_QUERY", "3"))
+# Similarité cosinus minimale pour qu'un passage soit proposé au ranker.
+DENSE_MIN_SCORE = float(os.getenv("DENSE_MIN_SCORE", "0.35"))
+# Nombre maximal de requêtes issues de l'analyste (encodage en un seul lot).
+DENSE_MAX_QUERIES = int(os.getenv("DENSE_MAX_QUERIES", "12"))
+
+# Texte encodé par passage : le modèle tronque de toute façon vers 128 tokens.
+_EMBED_MAX_CHARS = 1000
+_SNIPPET_CHARS = 300
+# Lignes recopiées à la fois du fichier brut vers le `.npy`.
+_COPY_ROWS = 65536
+
+_PASSAGES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS passages (
+    id      INTEGER PRIMARY KEY,     -- ligne dans vectors.npy
+    url     TEXT NOT NULL,
+    title   TEXT NOT NULL,
+    domain  TEXT NOT NULL,
+    label   TEXT NOT NULL,
+    text    TEXT NOT NULL
+);
+"""
+
+
+# ─── Encodage ─────────────────────────────────────────────────────────────────
+class Encoder:
+    """Encodeur sentence-transformers chargé à la première utilisation.
+
+    `encode` rend des vecteurs float32 normalisés (produit scalaire = cosinus).
+    Lève `ImportError` si `sentence-transformers` n'est pas installé.
+    """
+
+    def __init__(self, model_name: str = DENSE_MODEL, batch_size: int = DENSE_BATCH_SIZE):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        model = self._model or self._load()
+        vectors = model.encode(list(texts), batch_size=self.batch_size,
+                               normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """float32 → (int8, échelle par vecteur) ; `q * scale` reconstruit le vecteur."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+# ─── IVF ──────────────────────────────────────────────────────────────────────
+def _assign(vectors: np.ndarray, scales: np.ndarray, centroids: np.ndarray,
+            batch: int = 8192) -> np.ndarray:
+    """Centroïde le plus proche de chaque vecteur (lu par tranches sur le memmap)."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch):
+        block = vectors[start:start + batch].astype(np.float32) * scales[start:start + batch, None]
+        out[start:start + batch] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def train_ivf(sample: np.ndarray, nlist: int, iterations: int = 12, seed: int = 0) -> np.ndarray:
+    """k-means sphérique (centroïdes normalisés) sur un échantillon float32."""
+    rng = np.random.default_rng(seed)
+    nlist = max(1, min(nlist, len(sample)))
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=nlist)
+        empty = counts == 0
+        # Liste vide : on la relance sur un point tiré au hasard.
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids.astype(np.float32)
+
+
+class DenseIndex:
+    """Index IVF int8 en lecture (répertoire produit par `build_dense_index`)."""
+
+    def __init__(self, path: str, encoder: Optional[Encoder] = None):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"))
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.list_ids = np.load(os.path.join(path, "list_ids.npy"), mmap_mode="r")
+        self.list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+        self.encoder = encoder or Encoder(self.manifest.get("model", DENSE_MODEL))
+        self._local = threading.local()
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{os.path.join(self.path, 'passages.sqlite')}?mode=ro", uri=True)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def search_vectors(self, queries: np.ndarray, k: int,
+                       nprobe: int = DENSE_NPROBE) -> List[List[Tuple[int, float]]]:
+        """(id de passage, cosinus) des `k` plus proches voisins de chaque requête."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+        out = []
+        for q, lists in zip(queries, probes):
+            ids = np.concatenate([self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]]
+                                  for c in lists])
+            if not len(ids):
+                out.append([])
+                continue
+            ids.sort()  # lecture séquentielle du memmap
+            scores = (self.vectors[ids].astype(np.float32) @ q) * self.scales[ids]
+            if len(ids) > k:
+                part = np.argpartition(-scores, k)[:k]
+                top = part[np.argsort(-scores[part])]
+            else:
+                top = np.argsort(-scores)
+            out.append([(int(ids[i]), float(scores[i])) for i in top])
+        return out
+
+    def passages(self, ids: Iterable[int]) -> Dict[int, Dict]:
+        ids = list(ids)
+        if not ids:
+            return {}
+        rows = self._conn().execute(
+            f"SELECT * FROM passages WHERE id IN ({','.join('?' * len(ids))})", ids)
+        return {row["id"]: dict(row) for row in rows}
+
+    def search(self, queries: Sequence[str], k: int = DENSE_RESULTS_PER_QUERY,
+               nprobe: int = DENSE_NPROBE) -> List[List[Tuple[Dict, float]]]:
+        """Passages les plus proches de chaque requête texte (un seul lot d'encodage)."""
+        if not queries:
+            return []
+        hits = self.search_vectors(self.encoder.encode(queries), k, nprobe)
+        rows = self.passages({pid for per_query in hits for pid, _ in per_query})
+        return [[(rows[pid], score) for pid, score in per_query if pid in rows]
+                for per_query in hits]
+
+
+# ─── Construction ─────────────────────────────────────────────────────────────
+def iter_corpus_documents(corpus_path: str) -> Iterator[Dict]:
+    """Documents du corpus local (`utils.corpus_ingest`)."""
+    conn = sqlite3.connect(f"file:{corpus_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        for row in conn.execute("SELECT title, url, domain, content FROM documents ORDER BY id"):
+            yield dict(row)
+    finally:
+        conn.close()
+
+
+def iter_jsonl_documents(path: str) -> Iterator[Dict]:
+    """Documents supplémentaires : une ligne JSON `{title, url, domain, content}`."""
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                doc = json.loads(line)
+            except json.JSONDecodeError as exc:
+                logger.warning("%s:%d — JSON illisible : %s", path, n, exc)
+                continue
+            if doc.get("url") and doc.get("content"):
+                doc.setdefault("title", doc["url"])
+                doc.setdefault("domain", "")
+                yield doc
+
+
+def _iter_passages(documents: Iterable[Dict]) -> Iterator[Tuple[Dict, str, str]]:
+    for doc in documents:
+        for passage in split_passages(doc["content"], doc.get("domain", "")):
+            yield doc, passage.label, passage.text
+
+
+def build_dense_index(out: str, documents: Iterable[Dict], encoder: Optional[Encoder] = None,
+                      nlist: Optional[int] = None, batch_size: int = 1024) -> Dict[str, int]:
+    """Encode les passages de `documents` et écrit l'index dans `out`.
+
+    Écrit d'abord dans `<out>.tmp` puis substitue le répertoire : un worker
+    qui ouvre l'index ne voit jamais une construction partielle.
+    """
+    encoder = encoder or Encoder()
+    tmp = f"{out}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    conn = sqlite3.connect(os.path.join(tmp, "passages.sqlite"))
+    conn.executescript(_PASSAGES_SCHEMA)
+    # Les vecteurs sont écrits au fil de l'encodage, bruts, dans un fichier
+    # temporaire : le nombre de passages (la forme du `.npy`) n'est connu qu'à
+    # la fin. Seuls les facteurs d'échelle (un float par passage) restent en
+    # mémoire.
+    raw_path = os.path.join(tmp, "vectors.raw")
+    raw = open(raw_path, "wb")
+    scale_blocks: List[np.ndarray] = []
+    batch: List[Tuple[Dict, str, str]] = []
+    n = dim = 0
+
+    def flush():
+        nonlocal n, dim
+        texts = [f"{doc['title']} — {label}\n{text}"[:_EMBED_MAX_CHARS] for doc, label, text in batch]
+        q, scales = quantize(encoder.encode(texts))
+        raw.write(np.ascontiguousarray(q).tobytes())
+        dim = q.shape[1]
+        scale_blocks.append(scales)
+        conn.executemany(
+            "INSERT INTO passages (id, url, title, domain, label, text) VALUES (?, ?, ?, ?, ?, ?)",
+            [(n + i, doc["url"], doc["title"], doc.get("domain", ""), label, text)
+             for i, (doc, label, text) in enumerate(batch)],
+        )
+        n += len(batch)
+        batch.clear()
+
+    try:
+        for item in _iter_passages(documents):
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        conn.commit()
+    finally:
+        conn.close()
+        raw.close()
+    if not n:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise ValueError("Aucun passage à indexer")
+
+    vectors = np.lib.format.open_memmap(os.path.join(tmp, "vectors.npy"), mode="w+",
+                                        dtype=np.int8, shape=(n, dim))
+    written = np.memmap(raw_path, dtype=np.int8, mode="r", shape=(n, dim))
+    for row in range(0, n, _COPY_ROWS):
+        vectors[row:row + _COPY_ROWS] = written[row:row + _COPY_ROWS]
+    del written
+    os.remove(raw_path)
+    scales = np.concatenate(scale_blocks)
+
+    nlist = nlist or max(1, min(4096, int(np.sqrt(n))))
+    rng = np.random.default_rng(0)
+    sample_ids = np.sort(rng.choice(n, min(n, 256 * nlist), replace=False))
+    sample = _normalize(vectors[sample_ids].astype(np.float32) * scales[sample_ids, None])
+    centroids = train_ivf(sample, nlist)
+    assign = _assign(vectors, scales, centroids)
+    order = np.argsort(assign, kind="stable").astype(np.int64)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(centroids)))])
+    vectors.flush()
+    del vectors
+
+    np.save(os.path.join(tmp, "scales.npy"), scales)
+    np.save(os.path.join(tmp, "centroids.npy"), centroids)
+    np.save(os.path.join(tmp, "list_ids.npy"), order)
+    np.save(os.path.join(tmp, "list_offsets.npy"), offsets.astype(np.int64))
+    with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": encoder.model_name, "dim": int(centroids.shape[1]), "passages": n,
+                   "nlist": int(len(centroids)),
+                   "built_at": datetime.datetime.now().isoformat(timespec="seconds")}, f)
+
+    old = f"{out}.old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(out):
+        os.replace(out, old)
+    os.replace(tmp, out)
+    shutil.rmtree(old, ignore_errors=True)
+    return {"passages": n, "nlist": int(len(centroids))}
+
+
+# ─── Retriever ────────────────────────────────────────────────────────────────
+_index: Optional[DenseIndex] = None
+_index_checked = False
+_index_lock = threading.Lock()
+
+
+def get_dense_index() -> Optional[DenseIndex]:
+    """Index dense, ou None (index absent, ou `sentence-transformers` manquant)."""
+    global _index, _index_checked
+    if _index_checked:
+        return _index
+    with _index_lock:
+        if not _index_checked:
+            if not os.path.exists(os.path.join(DENSE_INDEX_DIR, "manifest.json")):
+                logger.info("Index dense absent (%s) — recherche lexicale seule", DENSE_INDEX_DIR)
+            else:
+                try:
+                    import sentence_transformers  # noqa: F401
+                    _index = DenseIndex(DENSE_INDEX_DIR)
+                    logger.info("Index dense : %d passages (%s)", len(_index), DENSE_INDEX_DIR)
+                except ImportError:
+                    logger.warning("Index dense présent mais sentence-transformers non installé — ignoré")
+                except (OSError, ValueError, sqlite3.Error) as exc:
+                    logger.warning("Index dense illisible (%s) : %s", DENSE_INDEX_DIR, exc)
+            _index_checked = True
+    return _index
+
+
+def dense_queries(analyst_json: Optional[dict], max_queries: int = DENSE_MAX_QUERIES) -> List[str]:
+    """Requêtes du retriever dense : axes de recherche puis concepts clefs de l'analyste."""
+    queries: List[str] = []
+    for key in ("axes_de_recherche_serp", "concepts_clefs_T0"):
+        value = (analyst_json or {}).get(key)
+        for item in (value if isinstance(value, list) else [value] if value else []):
+            text = str(item).strip()
+            if text and text not in queries:
+                queries.append(text)
+    return queries[:max_queries]
+
+
+def search_dense(
+    queries: List[str],
+    max_results_per_query: int = DENSE_RESULTS_PER_QUERY,
+    active_domains: Optional[List[str]] = None,
+    min_score: float = DENSE_MIN_SCORE,
+    nprobe: int = DENSE_NPROBE,
+) -> List[Dict]:
+    """Interroge l'index dense ; un résultat par document, au meilleur passage.
+
+    `_passages` désigne le passage trouvé, `content` reste vide : le document
+    complet arrive par la recherche lexicale ou le scraping (un passage seul ne
+    doit pas l'emporter au dédoublonnage), et `select_passages` retient ce
+    passage en priorité.
+    """
+    index = get_dense_index()
+    if index is None or not queries:
+        return []
+    # Suréchantillonnage : plusieurs passages d'un même document, filtres de domaine.
+    k = max_results_per_query * 4
+    try:
+        hits = index.search(queries, k, nprobe)
+    except Exception as exc:
+        logger.warning("Index dense — recherche en échec : %s", exc)
+        return []
+
+    best: Dict[str, Dict] = {}
+    for query, per_query in zip(queries, hits):
+        kept = 0
+        for row, score in per_query:
+            if kept >= max_results_per_query or score < min_score:
+                break
+            if active_domains is not None and row["domain"] not in active_domains:
+                continue
+            kept += 1
+            previous = best.get(row["url"])
+            if previous is not None and previous["_dense_score"] >= score:
+                continue
+            best[row["url"]] = {
+                "query": query,
+                "title": row["title"],
+                "url": row["url"],
+                "snippet": row["text"][:_SNIPPET_CHARS],
+                "source_domain": row["domain"],
+                "position": kept,
+                "_passages": [row["label"]],
+                "_dense_score": round(score, 4),
+            }
+    return sorted(best.values(), key=lambda r: -r["_dense_score"])
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-7s %(message)s")
+    from utils.corpus import LOCAL_CORPUS_PATH
+
+    ap = argparse.ArgumentParser(description="Construit l'index dense (int8 + IVF) des passages du corpus.")
+    ap.add_argument("--corpus", default=LOCAL_CORPUS_PATH, help="Base du corpus local ('' pour l'ignorer).")
+    ap.add_argument("--docs", action="append", default=[],
+                    help="Documents supplémentaires en JSONL {title, url, domain, content} (répétable).")
+    ap.add_argument("--model", default=DENSE_MODEL)
+    ap.add_argument("--nlist", type=int, default=None, help="Nombre de listes IVF (défaut : √passages).")
+    ap.add_argument("--out", default=DENSE_INDEX_DIR)
+    args = ap.parse_args()
+
+    def documents():
+        if args.corpus and os.path.exists(args.corpus):
+            yield from iter_corpus_documents(args.corpus)
+        for path in args.docs:
+            yield from iter_jsonl_documents(path)
+
+    stats = build_dense_index(args.out, documents(), encoder=Encoder(args.model), nlist=args.nlist)
+    print(f"Index dense écrit : {args.out} — {stats['passages']} passages, {stats['nlist']} listes IVF")
+
+
+if __name__ == "__main__":
+    main()
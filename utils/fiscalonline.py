@@ -22,6 +22,7 @@ import pandas as pd
 import requests
 from bs4 import BeautifulSoup
 
+from utils import metrics
 from utils.api_keys import get_fiscalonline_token, get_secret
 from utils.json_utils import clean_json_codefence
 from utils.llm import llm_call
@@ -60,9 +61,10 @@ def fetch_tags() -> dict:
     """
     url = f"{BASE_URL}/admin/tags?limit=2000"
     try:
-        resp = requests.get(url, headers=_headers(), timeout=15)
-        resp.raise_for_status()
-        tags = resp.json().get("data", [])
+        with metrics.http_call("fiscalonline", "api.fiscalonline.com", path="/admin/tags"):
+            resp = requests.get(url, headers=_headers(), timeout=15)
+            resp.raise_for_status()
+            tags = resp.json().get("data", [])
     except requests.RequestException as e:
         logger.error("Erreur lors de la récupération des tags FiscalOnline : %s", e)
         return {}
@@ -137,9 +139,10 @@ def fetch_articles_by(tag_ids) -> list:
         url = f"{BASE_URL}/articles"
         params = {"tagIds": tag_id, "limit": 1000}
         try:
-            resp = requests.get(url, params=params, headers=_headers(), timeout=15)
-            resp.raise_for_status()
-            articles = resp.json().get("data", [])
+            with metrics.http_call("fiscalonline", "api.fiscalonline.com", path="/articles"):
+                resp = requests.get(url, params=params, headers=_headers(), timeout=15)
+                resp.raise_for_status()
+                articles = resp.json().get("data", [])
             list_articles.append(articles)
         except requests.RequestException as e:
             logger.error("Erreur lors de la récupération des articles (tag %s) : %s", tag_id, e)
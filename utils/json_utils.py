@@ -4,6 +4,8 @@ Utilitaires pour le parsing JSON robuste
 import json
 import re
 
+from utils.profiler import profiled
+
 
 def clean_json_codefence(s):
     """Remove optional Markdown codefence like ```json ... ```"""
@@ -13,6 +15,7 @@ def clean_json_codefence(s):
     return s.strip()
 
 
+@profiled("json", "parse")
 def lire_json_beton(json_str):
     """
     Fonction robuste pour lire et décoder un JSON, même s'il y a des codefences ou du texte superflu autour,
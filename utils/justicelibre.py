@@ -4,15 +4,18 @@ Endpoint : https://justicelibre.org/mcp  (gratuit, sans clé, sans compte)
 Transport : Streamable HTTP / JSON-RPC 2.0
 """
 import logging
+import os
 import re
 from typing import List, Dict, Optional
 from urllib.parse import urlparse
 
 import requests
 
+from utils import metrics
+
 logger = logging.getLogger(__name__)
 
-JL_MCP_URL = "https://justicelibre.org/mcp"
+JL_MCP_URL = os.getenv("JL_MCP_URL", "https://justicelibre.org/mcp")
 JL_TIMEOUT = 15  # secondes par appel outil
 JL_HEALTH_TIMEOUT = 5
 
@@ -46,7 +49,9 @@ class MCPClient:
         headers = {}
         if self._mcp_session_id:
             headers["Mcp-Session-Id"] = self._mcp_session_id
-        resp = self._session.post(self.url, json=payload, headers=headers, timeout=self.timeout)
+        with metrics.http_call("justicelibre", urlparse(self.url).netloc, "POST",
+                               rpc=payload.get("method")):
+            resp = self._session.post(self.url, json=payload, headers=headers, timeout=self.timeout)
         if "Mcp-Session-Id" in resp.headers and not self._mcp_session_id:
             self._mcp_session_id = resp.headers["Mcp-Session-Id"]
         if "text/event-stream" in resp.headers.get("Content-Type", ""):
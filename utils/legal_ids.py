@@ -0,0 +1,216 @@
+"""
+Identifiants juridiques : de quel objet juridique parle une source ?
+
+Un article du CGI, une référence BOI, une décision du Conseil d'État ont
+plusieurs URL et plusieurs façons d'être écrits. Ce module :
+
+* réduit une référence brute à des **clés canoniques** (`canonical_keys`,
+  historiquement dans `eval/articles.py`, qui l'importe désormais d'ici) :
+  `cgi:150-0a`, `lpf:l64`, `boi-ir-liq-20-20`, `ce#389134`, `cjue#c123/45` ;
+* étiquette un candidat (résultat de recherche, document scrapé, décision
+  JusticeLibre) avec ses identifiants (`legal_ids`) — ceux qui désignent le
+  document lui-même, pas ceux qu'il se contente de citer — et, pour le
+  ranker, avec les références juridiques qu'il porte (`legal_refs`) ;
+* indexe ces identifiants (`LegalIdIndex`) pour que le dédoublonnage, le cache
+  de scraping et le ranker raisonnent sur l'identité juridique plutôt que sur
+  l'URL : la même BOI reçue par deux URL n'est scrapée et analysée qu'une fois.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Dict, Iterable, Optional, Set
+from urllib.parse import urlparse
+
+from utils.urls import canonical_url
+
+# ─── Normalisation de base ────────────────────────────────────────────────────
+def _strip_accents(s: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
+
+
+def _norm_text(s: str) -> str:
+    """Minuscule, sans accents, espaces compactés."""
+    s = _strip_accents(s.lower())
+    s = re.sub(r"\s+", " ", s)
+    return s.strip()
+
+
+# Codes juridiques reconnus → abréviation canonique
+_CODE_PATTERNS = [
+    (r"\bcode general des impots\b|\bc\.?\s*g\.?\s*i\.?\b|\bcgi\b", "cgi"),
+    (r"\blivre des procedures fiscales\b|\bl\.?\s*p\.?\s*f\.?\b|\blpf\b", "lpf"),
+    (r"\bcode civil\b|\bc\.?\s*civ\.?\b", "cciv"),
+    (r"\bcode de commerce\b|\bc\.?\s*com\.?\b", "ccom"),
+    (r"\bcode general des collectivites territoriales\b|\bcgct\b", "cgct"),
+]
+
+# Juridictions → abréviation canonique (tolérant aux espaces/apostrophes)
+_JURIS_PATTERNS = [
+    (r"\bconseil d['\s]?etat\b|\bce\b", "ce"),
+    (r"\bcour de cassation\b|\bcass\b", "cass"),
+    (r"\bcour administrative d['\s]?appel\b|\bcaa\b", "caa"),
+    (r"\btribunal administratif\b|\bta\b", "ta"),
+    (r"\bcour de justice de l['\s]?union europeenne\b|\bcjue\b|\bcjce\b", "cjue"),
+    (r"\bconseil constitutionnel\b|\bcons\.? const\.?\b", "ccel"),
+]
+
+
+def canonical_keys(reference: str) -> Set[str]:
+    """Retourne l'ensemble des clés canoniques extraites d'une référence brute.
+
+    Une même référence peut produire plusieurs clés (ex. un BOFiP + un numéro
+    d'article cités ensemble). Vide si rien d'exploitable.
+    """
+    if not reference:
+        return set()
+    txt = _norm_text(reference)
+    keys: Set[str] = set()
+
+    # 1) Références BOFiP : BOI-XXX-YYY-10-20-30 (avec ou sans §)
+    #    Structure : code en lettres (BOI-RSA-BASE…) PUIS segments numériques.
+    #    L'ordre lettres→chiffres évite d'avaler la prose qui suit la référence
+    #    (ex. "BOI-IF-TH-10-10 La loi…" ne capte pas "La").
+    for m in re.finditer(r"\bboi(?:[-\s][a-z]{1,6}){1,6}(?:[-\s]\d{1,4}){0,8}", txt):
+        boi = re.sub(r"\s+", "-", m.group(0).strip())
+        boi = re.sub(r"-+", "-", boi)
+        keys.add(boi)
+
+    # 2) Numéros de décision de jurisprudence : n° 389134, C-123/45 (CJUE)
+    juris_codes = []
+    for jp, abbr in _JURIS_PATTERNS:
+        if re.search(jp, txt):
+            juris_codes.append(abbr)
+    # numéro de pourvoi/requête — on émet TOUJOURS une clé générique "juris#NUM"
+    # (le numéro à ≥4 chiffres est très discriminant) + une clé par juridiction détectée.
+    for m in re.finditer(r"n[°o]\s*([0-9]{4,})", txt):
+        num = m.group(1)
+        keys.add(f"juris#{num}")
+        for abbr in juris_codes:
+            keys.add(f"{abbr}#{num}")
+    # affaire CJUE format C-xxx/yy
+    for m in re.finditer(r"\bc[-\s]?([0-9]{1,4})/([0-9]{2,4})", txt):
+        keys.add(f"cjue#c{m.group(1)}/{m.group(2)}")
+
+    # 3) Articles de code : "article 197 du cgi", "art l64 lpf", "787 c cgi", "150-0 b ter"
+    codes_present = [abbr for pat, abbr in _CODE_PATTERNS if re.search(pat, txt)]
+    # n° d'article : préfixe legislatif optionnel (L./R./A./D.), tirets, bis/ter…,
+    # lettre de subdivision finale (ex. "787 C") — mais PAS suivie d'une autre lettre
+    # (sinon on capterait le "c" de "cgi").
+    num_pat = (
+        r"([lradLRAD]\.?\s?)?"                     # préfixe legislatif éventuel
+        r"(\d+(?:[-\s]?\d+)*"                       # numéro (avec tirets)
+        r"(?:\s?[a-z](?![a-z])(?:\s?(?:bis|ter|quater|quinquies))?)?)"  # subdivision
+    )
+    art_re = re.compile(r"\bart(?:icle)?s?\.?\s*" + num_pat)
+    # variante "bare" : préfixe legislatif obligatoire (ex. "L. 64", "R 207") sans le mot "article"
+    bare_re = re.compile(r"\b([lrad])\.?\s?(\d+(?:[-\s]?\d+)*)\b")
+
+    def _add_art(prefix, body):
+        art = re.sub(r"[.\s]+", "", (prefix or "") + body)
+        if codes_present:
+            for code in codes_present:
+                keys.add(f"{code}:{art}")
+        else:
+            keys.add(f"art:{art}")
+
+    for m in art_re.finditer(txt):
+        _add_art(m.group(1), m.group(2))
+    for m in bare_re.finditer(txt):
+        _add_art(m.group(1), m.group(2))
+
+    # 4) À défaut de tout repère structuré : repli sur les mots significatifs
+    #    (évite qu'une attente "purement textuelle" ne matche jamais).
+    if not keys:
+        tokens = [t for t in re.findall(r"[a-z0-9]{4,}", txt)]
+        if tokens:
+            keys.add("kw:" + "_".join(sorted(set(tokens))[:6]))
+
+    return keys
+
+
+# ─── Identité d'un candidat ───────────────────────────────────────────────────
+_JURIS_DOMAINS = (
+    "conseil-etat.fr", "courdecassation.fr", "opendata.justice-administrative.fr",
+    "justicelibre.org", "conseil-constitutionnel.fr", "europa.eu",
+)
+# Date de publication accolée à une référence BOI : elle ne change pas l'objet.
+_BOI_DATE_RE = re.compile(r"\b(BOI(?:-[A-Z0-9]+)+?)-\d{8}\b", re.IGNORECASE)
+# Numéro de décision en fin d'intitulé Légifrance (« …, 13/06/2016, 389134 »).
+_TRAILING_DECISION_RE = re.compile(r",\s*(\d{5,})\s*(?:$|[,;|–-])")
+# Clés trop vagues pour fonder une identité.
+_WEAK_PREFIXES = ("kw:", "art:")
+
+
+def legal_ids(doc: Dict) -> Set[str]:
+    """Identifiants juridiques propres à un candidat (vide si inconnu).
+
+    Seuls l'URL et le **titre** sont lus : l'extrait ou le contenu citent
+    d'autres textes (renvois, visas) qui ne sont pas le document lui-même. Le
+    type d'identifiant retenu dépend du site — une page BOFiP dont le titre
+    mentionne un article du CGI reste une BOI. Un article Légifrance n'a pour
+    identité que son identifiant LEGIARTI (version comprise) : son titre est le
+    même d'une version à l'autre, il ne sert que de référence (`legal_refs`).
+    """
+    url = doc.get("url") or ""
+    host = (doc.get("source_domain") or urlparse(url).netloc).lower()
+    title = _BOI_DATE_RE.sub(r"\1", doc.get("title") or "")
+    ids: Set[str] = set()
+
+    key = canonical_url(url) if url else ""
+    if key.startswith(("legifrance:", "bofip:")):
+        ids.add(key)
+
+    title_keys = {k for k in canonical_keys(title) if not k.startswith(_WEAK_PREFIXES)}
+    if "bofip" in host:
+        ids |= {k for k in title_keys if k.startswith("boi")}
+        boi = re.search(r"BOI(?:-[A-Z0-9]+)+", _BOI_DATE_RE.sub(r"\1", url), re.IGNORECASE)
+        if boi:
+            ids |= {k for k in canonical_keys(boi.group(0)) if k.startswith("boi")}
+    elif any(d in host for d in _JURIS_DOMAINS) or "CETATEXT" in key or "JURITEXT" in key:
+        ids |= {k for k in title_keys if "#" in k}
+        m = _TRAILING_DECISION_RE.search(title)
+        if m and not any(k.startswith("juris#") for k in ids):
+            ids.add(f"juris#{m.group(1)}")
+    return ids
+
+
+def legal_refs(doc: Dict, ids: Optional[Set[str]] = None) -> Set[str]:
+    """Références juridiques d'un candidat, pour le ranker : ses identifiants,
+    plus l'article désigné par le titre d'une page d'article Légifrance
+    (`cgi:150-0a`) — ce qui le rapproche des articles cités par l'analyse."""
+    refs = set(legal_ids(doc) if ids is None else ids)
+    if any(i.startswith(("legifrance:LEGIARTI", "legifrance:JORFARTI")) for i in refs):
+        refs |= {k for k in canonical_keys(doc.get("title") or "")
+                 if ":" in k and not k.startswith(_WEAK_PREFIXES)}
+    return refs
+
+
+class LegalIdIndex:
+    """Index identifiant juridique → clé de document.
+
+    Deux documents partageant un identifiant sont le même objet : `key_for`
+    rend la clé du premier vu, et ses identifiants s'ajoutent à l'index
+    (une BOI vue par son numéro PGP puis par sa référence est rapprochée).
+    La clé d'un document sans identifiant est son URL canonique.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def find(self, ids: Iterable[str]) -> Optional[str]:
+        for i in ids:
+            if i in self._by_id:
+                return self._by_id[i]
+        return None
+
+    def key_for(self, doc: Dict, ids: Optional[Set[str]] = None) -> str:
+        """Clé d'identité du document, enregistrée au passage."""
+        ids = legal_ids(doc) if ids is None else ids
+        key = self.find(ids) or canonical_url(doc.get("url") or "")
+        for i in ids:
+            self._by_id.setdefault(i, key)
+        return key
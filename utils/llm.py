@@ -11,6 +11,11 @@ directement `google.generativeai` ou `openai`. Avantages :
 
 Les agents gardent leur signature actuelle (`api_key`, `model_name`) : ils délèguent
 juste l'appel réseau ici.
+
+LiteLLM n'est importé qu'au premier appel (`_litellm()`) : son import coûte à
+lui seul plusieurs secondes, payées sinon par tout ce qui importe ce module
+(`api.main`, les tests, les outils). Le worker l'importe d'avance au démarrage
+(`warm()`, appelé par `api/warmup.py`). `utils.llm.litellm` reste accessible.
 """
 from __future__ import annotations
 
@@ -20,19 +25,14 @@ import time
 import uuid
 from contextlib import contextmanager
 from contextvars import ContextVar
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
 from typing import Iterator, List, Dict, Optional
 
-import litellm
-
-from utils.model_registry import resolve_model, provider_of, register_custom_pricing
+from utils import metrics, profiler
+from utils.model_registry import resolve_model, provider_of, register_custom_pricing, token_cost
 
 logger = logging.getLogger(__name__)
 
-# LiteLLM est verbeux et lève parfois sur des champs de réponse manquants : on
-# préfère renvoyer ce qu'on a plutôt que crasher le pipeline.
-litellm.drop_params = True  # ignore les params non supportés par un provider donné
-
 # Budgets d'appel. Sans eux, un appel qui ne rend jamais la main immobilise un
 # slot de pipeline indéfiniment : un run de recette a vu l'orchestrateur bloqué
 # 290 s sur un seul appel — un délai que rien n'aurait interrompu.
@@ -42,6 +42,41 @@ LLM_STREAM_TIMEOUT_S = float(os.getenv("LLM_STREAM_TIMEOUT_S", "180"))
 # consommerait à lui seul la moitié du budget global de la requête.
 LLM_NUM_RETRIES = int(os.getenv("LLM_NUM_RETRIES", "1"))
 
+# Passerelle compatible OpenAI (proxy LiteLLM, serveurs factices du banc de
+# charge `bench/loadtest`) : si elle est définie, tous les appels y partent, le
+# nom LiteLLM d'origine servant de nom de modèle côté passerelle.
+LLM_API_BASE = os.getenv("LLM_API_BASE", "")
+LLM_API_KEY = os.getenv("LLM_API_KEY", "")
+
+# ─── Import différé de LiteLLM ────────────────────────────────────────────────
+_LITELLM = None
+
+
+def _litellm():
+    """Module `litellm`, importé et configuré au premier usage."""
+    global _LITELLM
+    if _LITELLM is None:
+        import litellm
+
+        # LiteLLM est verbeux et lève parfois sur des champs de réponse manquants :
+        # on préfère renvoyer ce qu'on a plutôt que crasher le pipeline.
+        litellm.drop_params = True  # ignore les params non supportés par un provider donné
+        _LITELLM = litellm
+    return _LITELLM
+
+
+def __getattr__(name: str):
+    # `utils.llm.litellm` (tests, bancs d'essai) : importe à la demande.
+    if name == "litellm":
+        return _litellm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def warm() -> None:
+    """Importe LiteLLM et enregistre les tarifs : le premier appel n'en paie plus le coût."""
+    _init_once()
+
+
 # ─── Init tarifs custom + callback Langfuse (une seule fois) ──────────────────
 _INITIALISED = False
 
@@ -50,6 +85,7 @@ def _init_once() -> None:
     global _INITIALISED
     if _INITIALISED:
         return
+    litellm = _litellm()
     register_custom_pricing()
     # Active le tracing Langfuse uniquement si les clés sont configurées.
     if os.getenv("LANGFUSE_PUBLIC_KEY") and os.getenv("LANGFUSE_SECRET_KEY"):
@@ -96,6 +132,43 @@ def _get_langfuse():
 
 
 # ─── Contexte de run (groupe les appels d'une question sous une trace) ────────
+@dataclass
+class StreamStats:
+    """Latence perçue d'un appel streamé : ce que l'utilisateur voit arriver."""
+    ttft_s: Optional[float]            # envoi de la requête → premier fragment de texte
+    generation_s: float                # premier fragment → fin du flux
+    chunks: int                        # fragments de texte reçus
+    gap_p50_s: float = 0.0             # écarts entre fragments successifs
+    gap_p95_s: float = 0.0
+    gap_max_s: float = 0.0
+    output_tokens_per_s: Optional[float] = None   # débit pendant la génération
+
+    @classmethod
+    def measure(cls, start: float, stamps: List[float], end: float) -> "StreamStats":
+        """`stamps` : instants (`perf_counter`) de réception des fragments de texte."""
+        if not stamps:
+            return cls(ttft_s=None, generation_s=0.0, chunks=0)
+        gaps = sorted(b - a for a, b in zip(stamps, stamps[1:]))
+        return cls(
+            ttft_s=stamps[0] - start,
+            generation_s=end - stamps[0],
+            chunks=len(stamps),
+            gap_p50_s=_quantile(gaps, 0.5),
+            gap_p95_s=_quantile(gaps, 0.95),
+            gap_max_s=gaps[-1] if gaps else 0.0,
+        )
+
+    def as_meta(self) -> Dict[str, object]:
+        """Champs arrondis, pour un `StepEvent` ou un `PipelineResult`."""
+        return {k: (round(v, 3) if isinstance(v, float) else v) for k, v in asdict(self).items()}
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
 @dataclass
 class CallRecord:
     """Métriques d'un appel LLM unitaire."""
@@ -106,6 +179,7 @@ class CallRecord:
     output_tokens: int
     cost_usd: float
     latency_s: float
+    stream: Optional[StreamStats] = None    # appels `llm_call_stream` uniquement
 
 
 @dataclass
@@ -118,6 +192,8 @@ class RunContext:
     # Objet trace Langfuse (SDK v2) associé — permet d'attacher des spans/événements
     # aux étapes non-LLM. `None` si Langfuse n'est pas configuré.
     lf_trace: object = None
+    # Profil de l'exécution (`utils.profiler.Profile`) s'il a été demandé.
+    profile: object = None
 
     @property
     def total_cost(self) -> float:
@@ -137,6 +213,10 @@ class RunContext:
             out[r.agent] = out.get(r.agent, 0.0) + r.cost_usd
         return out
 
+    def stream_stats(self) -> Dict[str, Dict[str, object]]:
+        """Latence perçue du dernier appel streamé de chaque agent."""
+        return {r.agent: r.stream.as_meta() for r in self.records if r.stream is not None}
+
 
 _run_ctx: ContextVar[Optional[RunContext]] = ContextVar("llm_run_ctx", default=None)
 
@@ -174,6 +254,9 @@ def llm_trace(trace_id: Optional[str] = None, session_id: Optional[str] = None,
             )
         except Exception as exc:  # pragma: no cover
             logger.debug("llm — création trace Langfuse échouée : %s", exc)
+    ctx.profile = profiler.current()
+    if ctx.profile is not None and not ctx.profile.trace_id:
+        ctx.profile.trace_id = ctx.trace_id
     token = _run_ctx.set(ctx)
     try:
         yield ctx
@@ -294,7 +377,7 @@ def _extract_cost(response, litellm_id: str) -> float:
     except Exception:
         pass
     try:
-        return float(litellm.completion_cost(completion_response=response))
+        return float(_litellm().completion_cost(completion_response=response))
     except Exception:
         logger.debug("llm — coût indisponible pour %s (tarif non enregistré ?)", litellm_id)
         return 0.0
@@ -307,14 +390,7 @@ def _record(agent_name: str, logical_model: str, response, latency_s: float) ->
     out_tok = int(getattr(usage, "completion_tokens", 0) or 0)
     cost = _extract_cost(response, litellm_id)
     provider = provider_of(logical_model)
-
-    ctx = _run_ctx.get()
-    if ctx is not None:
-        ctx.records.append(CallRecord(
-            agent=agent_name, model=logical_model, provider=provider,
-            input_tokens=in_tok, output_tokens=out_tok,
-            cost_usd=cost, latency_s=latency_s,
-        ))
+    _account(agent_name, logical_model, provider, in_tok, out_tok, cost, latency_s)
 
     text = ""
     try:
@@ -329,6 +405,42 @@ def _record(agent_name: str, logical_model: str, response, latency_s: float) ->
     )
 
 
+def _account(agent_name: str, logical_model: str, provider: str, in_tok: int, out_tok: int,
+             cost: float, latency_s: float, stream: Optional[StreamStats] = None) -> None:
+    """Métriques d'un appel terminé + `CallRecord` dans le contexte de run."""
+    metrics.LLM_SECONDS.observe(latency_s, agent_name, logical_model)
+    metrics.LLM_TOKENS.observe(in_tok, agent_name, logical_model, "input")
+    metrics.LLM_TOKENS.observe(out_tok, agent_name, logical_model, "output")
+    if stream is not None:
+        if out_tok and stream.generation_s > 0:
+            stream.output_tokens_per_s = out_tok / stream.generation_s
+        if stream.ttft_s is not None:
+            metrics.LLM_TTFT.observe(stream.ttft_s, agent_name, logical_model)
+
+    ctx = _run_ctx.get()
+    if ctx is not None:
+        ctx.records.append(CallRecord(
+            agent=agent_name, model=logical_model, provider=provider,
+            input_tokens=in_tok, output_tokens=out_tok,
+            cost_usd=cost, latency_s=latency_s, stream=stream,
+        ))
+
+
+def _profile_stream(agent_name: str, litellm_id: str, start: float,
+                    first_token: Optional[float], n_chunks: int) -> None:
+    """Spans d'un appel streamé : attente du premier token, puis génération.
+    Enregistrés a posteriori — le flux enjambe les `yield` du consommateur."""
+    end = time.perf_counter()
+    outer = profiler.record(f"llm:{agent_name}", "llm", start, end,
+                            model=litellm_id, chunks=n_chunks)
+    if outer is None:
+        return
+    ttft = first_token or end
+    profiler.record("ttft", "llm.ttft", start, ttft, parent=outer)
+    if first_token is not None:
+        profiler.record("generation", "llm", first_token, end, parent=outer)
+
+
 def _resolve_api_key(provider: str, fallback: Optional[str] = None) -> Optional[str]:
     """Clé API correspondant au PROVIDER du modèle (et non au provider d'origine de
     l'agent). Indispensable quand on bascule un agent vers un autre provider : sinon
@@ -343,6 +455,16 @@ def _resolve_api_key(provider: str, fallback: Optional[str] = None) -> Optional[
     return fallback
 
 
+def _via_gateway(kwargs: Dict, agent_name: str) -> None:
+    """Redirige l'appel vers `LLM_API_BASE` quand une passerelle est configurée."""
+    if not LLM_API_BASE:
+        return
+    kwargs["model"] = f"openai/{kwargs['model']}"
+    kwargs["api_base"] = LLM_API_BASE
+    kwargs["api_key"] = LLM_API_KEY or kwargs.get("api_key") or "gateway"
+    kwargs["extra_headers"] = {"X-Agent": agent_name}
+
+
 # ─── API publique ─────────────────────────────────────────────────────────────
 def llm_call(
     model_name: str,
@@ -385,10 +507,16 @@ def llm_call(
     resolved_key = _resolve_api_key(provider_of(model_name), api_key)
     if resolved_key:
         kwargs["api_key"] = resolved_key
+    _via_gateway(kwargs, agent_name)
 
     logger.info("%s — appel LLM (%s)", agent_name, litellm_id)
     t0 = time.time()
-    response = litellm.completion(**kwargs)
+    try:
+        with profiler.span(f"llm:{agent_name}", "llm", model=litellm_id):
+            response = _litellm().completion(**kwargs)
+    except Exception:
+        metrics.LLM_ERRORS.inc(agent_name, model_name)
+        raise
     latency = time.time() - t0
     res = _record(agent_name, model_name, response, latency)
     logger.info("%s — réponse (%.1fs, in=%d out=%d, $%.5f)",
@@ -404,13 +532,17 @@ def llm_call_stream(
     system: Optional[str] = None,
     temperature: float = 0.0,
     json_mode: bool = False,
+    max_tokens: Optional[int] = None,
     api_key: Optional[str] = None,
     agent_name: str = "llm_call_stream",
 ) -> Iterator[str]:
     """Version streamée : yield les chunks de texte au fil de l'eau.
 
-    Les métriques (tokens/coût/latence) sont enregistrées en fin de stream via
-    `litellm.stream_chunk_builder` (usage demandé avec stream_options).
+    Les métriques sont enregistrées en fin de stream : tokens lus dans le
+    fragment d'usage final (demandé avec stream_options), coût calculé d'après
+    le tarif du modèle, latence perçue (`StreamStats` : premier token, écarts
+    entre fragments, débit). Les fragments ne sont pas conservés : une
+    rédaction de plusieurs milliers de tokens en compte autant.
     """
     _init_once()
     litellm_id = resolve_model(model_name)
@@ -427,28 +559,47 @@ def llm_call_stream(
     }
     if json_mode:
         kwargs["response_format"] = {"type": "json_object"}
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
     resolved_key = _resolve_api_key(provider_of(model_name), api_key)
     if resolved_key:
         kwargs["api_key"] = resolved_key
+    _via_gateway(kwargs, agent_name)
 
     logger.info("%s — appel LLM stream (%s)", agent_name, litellm_id)
-    t0 = time.time()
-    chunks = []
-    response = litellm.completion(**kwargs)
-    for chunk in response:
-        chunks.append(chunk)
-        try:
-            delta = chunk.choices[0].delta.content
-        except Exception:
-            delta = None
-        if delta:
-            yield delta
+    t0, p0 = time.time(), time.perf_counter()
+    stamps: List[float] = []               # réception de chaque fragment de texte
+    n_chunks = in_tok = out_tok = 0
+    try:
+        response = _litellm().completion(**kwargs)
+        for chunk in response:
+            n_chunks += 1
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                # Selon le fournisseur : un fragment final, ou un cumul répété.
+                in_tok = max(in_tok, int(getattr(usage, "prompt_tokens", 0) or 0))
+                out_tok = max(out_tok, int(getattr(usage, "completion_tokens", 0) or 0))
+            try:
+                delta = chunk.choices[0].delta.content
+            except Exception:
+                delta = None
+            if delta:
+                # Le flux est tiré par le consommateur : les écarts incluent son
+                # temps (normalisation, envoi SSE), qui fait partie du perçu.
+                stamps.append(time.perf_counter())
+                yield delta
+    except Exception:
+        metrics.LLM_ERRORS.inc(agent_name, model_name)
+        raise
+    finally:
+        _profile_stream(agent_name, litellm_id, p0, stamps[0] if stamps else None, n_chunks)
 
     latency = time.time() - t0
-    # Reconstruit la réponse complète pour récupérer usage + coût.
-    try:
-        rebuilt = litellm.stream_chunk_builder(chunks, messages=kwargs["messages"])
-        _record(agent_name, model_name, rebuilt, latency)
-    except Exception as exc:
-        logger.debug("%s — usage stream indisponible : %s", agent_name, exc)
-    logger.info("%s — stream terminé (%.1fs, %d chunks)", agent_name, latency, len(chunks))
+    stream = StreamStats.measure(p0, stamps, time.perf_counter())
+    if not (in_tok or out_tok):
+        logger.warning("%s — flux sans usage (%s) : tokens et coût non comptés",
+                       agent_name, litellm_id)
+    _account(agent_name, model_name, provider_of(model_name), in_tok, out_tok,
+             token_cost(model_name, in_tok, out_tok), latency, stream=stream)
+    logger.info("%s — stream terminé (%.1fs, premier token %.1fs, %d chunks)", agent_name,
+                latency, stream.ttft_s or 0.0, n_chunks)
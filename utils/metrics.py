@@ -0,0 +1,419 @@
+"""
+Métriques d'exploitation au format texte Prometheus, agrégées entre workers.
+
+Les logs et les traces Langfuse décrivent une requête ; pour dimensionner le
+service il faut des distributions : durée des étapes, latence et tokens des
+appels LLM par agent et par modèle, latence et erreurs des appels sortants
+par hôte, taux de succès des caches, files d'attente des pools.
+
+Chaque worker accumule ses incréments en mémoire (un dict sous verrou, aucune
+I/O sur le chemin chaud) ; un thread les reverse toutes les `METRICS_FLUSH_S`
+secondes dans un fichier SQLite commun (`METRICS_PATH`) : compteurs et histogrammes y
+sont **additionnés**, si bien que `GET /metrics`, servi par n'importe quel
+worker, rend les totaux du serveur — y compris ceux des workers recyclés par
+gunicorn (`max_requests`). Les jauges (profondeur des files) sont relevées par
+chaque worker à son vidage et sommées sur les workers encore vivants ; une
+jauge `local` (places libres, déjà globales) n'est lue que par le worker qui
+répond.
+
+Tant que `enable()` n'a pas été appelé (Streamlit, évaluation, tests), rien
+n'est écrit sur disque : les métriques restent propres au processus.
+
+Pas de dépendance à `prometheus_client` : le format d'exposition texte tient
+en quelques lignes, et son mode multi-processus suppose un répertoire de
+fichiers mmap par worker, à purger soi-même.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from utils import profiler
+from utils.shared_state import pid_alive
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATH = os.getenv("METRICS_PATH", "data/metrics.sqlite")
+METRICS_FLUSH_S = float(os.getenv("METRICS_FLUSH_S", "2"))
+
+# Secondes : de l'appel SerpAPI (≈1 s) au run complet (plusieurs minutes).
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+TOKEN_BUCKETS = (100, 300, 1000, 3000, 10000, 30000, 100000)
+
+Labels = Tuple[str, ...]
+# Clé d'un échantillon : (nom de série, valeurs d'étiquettes, borne `le` ou "").
+_Key = Tuple[str, Labels, str]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    series  TEXT NOT NULL,
+    labels  TEXT NOT NULL,          -- valeurs d'étiquettes, séparées par \\x1f
+    le      TEXT NOT NULL,
+    value   REAL NOT NULL,
+    PRIMARY KEY (series, labels, le)
+);
+CREATE TABLE IF NOT EXISTS gauges (
+    pid         INTEGER NOT NULL,
+    series      TEXT NOT NULL,
+    labels      TEXT NOT NULL,
+    value       REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    PRIMARY KEY (pid, series, labels)
+);
+"""
+_SEP = "\x1f"
+
+
+# ─── Registre ─────────────────────────────────────────────────────────────────
+class Registry:
+    """Métriques déclarées + incréments en attente de vidage."""
+
+    def __init__(self, path: Optional[str] = None, flush_s: float = METRICS_FLUSH_S):
+        self.path = path
+        self.flush_s = flush_s
+        self.metrics: List["_Metric"] = []
+        self._pending: Dict[_Key, float] = {}
+        self._totals: Dict[_Key, float] = {}      # sans fichier : cumul du processus
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def register(self, metric: "_Metric") -> None:
+        self.metrics.append(metric)
+
+    def add(self, key: _Key, value: float) -> None:
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0.0) + value
+
+    def start(self) -> None:
+        """Vidage périodique, dans un thread du worker."""
+        def _loop():
+            while not self._stop.wait(self.flush_s):
+                self.flush()
+        threading.Thread(target=_loop, name="metrics-flush", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.flush()
+
+    def flush(self) -> None:
+        """Reverse les incréments (et le relevé des jauges) dans le fichier commun."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not self.path:
+            with self._lock:
+                for key, value in pending.items():
+                    self._totals[key] = self._totals.get(key, 0.0) + value
+            return
+        gauges = self._read_gauges(mode="sum")
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO samples (series, labels, le, value) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (series, labels, le) DO UPDATE SET value = value + excluded.value",
+                    [(s, _SEP.join(l), le, v) for (s, l, le), v in pending.items()])
+                pid = os.getpid()
+                conn.execute("DELETE FROM gauges WHERE pid = ?", (pid,))
+                conn.executemany(
+                    "INSERT INTO gauges (pid, series, labels, value, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    [(pid, s, _SEP.join(l), v, time.time()) for (s, l), v in gauges.items()])
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except Exception as exc:   # les métriques ne doivent jamais casser un appel
+            logger.warning("Métriques non enregistrées : %s", exc)
+            with self._lock:       # réessayées au prochain vidage
+                for key, value in pending.items():
+                    self._pending[key] = self._pending.get(key, 0.0) + value
+
+    def collect(self) -> Tuple[Dict[_Key, float], Dict[Tuple[str, Labels], float]]:
+        """Échantillons (compteurs, histogrammes) et jauges, tous workers confondus."""
+        self.flush()
+        gauges = self._read_gauges(mode="local")
+        if not self.path:
+            with self._lock:
+                samples = dict(self._totals)
+            for (series, labels), value in self._read_gauges(mode="sum").items():
+                gauges[(series, labels)] = value
+            return samples, gauges
+        conn = self._conn()
+        samples = {(s, tuple(l.split(_SEP)) if l else (), le): v
+                   for s, l, le, v in conn.execute("SELECT series, labels, le, value FROM samples")}
+        # Relevés d'un worker disparu, ou qui ne vide plus (bloqué) : ignorés.
+        pids = [pid for (pid,) in conn.execute("SELECT DISTINCT pid FROM gauges")]
+        dead = [pid for pid in pids if not pid_alive(pid)]
+        if dead:
+            conn.executemany("DELETE FROM gauges WHERE pid = ?", [(pid,) for pid in dead])
+        rows = conn.execute("SELECT series, labels, SUM(value) FROM gauges WHERE updated_at > ? "
+                            "GROUP BY series, labels", (time.time() - 5 * self.flush_s,))
+        for s, l, v in rows:
+            gauges[(s, tuple(l.split(_SEP)) if l else ())] = v
+        return samples, gauges
+
+    def _read_gauges(self, mode: str) -> Dict[Tuple[str, Labels], float]:
+        out: Dict[Tuple[str, Labels], float] = {}
+        for metric in self.metrics:
+            if isinstance(metric, Gauge) and metric.mode == mode:
+                try:
+                    values = metric.read()
+                except Exception as exc:
+                    logger.debug("Jauge %s illisible : %s", metric.name, exc)
+                    continue
+                for labels, value in values.items():
+                    out[(metric.name, labels)] = value
+        return out
+
+    def render(self) -> str:
+        """Exposition texte Prometheus (version 0.0.4)."""
+        samples, gauges = self.collect()
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(samples, gauges))
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._totals.clear()
+        if self.path:
+            conn = self._conn()
+            conn.execute("DELETE FROM samples")
+            conn.execute("DELETE FROM gauges")
+
+
+_registry = Registry()
+
+
+def enable(path: str = METRICS_PATH, flush_s: float = METRICS_FLUSH_S) -> Registry:
+    """Bascule sur le fichier commun aux workers (démarrage de l'API, dans
+    chaque worker : après le fork)."""
+    global _registry
+    if _registry.path == path:
+        return _registry
+    registry = Registry(path, flush_s)
+    registry.metrics = _registry.metrics
+    _registry.flush()
+    registry._pending = dict(_registry._totals)
+    _registry.stop()
+    _registry = registry
+    registry.start()
+    return registry
+
+
+def get_registry() -> Registry:
+    return _registry
+
+
+def reset_registry() -> None:
+    """Tests uniquement : revient au registre du processus, vide."""
+    global _registry
+    metrics = _registry.metrics
+    _registry.stop()
+    _registry.reset()
+    _registry = Registry()
+    _registry.metrics = metrics
+
+
+def render() -> str:
+    return _registry.render()
+
+
+atexit.register(lambda: _registry.flush())
+
+
+# ─── Types de métriques ───────────────────────────────────────────────────────
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        _registry.register(self)
+
+    def _labels(self, values: Labels, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(str(v))}"' for k, v in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self, samples, gauges) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, value: float = 1.0) -> None:
+        _registry.add((self.name, labels, ""), value)
+
+    def render(self, samples, gauges) -> List[str]:
+        return [f"{self.name}{self._labels(labels)} {_num(v)}"
+                for (series, labels, _), v in sorted(samples.items()) if series == self.name]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._bounds = tuple(_num(b) for b in self.buckets) + ("+Inf",)
+
+    def observe(self, value: float, *labels: str) -> None:
+        # Un seul incrément par observation : le seau le plus serré. Les
+        # cumuls `le` sont reconstitués à l'exposition.
+        for bound, le in zip(self.buckets, self._bounds):
+            if value <= bound:
+                break
+        else:
+            le = "+Inf"
+        _registry.add((f"{self.name}_bucket", labels, le), 1.0)
+        _registry.add((f"{self.name}_sum", labels, ""), value)
+
+    @contextmanager
+    def timer(self, *labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def render(self, samples, gauges) -> List[str]:
+        per_labels: Dict[Labels, Dict[str, float]] = {}
+        sums: Dict[Labels, float] = {}
+        for (series, labels, le), v in samples.items():
+            if series == f"{self.name}_bucket":
+                per_labels.setdefault(labels, {})[le] = v
+            elif series == f"{self.name}_sum":
+                sums[labels] = v
+        lines = []
+        for labels in sorted(per_labels):
+            cumulative = 0.0
+            for le in self._bounds:
+                cumulative += per_labels[labels].get(le, 0.0)
+                bound = 'le="' + le + '"'
+                lines.append(f"{self.name}_bucket{self._labels(labels, bound)} {_num(cumulative)}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_num(sums.get(labels, 0.0))}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {_num(cumulative)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Jauge relevée à la demande : `fn` rend une valeur, ou `{étiquettes: valeur}`.
+
+    `mode="sum"` : relevée par chaque worker, sommée sur les workers vivants ;
+    `mode="local"` : lue par le seul worker qui répond (valeur déjà globale).
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Union[float, Dict[Labels, float]]],
+                 labels: Sequence[str] = (), mode: str = "sum"):
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self.mode = mode
+
+    def read(self) -> Dict[Labels, float]:
+        value = self.fn()
+        return value if isinstance(value, dict) else {(): float(value)}
+
+    def render(self, samples, gauges) -> List[str]:
+        return [f"{self.name}{self._labels(labels)} {_num(v)}"
+                for (series, labels), v in sorted(gauges.items()) if series == self.name]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# ─── Pools de threads suivis ──────────────────────────────────────────────────
+_pools: Dict[str, "weakref.WeakSet[ThreadPoolExecutor]"] = {}
+_pools_lock = threading.Lock()
+
+
+def track_pool(name: str, executor: ThreadPoolExecutor) -> ThreadPoolExecutor:
+    """Expose la file d'attente de `executor` (pools éphémères compris : la
+    jauge somme les pools vivants de même nom)."""
+    with _pools_lock:
+        _pools.setdefault(name, weakref.WeakSet()).add(executor)
+    return executor
+
+
+def _pool_queue_depths() -> Dict[Labels, float]:
+    with _pools_lock:
+        pools = {name: list(executors) for name, executors in _pools.items()}
+    # `_work_queue` : tâches soumises qu'aucun thread n'a encore prises.
+    return {(name,): float(sum(e._work_queue.qsize() for e in executors))
+            for name, executors in sorted(pools.items())}
+
+
+# ─── Métriques du service ─────────────────────────────────────────────────────
+STEP_SECONDS = Histogram("fisca_pipeline_step_seconds", "Durée des étapes du pipeline.",
+                         ("step", "status"))
+LLM_SECONDS = Histogram("fisca_llm_call_seconds", "Latence des appels LLM.", ("agent", "model"))
+LLM_TOKENS = Histogram("fisca_llm_tokens", "Tokens par appel LLM.", ("agent", "model", "direction"),
+                       buckets=TOKEN_BUCKETS)
+LLM_TTFT = Histogram("fisca_llm_ttft_seconds", "Attente du premier token des appels streamés.",
+                     ("agent", "model"))
+LLM_ERRORS = Counter("fisca_llm_errors_total", "Appels LLM en échec.", ("agent", "model"))
+HTTP_SECONDS = Histogram("fisca_http_request_seconds",
+                         "Latence des appels sortants (SerpAPI, JusticeLibre, scraping…).",
+                         ("service", "host"))
+HTTP_ERRORS = Counter("fisca_http_errors_total", "Appels sortants en échec.",
+                      ("service", "host", "error"))
+CACHE_LOOKUPS = Counter("fisca_cache_lookups_total",
+                        "Consultations des caches ; taux de succès = hit / (hit + miss).",
+                        ("cache", "result"))
+POOL_QUEUE = Gauge("fisca_pool_queue_depth", "Tâches en attente d'un thread, par pool.",
+                   _pool_queue_depths, ("pool",))
+
+
+@contextmanager
+def http_call(service: str, host: str, method: str = "GET", **meta) -> Iterator[None]:
+    """Appel sortant : latence et erreurs par hôte, et span du profil courant."""
+    t0 = time.perf_counter()
+    try:
+        with profiler.span(f"{method} {host}", "http", **meta):
+            yield
+    except Exception as exc:
+        HTTP_ERRORS.inc(service, host, type(exc).__name__)
+        raise
+    finally:
+        HTTP_SECONDS.observe(time.perf_counter() - t0, service, host)
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.inc(cache, "hit" if hit else "miss")
@@ -66,8 +66,9 @@ def provider_of(logical_name: str) -> str:
 def register_custom_pricing() -> None:
     """Enregistre les tarifs custom auprès de LiteLLM (idempotent).
 
-    Appelé une fois à l'import de utils.llm. Sans cela, `litellm.completion_cost`
-    renvoie 0 pour les modèles preview inconnus de la table interne.
+    Appelé une fois, au premier appel LLM (`utils.llm._init_once`). Sans cela,
+    `litellm.completion_cost` renvoie 0 pour les modèles preview inconnus de la
+    table interne.
     """
     if not CUSTOM_PRICING:
         return
@@ -86,3 +87,24 @@ def register_custom_pricing() -> None:
             logger.info("model_registry — tarif custom enregistré pour %s", litellm_id)
     except Exception as exc:  # pragma: no cover - dépend de litellm installé
         logger.warning("model_registry — échec enregistrement tarifs custom : %s", exc)
+
+
+def token_cost(logical_name: str, input_tokens: int, output_tokens: int) -> float:
+    """Coût USD d'un appel d'après ses tokens : tarif custom, sinon table LiteLLM.
+
+    Pour les appels streamés, dont on ne garde pas la réponse reconstruite que
+    demande `litellm.completion_cost`. 0 si le modèle n'a pas de tarif connu.
+    """
+    prices = CUSTOM_PRICING.get(logical_name)
+    if prices:
+        return (input_tokens * prices["input_cost_per_token"]
+                + output_tokens * prices["output_cost_per_token"])
+    try:
+        import litellm
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=resolve_model(logical_name), prompt_tokens=input_tokens,
+            completion_tokens=output_tokens)
+        return float(prompt_cost + completion_cost)
+    except Exception:
+        logger.debug("model_registry — tarif inconnu pour %s, coût 0", logical_name)
+        return 0.0
@@ -0,0 +1,368 @@
+"""
+Découpage des documents scrapés en passages et sélection lexicale (BM25).
+
+Une page BOFiP scrapée pèse couramment 30 à 80 Ko, dont seuls deux ou trois
+paragraphes répondent à la question. Tout envoyer au rédactionnel gonfle les
+tokens d'entrée — donc le coût et surtout le délai avant le premier token.
+
+Ce module :
+
+1. découpe chaque document selon sa **structure juridique** :
+   paragraphes numérotés du BOFiP (`10`, `20`, …), articles Légifrance
+   (`Article 150-0 B ter`), points / « considérant » des décisions ; à défaut,
+   paragraphes du texte regroupés en fenêtres ;
+2. indexe tous les passages dans un index **BM25** local, avec une
+   normalisation française (minuscules, sans accents, mots vides retirés,
+   racinisation légère) ;
+3. interroge l'index avec la question et les axes de l'analyste, puis ne garde
+   que les meilleurs passages de chaque document, **dans l'ordre du document**
+   et étiquetés (`[§ 20]`, `[Article L. 64]`) pour que l'attribution reste
+   lisible par le rédactionnel.
+
+Aucune dépendance : l'index tient en mémoire le temps d'une requête (quelques
+centaines de passages).
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# En dessous de cette taille, un document est transmis entier : le découper ne
+# ferait gagner que quelques centaines de tokens au prix du contexte.
+PASSAGES_WHOLE_DOC_MAX_CHARS = int(os.getenv("PASSAGES_WHOLE_DOC_MAX_CHARS", "3000"))
+# Passages retenus au plus par document.
+PASSAGES_PER_DOC = int(os.getenv("PASSAGES_PER_DOC", "4"))
+# Budget total du corpus transmis au rédactionnel (≈ 15k tokens).
+PASSAGES_MAX_TOTAL_CHARS = int(os.getenv("PASSAGES_MAX_TOTAL_CHARS", "60000"))
+# Bornes de taille d'un passage.
+PASSAGE_MIN_CHARS = 200
+PASSAGE_MAX_CHARS = 1800
+
+_SEPARATOR = "\n[…]\n"
+
+# ─── Normalisation française ──────────────────────────────────────────────────
+_STOPWORDS = frozenset("""
+a afin ai aie aient aies ait alors as au aucun aucune aupres auquel aura aurai auraient
+aurais aurait auras aurez auriez aurons auront aussi autre autres aux auxquelles auxquels
+avaient avais avait avant avec avez aviez avions avoir avons ayant ayez ayons c ca ce ceci
+cela celle celles celui cependant certain certaine certaines certains ces cet cette ceux
+chacun chaque chez ci comme comment d dans de des desquelles desquels deux devant doit donc
+dont du duquel elle elles en encore entre es est et etaient etais etait etant ete etes etiez
+etions etre eu eue eues eurent eus eusse eussent eusses eussiez eussions eut eux fait faut
+furent fus fusse fussent fusses fussiez fussions fut hors ici il ils j je jusqu jusque l la
+laquelle le lequel les lesquelles lesquels leur leurs lors lorsque lui m ma mais me meme
+memes mes moi mon n ne ni non nos notre nous on ont or ou par parce pas peu peut plus pour
+pourquoi puis qu quand que quel quelle quelles quels qui quoi s sa sans se selon ses si
+sien soi soient sois soit sommes son sont sous suis sur t ta te tel telle telles tels tes
+toi ton tous tout toute toutes tres tu un une vers voici voila vos votre vous y
+""".split())
+
+# Suffixes retirés, du plus long au plus court (racinisation « légère » : on
+# rapproche « imposition » / « imposable » / « imposé », sans l'agressivité d'un
+# Snowball qui confondrait des termes juridiques distincts).
+_SUFFIXES = (
+    "issements", "issement", "ations", "ation", "ements", "ement", "ables", "able",
+    "iques", "ique", "ives", "ive", "eurs", "euse", "eur", "ites", "ite",
+    "ees", "ee", "es", "er", "e", "s", "x",
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _strip_accents(s: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
+
+
+def _stem(token: str) -> str:
+    if token.isdigit() or len(token) <= 4:
+        return token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens normalisés d'un texte français (sans accents, mots vides, racinisés)."""
+    if not text:
+        return []
+    txt = _strip_accents(text.lower())
+    return [_stem(t) for t in _TOKEN_RE.findall(txt) if t not in _STOPWORDS]
+
+
+# ─── Découpage structurel ─────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class Passage:
+    """Segment d'un document, avec son repère dans la structure d'origine."""
+    label: str          # "§ 20", "Article L. 64", "Point 4", "Extrait 3"
+    text: str
+    ordinal: int        # position dans le document (ordre de restitution)
+
+
+# Numéro de paragraphe BOFiP seul sur sa ligne (produit par LegalScraper).
+_BOFIP_PARA_RE = re.compile(r"^\s*(\d{1,4})\s*$")
+# Début d'article de code. Le texte Légifrance est souvent aplati (get_text sans
+# séparateur) : on ne peut pas s'ancrer en début de ligne.
+_ARTICLE_RE = re.compile(
+    r"Article\s+((?:[LRDA]\.?\s?)?\d+(?:[-‑]\d+)*(?:\s?[A-Z](?![a-z]))?"
+    r"(?:\s(?:bis|ter|quater|quinquies|sexies))?)"
+)
+# Points numérotés (« 4. Il résulte… ») et considérants des décisions.
+_POINT_RE = re.compile(r"(?m)^\s*(\d{1,3})\.\s+(?=[A-ZÀ-Ý])")
+_CONSIDERANT_RE = re.compile(r"(?i)(?<![\w])(?:considérant|considerant)\s+qu")
+
+
+def split_passages(content: str, source_domain: str = "") -> List[Passage]:
+    """Découpe un document selon sa structure (BOFiP, Légifrance, décision).
+
+    Le découpage retenu est le premier qui reconnaît une structure plausible ;
+    à défaut, les paragraphes du texte sont regroupés en fenêtres.
+    """
+    if not content or not content.strip():
+        return []
+    domain = (source_domain or "").lower()
+
+    segments: List[Tuple[str, str]] = []
+    if "bofip" in domain or _count_bofip_markers(content) >= 3:
+        segments = _split_bofip(content)
+    if not segments and len(_ARTICLE_RE.findall(content)) >= 2:
+        segments = _split_on(_ARTICLE_RE, content, lambda m: f"Article {m.group(1)}")
+    if not segments and len(_POINT_RE.findall(content)) >= 3:
+        segments = _split_on(_POINT_RE, content, lambda m: f"Point {m.group(1)}")
+    if not segments and len(_CONSIDERANT_RE.findall(content)) >= 2:
+        counter = iter(range(1, 10_000))
+        segments = _split_on(_CONSIDERANT_RE, content, lambda _m: f"Considérant {next(counter)}")
+    if not segments:
+        segments = _split_paragraphs(content)
+
+    passages: List[Passage] = []
+    for label, text in _resize(segments):
+        passages.append(Passage(label=label, text=text, ordinal=len(passages)))
+    return passages
+
+
+def _count_bofip_markers(content: str) -> int:
+    return sum(1 for line in content.splitlines() if _BOFIP_PARA_RE.match(line))
+
+
+def _split_bofip(content: str) -> List[Tuple[str, str]]:
+    segments: List[Tuple[str, str]] = []
+    label, buf = "En-tête", []
+    for line in content.splitlines():
+        m = _BOFIP_PARA_RE.match(line)
+        if m:
+            if any(x.strip() for x in buf):
+                segments.append((label, "\n".join(buf).strip()))
+            label, buf = f"§ {m.group(1)}", []
+            continue
+        buf.append(line)
+    if any(x.strip() for x in buf):
+        segments.append((label, "\n".join(buf).strip()))
+    # Une seule section = aucun numéro de paragraphe exploitable.
+    return segments if len(segments) > 1 else []
+
+
+def _split_on(pattern: re.Pattern, content: str, make_label) -> List[Tuple[str, str]]:
+    matches = list(pattern.finditer(content))
+    segments: List[Tuple[str, str]] = []
+    head = content[: matches[0].start()].strip()
+    if head:
+        segments.append(("En-tête", head))
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(content)
+        text = content[m.start():end].strip()
+        if text:
+            segments.append((make_label(m), text))
+    return segments
+
+
+def _split_paragraphs(content: str) -> List[Tuple[str, str]]:
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", content) if p.strip()]
+    if len(paragraphs) <= 1:
+        paragraphs = [p.strip() for p in content.splitlines() if p.strip()]
+    return [(f"Extrait {i + 1}", p) for i, p in enumerate(paragraphs)]
+
+
+def _resize(segments: Sequence[Tuple[str, str]]) -> Iterable[Tuple[str, str]]:
+    """Fusionne les segments trop courts et redécoupe les trop longs."""
+    merged: List[Tuple[str, str]] = []
+    for label, text in segments:
+        if merged and len(merged[-1][1]) < PASSAGE_MIN_CHARS:
+            prev_label, prev_text = merged[-1]
+            # Un en-tête trop court s'efface devant le repère qui suit.
+            merged[-1] = (label if prev_label == "En-tête" else prev_label, f"{prev_text}\n{text}")
+        else:
+            merged.append((label, text))
+
+    for label, text in merged:
+        if len(text) <= PASSAGE_MAX_CHARS:
+            yield label, text
+            continue
+        for i, piece in enumerate(_window(text, PASSAGE_MAX_CHARS)):
+            yield (label if i == 0 else f"{label} (suite)"), piece
+
+
+def _window(text: str, size: int) -> Iterable[str]:
+    """Coupe un texte long en fenêtres, de préférence sur une fin de phrase."""
+    start, n = 0, len(text)
+    while start < n:
+        end = min(n, start + size)
+        if end < n:
+            cut = max(text.rfind(". ", start + size // 2, end), text.rfind("\n", start + size // 2, end))
+            if cut > start:
+                end = cut + 1
+        piece = text[start:end].strip()
+        if piece:
+            yield piece
+        start = end
+
+
+# ─── Index BM25 ───────────────────────────────────────────────────────────────
+class BM25Index:
+    """Index Okapi BM25 en mémoire sur des listes de tokens déjà normalisés."""
+
+    def __init__(self, documents: Sequence[Sequence[str]], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._tfs = [Counter(doc) for doc in documents]
+        self._lengths = [len(doc) for doc in documents]
+        self._avgdl = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        df: Counter = Counter()
+        for tf in self._tfs:
+            df.update(tf.keys())
+        n = len(self._tfs)
+        self._idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def __len__(self) -> int:
+        return len(self._tfs)
+
+    def scores(self, query: Sequence[str]) -> List[float]:
+        terms = [t for t in set(query) if t in self._idf]
+        out = []
+        for tf, length in zip(self._tfs, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self._avgdl or 1.0))
+            score = 0.0
+            for t in terms:
+                f = tf.get(t)
+                if f:
+                    score += self._idf[t] * f * (self.k1 + 1) / (f + norm)
+            out.append(score)
+        return out
+
+
+# ─── Sélection pour le rédactionnel ───────────────────────────────────────────
+def build_query(question: str, analyst_json: Optional[dict]) -> List[str]:
+    """Requête lexicale : question + axes de recherche et concepts de l'analyste."""
+    parts = [question or ""]
+    for key in ("axes_de_recherche_serp", "concepts_clefs_T0", "concepts_miroirs_Tplus1"):
+        value = (analyst_json or {}).get(key)
+        if isinstance(value, list):
+            parts.extend(str(v) for v in value if v)
+        elif isinstance(value, str):
+            parts.append(value)
+    return tokenize(" ".join(parts))
+
+
+def select_passages(
+    docs: List[Dict],
+    question: str,
+    analyst_json: Optional[dict] = None,
+    *,
+    per_doc: int = PASSAGES_PER_DOC,
+    max_total_chars: int = PASSAGES_MAX_TOTAL_CHARS,
+) -> Tuple[List[Dict], Dict[str, int]]:
+    """Réduit le `content` de chaque document à ses passages les plus pertinents.
+
+    Les passages déjà désignés en amont (`_passages` : ceux qu'a trouvés
+    l'index dense, qui ne partagent parfois aucun mot avec la question) sont
+    retenus d'abord. Chaque document conserve ensuite au moins son meilleur
+    passage (la source reste citable), puis le budget restant est attribué
+    par score décroissant sur l'ensemble du corpus. Les documents sans contenu sont rendus tels quels :
+    le rédactionnel sait exploiter titre + extrait.
+
+    Returns:
+        (documents réduits, dans le même ordre ; statistiques pour la trace).
+    """
+    stats = {"chars_avant": sum(len(d.get("content") or "") for d in docs),
+             "chars_apres": 0, "passages": 0, "docs_decoupes": 0}
+    if not docs:
+        return [], stats
+
+    # (index doc, passage) pour tous les documents à découper
+    split: Dict[int, List[Passage]] = {}
+    for i, doc in enumerate(docs):
+        content = doc.get("content") or ""
+        if len(content) > PASSAGES_WHOLE_DOC_MAX_CHARS:
+            passages = split_passages(content, doc.get("source_domain", ""))
+            if len(passages) > 1:
+                split[i] = passages
+
+    if not split:
+        stats["chars_apres"] = stats["chars_avant"]
+        return list(docs), stats
+
+    flat = [(i, p) for i, passages in split.items() for p in passages]
+    # Le titre n'est pas indexé : commun à tous les passages d'un document, il
+    # ne les départage pas et ferait remonter du bruit au-dessus de zéro.
+    index = BM25Index([tokenize(f"{p.label} {p.text}") for _, p in flat])
+    scores = index.scores(build_query(question, analyst_json))
+    ranked = sorted(range(len(flat)), key=lambda k: scores[k], reverse=True)
+
+    whole_chars = sum(len(docs[i].get("content") or "") for i in range(len(docs)) if i not in split)
+    budget = max(0, max_total_chars - whole_chars)
+    chosen: Dict[int, List[Passage]] = {i: [] for i in split}
+
+    # 0) les passages désignés en amont : le premier d'un document est garanti,
+    #    les suivants dans la limite du budget
+    taken = set()
+    for k, (i, p) in enumerate(flat):
+        if p.label not in (docs[i].get("_passages") or ()) or len(chosen[i]) >= per_doc:
+            continue
+        if chosen[i] and len(p.text) > budget:
+            continue
+        chosen[i].append(p)
+        taken.add(k)
+        budget -= len(p.text)
+    # 1) le meilleur passage de chaque document (attribution garantie)
+    for k in ranked:
+        i, p = flat[k]
+        if not chosen[i]:
+            chosen[i].append(p)
+            taken.add(k)
+            budget -= len(p.text)
+    # 2) puis les meilleurs passages restants, dans la limite du budget
+    for k in ranked:
+        if k in taken or scores[k] <= 0:
+            continue
+        i, p = flat[k]
+        if len(chosen[i]) >= per_doc or len(p.text) > budget:
+            continue
+        chosen[i].append(p)
+        budget -= len(p.text)
+
+    out: List[Dict] = []
+    for i, doc in enumerate(docs):
+        if i not in split:
+            out.append(doc)
+            continue
+        kept = sorted(chosen[i], key=lambda p: p.ordinal)
+        reduced = dict(doc)
+        reduced["content"] = _SEPARATOR.join(f"[{p.label}]\n{p.text}" for p in kept)
+        reduced["_passages"] = [p.label for p in kept]
+        out.append(reduced)
+        stats["passages"] += len(kept)
+        stats["docs_decoupes"] += 1
+
+    stats["chars_apres"] = sum(len(d.get("content") or "") for d in out)
+    logger.info("Passages — %d docs découpés, %d passages retenus, %d → %d chars",
+                stats["docs_decoupes"], stats["passages"],
+                stats["chars_avant"], stats["chars_apres"])
+    return out, stats
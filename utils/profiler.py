@@ -0,0 +1,325 @@
+"""
+Profilage d'une exécution : spans imbriqués, chemin critique, export speedscope.
+
+`PipelineResult.timings` dit combien dure chaque étape, pas où passe ce temps.
+Activé pour une exécution (`profiling()`, en-tête `X-Profile` côté API), ce
+module enregistre des **spans** imbriqués :
+
+- `llm:<agent>` (`utils.llm`) — avec, en streaming, `ttft` (attente du premier
+  token) et `generation` ;
+- `GET <hôte>` (recherche, scraping, JusticeLibre, FiscalOnline) et
+  `extract <type>` (trafilatura / BeautifulSoup) ;
+- `json` (`lire_json_beton`) ;
+- `queue:<pool>` : attente d'un thread libre dans un pool (`bind`) ;
+- `step:<étape>` : les étapes du pipeline (`pipeline.profiling`).
+
+Chaque span porte son thread et son temps CPU (`time.thread_time`) : un span
+dont le temps CPU est très inférieur au temps réel attendait — le réseau, ou
+le GIL s'il n'y a pas d'I/O (extraction, parsing).
+
+Le profil se lit de deux façons :
+
+- `summary()` : **chemin critique** (la chaîne de spans qui détermine la durée
+  totale, temps propre de chacun) et répartition par catégorie ;
+- `to_speedscope()` : flame graph par thread, au format
+  https://www.speedscope.app (fichier JSON à glisser dans l'application).
+
+Inactif, le coût est celui d'une lecture de `ContextVar` par span.
+"""
+from __future__ import annotations
+
+import functools
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Tolérance d'horloge pour l'inclusion d'un span dans son parent (s).
+_EPS = 1e-6
+_TOP = 10
+
+
+@dataclass
+class Span:
+    id: int
+    name: str
+    category: str
+    start: float                      # perf_counter
+    end: Optional[float] = None
+    parent: Optional[int] = None
+    thread: str = ""
+    cpu_s: Optional[float] = None
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, (self.end or self.start) - self.start)
+
+
+class Profile:
+    """Spans d'une exécution ; alimenté depuis plusieurs threads."""
+
+    def __init__(self, trace_id: str = ""):
+        self.trace_id = trace_id
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.t_end: Optional[float] = None
+        self.spans: List[Span] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # ── Enregistrement ───────────────────────────────────────────────────────
+    def open(self, name: str, category: str, parent: Optional[int] = None, **meta) -> Span:
+        span = Span(id=next(self._ids), name=name, category=category, start=time.perf_counter(),
+                    parent=parent, thread=threading.current_thread().name, meta=meta)
+        span.cpu_s = -time.thread_time()
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def close(self, span: Span, **meta) -> None:
+        span.end = time.perf_counter()
+        if span.cpu_s is not None and span.cpu_s <= 0:
+            span.cpu_s += time.thread_time()
+        span.meta.update(meta)
+
+    def record(self, name: str, category: str, start: float, end: float,
+               parent: Optional[int] = None, **meta) -> Span:
+        """Span a posteriori (bornes `perf_counter` connues), sans temps CPU."""
+        span = Span(id=next(self._ids), name=name, category=category, start=start, end=end,
+                    parent=parent, thread=threading.current_thread().name, meta=meta)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def finish(self) -> None:
+        self.t_end = time.perf_counter()
+        for span in self.spans:                   # spans interrompus (annulation)
+            if span.end is None:
+                span.end = self.t_end
+                span.meta["unfinished"] = True
+                if span.cpu_s is not None and span.cpu_s < 0:
+                    span.cpu_s = None
+
+    # ── Lecture ──────────────────────────────────────────────────────────────
+    @property
+    def total_s(self) -> float:
+        return (self.t_end or time.perf_counter()) - self.t0
+
+    def _children(self) -> Dict[Optional[int], List[Span]]:
+        children: Dict[Optional[int], List[Span]] = {}
+        for span in self.spans:
+            children.setdefault(span.parent, []).append(span)
+        return children
+
+    def critical_path(self) -> List[Dict[str, Any]]:
+        """Temps propre des spans du chemin critique (chaque span avant ses
+        enfants, les enfants dans l'ordre chronologique).
+
+        Depuis la fin d'un span, on remonte la chaîne des enfants qui se
+        terminent le plus tard (chacun avant le début du précédent retenu) :
+        ce sont eux qui ont fixé sa fin. Le reste de sa durée est son temps
+        propre. La somme des `ms` vaut la durée totale.
+        """
+        children = self._children()
+        out: List[Dict[str, Any]] = []
+
+        def _walk(name: str, category: str, start: float, end: float, kids: List[Span],
+                  path: str) -> None:
+            chain, cursor = [], end
+            for kid in sorted(kids, key=lambda s: s.end or s.start, reverse=True):
+                if (kid.end or kid.start) <= cursor + _EPS and kid.start >= start - _EPS:
+                    chain.append(kid)
+                    cursor = kid.start
+            own = (end - start) - sum(k.duration for k in chain)
+            if own > _EPS:
+                out.append({"name": name, "category": category, "path": path,
+                            "ms": round(own * 1000, 1)})
+            for kid in reversed(chain):
+                _walk(kid.name, kid.category, kid.start, kid.end or kid.start,
+                      children.get(kid.id, []), f"{path}/{kid.name}" if path else kid.name)
+
+        _walk("(hors spans)", "self", self.t0, self.t0 + self.total_s, children.get(None, []), "")
+        return out
+
+    def summary(self) -> Dict[str, Any]:
+        path = self.critical_path()
+        by_category: Dict[str, Dict[str, float]] = {}
+        for entry in path:
+            cat = by_category.setdefault(entry["category"], {"critical_ms": 0.0, "wall_ms": 0.0,
+                                                             "cpu_ms": 0.0})
+            cat["critical_ms"] += entry["ms"]
+        for span in self.spans:
+            cat = by_category.setdefault(span.category, {"critical_ms": 0.0, "wall_ms": 0.0,
+                                                         "cpu_ms": 0.0})
+            cat["wall_ms"] += span.duration * 1000
+            cat["cpu_ms"] += (span.cpu_s or 0.0) * 1000
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round(self.total_s * 1000, 1),
+            "spans": len(self.spans),
+            "by_category": {k: {m: round(v, 1) for m, v in c.items()}
+                            for k, c in sorted(by_category.items(),
+                                               key=lambda kv: -kv[1]["critical_ms"])},
+            "top": sorted(path, key=lambda e: -e["ms"])[:_TOP],
+            "critical_path": path,
+        }
+
+    def to_speedscope(self) -> Dict[str, Any]:
+        """Profil « evented » par thread, au format speedscope (millisecondes).
+
+        Deux spans d'un même thread qui se chevauchent sans s'imbriquer (un
+        span enregistré a posteriori, par exemple) vont sur deux pistes.
+        """
+        frames: List[Dict[str, str]] = []
+        frame_ids: Dict[str, int] = {}
+        lanes: Dict[str, List[List[Span]]] = {}      # thread → pistes (spans de la piste)
+        stacks: Dict[str, List[List[Span]]] = {}     # thread → pile ouverte de chaque piste
+
+        for span in sorted(self.spans, key=lambda s: (s.start, -(s.end or s.start))):
+            if span.duration <= 0:
+                continue
+            thread_lanes = lanes.setdefault(span.thread, [])
+            thread_stacks = stacks.setdefault(span.thread, [])
+            for lane, stack in zip(thread_lanes, thread_stacks):
+                while stack and stack[-1].end <= span.start + _EPS:
+                    stack.pop()
+                if not stack or span.end <= stack[-1].end + _EPS:
+                    lane.append(span)
+                    stack.append(span)
+                    break
+            else:
+                thread_lanes.append([span])
+                thread_stacks.append([span])
+
+        profiles = []
+        end_ms = round(self.total_s * 1000, 3)
+        for thread, thread_lanes in lanes.items():
+            for n, lane in enumerate(thread_lanes):
+                events = []
+                for span in lane:
+                    if span.name not in frame_ids:
+                        frame_ids[span.name] = len(frames)
+                        frames.append({"name": span.name, "file": span.category})
+                    frame = frame_ids[span.name]
+                    start, end = (span.start - self.t0) * 1000, (span.end - self.t0) * 1000
+                    # À instant égal : fermetures avant ouvertures, englobant ouvert d'abord.
+                    events.append((start, 1, -end, "O", frame))
+                    events.append((end, 0, -start, "C", frame))
+                events.sort()
+                profiles.append({
+                    "type": "evented",
+                    "name": thread if n == 0 else f"{thread} ({n + 1})",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": end_ms,
+                    "events": [{"type": kind, "frame": frame, "at": round(at, 3)}
+                               for at, _, _, kind, frame in events],
+                })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.trace_id or "profil",
+            "exporter": "fisca",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+
+# ── Profil courant ───────────────────────────────────────────────────────────
+_active: ContextVar[Optional[Profile]] = ContextVar("profile_active", default=None)
+_parent: ContextVar[Optional[int]] = ContextVar("profile_parent", default=None)
+
+
+def current() -> Optional[Profile]:
+    return _active.get()
+
+
+@contextmanager
+def profiling(trace_id: str = "") -> Iterator[Profile]:
+    """Active un profil pour le bloc (et les workers lancés via `bind`)."""
+    profile = Profile(trace_id)
+    token, parent_token = _active.set(profile), _parent.set(None)
+    try:
+        yield profile
+    finally:
+        profile.finish()
+        _parent.reset(parent_token)
+        _active.reset(token)
+
+
+def set_parent(span_: Optional[Span]) -> None:
+    """Rattache les spans suivants du contexte à `span_` (None : à la racine).
+
+    Pour les spans qui ne tiennent pas dans un bloc `with` — les étapes du
+    pipeline, ouvertes et fermées entre deux `yield`.
+    """
+    _parent.set(span_.id if span_ is not None else None)
+
+
+@contextmanager
+def span(name: str, category: str, **meta) -> Iterator[Optional[Span]]:
+    """Span imbriqué dans le span courant ; sans profil actif, ne fait rien."""
+    profile = _active.get()
+    if profile is None:
+        yield None
+        return
+    current_span = profile.open(name, category, parent=_parent.get(), **meta)
+    token = _parent.set(current_span.id)
+    try:
+        yield current_span
+    finally:
+        _parent.reset(token)
+        profile.close(current_span)
+
+
+def record(name: str, category: str, start: float, end: float,
+           parent: Optional[Span] = None, **meta) -> Optional[Span]:
+    """Span a posteriori sous `parent` (par défaut le span courant) ; sans
+    profil actif, ne fait rien. Pour les durées qui enjambent un `yield`."""
+    profile = _active.get()
+    if profile is None:
+        return None
+    return profile.record(name, category, start, end,
+                          parent=parent.id if parent is not None else _parent.get(), **meta)
+
+
+def profiled(name: str, category: str) -> Callable:
+    """Décorateur : chaque appel de la fonction est un span."""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _active.get() is None:
+                return fn(*args, **kwargs)
+            with span(name, category):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(fn: Callable, pool: str) -> Callable:
+    """Rattache au profil courant une tâche soumise à un pool de threads.
+
+    À appeler dans le thread qui soumet : la tâche s'exécute sous le span
+    courant, précédée d'un span `queue:<pool>` (attente d'un thread libre).
+    Sans profil actif, rend `fn` telle quelle.
+    """
+    profile = _active.get()
+    if profile is None:
+        return fn
+    parent = _parent.get()
+    submitted = time.perf_counter()
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        profile.record(f"queue:{pool}", "queue", submitted, time.perf_counter(), parent=parent)
+        token, parent_token = _active.set(profile), _parent.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _parent.reset(parent_token)
+            _active.reset(token)
+    return bound
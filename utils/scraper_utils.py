@@ -1,13 +1,22 @@
 """
 Utilitaires pour le scraping avec fallback Firecrawl
+
+`scrapper()` scrape une liste connue d'avance ; `ScrapeSession` accepte des
+documents au fil de l'eau (ranker streamé) et rend la liste finale ensuite.
 """
 import os
 import logging
-from typing import List, Dict
+import threading
+from typing import List, Dict, Optional
+from urllib.parse import urlparse
 from concurrent.futures import (
-    ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed,
+    Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed,
 )
 from legal_scraper import LegalScraper
+from utils import metrics, profiler
+from utils.corpus import corpus_content
+from utils.legal_ids import LegalIdIndex
+from utils.urls import clean_url
 
 logger = logging.getLogger(__name__)
 
@@ -23,134 +32,286 @@ FIRECRAWL_TIMEOUT_S = float(os.getenv("FIRECRAWL_TIMEOUT_S", "45"))
 # indéfiniment sur une page volumineuse.
 SCRAPE_TOTAL_TIMEOUT_S = float(os.getenv("SCRAPE_TOTAL_TIMEOUT_S", "120"))
 
+# Scraping spéculatif, lancé pendant le ranking sur les candidats à forte
+# priorité a priori (Légifrance, BOFiP bien classés) : URL au plus, threads
+# dédiés (ne concurrencent pas le scraping demandé) et volume extrait au-delà
+# duquel on cesse de spéculer.
+SCRAPE_PREFETCH_MAX_URLS = int(os.getenv("SCRAPE_PREFETCH_MAX_URLS", "8"))
+SCRAPE_PREFETCH_MAX_WORKERS = int(os.getenv("SCRAPE_PREFETCH_MAX_WORKERS", "2"))
+SCRAPE_PREFETCH_MAX_BYTES = int(os.getenv("SCRAPE_PREFETCH_MAX_BYTES", "3000000"))
+
 # Pool dédié aux appels Firecrawl : permet d'abandonner un appel qui ne rend pas
 # la main (le thread se termine de lui-même) sans bloquer le thread de scraping.
-_firecrawl_pool = ThreadPoolExecutor(max_workers=SCRAPE_MAX_WORKERS,
-                                     thread_name_prefix="firecrawl")
+_firecrawl_pool = metrics.track_pool("firecrawl", ThreadPoolExecutor(
+    max_workers=SCRAPE_MAX_WORKERS, thread_name_prefix="firecrawl"))
 
 
-def scrapper(ranked_keep: List[Dict]) -> List[Dict]:
-    """
-    Pour chaque document de la liste filtrée, utilise LegalScraper pour récupérer le contenu de l'URL.
-    Si le scraping échoue ou retourne un contenu vide, utilise Firecrawl comme fallback.
-    Ajoute une clé 'content' au dictionnaire.
-    Les URLs sont scrapées en parallèle pour réduire le temps total.
+class ScrapeSession:
+    """Session de scraping alimentée au fil de l'eau.
+
+    Les documents peuvent être soumis (`submit`) avant que la liste définitive
+    ne soit connue — typiquement dès que le ranker streamé retient une source —
+    puis `results` rend la liste complète, dans l'ordre demandé, en soumettant
+    ce qui ne l'a pas encore été. Un document n'est scrapé qu'une fois, même
+    demandé sous deux URL : les clés sont des identités juridiques
+    (`utils.legal_ids`), à défaut des URL canoniques.
+
+    `prefetch` lance en plus un scraping **spéculatif**, avant toute décision :
+    c'est un cache propre à la requête, consulté par `submit` / `results`.
+    Les spéculations non demandées au final sont annulées si elles n'ont pas
+    démarré, et comptées comme gaspillées sinon (`stats`).
+
+        with ScrapeSession() as session:
+            agent_ranker(..., on_result=lambda d: session.submit(d))
+            docs = session.results(ranked_keep)
     """
-    if not ranked_keep:
-        return []
 
-    try:
-        scraper = LegalScraper()
-        firecrawl_client = None  # Lazy init pour éviter l'import si non nécessaire
+    def __init__(self, max_workers: int = SCRAPE_MAX_WORKERS):
+        self._scraper = LegalScraper()
+        self._firecrawl_client = None  # Lazy init pour éviter l'import si non nécessaire
+        self._executor = metrics.track_pool("scraper", ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="scraper"))
+        self._futures: Dict[str, Future] = {}   # clé : identité juridique / URL canonique
+        self._ids = LegalIdIndex()
+        self._lock = threading.Lock()
+        self._closed = False
+        # Spéculation
+        self._prefetch_pool: Optional[ThreadPoolExecutor] = None
+        self._speculative: set = set()      # URL soumises en spéculation
+        self._spec_started: set = set()     # … effectivement scrapées
+        self._spec_skipped: set = set()     # … abandonnées (budget d'octets épuisé)
+        self._spec_bytes = 0
+        self._wanted: set = set()           # URL demandées (submit / results)
+
+    def __enter__(self) -> "ScrapeSession":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def submitted(self) -> int:
+        """Nombre d'URL soumises depuis l'ouverture de la session."""
+        return len(self._futures)
+
+    def submit(self, doc: Dict) -> bool:
+        """Lance le scraping d'un document ; False si déjà soumis ou inutile.
 
-        def _scrape_single(doc: Dict) -> Dict:
-            """Scrape une URL unique avec fallback Firecrawl."""
-            nonlocal firecrawl_client
+        Thread-safe : appelable depuis les threads du ranker.
+        """
+        url = doc.get("url")
+        if not url or doc.get("content"):
+            return False
+        with self._lock:
+            key = self._ids.key_for(doc)
+            self._wanted.add(key)
+            if self._closed:
+                return False
+            future = self._futures.get(key)
+            # Spéculation encore en file : passée au pool principal, plus large
+            # que celui de la spéculation. Démarrée, elle y reste.
+            moved = key in self._speculative and future is not None and future.cancel()
+            # Une spéculation abandonnée faute de budget est relancée pour de bon.
+            if future is not None and not moved and key not in self._spec_skipped:
+                return False
+            self._spec_skipped.discard(key)
+            self._futures[key] = self._executor.submit(profiler.bind(self._scrape_single, "scraper"), url)
+            return True
 
-            # Contenu pré-rempli par JusticeLibre : pas de scraping nécessaire
-            if doc.get("content"):
-                return doc
+    def prefetch(self, docs: List[Dict], limit: int = SCRAPE_PREFETCH_MAX_URLS) -> int:
+        """Scrape par anticipation les premiers `docs` (déjà triés par priorité).
 
+        Returns:
+            Nombre d'URL soumises en spéculation.
+        """
+        n = 0
+        for doc in docs:
+            if n >= limit:
+                break
             url = doc.get("url")
-            content = ""
-            source_method = None
+            if not url or doc.get("content"):
+                continue
+            with self._lock:
+                key = self._ids.key_for(doc)
+                if self._closed or key in self._futures:
+                    continue
+                if self._prefetch_pool is None:
+                    self._prefetch_pool = metrics.track_pool("scraper-prefetch", ThreadPoolExecutor(
+                        max_workers=max(1, SCRAPE_PREFETCH_MAX_WORKERS),
+                        thread_name_prefix="scraper-prefetch",
+                    ))
+                self._futures[key] = self._prefetch_pool.submit(
+                    profiler.bind(self._speculative_single, "scraper-prefetch"), key, url)
+                self._speculative.add(key)
+            n += 1
+        return n
+
+    def stats(self) -> Dict[str, float]:
+        """Efficacité de la spéculation, pour les métadonnées de l'étape scraping.
+
+        * `taux_succes` : part des URL demandées servies par une spéculation ;
+        * `taux_gaspillage` : part des scrapings spéculatifs lancés pour rien.
+        """
+        with self._lock:
+            demanded = len(self._wanted)
+            # Une spéculation abandonnée faute de budget n'a rien servi.
+            hits = len(self._spec_started & self._wanted)
+            wasted = len(self._spec_started - self._wanted)
+            return {
+                "speculatifs": len(self._speculative),
+                "speculatifs_utiles": hits,
+                "taux_succes": round(hits / demanded, 2) if demanded else 0.0,
+                "taux_gaspillage": round(wasted / len(self._spec_started), 2) if self._spec_started else 0.0,
+                "octets_speculatifs": self._spec_bytes,
+            }
+
+    def results(self, docs: List[Dict], timeout: Optional[float] = None) -> List[Dict]:
+        """Rend `docs` enrichis d'un `content`, dans le même ordre.
+
+        Scraping parallèle, borné dans le temps.
+
+        Les timeouts par appel ne suffisent pas : `requests` est bien borné à
+        30 s, mais l'extraction trafilatura d'une page BOFiP volumineuse est du
+        calcul pur, sans aucune limite. Un run de recette est resté bloqué là
+        plus de trente minutes. On borne donc l'étape entière et on rédige avec
+        ce qui a été récupéré : le prompt rédactionnel sait déjà exploiter une
+        source dont le contenu manque (titre + extrait).
+        """
+        timeout = SCRAPE_TOTAL_TIMEOUT_S if timeout is None else timeout
+        for doc in docs:
+            self.submit(doc)
+        # La liste est définitive : les spéculations inutiles encore en file
+        # d'attente n'ont plus lieu d'être.
+        with self._lock:
+            for key in self._speculative - self._wanted:
+                self._futures[key].cancel()
+        # Défaut : documents inchangés, avec un `content` vide. Le contenu
+        # pré-rempli (JusticeLibre, FiscalOnline) est conservé tel quel.
+        enriched = [{**doc, "content": doc.get("content", "")} for doc in docs]
+        waiting: Dict[Future, List[int]] = {}
+        for i, doc in enumerate(docs):
+            with self._lock:
+                key = self._ids.key_for(doc)
+            if not doc.get("content") and key in self._futures:
+                waiting.setdefault(self._futures[key], []).append(i)
 
-            if url:
-                # 1. Essayer d'abord avec LegalScraper
-                try:
-                    scraped = scraper.scrape_url(url)
-                    if scraped:
-                        if hasattr(scraped, "content") and scraped.content:
-                            content = scraped.content
-                            source_method = "LegalScraper"
-                        elif isinstance(scraped, dict) and scraped.get("content"):
-                            content = scraped["content"]
-                            source_method = "LegalScraper"
-                except Exception as e:
-                    logger.warning(f"LegalScraper failed for {url}: {e}")
-
-                # 2. Fallback Firecrawl si contenu vide
-                if not content or 'requires JS' in content:
-                    try:
-                        if firecrawl_client is None:
-                            from firecrawl import V1FirecrawlApp
-                            api_key = os.getenv("FIRECRAWL_API_KEY")
-                            if api_key:
-                                firecrawl_client = V1FirecrawlApp(api_key=api_key)
-                            else:
-                                logger.warning("FIRECRAWL_API_KEY not set, skipping fallback")
-
-                        if firecrawl_client:
-                            import re
-                            cleaned_url = url
-                            cleaned_url = re.sub(r';jsessionid=[^/?&#]+', '', cleaned_url, flags=re.IGNORECASE)
-                            cleaned_url = re.sub(r'([&?])cid=[^&]+', lambda m: '?' if m.group(1) == '?' else '', cleaned_url)
-                            cleaned_url = re.sub(r'\?$', '', cleaned_url)
-                            future = _firecrawl_pool.submit(
-                                firecrawl_client.scrape_url, cleaned_url, proxy='stealth'
-                            )
-                            result = future.result(timeout=FIRECRAWL_TIMEOUT_S)
-                            if result and result.markdown:
-                                content = result.markdown
-                                source_method = "Firecrawl"
-                                logger.info(f"Firecrawl fallback success for {cleaned_url}")
-                    except FuturesTimeout:
-                        logger.warning(
-                            "Firecrawl fallback timeout (%ss) for %s", FIRECRAWL_TIMEOUT_S, url
-                        )
-                    except Exception as e:
-                        logger.warning(f"Firecrawl fallback failed for {url}: {e}")
-
-                if source_method:
-                    logger.debug(f"Scraped {url} using {source_method}")
-
-            doc_with_content = dict(doc)
-            doc_with_content["content"] = content
-            return doc_with_content
-
-        # Scraping parallèle, borné dans le temps.
-        #
-        # Les timeouts par appel ne suffisent pas : `requests` est bien borné à
-        # 30 s, mais l'extraction trafilatura d'une page BOFiP volumineuse est du
-        # calcul pur, sans aucune limite. Un run de recette est resté bloqué là
-        # plus de trente minutes. On borne donc l'étape entière et on rédige avec
-        # ce qui a été récupéré : le prompt rédactionnel sait déjà exploiter une
-        # source dont le contenu manque (titre + extrait).
-        executor = ThreadPoolExecutor(
-            max_workers=min(SCRAPE_MAX_WORKERS, max(1, len(ranked_keep))),
-            thread_name_prefix="scraper",
-        )
-        futures = {executor.submit(_scrape_single, doc): i
-                   for i, doc in enumerate(ranked_keep)}
-        # Défaut : documents inchangés, avec un `content` vide.
-        enriched = [{**doc, "content": doc.get("content", "")} for doc in ranked_keep]
         done = 0
         try:
-            for future in as_completed(futures, timeout=SCRAPE_TOTAL_TIMEOUT_S):
-                index = futures[future]
+            for future in as_completed(waiting, timeout=timeout):
+                indexes = waiting[future]
                 try:
-                    enriched[index] = future.result()
+                    content = future.result()
                     done += 1
                 except Exception as exc:
                     logger.warning("Scraping en échec pour %s : %s",
-                                   ranked_keep[index].get("url"), exc)
+                                   docs[indexes[0]].get("url"), exc)
+                    continue
+                for i in indexes:
+                    enriched[i]["content"] = content or ""
         except FuturesTimeout:
             logger.warning(
                 "Scraping — budget global de %ss dépassé : %d/%d documents récupérés, "
                 "rédaction avec ce qui est disponible",
-                SCRAPE_TOTAL_TIMEOUT_S, done, len(ranked_keep),
+                timeout, done, len(waiting),
             )
-        finally:
-            # wait=False : ne pas attendre les workers en souffrance, c'est
-            # précisément ce dont on cherche à se protéger.
-            executor.shutdown(wait=False, cancel_futures=True)
+        return enriched
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+        # wait=False : ne pas attendre les workers en souffrance, c'est
+        # précisément ce dont on cherche à se protéger.
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._prefetch_pool is not None:
+            self._prefetch_pool.shutdown(wait=False, cancel_futures=True)
+        try:
+            self._scraper.close()
+        except Exception:
+            pass
+
+    def _speculative_single(self, key: str, url: str) -> Optional[str]:
+        with self._lock:
+            if key not in self._wanted and self._spec_bytes >= SCRAPE_PREFETCH_MAX_BYTES:
+                self._spec_skipped.add(key)
+                return None
+            self._spec_started.add(key)
+        content = self._scrape_single(url)
+        with self._lock:
+            self._spec_bytes += len(content.encode("utf-8"))
+        return content
+
+    def _scrape_single(self, url: str) -> str:
+        """Scrape une URL unique avec fallback Firecrawl ; rend le contenu (ou "")."""
+        content = ""
+        source_method = None
+
+        # 0. Texte déjà présent dans le corpus local (Légifrance / BOFiP)
+        local = corpus_content(url)
+        metrics.cache_lookup("corpus", bool(local))
+        if local:
+            logger.debug(f"Scraped {url} using corpus")
+            return local
+
+        # 1. Essayer d'abord avec LegalScraper
+        try:
+            scraped = self._scraper.scrape_url(url)
+            if scraped:
+                if hasattr(scraped, "content") and scraped.content:
+                    content = scraped.content
+                    source_method = "LegalScraper"
+                elif isinstance(scraped, dict) and scraped.get("content"):
+                    content = scraped["content"]
+                    source_method = "LegalScraper"
+        except Exception as e:
+            logger.warning(f"LegalScraper failed for {url}: {e}")
+
+        # 2. Fallback Firecrawl si contenu vide
+        if not content or 'requires JS' in content:
             try:
-                scraper.close()
-            except Exception:
-                pass
+                if self._firecrawl_client is None:
+                    from firecrawl import V1FirecrawlApp
+                    api_key = os.getenv("FIRECRAWL_API_KEY")
+                    if api_key:
+                        self._firecrawl_client = V1FirecrawlApp(api_key=api_key)
+                    else:
+                        logger.warning("FIRECRAWL_API_KEY not set, skipping fallback")
+
+                if self._firecrawl_client:
+                    cleaned_url = clean_url(url)
+                    future = _firecrawl_pool.submit(
+                        self._firecrawl_client.scrape_url, cleaned_url, proxy='stealth'
+                    )
+                    with metrics.http_call("firecrawl", urlparse(cleaned_url).netloc):
+                        result = future.result(timeout=FIRECRAWL_TIMEOUT_S)
+                    if result and result.markdown:
+                        content = result.markdown
+                        source_method = "Firecrawl"
+                        logger.info(f"Firecrawl fallback success for {cleaned_url}")
+            except FuturesTimeout:
+                logger.warning(
+                    "Firecrawl fallback timeout (%ss) for %s", FIRECRAWL_TIMEOUT_S, url
+                )
+            except Exception as e:
+                logger.warning(f"Firecrawl fallback failed for {url}: {e}")
+
+        if source_method:
+            logger.debug(f"Scraped {url} using {source_method}")
+        return content
 
-        return enriched
 
+def scrapper(ranked_keep: List[Dict]) -> List[Dict]:
+    """
+    Pour chaque document de la liste filtrée, utilise LegalScraper pour récupérer le contenu de l'URL.
+    Si le scraping échoue ou retourne un contenu vide, utilise Firecrawl comme fallback.
+    Ajoute une clé 'content' au dictionnaire.
+    Les URLs sont scrapées en parallèle pour réduire le temps total.
+    """
+    if not ranked_keep:
+        return []
+
+    try:
+        with ScrapeSession(max_workers=min(SCRAPE_MAX_WORKERS, len(ranked_keep))) as session:
+            return session.results(ranked_keep)
     except ImportError as e:
         logger.error(f"Import error: {e}")
         return ranked_keep
@@ -8,6 +8,8 @@ from urllib.parse import urlparse
 from typing import List, Dict
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from utils import metrics, profiler
+
 logger = logging.getLogger(__name__)
 
 # Taille du pool de requêtes SerpAPI. Sous FastAPI, plusieurs pipelines tournent
@@ -20,6 +22,8 @@ SERPAPI_TIMEOUT = (
     float(os.getenv("SERPAPI_CONNECT_TIMEOUT", "5")),
     float(os.getenv("SERPAPI_READ_TIMEOUT", "20")),
 )
+# Surchargeable : banc de charge (`bench/loadtest`) ou proxy de sortie.
+SERPAPI_ENDPOINT = os.getenv("SERPAPI_ENDPOINT", "https://serpapi.com/search")
 
 # Domaines couverts par JusticeLibre (retirés de SerpAPI quand JL est actif)
 JL_COVERED_DOMAINS = {"conseil-etat.fr", "courdecassation.fr", "europa.eu"}
@@ -57,7 +61,7 @@ def search_official_sources(
     Returns:
         Liste de dictionnaires structurés avec titre, URL, snippet, domaine, position.
     """
-    endpoint = "https://serpapi.com/search"
+    endpoint = SERPAPI_ENDPOINT
     results = []
     
     # Utiliser les domaines actifs ou tous les domaines par défaut
@@ -86,9 +90,10 @@ def search_official_sources(
         }
         query_results = []
         try:
-            resp = requests.get(endpoint, params=params, timeout=SERPAPI_TIMEOUT)
-            resp.raise_for_status()
-            data = resp.json()
+            with metrics.http_call("serpapi", urlparse(endpoint).netloc):
+                resp = requests.get(endpoint, params=params, timeout=SERPAPI_TIMEOUT)
+                resp.raise_for_status()
+                data = resp.json()
         except Exception as exc:
             logger.warning(f"Erreur lors de l'appel SerpAPI pour '{query}': {exc}")
             return query_results
@@ -113,8 +118,10 @@ def search_official_sources(
         return query_results
 
     # Exécution parallèle des requêtes
-    with ThreadPoolExecutor(max_workers=min(SEARCH_MAX_WORKERS, max(1, len(queries)))) as executor:
-        futures = {executor.submit(_search_single_query, q): q for q in queries}
+    pool = ThreadPoolExecutor(max_workers=min(SEARCH_MAX_WORKERS, max(1, len(queries))),
+                              thread_name_prefix="search")
+    with metrics.track_pool("search", pool) as executor:
+        futures = {executor.submit(profiler.bind(_search_single_query, "search"), q): q for q in queries}
         for future in as_completed(futures):
             results.extend(future.result())
 
@@ -137,14 +144,43 @@ def search_with_fallback(
         • SerpAPI couvre le reste (BOFiP, Légifrance, Assemblée, Sénat, fiscalonline…)
     - Si JL est indisponible (down / timeout) : fallback automatique vers SerpAPI seul.
     - Si use_justicelibre=False ou analyst_json absent : SerpAPI seul.
+
+    Dans tous les cas, le corpus local (`utils.corpus`, CGI / LPF / BOFiP) est
+    interrogé d'abord : ses résultats arrivent avec leur `content`, et les
+    domaines qu'il couvre entièrement sortent du périmètre SerpAPI. Avec
+    `analyst_json`, l'index dense (`utils.dense`) est interrogé sur les axes de
+    recherche et concepts clefs de l'analyste.
     """
     jl_results: List[Dict] = []
     serp_domains = list(active_domains) if active_domains is not None else list(OFFICIAL_DOMAINS)
+    requested_domains = list(serp_domains)
+
+    corpus_results: List[Dict] = []
+    try:
+        from utils.corpus import CORPUS_SERP_EXCLUDED_DOMAINS, search_corpus
+        corpus_results = search_corpus(queries, active_domains=serp_domains)
+        if corpus_results:
+            covered = {r["source_domain"] for r in corpus_results}
+            serp_domains = [d for d in serp_domains
+                            if not (d in CORPUS_SERP_EXCLUDED_DOMAINS and d in covered)]
+            logger.info("[search] Corpus local — %d résultats", len(corpus_results))
+    except Exception as exc:
+        logger.warning("[search] Corpus local en erreur (%s) — recherche web seule", exc)
+
+    dense_results: List[Dict] = []
+    if analyst_json:
+        try:
+            from utils.dense import dense_queries, search_dense
+            dense_results = search_dense(dense_queries(analyst_json), active_domains=requested_domains)
+            if dense_results:
+                logger.info("[search] Index dense — %d résultats", len(dense_results))
+        except Exception as exc:
+            logger.warning("[search] Index dense en erreur (%s) — ignoré", exc)
 
     if use_justicelibre and analyst_json:
         try:
-            from utils.justicelibre import MCPClient, is_jl_available, search_justicelibre
-            client = MCPClient(url="https://justicelibre.org/mcp")
+            from utils.justicelibre import JL_MCP_URL, MCPClient, is_jl_available, search_justicelibre
+            client = MCPClient(url=JL_MCP_URL)
             client.initialize()
             if is_jl_available(client):
                 jl_results = search_justicelibre(analyst_json, client)
@@ -169,4 +205,4 @@ def search_with_fallback(
             active_domains=serp_domains,
         )
 
-    return jl_results + serp_results
+    return corpus_results + dense_results + jl_results + serp_results
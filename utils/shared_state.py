@@ -0,0 +1,442 @@
+"""
+État partagé entre les workers gunicorn : quotas par utilisateur et places
+d'exécution.
+
+En mémoire, chaque worker tenait ses propres compteurs : avec
+`WEB_CONCURRENCY=2`, un abonné disposait de deux quotas et le serveur de deux
+fois `MAX_CONCURRENT_PIPELINES` places, réparties au hasard de l'équilibrage.
+Les backends ci-dessous rendent quotas et capacité **globaux** :
+
+- `SQLiteSharedState` (défaut) : un fichier SQLite en WAL, chaque opération
+  dans une transaction `BEGIN IMMEDIATE` — atomique entre processus d'un même
+  serveur, sans service externe ;
+- `RedisSharedState` : pour un service répliqué sur plusieurs serveurs. Ne
+  s'appuie que sur `GET` / `SET NX PX` / `DEL` (verrou court par clé), donc
+  n'importe quel client compatible Redis convient — y compris un substitut
+  local en test ;
+- `MemorySharedState` : mono-process (un seul worker, outils, tests), à
+  verrous segmentés et éviction des utilisateurs inactifs.
+
+Fenêtre glissante d'un quota : un **anneau** des `n` derniers horodatages
+(`n` = quota le plus large), sérialisé en quelques centaines d'octets. Le
+k-ième appel le plus récent est à `head - k` : vérifier « au plus `k` appels
+sur `window` secondes » revient à lire une case, sans parcourir l'historique —
+O(1) par appel, exact, là où des compteurs par minute n'approcheraient la
+fenêtre glissante qu'à la minute près. Banc d'essai : `bench/rate_limiter.py`.
+
+Places d'exécution : des **baux** (`holder` → échéance). Un bail expire seul
+(`ttl_s`) si son worker meurt sans le rendre ; en SQLite, les baux d'un PID
+disparu sont repris aussitôt.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "data/shared_state.sqlite")
+
+# (quota, fenêtre en secondes) — ex. ((30, 3600.0), (3, 60.0)). Un tuple :
+# sa forme (taille d'anneau, plus longue fenêtre) est calculée une fois.
+Limits = Tuple[Tuple[int, float], ...]
+
+# Purge des fenêtres inactives (SQLite), toutes les N écritures.
+_PURGE_EVERY = 1000
+
+
+# ─── Anneau d'horodatages ─────────────────────────────────────────────────────
+def ring_hit(ring: array, head: int, limits: Limits, now: float) -> Tuple[array, int, Optional[float]]:
+    """Applique les quotas `limits` à l'anneau `ring` (tête `head`).
+
+    Rend `(ring, head, retry_after)` : `retry_after` vaut None si l'appel est
+    accepté — il est alors enregistré — et sinon le délai avant qu'il le soit.
+    L'anneau est redimensionné si le quota le plus large a changé.
+    """
+    size, _ = _shape(limits)
+    if not ring:
+        ring, head = array("d", bytes(8 * size)), 0
+    elif len(ring) != size:
+        chronological = list(ring[head:]) + list(ring[:head])
+        kept = chronological[-size:]
+        ring = array("d", [0.0] * (size - len(kept)) + kept)
+        head = 0
+    retry_after = None
+    for limit, window in limits:
+        if limit <= 0:
+            return ring, head, window
+        oldest = ring[(head - limit) % size]          # k-ième appel le plus récent
+        if oldest and now - oldest < window:
+            wait = window - (now - oldest)
+            retry_after = max(retry_after or 0.0, wait)
+    if retry_after is not None:
+        return ring, head, retry_after
+    ring[head] = now
+    return ring, (head + 1) % size, None
+
+
+@lru_cache(maxsize=32)
+def _shape(limits: Limits) -> Tuple[int, float]:
+    """Taille d'anneau (quota le plus large) et plus longue fenêtre."""
+    return max(limit for limit, _ in limits), max(window for _, window in limits)
+
+
+def _pack(ring: array, head: int) -> bytes:
+    return struct.pack("<I", head) + ring.tobytes()
+
+
+def _unpack(blob: Optional[bytes]) -> Tuple[array, int]:
+    if not blob:
+        return array("d"), 0
+    ring = array("d")
+    ring.frombytes(blob[4:])
+    return ring, struct.unpack("<I", blob[:4])[0]
+
+
+def new_holder() -> str:
+    """Identifiant de bail, unique entre processus."""
+    return f"{os.getpid()}:{uuid.uuid4().hex[:12]}"
+
+
+# ─── Backends ─────────────────────────────────────────────────────────────────
+class SharedState:
+    """Interface commune des backends."""
+
+    def hit(self, key: str, limits: Limits, now: Optional[float] = None) -> Optional[float]:
+        """Enregistre un appel de `key` s'il respecte `limits` ; sinon rend le
+        délai (s) avant qu'il le fasse."""
+        raise NotImplementedError
+
+    def acquire_slot(self, holder: str, capacity: int, ttl_s: float) -> bool:
+        """Prend une place si moins de `capacity` sont occupées."""
+        raise NotImplementedError
+
+    def release_slot(self, holder: str) -> None:
+        raise NotImplementedError
+
+    def slots_in_use(self) -> int:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """Efface quotas et baux (tests, outils)."""
+        raise NotImplementedError
+
+
+class _Stripe:
+    """Un segment des fenêtres en mémoire : son verrou et ses clés, de la moins
+    récemment vue à la plus récente."""
+
+    __slots__ = ("lock", "rings")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # clé → [anneau, tête, dernier appel accepté]
+        self.rings: "OrderedDict[str, list]" = OrderedDict()
+
+
+class MemorySharedState(SharedState):
+    """Mono-process : les compteurs ne quittent pas le worker.
+
+    Les fenêtres sont réparties en `stripes` segments à verrou propre : deux
+    utilisateurs différents ne se disputent (presque) jamais le même verrou.
+    Chaque segment est rangé par dernier accès ; à chaque appel, les clés
+    restées inactives plus longtemps que la plus longue fenêtre sont évincées
+    par la tête — coût amorti constant, mémoire bornée aux utilisateurs actifs.
+    """
+
+    def __init__(self, stripes: int = 16):
+        self._stripes = [_Stripe() for _ in range(stripes)]
+        self._leases: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limits: Limits, now: Optional[float] = None) -> Optional[float]:
+        now = time.time() if now is None else now
+        stripe = self._stripes[hash(key) % len(self._stripes)]
+        with stripe.lock:
+            rings = stripe.rings
+            if rings:
+                horizon = now - _shape(limits)[1]
+                if next(iter(rings.values()))[2] < horizon:
+                    _evict_idle(rings, horizon)
+            entry = rings.get(key)
+            if entry is None:
+                ring, head, retry_after = ring_hit(array("d"), 0, limits, now)
+                if retry_after is None:
+                    rings[key] = [ring, head, now]
+                return retry_after
+            ring, head, retry_after = ring_hit(entry[0], entry[1], limits, now)
+            if retry_after is None:
+                entry[0], entry[1], entry[2] = ring, head, now
+                rings.move_to_end(key)
+            return retry_after
+
+    def keys(self) -> int:
+        """Nombre d'utilisateurs suivis (bancs d'essai, diagnostic)."""
+        return sum(len(stripe.rings) for stripe in self._stripes)
+
+    def acquire_slot(self, holder: str, capacity: int, ttl_s: float) -> bool:
+        now = time.time()
+        with self._lock:
+            self._leases = {h: exp for h, exp in self._leases.items() if exp > now}
+            if holder not in self._leases and len(self._leases) >= capacity:
+                return False
+            self._leases[holder] = now + ttl_s
+            return True
+
+    def release_slot(self, holder: str) -> None:
+        with self._lock:
+            self._leases.pop(holder, None)
+
+    def slots_in_use(self) -> int:
+        now = time.time()
+        with self._lock:
+            return sum(1 for exp in self._leases.values() if exp > now)
+
+    def reset(self) -> None:
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.rings.clear()
+        with self._lock:
+            self._leases.clear()
+
+
+def _evict_idle(rings: "OrderedDict[str, list]", horizon: float) -> None:
+    """Retire, par la tête, les fenêtres dont le dernier appel précède `horizon`."""
+    while rings:
+        key, entry = next(iter(rings.items()))
+        if entry[2] >= horizon:
+            return
+        del rings[key]
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_windows (
+    key         TEXT PRIMARY KEY,
+    ring        BLOB NOT NULL,          -- tête (uint32) + horodatages (float64)
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rate_windows_updated ON rate_windows (updated_at);
+CREATE TABLE IF NOT EXISTS slot_leases (
+    holder      TEXT PRIMARY KEY,
+    pid         INTEGER NOT NULL,
+    acquired_at REAL NOT NULL,
+    expires_at  REAL NOT NULL
+);
+"""
+
+
+class SQLiteSharedState(SharedState):
+    """Fichier SQLite partagé par les workers d'un serveur ; une connexion par thread."""
+
+    def __init__(self, path: str = SHARED_STATE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None : transactions explicites (BEGIN IMMEDIATE).
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")       # verrou d'écriture pris d'emblée
+        return conn
+
+    def hit(self, key: str, limits: Limits, now: Optional[float] = None) -> Optional[float]:
+        now = time.time() if now is None else now
+        conn = self._transaction()
+        try:
+            row = conn.execute("SELECT ring FROM rate_windows WHERE key = ?", (key,)).fetchone()
+            ring, head = _unpack(row[0] if row else None)
+            ring, head, retry_after = ring_hit(ring, head, limits, now)
+            if retry_after is None:
+                conn.execute("INSERT OR REPLACE INTO rate_windows (key, ring, updated_at) VALUES (?, ?, ?)",
+                             (key, _pack(ring, head), now))
+                self._writes += 1
+                if self._writes % _PURGE_EVERY == 0:
+                    conn.execute("DELETE FROM rate_windows WHERE updated_at < ?",
+                                 (now - _shape(limits)[1],))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after
+
+    def acquire_slot(self, holder: str, capacity: int, ttl_s: float) -> bool:
+        now = time.time()
+        conn = self._transaction()
+        try:
+            conn.execute("DELETE FROM slot_leases WHERE expires_at <= ?", (now,))
+            for (pid,) in conn.execute("SELECT DISTINCT pid FROM slot_leases").fetchall():
+                if not pid_alive(pid):
+                    logger.warning("Places d'exécution : baux du worker %d (disparu) repris", pid)
+                    conn.execute("DELETE FROM slot_leases WHERE pid = ?", (pid,))
+            in_use = conn.execute("SELECT COUNT(*) FROM slot_leases WHERE holder != ?",
+                                  (holder,)).fetchone()[0]
+            granted = in_use < capacity
+            if granted:
+                conn.execute("INSERT OR REPLACE INTO slot_leases (holder, pid, acquired_at, expires_at) "
+                             "VALUES (?, ?, ?, ?)", (holder, os.getpid(), now, now + ttl_s))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return granted
+
+    def release_slot(self, holder: str) -> None:
+        self._conn().execute("DELETE FROM slot_leases WHERE holder = ?", (holder,))
+
+    def slots_in_use(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM slot_leases WHERE expires_at > ?",
+                                    (time.time(),)).fetchone()[0]
+
+    def reset(self) -> None:
+        conn = self._transaction()
+        conn.execute("DELETE FROM rate_windows")
+        conn.execute("DELETE FROM slot_leases")
+        conn.execute("COMMIT")
+
+
+def pid_alive(pid: int) -> bool:
+    """Le processus `pid` existe-t-il encore (sur cette machine) ?"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:        # processus d'un autre utilisateur : vivant
+        return True
+    return True
+
+
+class RedisSharedState(SharedState):
+    """Backend Redis (ou compatible), pour un service réparti sur plusieurs serveurs.
+
+    `client` : objet exposant `get`, `set(name, value, nx=, px=)` et `delete` —
+    `redis.Redis` en production, un substitut local en test. Chaque
+    lecture-modification-écriture se fait sous un verrou court `SET NX PX` sur
+    la clé concernée.
+    """
+
+    LOCK_TTL_MS = 2000
+
+    def __init__(self, client, prefix: str = "fisca:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "fisca:") -> "RedisSharedState":
+        import redis  # dépendance optionnelle, seulement pour ce backend
+        return cls(redis.Redis.from_url(url), prefix)
+
+    def _locked(self, key: str):
+        return _RedisLock(self.client, f"{self.prefix}lock:{key}", self.LOCK_TTL_MS)
+
+    def hit(self, key: str, limits: Limits, now: Optional[float] = None) -> Optional[float]:
+        now = time.time() if now is None else now
+        name = f"{self.prefix}rl:{key}"
+        with self._locked(name):
+            ring, head = _unpack(self.client.get(name))
+            ring, head, retry_after = ring_hit(ring, head, limits, now)
+            if retry_after is None:
+                # L'expiration Redis fait office de purge des utilisateurs inactifs.
+                horizon_ms = int(_shape(limits)[1] * 1000)
+                self.client.set(name, _pack(ring, head), px=horizon_ms)
+        return retry_after
+
+    def _leases(self) -> Dict[str, float]:
+        raw = self.client.get(f"{self.prefix}slots")
+        leases = json.loads(raw) if raw else {}
+        now = time.time()
+        return {h: exp for h, exp in leases.items() if exp > now}
+
+    def acquire_slot(self, holder: str, capacity: int, ttl_s: float) -> bool:
+        with self._locked("slots"):
+            leases = self._leases()
+            if holder not in leases and len(leases) >= capacity:
+                return False
+            leases[holder] = time.time() + ttl_s
+            self.client.set(f"{self.prefix}slots", json.dumps(leases))
+            return True
+
+    def release_slot(self, holder: str) -> None:
+        with self._locked("slots"):
+            leases = self._leases()
+            if leases.pop(holder, None) is not None:
+                self.client.set(f"{self.prefix}slots", json.dumps(leases))
+
+    def slots_in_use(self) -> int:
+        return len(self._leases())
+
+    def reset(self) -> None:
+        self.client.delete(f"{self.prefix}slots")
+        # Les fenêtres de quota expirent seules ; on ne parcourt pas les clés.
+
+
+class _RedisLock:
+    """Verrou `SET NX PX` ; rendu seulement par son détenteur."""
+
+    def __init__(self, client, name: str, ttl_ms: int, wait_s: float = 2.0):
+        self.client = client
+        self.name = name
+        self.ttl_ms = ttl_ms
+        self.wait_s = wait_s
+        self.token = uuid.uuid4().hex
+
+    def __enter__(self) -> "_RedisLock":
+        deadline = time.monotonic() + self.wait_s
+        while not self.client.set(self.name, self.token, nx=True, px=self.ttl_ms):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Verrou {self.name} indisponible")
+            time.sleep(0.005)
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        held = self.client.get(self.name)
+        if held in (self.token, self.token.encode()):
+            self.client.delete(self.name)
+
+
+# ─── Instance du process ─────────────────────────────────────────────────────
+_state: Optional[SharedState] = None
+_state_lock = threading.Lock()
+
+
+def get_shared_state(backend: str = "sqlite", redis_url: str = "") -> SharedState:
+    """Backend partagé du process, créé au premier appel."""
+    global _state
+    with _state_lock:
+        if _state is None:
+            if backend == "redis":
+                _state = RedisSharedState.from_url(redis_url)
+            elif backend == "sqlite":
+                _state = SQLiteSharedState(SHARED_STATE_PATH)
+            else:
+                _state = MemorySharedState()
+    return _state
+
+
+def reset_shared_state() -> None:
+    """Tests uniquement : efface aussi quotas et baux."""
+    global _state
+    if _state is not None:
+        _state.reset()
+    _state = None
+
@@ -0,0 +1,140 @@
+"""
+Magasin clé → valeur JSON à durée de vie, sur SQLite.
+
+Partagé par les caches applicatifs (réponses complètes, …) : un fichier
+SQLite en mode WAL est lu et écrit sans heurt par les workers gunicorn d'un même
+serveur, ce qu'un dict en mémoire ne permet pas — chaque worker aurait son
+propre cache, et une invalidation n'en viderait qu'un.
+
+Les entrées sont rangées par espace de noms (`namespace`) ; une entrée peut
+porter un vecteur (float32) pour les recherches par similarité. Les entrées
+expirées ne sont jamais rendues, et sont purgées à l'écriture.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Fichier par défaut des caches applicatifs (chacun peut avoir le sien).
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "data/cache.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace   TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    value       TEXT NOT NULL,          -- JSON
+    vector      BLOB,                   -- float32, optionnel
+    created_at  REAL NOT NULL,
+    expires_at  REAL NOT NULL,
+    hits        INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires_at);
+"""
+
+
+class TTLStore:
+    """Accès au magasin ; une connexion SQLite par thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        """Valeur de `key` (avec `created_at`), ou None si absente ou expirée."""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, created_at FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE entries SET hits = hits + 1 WHERE namespace = ? AND key = ?",
+                     (namespace, key))
+        conn.commit()
+        return {"value": json.loads(row["value"]), "created_at": row["created_at"]}
+
+    def put(self, namespace: str, key: str, value: Any, ttl_s: float,
+            vector: Optional[np.ndarray] = None) -> None:
+        now = time.time()
+        blob = np.asarray(vector, dtype=np.float32).tobytes() if vector is not None else None
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, vector, created_at, expires_at, hits) "
+            "VALUES (?, ?, ?, ?, ?, ?, 0)",
+            (namespace, key, json.dumps(value, ensure_ascii=False, default=str), blob, now, now + ttl_s),
+        )
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        conn.commit()
+
+    def vectors(self, namespace: str) -> Tuple[List[str], np.ndarray]:
+        """Clés et vecteurs (matrice float32) des entrées vivantes de `namespace`."""
+        rows = self._conn().execute(
+            "SELECT key, vector FROM entries WHERE namespace = ? AND expires_at > ? AND vector IS NOT NULL",
+            (namespace, time.time()),
+        ).fetchall()
+        if not rows:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return ([row["key"] for row in rows],
+                np.stack([np.frombuffer(row["vector"], dtype=np.float32) for row in rows]))
+
+    def delete(self, namespace_prefix: str, key: Optional[str] = None,
+               contains: Optional[str] = None) -> int:
+        """Supprime les entrées dont l'espace de noms commence par `namespace_prefix`.
+
+        `key` restreint à une clé exacte, `contains` aux valeurs dont le JSON
+        contient la chaîne (insensible à la casse). Rend le nombre d'entrées supprimées.
+        """
+        sql = "DELETE FROM entries WHERE namespace LIKE ? ESCAPE '\\'"
+        params: list = [_like_prefix(namespace_prefix)]
+        if key is not None:
+            sql += " AND key = ?"
+            params.append(key)
+        if contains:
+            sql += " AND lower(value) LIKE ? ESCAPE '\\'"
+            params.append(f"%{_like_escape(contains.lower())}%")
+        conn = self._conn()
+        deleted = conn.execute(sql, params).rowcount
+        conn.commit()
+        return deleted
+
+    def stats(self, namespace_prefix: str) -> Dict[str, Any]:
+        row = self._conn().execute(
+            "SELECT COUNT(*) AS entries, COALESCE(SUM(hits), 0) AS hits, MIN(created_at) AS oldest "
+            "FROM entries WHERE namespace LIKE ? ESCAPE '\\' AND expires_at > ?",
+            (_like_prefix(namespace_prefix), time.time()),
+        ).fetchone()
+        return {"entries": row["entries"], "hits": row["hits"],
+                "oldest_age_s": round(time.time() - row["oldest"], 1) if row["oldest"] else None}
+
+
+def _like_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _like_prefix(prefix: str) -> str:
+    return _like_escape(prefix) + "%"
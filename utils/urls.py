@@ -0,0 +1,99 @@
+"""
+Canonicalisation des URL de sources juridiques.
+
+Une même source arrive sous plusieurs URL : l'article Légifrance en
+`/codes/article_lc/LEGIARTI…`, `/codes/id/LEGIARTI…`, avec `;jsessionid=` ou des
+paramètres de suivi, ou sous la forme `/ceta/id/` construite pour JusticeLibre ;
+la même page BOFiP en `bofip/NNNN-PGP.html`, `…/identifiant=BOI-…-AAAAMMJJ`, etc.
+Dédupliquer sur la chaîne brute laisse passer ces doublons jusqu'au ranker
+(tokens) et au scraping (requêtes).
+
+`canonical_url` réduit chaque URL à une clé stable :
+
+  * Légifrance → l'identifiant le plus précis présent (`LEGIARTI`, `CETATEXT`,
+    `JURITEXT`…), suivi de la date de version s'il y en a une ;
+  * BOFiP      → le numéro de publication `NNNN-PGP`, à défaut la référence
+    BOI sans sa date de publication ;
+  * ailleurs   → URL normalisée (hôte en minuscules sans `www.`, sans
+    fragment, sans paramètres de suivi, paramètres triés).
+
+`clean_url` retire seulement les artefacts de session qui font échouer
+Firecrawl ; l'URL reste une URL.
+"""
+from __future__ import annotations
+
+import re
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# Identifiants Légifrance, du plus précis au plus général : une URL de section
+# porte aussi le LEGITEXT du code, qu'il ne faut pas retenir comme clé.
+_LEGIFRANCE_IDS = (
+    "LEGIARTI", "JORFARTI", "KALIARTI",
+    "CETATEXT", "JURITEXT", "CONSTEXT", "CNILTEXT",
+    "LEGISCTA", "JORFTEXT", "KALITEXT", "LEGITEXT",
+)
+_LEGIFRANCE_ID_RE = re.compile(r"(" + "|".join(_LEGIFRANCE_IDS) + r")(\d{12})", re.IGNORECASE)
+# Date de version (`/codes/article_lc/LEGIARTI…/2019-01-01`).
+_LEGIFRANCE_DATE_RE = re.compile(r"/(\d{4}-\d{2}-\d{2})(?:[/?#]|$)")
+
+_BOFIP_PGP_RE = re.compile(r"/(\d{1,6})-PGP(?:\.html)?", re.IGNORECASE)
+_BOFIP_BOI_RE = re.compile(r"(BOI(?:-[A-Z0-9]+)+)", re.IGNORECASE)
+# Date de publication accolée à la référence BOI (`…-20-20-20230215`).
+_BOI_DATE_RE = re.compile(r"-\d{8}$")
+
+# Paramètres sans incidence sur le contenu.
+_TRACKING_PARAMS = re.compile(
+    r"^(utm_[a-z]+|gclid|fbclid|msclkid|xtor|xtref|mc_[a-z]+|_ga|ref|cid|jsessionid)$",
+    re.IGNORECASE,
+)
+_JSESSIONID_RE = re.compile(r";jsessionid=[^/?&#]+", re.IGNORECASE)
+
+
+def clean_url(url: str) -> str:
+    """Retire `;jsessionid=` et le paramètre `cid` (rejetés par Firecrawl)."""
+    cleaned = _JSESSIONID_RE.sub("", url or "")
+    cleaned = re.sub(r'([&?])cid=[^&]+', lambda m: '?' if m.group(1) == '?' else '', cleaned)
+    cleaned = re.sub(r'\?$', '', cleaned)
+    return cleaned
+
+
+def _host(netloc: str) -> str:
+    host = netloc.lower().split("@")[-1].split(":")[0]
+    return host[4:] if host.startswith("www.") else host
+
+
+def canonical_url(url: str) -> str:
+    """Clé canonique d'une URL de source (voir le docstring du module).
+
+    Deux URL qui désignent le même document ont la même clé ; une URL
+    illisible est rendue telle quelle.
+    """
+    if not url:
+        return ""
+    try:
+        parsed = urlparse(_JSESSIONID_RE.sub("", url.strip()))
+    except ValueError:
+        return url
+    host = _host(parsed.netloc)
+
+    if host.endswith("legifrance.gouv.fr"):
+        found = {m.group(1).upper(): m.group(2) for m in _LEGIFRANCE_ID_RE.finditer(url)}
+        for prefix in _LEGIFRANCE_IDS:
+            if prefix in found:
+                key = f"legifrance:{prefix}{found[prefix]}"
+                date = _LEGIFRANCE_DATE_RE.search(parsed.path)
+                return f"{key}@{date.group(1)}" if date else key
+
+    if host.endswith("bofip.impots.gouv.fr"):
+        pgp = _BOFIP_PGP_RE.search(parsed.path)
+        if pgp:
+            return f"bofip:{pgp.group(1)}-PGP"
+        boi = _BOFIP_BOI_RE.search(url)
+        if boi:
+            return "bofip:" + _BOI_DATE_RE.sub("", boi.group(1).upper())
+
+    query = sorted((k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+                   if not _TRACKING_PARAMS.match(k))
+    path = parsed.path.rstrip("/") or "/"
+    return urlunparse(("https" if parsed.scheme in ("http", "https") else parsed.scheme,
+                       host, path, "", urlencode(query), ""))